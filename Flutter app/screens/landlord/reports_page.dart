@@ -13,7 +13,10 @@ class ReportsPage extends StatefulWidget {
 }
 
 class _ReportsPageState extends State<ReportsPage> {
+  static const int _pageSize = 50;
+
   bool _isLoading = true;
+  bool _isLoadingMore = false;
   Map<String, dynamic>? _reportsData;
   String? _error;
   final ScrollController _scrollController = ScrollController();
@@ -21,9 +24,65 @@ class _ReportsPageState extends State<ReportsPage> {
   @override
   void initState() {
     super.initState();
+    _scrollController.addListener(_onScroll);
     _loadReports();
   }
 
+  void _onScroll() {
+    if (_scrollController.position.pixels >= _scrollController.position.maxScrollExtent - 300) {
+      _loadMore();
+    }
+  }
+
+  bool get _hasMore {
+    final pagination = _reportsData?['pagination'] as Map<String, dynamic>?;
+    if (pagination == null) return false;
+    return pagination['has_more_bookings'] == true || pagination['has_more_payments'] == true;
+  }
+
+  Future<Map<String, dynamic>> _fetchPage(int skip) async {
+    final token = await UserSessionService.getUserToken();
+    if (token == null) {
+      throw Exception('Not authenticated');
+    }
+
+    final response = await http.get(
+      Uri.parse('$kBaseUrl/bookings/landlord/reports/').replace(queryParameters: {
+        'skip': skip.toString(),
+        'limit': _pageSize.toString(),
+      }),
+      headers: {
+        'Authorization': 'Bearer $token',
+        'Content-Type': 'application/json',
+      },
+    );
+
+    if (response.statusCode != 200) {
+      throw Exception('Failed to load reports: ${response.statusCode}');
+    }
+    return json.decode(utf8.decode(response.bodyBytes)) as Map<String, dynamic>;
+  }
+
+  Future<void> _loadMore() async {
+    if (_isLoading || _isLoadingMore || _reportsData == null || !_hasMore) return;
+    setState(() => _isLoadingMore = true);
+
+    try {
+      final pagination = _reportsData!['pagination'] as Map<String, dynamic>;
+      final skip = (pagination['skip'] as int) + _pageSize;
+      final page = await _fetchPage(skip);
+      setState(() {
+        (_reportsData!['bookings'] as List<dynamic>).addAll(page['bookings'] as List<dynamic>);
+        (_reportsData!['payments'] as List<dynamic>).addAll(page['payments'] as List<dynamic>);
+        _reportsData!['summary'] = page['summary'];
+        _reportsData!['pagination'] = page['pagination'];
+        _isLoadingMore = false;
+      });
+    } catch (e) {
+      setState(() => _isLoadingMore = false);
+    }
+  }
+
   @override
   void dispose() {
     _scrollController.dispose();
@@ -37,28 +96,11 @@ class _ReportsPageState extends State<ReportsPage> {
     });
 
     try {
-      final token = await UserSessionService.getUserToken();
-      if (token == null) {
-        throw Exception('Not authenticated');
-      }
-
-      final response = await http.get(
-        Uri.parse('$kBaseUrl/bookings/landlord/reports/'),
-        headers: {
-          'Authorization': 'Bearer $token',
-          'Content-Type': 'application/json',
-        },
-      );
-
-      if (response.statusCode == 200) {
-        final data = json.decode(utf8.decode(response.bodyBytes));
-        setState(() {
-          _reportsData = data;
-          _isLoading = false;
-        });
-      } else {
-        throw Exception('Failed to load reports: ${response.statusCode}');
-      }
+      final data = await _fetchPage(0);
+      setState(() {
+        _reportsData = data;
+        _isLoading = false;
+      });
     } catch (e) {
       setState(() {
         _error = e.toString();
@@ -164,6 +206,12 @@ class _ReportsPageState extends State<ReportsPage> {
                             
                             // Payments Section
                             _buildPaymentsSection(),
+
+                            if (_isLoadingMore)
+                              const Padding(
+                                padding: EdgeInsets.symmetric(vertical: 16),
+                                child: Center(child: CircularProgressIndicator()),
+                              ),
                           ],
                         ),
                       ),
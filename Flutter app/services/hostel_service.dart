@@ -10,6 +10,33 @@ class HostelService {
   
   HostelService._internal();
 
+  // Last ETag and body per URL, so unchanged catalog/detail responses come
+  // back as a bodyless 304 and are served from memory.
+  final Map<String, String> _etags = {};
+  final Map<String, List<int>> _bodies = {};
+
+  Future<http.Response> _conditionalGet(Uri uri) async {
+    final key = uri.toString();
+    final headers = {'Content-Type': 'application/json'};
+    final etag = _etags[key];
+    if (etag != null && _bodies.containsKey(key)) {
+      headers['If-None-Match'] = etag;
+    }
+
+    final response = await http.get(uri, headers: headers);
+    if (response.statusCode == 304 && _bodies.containsKey(key)) {
+      return http.Response.bytes(_bodies[key]!, 200, headers: response.headers);
+    }
+    if (response.statusCode == 200) {
+      final newEtag = response.headers['etag'];
+      if (newEtag != null) {
+        _etags[key] = newEtag;
+        _bodies[key] = response.bodyBytes;
+      }
+    }
+    return response;
+  }
+
   Future<Map<String, dynamic>> createHostel({
     required String landlordEmail,
     required String name,
@@ -58,10 +85,7 @@ class HostelService {
 
   Future<List<Map<String, dynamic>>> getAllHostels() async {
     try {
-      final response = await http.get(
-        Uri.parse('$kBaseUrl/hostels/all-hostels'),
-        headers: {'Content-Type': 'application/json'},
-      );
+      final response = await _conditionalGet(Uri.parse('$kBaseUrl/hostels/all-hostels'));
 
       if (response.statusCode == 200) {
         final List<dynamic> data = jsonDecode(utf8.decode(response.bodyBytes));
@@ -74,6 +98,40 @@ class HostelService {
     }
   }
 
+  /// Fetch one page of the hostel catalog. Pass the `next_cursor` of the
+  /// previous page to continue; the response also carries `has_more`.
+  Future<Map<String, dynamic>> getHostelsPage({String? cursor, int limit = 50}) async {
+    try {
+      final query = <String, String>{'limit': limit.toString()};
+      if (cursor != null) {
+        query['cursor'] = cursor;
+      }
+      final response = await http.get(
+        Uri.parse('$kBaseUrl/hostels/all-hostels').replace(queryParameters: query),
+        headers: {'Content-Type': 'application/json'},
+      );
+
+      if (response.statusCode == 200) {
+        return jsonDecode(utf8.decode(response.bodyBytes)) as Map<String, dynamic>;
+      } else {
+        throw Exception('Failed to load hostels page: ${response.statusCode}');
+      }
+    } catch (e) {
+      throw Exception('Error fetching hostels page: $e');
+    }
+  }
+
+  /// Stream the catalog page by page instead of downloading it in one response.
+  Stream<List<Map<String, dynamic>>> streamAllHostels({int pageSize = 50}) async* {
+    String? cursor;
+    do {
+      final page = await getHostelsPage(cursor: cursor, limit: pageSize);
+      final items = (page['items'] as List<dynamic>).cast<Map<String, dynamic>>();
+      yield items;
+      cursor = page['has_more'] == true ? page['next_cursor'] as String? : null;
+    } while (cursor != null);
+  }
+
   Future<List<Map<String, dynamic>>> getLandlordHostels(String landlordEmail) async {
     try {
       final response = await http.get(
@@ -94,10 +152,7 @@ class HostelService {
 
   Future<Map<String, dynamic>> getHostel(String hostelId) async {
     try {
-      final response = await http.get(
-        Uri.parse('$kBaseUrl/hostels/$hostelId'),
-        headers: {'Content-Type': 'application/json'},
-      );
+      final response = await _conditionalGet(Uri.parse('$kBaseUrl/hostels/$hostelId'));
 
       if (response.statusCode == 200) {
         return json.decode(response.body);
@@ -0,0 +1,87 @@
+import 'dart:convert';
+
+import 'package:http/http.dart' as http;
+import 'package:shared_preferences/shared_preferences.dart';
+
+import '../config.dart';
+import 'auth_helper.dart';
+import 'user_session_service.dart';
+
+/// Client for the `/sync` delta endpoint.
+///
+/// Keeps the last `next_cursor` in shared preferences. [pull] returns the
+/// changed hostels, rooms, media, bookings and notifications since the last
+/// call; when the result has `reset == true` the caller must reload its lists
+/// through the regular endpoints (the cursor is already advanced).
+class SyncService {
+  static const String _cursorKey = 'sync_cursor';
+
+  final String _baseUrl;
+
+  SyncService({String? baseUrl}) : _baseUrl = baseUrl ?? kBaseUrl;
+
+  Future<String?> _loadCursor() async {
+    final prefs = await SharedPreferences.getInstance();
+    return prefs.getString(_cursorKey);
+  }
+
+  Future<void> _saveCursor(String cursor) async {
+    final prefs = await SharedPreferences.getInstance();
+    await prefs.setString(_cursorKey, cursor);
+  }
+
+  Future<void> clearCursor() async {
+    final prefs = await SharedPreferences.getInstance();
+    await prefs.remove(_cursorKey);
+  }
+
+  /// Fetch all pending changes, following `has_more` until caught up.
+  ///
+  /// Returns `{"reset": bool, "changes": {...}}` with the pages merged in order.
+  Future<Map<String, dynamic>> pull({int limit = 200}) async {
+    final token = await UserSessionService.getUserToken();
+    if (token == null) throw Exception('User not authenticated');
+
+    var cursor = await _loadCursor();
+    var reset = false;
+    final merged = <String, Map<String, List<dynamic>>>{};
+
+    while (true) {
+      final query = <String, String>{'limit': limit.toString()};
+      if (cursor != null) {
+        query['cursor'] = cursor;
+      }
+      final response = await http.get(
+        Uri.parse('$_baseUrl/sync').replace(queryParameters: query),
+        headers: {
+          'Authorization': 'Bearer $token',
+          'Content-Type': 'application/json',
+        },
+      );
+
+      if (response.statusCode == 401) {
+        await AuthHelper.handleUnauthorized();
+        throw Exception('Unauthorized');
+      }
+      if (response.statusCode != 200) {
+        throw Exception('Failed to sync: ${response.statusCode}');
+      }
+
+      final page = jsonDecode(utf8.decode(response.bodyBytes)) as Map<String, dynamic>;
+      reset = reset || page['reset'] == true;
+      final changes = (page['changes'] as Map<String, dynamic>? ?? {});
+      changes.forEach((entity, groups) {
+        final target = merged.putIfAbsent(entity, () => {});
+        (groups as Map<String, dynamic>).forEach((action, items) {
+          target.putIfAbsent(action, () => []).addAll(items as List<dynamic>);
+        });
+      });
+
+      cursor = page['next_cursor'] as String;
+      await _saveCursor(cursor);
+      if (page['has_more'] != true) break;
+    }
+
+    return {'reset': reset, 'changes': merged};
+  }
+}
@@ -347,6 +347,27 @@ public function getAllHostels()
         return $response;
     }
 
+    /**
+     * Fetch one page of the hostel catalog using the keyset cursor returned
+     * by the previous page (`next_cursor`).
+     */
+    public function getHostelsPage(?string $cursor = null, int $limit = 50)
+    {
+        $token = session('palevel_token');
+        $headers = [];
+
+        if ($token) {
+            $headers['Authorization'] = "Bearer {$token}";
+        }
+
+        $query = ['limit' => $limit];
+        if ($cursor) {
+            $query['cursor'] = $cursor;
+        }
+
+        return $this->makeRequest('GET', '/hostels/all-hostels', $query, $headers);
+    }
+
     public function verifyExtensionPayment(string $paymentId, string $token)
     {
         return $this->makeRequest('POST', '/payments/verify-extension-payment/', [
@@ -1,11 +1,14 @@
-import os
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Form, Body
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import text, func, desc
 from database import get_db, db_session
-from models import User, Hostel, Room, Booking, Payment, Configuration, Notification, Verification, PaymentPreference, Disbursement, DisbursementCreate, BatchDisbursementCreate
+from models import User, Hostel, Room, Booking, Payment, Configuration, Notification, Verification, PaymentPreference
 from endpoints.users import get_current_user
+from endpoints.hostel_cache import bump_hostel_version
+from endpoints.hostel_stats import rebuild_hostel_stats
+from endpoints.config import get_config_value
+from endpoints.config_cache import config_decimal, invalidate as invalidate_config_cache
 from datetime import datetime, timedelta
 from typing import Optional
 import uuid
@@ -51,9 +54,7 @@ async def get_admin_stats(
     cancelled_bookings = db.query(Booking).filter(Booking.status == 'cancelled').count()
     
     # Revenue statistics
-    platform_fee = db.query(Configuration.config_value).filter(
-        Configuration.config_key == "platform_fee"
-    ).scalar() or 0
+    platform_fee = config_decimal(db, "platform_fee") or 0
     
     total_payments = db.query(Payment).filter(Payment.status == 'completed').count()
     total_revenue = db.query(Payment).filter(Payment.status == 'completed').with_entities(
@@ -486,10 +487,21 @@ async def update_hostel_status(
         raise HTTPException(status_code=404, detail="Hostel not found")
     
     hostel.is_active = (new_status == 'active')
+    bump_hostel_version(db, hostel.hostel_id)
     db.commit()
     
     return {"message": f"Hostel status updated to {new_status}"}
 
+@router.post("/hostel-stats/rebuild")
+def rebuild_hostel_stats_endpoint(
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute hostel statistics from rooms and reviews (repair after manual data fixes)."""
+    rebuild_hostel_stats(db)
+    logger.info("Hostel stats rebuilt by admin %s", current_user.user_id)
+    return {"message": "Hostel statistics rebuilt"}
+
 @router.get("/config")
 async def get_system_config(
     current_user: User = Depends(require_admin_user),
@@ -525,6 +537,7 @@ async def update_system_config(
     
     config.config_value = value
     db.commit()
+    invalidate_config_cache()
     
     return {"message": f"Configuration {config_key} updated to {value}"}
 
@@ -628,8 +641,7 @@ async def get_disbursements(
     """Get disbursement data for landlords with booking details and payment preferences"""
     
     # Get platform fee from configuration
-    platform_fee_config = db.query(Configuration).filter(Configuration.config_key == 'platform_fee').first()
-    platform_fee_amount = float(platform_fee_config.config_value) if platform_fee_config else 10.0
+    platform_fee_amount = get_config_value(db, 'platform_fee', 10.0)
     
     # Query confirmed bookings that haven't been disbursed
     query = db.query(Booking).options(
@@ -702,6 +714,12 @@ async def get_disbursements(
             "disbursement_status": booking.disbursements[0].status if booking.disbursements and len(booking.disbursements) > 0 else "pending"
         })
     
+    # Ledger balances for the landlords on this page: one primary-key lookup
+    from endpoints.ledger import landlord_balances
+    balances = landlord_balances(db, list(landlord_disbursements))
+    for landlord_id, entry in landlord_disbursements.items():
+        entry["ledger"] = balances[landlord_id]
+
     return {
         "total": total,
         "disbursements": list(landlord_disbursements.values()),
@@ -714,277 +732,6 @@ async def get_disbursements(
         }
     }
 
-@router.post("/disbursements/process")
-async def process_disbursement(
-    payload: DisbursementCreate = Body(...),
-    is_batch: bool = False,
-    current_user: User = Depends(require_admin_user),
-    db: Session = Depends(get_db)
-):
-    """Process an individual disbursement to a landlord using JSON payload."""
-
-    booking_id = payload.booking_id
-    landlord_id = payload.landlord_id
-    amount = payload.disbursement_amount if hasattr(payload, 'disbursement_amount') and payload.disbursement_amount is not None else payload.amount
-
-    # Get the booking
-    booking = db.query(Booking).filter(Booking.booking_id == booking_id).first()
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
-
-    # Get landlord
-    landlord = db.query(User).filter(User.user_id == landlord_id, User.user_type == 'landlord').first()
-    if not landlord:
-        raise HTTPException(status_code=404, detail="Landlord not found")
-
-    # Get payment preferences
-    payment_preference = db.query(PaymentPreference).filter(
-        PaymentPreference.user_id == landlord_id,
-        PaymentPreference.is_preferred == True
-    ).first()
-
-    if not payment_preference:
-        raise HTTPException(status_code=400, detail="Landlord has no payment preferences set")
-
-    # Check if disbursement is already processed
-    if booking.disbursements and len(booking.disbursements) > 0:
-        existing_disbursement = booking.disbursements[0]
-        if existing_disbursement.status == 'completed':
-            raise HTTPException(status_code=400, detail="Disbursement already processed")
-
-    try:
-        # Get platform fee from configuration
-        platform_fee_config = db.query(Configuration).filter(Configuration.config_key == 'platform_fee').first()
-        platform_fee_amount = float(platform_fee_config.config_value) if platform_fee_config else 10.0
-        print("Creating disbursement")
-        # Create disbursement record in processing state
-        disbursement = Disbursement(
-            booking_id=booking_id,
-            landlord_id=landlord_id,
-            amount=float(booking.total_amount) if booking.total_amount else 0.0,
-            platform_fee=platform_fee_amount,
-            disbursement_amount=float(amount),
-            status='processing',
-            payment_reference=None,
-            payment_method=payload.payment_method or ('mobile_money' if payment_preference.mobile_number else 'bank_transfer'),
-            processed_at=None
-        )
-        db.add(disbursement)
-        
-        # Update booking status if needed
-        if booking.status != 'confirmed':
-            booking.status = 'confirmed'
-        
-        db.commit()
-        db.refresh(disbursement)
-        print("Disbursement created with ID:", disbursement.disbursement_id)
-        # Determine transfer params (allow overrides from payload)
-        bank_uuid = payload.bank_uuid or getattr(payment_preference, 'bank_uuid', None) or os.getenv('PAYCHANGU_DEFAULT_BANK_UUID')
-        bank_account_number = payload.bank_account_number or payment_preference.account_number or payment_preference.mobile_number
-        bank_account_name = payload.bank_account_name or payment_preference.account_name
-        # Use account_name as the default mobile account name when mobile-specific name is not provided
-        mobile_account_name = payload.mobile_account_name or payment_preference.account_name
-        # Use account_name as the default mobile account name when mobile-specific name is not provided
-        mobile_account_name = payload.mobile_account_name or payment_preference.account_name
-        # Optional mobile operator reference id (fallback to env if not provided)
-        mobile_money_operator_ref_id = payload.mobile_money_operator_ref_id or os.getenv('PAYCHANGU_MOBILE_OPERATOR_REF_ID')
-        payment_method = payload.payment_method or disbursement.payment_method
-
-        print("Executing disbursement via PayChangu")
-        if not bank_uuid:
-            db.rollback()
-            raise HTTPException(status_code=400, detail="Missing bank_uuid for PayChangu transfer. Set PAYCHANGU_DEFAULT_BANK_UUID or provide bank_uuid in request.")
-
-        try:
-            print("Calling process_disbursement for disbursement ID:", disbursement.disbursement_id)
-            # Execute live transfer (this will poll PayChangu and update the DB record)
-            from paychangu_service import process_disbursement as execute_disbursement
-            processed_disb = execute_disbursement(
-                str(disbursement.disbursement_id),
-                bank_uuid=bank_uuid,
-                bank_account_number=str(bank_account_number) if bank_account_number is not None else None,
-                bank_account_name=bank_account_name,
-                mobile_number=payload.mobile_number or payment_preference.mobile_number,
-                mobile_account_name=mobile_account_name,
-                mobile_money_operator_ref_id=bank_uuid,
-                payment_method=payment_method
-            )
-
-            payment_result = {
-                "success": processed_disb.status == 'completed',
-                "transaction_id": processed_disb.payment_reference,
-                "amount": float(processed_disb.disbursement_amount),
-                "status": processed_disb.status,
-                "failure_reason": processed_disb.failure_reason,
-                "landlord_name": f"{landlord.first_name} {landlord.last_name}",
-                "payment_method": {
-                    "mobile_number": payment_preference.mobile_number,
-                    "bank_name": payment_preference.bank_name,
-                    "account_name": payment_preference.account_name,
-                },
-                "processed_at": processed_disb.processed_at.isoformat() if processed_disb.processed_at else None,
-                "message": "Disbursement completed" if processed_disb.status == 'completed' else "Transfer initiated; pending settlement"
-            }
-
-            return payment_result
-
-        except Exception as e:
-            print("Disbursement processing failed:", str(e))
-            logger.exception("PayChangu transfer failed for disbursement=%s: %s", disbursement.disbursement_id, str(e))
-            # process_disbursement already updated the DB to failed; refresh to return failure_reason
-            db.refresh(disbursement)
-            raise HTTPException(status_code=500, detail=f"Failed to process disbursement: {str(e)}")
-        
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to process disbursement: {str(e)}")
-
-@router.post("/disbursements/batch")
-async def process_batch_disbursement(
-    payload: BatchDisbursementCreate = Body(...),
-    current_user: User = Depends(require_admin_user),
-    db: Session = Depends(get_db)
-):
-    """Process batch disbursement for a landlord. Accepts JSON payload; if totals are omitted they will be computed."""
-
-    landlord_id = payload.landlord_id
-    total_amount = payload.total_amount
-    total_bookings = payload.total_bookings
-
-    # Get landlord
-    landlord = db.query(User).filter(User.user_id == landlord_id, User.user_type == 'landlord').first()
-    if not landlord:
-        raise HTTPException(status_code=404, detail="Landlord not found")
-
-    # Get payment preferences
-    payment_preference = db.query(PaymentPreference).filter(
-        PaymentPreference.user_id == landlord_id,
-        PaymentPreference.is_preferred == True
-    ).first()
-
-    if not payment_preference:
-        raise HTTPException(status_code=400, detail="Landlord has no payment preferences set")
-
-    # Get all confirmed bookings for landlord
-    bookings = db.query(Booking).options(
-        joinedload(Booking.disbursements)
-    ).join(Room).join(Hostel).filter(
-        Hostel.landlord_id == landlord_id,
-        Booking.status == 'confirmed'
-    ).all()
-
-    # Filter bookings that haven't been processed
-    unprocessed_bookings = []
-    for booking in bookings:
-        if not booking.disbursements or len(booking.disbursements) == 0 or booking.disbursements[0].status != 'completed':
-            unprocessed_bookings.append(booking)
-
-    if len(unprocessed_bookings) == 0:
-        raise HTTPException(status_code=400, detail="No pending disbursements found for this landlord")
-
-    try:
-        # If totals are not provided, compute them
-        if total_amount is None:
-            total_amount = sum(float(b.total_amount or 0.0) for b in unprocessed_bookings)
-        if total_bookings is None:
-            total_bookings = len(unprocessed_bookings)
-
-        # Create disbursement records for all unprocessed bookings (initially processing)
-        processed_disbursements = []
-        for booking in unprocessed_bookings:
-            # Calculate platform fee and disbursement amount
-            platform_fee_config = db.query(Configuration).filter(Configuration.config_key == 'platform_fee').first()
-            platform_fee_amount = float(platform_fee_config.config_value) if platform_fee_config else 10.0
-
-            booking_amount = float(booking.total_amount) if booking.total_amount else 0.0
-            platform_fee = platform_fee_amount
-            disbursement_amount = booking_amount - platform_fee
-
-            # Determine payment method based on payment preference
-            if payment_preference.mobile_number:
-                payment_method = 'mobile_money'
-            elif payment_preference.account_number:
-                payment_method = 'bank_transfer'
-            else:
-                payment_method = 'bank_transfer'  # fallback
-
-            disbursement = Disbursement(
-                booking_id=booking.booking_id,
-                landlord_id=landlord_id,
-                amount=booking_amount,
-                platform_fee=platform_fee,
-                disbursement_amount=disbursement_amount,
-                status='processing',
-                payment_reference=None,
-                payment_method=payment_method,
-                processed_at=None
-            )
-            db.add(disbursement)
-            processed_disbursements.append(disbursement)
-
-        db.commit()
-
-        # Execute transfers sequentially (will poll each until settled or failed)
-        results = []        # Prefer any stored bank_uuid on the landlord's payment preference, fall back to env default
-        bank_uuid = payload.bank_uuid or getattr(payment_preference, 'bank_uuid', None) or os.getenv('PAYCHANGU_DEFAULT_BANK_UUID')
-        if not bank_uuid:
-            logger.error("Missing bank_uuid for batch disbursement: neither payment preference nor PAYCHANGU_DEFAULT_BANK_UUID is set for landlord=%s", landlord_id)
-            raise HTTPException(status_code=400, detail="Missing bank UUID for batch disbursements. Set PAYCHANGU_DEFAULT_BANK_UUID or save a bank_uuid in the landlord's payment preferences.")
-
-        for disbursement in processed_disbursements:
-            try:
-                from paychangu_service import process_disbursement as execute_disbursement
-                processed = execute_disbursement(
-                    str(disbursement.disbursement_id),
-                    bank_uuid=bank_uuid,
-                    bank_account_number=payment_preference.account_number or payment_preference.mobile_number,
-                    bank_account_name=payment_preference.account_name,
-                    mobile_account_name=payment_preference.account_name,
-                    mobile_money_operator_ref_id=os.getenv('PAYCHANGU_MOBILE_OPERATOR_REF_ID'),
-                    payment_method=disbursement.payment_method
-                )
-                db.refresh(processed)
-                results.append({
-                    "booking_id": str(processed.booking_id),
-                    "amount": float(processed.disbursement_amount),
-                    "transaction_id": processed.payment_reference,
-                    "status": processed.status,
-                    "failure_reason": processed.failure_reason
-                })
-            except Exception as e:
-                db.refresh(disbursement)
-                results.append({
-                    "booking_id": str(disbursement.booking_id),
-                    "amount": float(disbursement.disbursement_amount),
-                    "transaction_id": disbursement.payment_reference,
-                    "status": disbursement.status,
-                    "failure_reason": disbursement.failure_reason or str(e)
-                })
-
-        # Build batch result summary
-        all_completed = all(r["status"] == 'completed' for r in results)
-        batch_result = {
-            "success": all_completed,
-            "batch_reference": f"BATCH_DISB_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
-            "total_amount": float(total_amount),
-            "total_bookings": int(total_bookings),
-            "landlord_name": f"{landlord.first_name} {landlord.last_name}",
-            "payment_method": {
-                "mobile_number": payment_preference.mobile_number,
-                "bank_name": payment_preference.bank_name,
-                "account_name": payment_preference.account_name
-            },
-            "processed_bookings": results,
-            "processed_at": datetime.utcnow().isoformat(),
-            "message": f"Batch disbursement processed: {len(results)} transactions. " + ("All completed" if all_completed else "Some pending/failed")
-        }
-
-        return batch_result
-
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to process batch disbursement: {str(e)}")
-
 @router.get("/recent-activity")
 async def get_recent_activity(
     limit: int = Query(10, ge=1, le=50),
@@ -0,0 +1,200 @@
+"""Background sweeper for abandoned bookings and payments.
+
+A booking whose PayChangu checkout is abandoned stays `pending` with a
+bed hold; a payment that is never completed stays `pending` forever. The
+sweeper runs every `SWEEP_INTERVAL_SECONDS` in each worker and, in
+batches of `SWEEP_BATCH_SIZE` rows per statement:
+
+- marks pending bookings whose hold lapsed as `expired` (releasing their
+  bed) together with their pending payments;
+- marks pending payments older than `PENDING_PAYMENT_TTL_MINUTES` as
+  `expired`, and returns bookings left waiting on an extension or
+  completion payment to `confirmed`;
+- deletes idempotency keys past their TTL and `change_log` rows past
+  `CHANGE_LOG_RETENTION_DAYS`.
+
+Each batch is one `UPDATE ... RETURNING` over rows picked with `FOR UPDATE
+SKIP LOCKED`, committed on its own, so several workers can sweep at once
+without blocking each other or request traffic. Landlords get one
+notification per sweep listing everything that expired in their hostels.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from database import db_session
+from endpoints.notifications import send_notification_to_users
+from endpoints.idempotency import purge_idempotency_keys
+from endpoints.change_log import prune_change_log
+
+logger = logging.getLogger('booking_sweeper')
+
+SWEEP_INTERVAL_SECONDS = int(os.getenv("BOOKING_SWEEP_INTERVAL_SECONDS", "60"))
+SWEEP_BATCH_SIZE = int(os.getenv("BOOKING_SWEEP_BATCH_SIZE", "500"))
+PENDING_PAYMENT_TTL_MINUTES = int(os.getenv("PENDING_PAYMENT_TTL_MINUTES", "60"))
+
+# Booking states that only wait on a follow-up payment
+AWAITING_PAYMENT_STATUSES = ('pending_extension', 'extension_in_progress', 'completing_payment')
+
+_EXPIRE_HOLDS_SQL = text("""
+WITH stale AS (
+    SELECT booking_id FROM bookings
+    WHERE status = 'pending' AND hold_expires_at <= now()
+    ORDER BY hold_expires_at
+    LIMIT :batch
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE bookings b
+SET status = 'expired'
+FROM stale, rooms r, hostels h
+WHERE b.booking_id = stale.booking_id
+  AND r.room_id = b.room_id
+  AND h.hostel_id = r.hostel_id
+RETURNING b.booking_id, r.room_number, h.name AS hostel_name, h.landlord_id
+""")
+
+_EXPIRE_BOOKING_PAYMENTS_SQL = text("""
+UPDATE payments SET status = 'expired'
+WHERE booking_id IN :booking_ids AND status = 'pending'
+""").bindparams(bindparam("booking_ids", expanding=True))
+
+_EXPIRE_PAYMENTS_SQL = text("""
+WITH stale AS (
+    SELECT payment_id FROM payments
+    WHERE status = 'pending' AND created_at <= now() - make_interval(mins => :ttl)
+    ORDER BY created_at
+    LIMIT :batch
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE payments p
+SET status = 'expired'
+FROM stale
+WHERE p.payment_id = stale.payment_id
+RETURNING p.booking_id
+""")
+
+_RESTORE_BOOKINGS_SQL = text("""
+UPDATE bookings b
+SET status = 'confirmed'
+FROM rooms r, hostels h
+WHERE b.booking_id IN :booking_ids
+  AND b.status IN :awaiting
+  AND r.room_id = b.room_id
+  AND h.hostel_id = r.hostel_id
+  AND NOT EXISTS (
+      SELECT 1 FROM payments p
+      WHERE p.booking_id = b.booking_id AND p.status = 'pending'
+  )
+RETURNING b.booking_id, r.room_number, h.name AS hostel_name, h.landlord_id
+""").bindparams(
+    bindparam("booking_ids", expanding=True),
+    bindparam("awaiting", expanding=True),
+)
+
+
+def expire_stale_holds(db: Session, batch: int = SWEEP_BATCH_SIZE) -> List[dict]:
+    """Expire lapsed booking holds and their payments; returns the expired bookings."""
+    expired: List[dict] = []
+    while True:
+        rows = db.execute(_EXPIRE_HOLDS_SQL, {"batch": batch}).mappings().all()
+        if rows:
+            db.execute(_EXPIRE_BOOKING_PAYMENTS_SQL, {"booking_ids": [row["booking_id"] for row in rows]})
+        db.commit()
+        expired.extend(dict(row) for row in rows)
+        if len(rows) < batch:
+            return expired
+
+
+def expire_stale_payments(db: Session, batch: int = SWEEP_BATCH_SIZE, ttl_minutes: int = PENDING_PAYMENT_TTL_MINUTES) -> List[dict]:
+    """Expire pending payments older than the TTL; returns bookings put back to `confirmed`."""
+    restored: List[dict] = []
+    while True:
+        booking_ids = list(set(db.execute(_EXPIRE_PAYMENTS_SQL, {"batch": batch, "ttl": ttl_minutes}).scalars().all()))
+        rows = []
+        if booking_ids:
+            rows = db.execute(_RESTORE_BOOKINGS_SQL, {
+                "booking_ids": booking_ids,
+                "awaiting": list(AWAITING_PAYMENT_STATUSES),
+            }).mappings().all()
+        db.commit()
+        restored.extend(dict(row) for row in rows)
+        if len(booking_ids) < batch:
+            return restored
+
+
+def sweep(db: Session) -> Dict[str, List[dict]]:
+    return {
+        "expired_bookings": expire_stale_holds(db),
+        "restored_bookings": expire_stale_payments(db),
+    }
+
+
+def _landlord_digests(result: Dict[str, List[dict]]) -> Dict[object, dict]:
+    """Group swept bookings per landlord into one notification each."""
+    digests: Dict[object, dict] = defaultdict(lambda: {"expired": [], "restored": [], "hostels": set()})
+    for key, kind in (("expired_bookings", "expired"), ("restored_bookings", "restored")):
+        for row in result[key]:
+            if row["landlord_id"] is None:
+                continue
+            digest = digests[row["landlord_id"]]
+            digest[kind].append(str(row["booking_id"]))
+            digest["hostels"].add(row["hostel_name"])
+    return digests
+
+
+async def notify_landlords(result: Dict[str, List[dict]]) -> None:
+    digests = _landlord_digests(result)
+    if not digests:
+        return
+    with db_session() as db:
+        for landlord_id, digest in digests.items():
+            parts = []
+            if digest["expired"]:
+                parts.append(f"{len(digest['expired'])} unpaid booking request(s) expired and their beds are available again")
+            if digest["restored"]:
+                parts.append(f"{len(digest['restored'])} unpaid extension or balance payment(s) expired")
+            hostels = ", ".join(sorted(digest["hostels"]))
+            try:
+                await send_notification_to_users(
+                    db=db,
+                    user_ids=[landlord_id],
+                    title="Pending bookings expired",
+                    body=f"{'; '.join(parts)} ({hostels}).",
+                    notification_type="booking",
+                    data={
+                        "expired_booking_ids": digest["expired"],
+                        "restored_booking_ids": digest["restored"],
+                    },
+                )
+            except Exception as e:
+                logger.error("Failed to notify landlord %s about expired bookings: %s", landlord_id, e)
+
+
+def _sweep_once() -> Dict[str, List[dict]]:
+    with db_session() as db:
+        result = sweep(db)
+        purge_idempotency_keys(db, batch=SWEEP_BATCH_SIZE)
+        prune_change_log(db, batch=SWEEP_BATCH_SIZE)
+        return result
+
+
+async def run_sweeper() -> None:
+    """Sweep forever; started from the app lifespan and cancelled on shutdown."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            result = await loop.run_in_executor(None, _sweep_once)
+            if result["expired_bookings"] or result["restored_bookings"]:
+                logger.info(
+                    "Expired %d booking holds, restored %d bookings awaiting payment",
+                    len(result["expired_bookings"]), len(result["restored_bookings"]),
+                )
+                await notify_landlords(result)
+        except Exception as e:
+            logger.error("Booking sweep failed: %s", e)
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
@@ -2,12 +2,23 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, Background
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import text, exists
+from sqlalchemy.exc import IntegrityError
 from database import get_db, db_session
-from models import Booking as BookingModel, Payment, Room, Hostel, User, Configuration
+from models import Booking as BookingModel, Payment, Room, Hostel, User
 from endpoints.users import get_current_user, require_landlord
-from endpoints.config import get_platform_fee
+from endpoints.config import get_config_value, get_platform_fee
 from endpoints.notifications import send_notification_to_users
-from datetime import datetime, date
+from endpoints.room_availability import admit_booking, extension_bed, hold_deadline
+from endpoints.payment_schedule import (
+    MAX_DUE_WINDOW_DAYS,
+    instalments_due_within,
+    materialize_schedule,
+    quote_instalments,
+    unpaid_total,
+)
+from endpoints.landlord_reports import get_landlord_report, REPORT_PAGE_SIZE, MAX_REPORT_PAGE_SIZE
+from endpoints.idempotency import IdempotencyContext, idempotent
+from datetime import datetime
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 import uuid
@@ -244,7 +255,8 @@ async def create_booking(
     payload: dict, 
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idem: IdempotencyContext = Depends(idempotent("create_booking"))
 ):
     print("\n=== New Booking Request ===")
     print(f"Request from user: {current_user.email} (ID: {current_user.user_id})")
@@ -328,7 +340,14 @@ async def create_booking(
    
     
     try:
-        # Create booking
+        # Lock the room and reserve a bed free for the whole stay; the lock
+        # is held until commit so concurrent requests cannot take the same bed
+        room, bed_number = admit_booking(db, room_id, start_date, end_date)
+        if bed_number is None:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Room is fully booked for the selected dates")
+        
+        # Create booking holding the bed while payment is in flight
         booking = BookingModel(
             student_id=current_user.user_id,
             room_id=room_id,
@@ -337,7 +356,9 @@ async def create_booking(
             duration_months=duration_months,  # Store calculated duration
             status="pending",
             total_amount=total_amount,
-            payment_type=payment_type  # Store the payment type
+            payment_type=payment_type,  # Store the payment type
+            bed_number=bed_number,
+            hold_expires_at=hold_deadline()
         )
         db.add(booking)
         db.flush()
@@ -351,6 +372,10 @@ async def create_booking(
             payment_type=payment_type
         )
         db.add(payment)
+        db.flush()
+        
+        # Expected monthly instalments; a full payment covers all of them
+        materialize_schedule(db, booking, room.price_per_month, payment.payment_id if payment_type == "full" else None)
 
         db.commit()
         db.refresh(booking)
@@ -396,9 +421,18 @@ async def create_booking(
     },
     "currency": "MWK",
     "created_at": booking.created_at.isoformat() if booking.created_at else None,
+    "hold_expires_at": booking.hold_expires_at.isoformat() if booking.hold_expires_at else None,
     }
-        return JSONResponse(status_code=status.HTTP_201_CREATED, content=response_content)
+        return idem.complete(JSONResponse(status_code=status.HTTP_201_CREATED, content=response_content))
 
+    except HTTPException:
+        raise
+    except IntegrityError as e:
+        db.rollback()
+        if "bookings_no_double_bed" in str(e.orig):
+            # Another booking took the same bed concurrently
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Room is fully booked for the selected dates")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create booking: {e}")
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create booking: {e}")
@@ -453,9 +487,7 @@ def get_user_bookings(
             "check_in_date": b.start_date.isoformat(),
             "check_out_date": b.end_date.isoformat(),
             "created_at": b.created_at.isoformat(),
-            "platform_fee": float(db.query(Configuration.config_value)
-                     .filter(Configuration.config_key == "platform_fee")
-                     .scalar() or 0),
+            "platform_fee": get_config_value(db, "platform_fee", 0.0),
             "duration_months": duration_months,
             "room": {
                 "room_id": str(b.room.room_id),
@@ -496,6 +528,7 @@ def get_landlord_bookings(current_user: User = Depends(require_landlord), db: Se
         .join(Hostel, Room.hostel_id == Hostel.hostel_id)
         .join(User, BookingModel.student_id == User.user_id)
         .filter(Hostel.landlord_id == current_user.user_id)
+        .filter(BookingModel.status != 'expired')  # abandoned checkouts, see booking_sweeper
         .options(
             joinedload(BookingModel.student),
             joinedload(BookingModel.room).joinedload(Room.hostel),
@@ -527,200 +560,39 @@ def get_landlord_bookings(current_user: User = Depends(require_landlord), db: Se
 
 @router.get("/landlord/reports/", response_model=dict)
 def get_landlord_reports(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(REPORT_PAGE_SIZE, ge=1, le=MAX_REPORT_PAGE_SIZE),
     current_user: User = Depends(require_landlord), 
     db: Session = Depends(get_db)
 ):
     """
-    Get comprehensive reports for landlord including all bookings and payments
-    with payment due dates for all hostels managed by the landlord.
+    Get reports for the landlord: totals over all bookings, payments and
+    disbursements, plus one page of bookings (with payment due dates) and
+    payments for all hostels managed by the landlord.
     """
-    from sqlalchemy import func, case
-    
-    # Get all bookings for landlord's hostels with payment details
-    bookings = (
-        db.query(BookingModel)
-        .join(Room, BookingModel.room_id == Room.room_id)
-        .join(Hostel, Room.hostel_id == Hostel.hostel_id)
-        .join(User, BookingModel.student_id == User.user_id)
-        .filter(Hostel.landlord_id == current_user.user_id)
-        .options(
-            joinedload(BookingModel.student),
-            joinedload(BookingModel.room).joinedload(Room.hostel),
-            joinedload(BookingModel.payments),
-        )
-        .order_by(BookingModel.created_at.desc())
-        .all()
-    )
-    
-    # Get all payments for landlord's hostels
-    payments = (
-        db.query(Payment)
-        .join(BookingModel, Payment.booking_id == BookingModel.booking_id)
-        .join(Room, BookingModel.room_id == Room.room_id)
-        .join(Hostel, Room.hostel_id == Hostel.hostel_id)
-        .filter(Hostel.landlord_id == current_user.user_id)
-        .options(
-            joinedload(Payment.booking).joinedload(BookingModel.student),
-            joinedload(Payment.booking).joinedload(BookingModel.room).joinedload(Room.hostel),
-        )
-        .order_by(Payment.paid_at.desc().nulls_last(), Payment.payment_id.desc())
-        .all()
-    )
-    
-    # Get all disbursements for landlord
-    from models import Disbursement
-    disbursements = (
-        db.query(Disbursement)
-        .filter(Disbursement.landlord_id == current_user.user_id)
-        .filter(Disbursement.status == 'completed')
-        .all()
-    )
-    
-    # Process bookings with payment due dates
-    bookings_data = []
-    total_revenue = Decimal('0.0')
-    total_pending = Decimal('0.0')
-    total_paid = Decimal('0.0')
-    total_disbursed = Decimal('0.0')
-    
-    for booking in bookings:
-        # Use room's price_per_month as monthly rent
-        monthly_rent = booking.room.price_per_month
-        
-        # Get all payments for this booking
-        booking_payments = [p for p in payments if p.booking_id == booking.booking_id]
-        paid_amount = sum(p.amount for p in booking_payments if p.status == 'completed')
-        
-        # Calculate next payment due date
-        next_payment_due = None
-        next_payment_amount = None
-        payment_due_explanation = None
-        
-        if booking.status in ['confirmed', 'active']:
-            # Calculate next payment due date within booking period
-            today = date.today()
-            
-            # Debug logging
-            logger.info(f"Booking {booking.booking_id}: start_date={booking.start_date}, end_date={booking.end_date}, today={today}")
-            
-            # If booking hasn't started yet, first payment is due on start_date
-            if today < booking.start_date:
-                next_payment_due = booking.start_date
-                payment_due_explanation = f"Due in {(booking.start_date - today).days} day(s)"
-            else:
-                # Calculate how many full payments have been made
-                months_paid = len([p for p in booking_payments if p.status == 'completed' and p.payment_type == 'full'])
-                logger.info(f"Booking {booking.booking_id}: months_paid={months_paid}")
-                
-                # Use stored booking duration instead of calculating
-                total_months = booking.duration_months
-                logger.info(f"Booking {booking.booking_id}: total_months={total_months}")
-                
-                # Next payment is for the next month after the last paid month
-                # If no payments made, first payment is due on start_date
-                if months_paid == 0:
-                    potential_due = booking.start_date
-                else:
-                    potential_due = booking.start_date + relativedelta(months=months_paid)
-                
-                logger.info(f"Booking {booking.booking_id}: potential_due={potential_due}")
-                
-                # Check if this payment is still within the booking period
-                if potential_due <= booking.end_date and months_paid < total_months:
-                    next_payment_due = potential_due
-                    next_payment_amount = float(monthly_rent)
-                    
-                    # Calculate days until due relative to end_date
-                    days_until_due = (booking.end_date - today).days
-                    logger.info(f"Booking {booking.booking_id}: days_until_end={days_until_due}")
-                    
-                    # Show time remaining until booking ends
-                    if days_until_due < 0:
-                        payment_due_explanation = f"Booking ended {abs(days_until_due)} day(s) ago"
-                    elif days_until_due == 0:
-                        payment_due_explanation = "Booking ends today"
-                    elif days_until_due <= 7:
-                        payment_due_explanation = f"Booking ends in {days_until_due} day(s)"
-                    else:
-                        payment_due_explanation = f"Booking ends in {days_until_due} day(s)"
-                else:
-                    # All payments within booking period are completed
-                    next_payment_due = None
-                    logger.info(f"Booking {booking.booking_id}: All payments completed within booking period")
-        
-        # Calculate remaining amount
-        remaining_amount = float(booking.total_amount) - float(paid_amount)
-        
-        # Update totals
-        total_paid += Decimal(str(paid_amount))
-        if remaining_amount > 0:
-            total_pending += Decimal(str(remaining_amount))
-        total_revenue += Decimal(str(booking.total_amount))
-        
-        bookings_data.append({
-            "booking_id": str(booking.booking_id),
-            "hostel_name": booking.room.hostel.name,
-            "room_number": booking.room.room_number,
-            "student_name": f"{booking.student.first_name} {booking.student.last_name}",
-            "student_email": booking.student.email,
-            "check_in_date": booking.start_date.isoformat(),
-            "check_out_date": booking.end_date.isoformat(),
-            "duration_months": booking.duration_months,
-            "monthly_rent": float(monthly_rent),
-            "total_amount": float(booking.total_amount),
-            "paid_amount": float(paid_amount),
-            "remaining_amount": remaining_amount,
-            "status": booking.status,
-            "next_payment_due_date": next_payment_due.isoformat() if next_payment_due else None,
-            "next_payment_amount": next_payment_amount,
-            "payment_due_explanation": payment_due_explanation,
-            "created_at": booking.created_at.isoformat() if booking.created_at else None,
-        })
-    
-    # Process payments data
-    payments_data = []
-    for payment in payments:
-        payments_data.append({
-            "payment_id": str(payment.payment_id),
-            "booking_id": str(payment.booking_id),
-            "hostel_name": payment.booking.room.hostel.name if payment.booking and payment.booking.room else None,
-            "room_number": payment.booking.room.room_number if payment.booking and payment.booking.room else None,
-            "student_name": f"{payment.booking.student.first_name} {payment.booking.student.last_name}" if payment.booking and payment.booking.student else None,
-            "amount": float(payment.amount),
-            "payment_type": payment.payment_type,
-            "payment_method": payment.payment_method,
-            "status": payment.status,
-            "transaction_id": payment.transaction_id,
-            "paid_at": payment.paid_at.isoformat() if payment.paid_at else None,
-        })
-    
-    # Calculate summary statistics
-    active_bookings = len([b for b in bookings_data if b['status'] in ['confirmed', 'active']])
-    pending_bookings = len([b for b in bookings_data if b['status'] == 'pending'])
-    completed_bookings = len([b for b in bookings_data if b['status'] == 'completed'])
-    
-    completed_payments = [p for p in payments_data if p['status'] == 'completed']
-    pending_payments = [p for p in payments_data if p['status'] == 'pending']
-    
-    # Calculate total disbursed amount
-    total_disbursed = sum(d.disbursement_amount for d in disbursements)
-    
-    return {
-        "summary": {
-            "total_revenue": float(total_revenue),
-            "total_paid": float(total_paid),
-            "total_disbursed": float(total_disbursed),
-            "total_pending": float(total_pending),
-            "active_bookings": active_bookings,
-            "pending_bookings": pending_bookings,
-            "completed_bookings": completed_bookings,
-            "total_payments": len(payments_data),
-            "completed_payments": len(completed_payments),
-            "pending_payments": len(pending_payments),
-        },
-        "bookings": bookings_data,
-        "payments": payments_data,
-    }
+    return get_landlord_report(db, current_user.user_id, skip=skip, limit=limit)
+
+
+@router.get("/landlord/due-soon/", response_model=list[dict])
+def get_landlord_due_soon(
+    days: int = Query(7, ge=0, le=MAX_DUE_WINDOW_DAYS),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    current_user: User = Depends(require_landlord),
+    db: Session = Depends(get_db)
+):
+    """Unpaid rent instalments due within the next `days` days across the landlord's hostels."""
+    return instalments_due_within(db, days, landlord_id=current_user.user_id, skip=skip, limit=limit)
+
+
+@router.get("/my-bookings/due-soon/", response_model=list[dict])
+def get_my_due_soon(
+    days: int = Query(30, ge=0, le=MAX_DUE_WINDOW_DAYS),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The current student's unpaid rent instalments due within the next `days` days."""
+    return instalments_due_within(db, days, student_id=current_user.user_id)
 
 
 @router.post("/{booking_id}/approve/", status_code=status.HTTP_200_OK)
@@ -1127,7 +999,8 @@ async def extend_booking(
     payload: dict,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idem: IdempotencyContext = Depends(idempotent("extend_booking"))
 ):
     """Extend a confirmed booking by additional months."""
     
@@ -1206,14 +1079,14 @@ async def extend_booking(
         booking.end_date.isoformat()
     )
     
-    return {
+    return idem.complete({
         "message": "Booking extension initiated successfully",
         "extension_payment_id": str(extension_payment.payment_id),
         "current_end_date": booking.end_date.isoformat(),
         "extension_amount": float(extension_amount),
         "additional_months": additional_months,
         "booking_status": booking.status
-    }
+    })
 
 
 @router.get("/{booking_id}/extension-pricing")
@@ -1265,6 +1138,11 @@ async def get_extension_pricing(
     
     # Calculate new checkout date
     new_checkout_date = booking.end_date + relativedelta(months=additional_months)
+    if extension_bed(db, room, booking, new_checkout_date) is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No bed in this room is free for the extended stay"
+        )
     
     return {
         "monthly_price": float(monthly_rent),
@@ -1273,6 +1151,7 @@ async def get_extension_pricing(
         "additional_months": additional_months,
         "current_checkout_date": booking.end_date.isoformat(),
         "new_checkout_date": new_checkout_date.isoformat(),
+        "instalments": quote_instalments(booking, additional_months, monthly_rent),
         "room_number": room.room_number,
         "hostel_name": room.hostel.name if room.hostel else "Unknown Hostel"
     }
@@ -1329,8 +1208,10 @@ async def get_complete_payment_pricing(
             detail="Invalid booking duration"
         )
     
-    # Calculate total price for remaining months
-    total_price = monthly_rent * Decimal(remaining_months)
+    # Rent still owed on the payment schedule (whole stay for bookings without one)
+    total_price = unpaid_total(db, booking.booking_id)
+    if total_price is None:
+        total_price = monthly_rent * Decimal(remaining_months)
     
     # Get booking fee already paid from payment records
     booking_fee_payment = db.query(Payment).filter(
@@ -0,0 +1,142 @@
+"""Trigger-maintained change feed behind the `/sync` delta endpoint.
+
+Row triggers on hostels, rooms, media, bookings and notifications append
+one `change_log` row per insert, update or delete, in the same transaction
+as the write. Each row carries the writing transaction id (`txid`); readers
+consume the log in `(txid, change_id)` order and only past the oldest
+still-running transaction, so a slow transaction that commits late can
+never be skipped by a cursor that has already moved on.
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger('change_log')
+
+# How long change rows are kept; older sync cursors must do a full reload
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", "30"))
+
+# Arbitrary advisory lock id so only one worker installs triggers at a time
+_INSTALL_LOCK_ID = 724002
+
+# Change-log entity names by table
+TRACKED_TABLES = {
+    "hostels": "hostel",
+    "rooms": "room",
+    "media": "media",
+    "bookings": "booking",
+    "notifications": "notification",
+}
+
+_RECORD_FUNCTION = """
+CREATE OR REPLACE FUNCTION change_log_record() RETURNS TRIGGER AS $$
+DECLARE
+    rec RECORD;
+    v_entity TEXT;
+    v_id UUID;
+    v_user UUID;
+    v_landlord UUID;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME = 'hostels' THEN
+        v_entity := 'hostel';
+        v_id := rec.hostel_id;
+        v_landlord := rec.landlord_id;
+    ELSIF TG_TABLE_NAME = 'rooms' THEN
+        v_entity := 'room';
+        v_id := rec.room_id;
+        SELECT landlord_id INTO v_landlord FROM hostels WHERE hostel_id = rec.hostel_id;
+    ELSIF TG_TABLE_NAME = 'media' THEN
+        v_entity := 'media';
+        v_id := rec.media_id;
+    ELSIF TG_TABLE_NAME = 'bookings' THEN
+        v_entity := 'booking';
+        v_id := rec.booking_id;
+        v_user := rec.student_id;
+        SELECT h.landlord_id INTO v_landlord
+        FROM rooms r JOIN hostels h ON h.hostel_id = r.hostel_id
+        WHERE r.room_id = rec.room_id;
+    ELSE
+        v_entity := 'notification';
+        v_id := rec.notification_id;
+        v_user := rec.user_id;
+    END IF;
+
+    INSERT INTO change_log (txid, entity, entity_id, op, user_id, landlord_id, changed_at)
+    VALUES (pg_current_xact_id()::text::bigint, v_entity, v_id, left(TG_OP, 1), v_user, v_landlord, now());
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _trigger_sql(table: str) -> str:
+    return f"""
+DROP TRIGGER IF EXISTS change_log_{table} ON {table};
+CREATE TRIGGER change_log_{table}
+    AFTER INSERT OR UPDATE OR DELETE ON {table}
+    FOR EACH ROW EXECUTE FUNCTION change_log_record();
+"""
+
+
+def install_change_log(engine) -> None:
+    """Create/refresh the change-log triggers and drop expired rows.
+
+    Idempotent; called on startup after `create_all`.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _INSTALL_LOCK_ID})
+        conn.execute(text(_RECORD_FUNCTION))
+        for table in TRACKED_TABLES:
+            conn.execute(text(_trigger_sql(table)))
+        conn.execute(
+            text("DELETE FROM change_log WHERE changed_at < :cutoff"),
+            {"cutoff": retention_cutoff()},
+        )
+
+
+_PRUNE_SQL = text("""
+DELETE FROM change_log
+WHERE change_id IN (
+    SELECT change_id FROM change_log
+    WHERE changed_at < :cutoff
+    LIMIT :batch
+    FOR UPDATE SKIP LOCKED
+)
+""")
+
+
+def retention_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=CHANGE_LOG_RETENTION_DAYS)
+
+
+def prune_change_log(db: Session, batch: int = 5000) -> int:
+    """Delete change rows past the retention window in batches; returns the number removed.
+
+    Called from the booking sweeper; rows another worker is already
+    deleting are skipped.
+    """
+    cutoff = retention_cutoff()
+    removed = 0
+    while True:
+        deleted = db.execute(_PRUNE_SQL, {"cutoff": cutoff, "batch": batch}).rowcount
+        db.commit()
+        removed += deleted
+        if deleted < batch:
+            break
+    if removed:
+        logger.info("Pruned %s change_log rows", removed)
+    return removed
+
+
+def visible_horizon(db: Session) -> int:
+    """Oldest transaction id still running; every change below it is final."""
+    return int(db.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar())
@@ -4,15 +4,16 @@ from database import get_db
 from models import Configuration, ConfigCreate, ConfigUpdate, ConfigRead
 from typing import List
 from .users import get_current_user, require_landlord as require_admin
+from .config_cache import config_decimal, invalidate as invalidate_config_cache
 
 router = APIRouter(prefix="/config", tags=["config"])
 
 def get_config_value(db: Session, key: str, default: float = 0.0) -> float:
-    """Helper function to get a configuration value by key."""
-    config = db.query(Configuration).filter(Configuration.config_key == key).first()
-    if not config:
+    """Helper function to get a configuration value by key (served from the config cache)."""
+    value = config_decimal(db, key)
+    if value is None:
         return default
-    return float(config.config_value)
+    return float(value)
 
 @router.get("/{config_key}", response_model=ConfigRead)
 def get_config(config_key: str, db: Session = Depends(get_db)):
@@ -33,6 +34,7 @@ def create_config(config: ConfigCreate, db: Session = Depends(get_db), current_u
     db_config = Configuration(**config.dict())
     db.add(db_config)
     db.commit()
+    invalidate_config_cache()
     db.refresh(db_config)
     return db_config
 
@@ -48,6 +50,7 @@ def update_config(config_key: str, config_update: ConfigUpdate, db: Session = De
         setattr(db_config, field, value)
     
     db.commit()
+    invalidate_config_cache()
     db.refresh(db_config)
     return db_config
 
@@ -0,0 +1,170 @@
+"""In-process cache of the `configurations` table, invalidated across workers.
+
+Fees and other settings are read on every booking, pricing, webhook and
+receipt, but change only when an admin edits them. Each worker keeps the
+whole table as `{config_key: Decimal}` and serves reads from memory.
+
+A trigger on `configurations` sends `NOTIFY configurations_changed` for
+every write, whichever code path made it. Postgres delivers it when the
+writing transaction commits. Each worker holds a dedicated connection
+that `LISTEN`s on the channel (`run_config_listener`, started from the app
+lifespan) and drops its copy on every notification; the next read reloads
+it. The worker that made the change also drops its copy right after
+committing (`invalidate()`), so it never reads its own stale value.
+
+The cache is only used while the listener is connected. Before the first
+`LISTEN`, and whenever the connection is lost, reads go to the database
+like before, so a missed notification can't leave a stale fee in memory.
+A reload that overlaps a notification is discarded rather than cached.
+"""
+import asyncio
+import logging
+import os
+import threading
+from decimal import Decimal
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import db_session, engine
+from models import Configuration
+
+logger = logging.getLogger('config_cache')
+
+CONFIG_CHANNEL = "configurations_changed"
+CONFIG_LISTEN_RETRY_SECONDS = float(os.getenv("CONFIG_LISTEN_RETRY_SECONDS", "5"))
+# Ping the listening connection this often so a dead one is noticed
+CONFIG_LISTEN_KEEPALIVE_SECONDS = float(os.getenv("CONFIG_LISTEN_KEEPALIVE_SECONDS", "60"))
+
+# Arbitrary advisory lock id so only one worker installs the trigger at a time
+_INSTALL_LOCK_ID = 724007
+
+_NOTIFY_TRIGGER = f"""
+CREATE OR REPLACE FUNCTION configurations_notify_trg() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('{CONFIG_CHANNEL}', COALESCE(NEW.config_key, OLD.config_key));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS configurations_notify ON configurations;
+CREATE TRIGGER configurations_notify
+    AFTER INSERT OR UPDATE OR DELETE ON configurations
+    FOR EACH ROW EXECUTE FUNCTION configurations_notify_trg();
+"""
+
+_lock = threading.Lock()
+_values: Optional[Dict[str, Decimal]] = None
+# Bumped by every invalidation; a reload only installs if it is unchanged
+_generation = 0
+_listening = False
+
+
+def install_config_notify(engine) -> None:
+    """Create/refresh the NOTIFY trigger on `configurations`.
+
+    Idempotent; called on startup after `create_all`.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _INSTALL_LOCK_ID})
+        conn.execute(text(_NOTIFY_TRIGGER))
+
+
+def invalidate() -> None:
+    """Drop this worker's copy; the next read reloads it."""
+    global _values, _generation
+    with _lock:
+        _values = None
+        _generation += 1
+
+
+def _set_listening(listening: bool) -> None:
+    global _listening
+    with _lock:
+        _listening = listening
+    invalidate()
+
+
+def config_values(db: Session) -> Dict[str, Decimal]:
+    """All configuration values by key; do not modify the returned dict."""
+    global _values
+    values = _values
+    if values is not None:
+        return values
+    with _lock:
+        generation, listening = _generation, _listening
+    values = {key: value for key, value in db.query(Configuration.config_key, Configuration.config_value)}
+    if listening:
+        with _lock:
+            if _generation == generation:
+                _values = values
+    return values
+
+
+def config_decimal(db: Session, key: str, default: Optional[Decimal] = None) -> Optional[Decimal]:
+    value = config_values(db).get(key)
+    return default if value is None else value
+
+
+def _connect():
+    """A dedicated autocommit psycopg2 connection listening on the channel."""
+    pooled = engine.raw_connection()
+    # Never returned to the pool; it is closed when the listener stops
+    pooled.detach()
+    conn = pooled.driver_connection
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {CONFIG_CHANNEL}")
+    return conn
+
+
+def _ping(conn) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def _warm() -> None:
+    with db_session() as db:
+        config_values(db)
+
+
+async def run_config_listener() -> None:
+    """Listen for configuration changes forever; started from the app lifespan and cancelled on shutdown."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            conn = await loop.run_in_executor(None, _connect)
+        except Exception as e:
+            logger.error("Could not listen for configuration changes: %s", e)
+            await asyncio.sleep(CONFIG_LISTEN_RETRY_SECONDS)
+            continue
+
+        readable = asyncio.Event()
+        fd = conn.fileno()
+        loop.add_reader(fd, readable.set)
+        try:
+            _set_listening(True)
+            await loop.run_in_executor(None, _warm)
+            while True:
+                try:
+                    await asyncio.wait_for(readable.wait(), CONFIG_LISTEN_KEEPALIVE_SECONDS)
+                    readable.clear()
+                    conn.poll()
+                except asyncio.TimeoutError:
+                    # The ping also collects any notification that arrived meanwhile
+                    await loop.run_in_executor(None, _ping, conn)
+                if conn.notifies:
+                    keys = sorted({notify.payload for notify in conn.notifies})
+                    conn.notifies.clear()
+                    invalidate()
+                    logger.info("Configuration changed: %s", ", ".join(keys))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Configuration listener lost its connection: %s", e)
+        finally:
+            _set_listening(False)
+            loop.remove_reader(fd)
+            conn.close()
+        await asyncio.sleep(CONFIG_LISTEN_RETRY_SECONDS)
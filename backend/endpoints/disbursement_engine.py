@@ -0,0 +1,737 @@
+"""Queued landlord payouts.
+
+`POST /admin/disbursements/batch` no longer talks to PayChangu. It writes a
+`disbursement_batches` row and one `queued` disbursement per unpaid booking,
+then answers 202 with the batch id. The rest happens in the background,
+started by `run_disbursement_engine()` from the app lifespan:
+
+- `DISBURSE_SUBMIT_WORKERS` submit workers per process claim queued
+  disbursements (`FOR UPDATE SKIP LOCKED`, leased while in `submitting`) and
+  send the transfer under charge id `disb_<id>`. This bounds how many payout
+  requests are in flight at once.
+- One settlement scheduler across all processes (advisory lock 724005) polls
+  every transfer in `processing` that is due, `DISBURSE_SETTLE_CONCURRENCY`
+  at a time. It writes the results in one transaction and closes batches
+  that have no open transfers left.
+
+A transfer is never sent twice. It goes back to `queued` only if the request
+certainly never reached PayChangu (connect errors, or the circuit breaker was
+open). If a submit timed out, or its worker died mid-request, the transfer
+moves to `processing` and the scheduler looks it up by charge id. Transfers
+still unsettled after `DISBURSE_SETTLE_TIMEOUT_HOURS` stay `processing` but
+are no longer polled, and need a manual check.
+
+`POST /admin/disbursements/process` queues a single booking's payout the same
+way, as a batch of one. Both refuse bookings that already have a queued,
+in-flight or completed disbursement, and payouts beyond the landlord's ledger
+balance unless `override_balance` is set.
+
+`GET /admin/disbursements/batches/{batch_id}` reports a batch's progress.
+"""
+import asyncio
+import functools
+import logging
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from database import db_session, engine, get_db
+from models import (
+    BatchDisbursementCreate, Booking, Disbursement, DisbursementBatch, DisbursementCreate,
+    Hostel, PaymentPreference, Room, User,
+)
+from endpoints.admin import require_admin_user
+from endpoints.config import get_config_value
+from endpoints.ledger import payout_available
+from paychangu_service import (
+    DISBURSEMENT_COMPLETED_STATES, DISBURSEMENT_FAILED_STATES, TransferRejected,
+    disbursement_charge_id, get_paychangu_client, request_not_sent, submit_transfer, transfer_status,
+)
+
+logger = logging.getLogger('disbursement_engine')
+
+router = APIRouter(tags=["admin"])
+
+DISBURSE_SUBMIT_WORKERS = int(os.getenv("DISBURSE_SUBMIT_WORKERS", "4"))
+DISBURSE_POLL_SECONDS = float(os.getenv("DISBURSE_POLL_SECONDS", "2"))
+DISBURSE_LEASE_SECONDS = int(os.getenv("DISBURSE_LEASE_SECONDS", "120"))
+DISBURSE_MAX_SUBMIT_ATTEMPTS = int(os.getenv("DISBURSE_MAX_SUBMIT_ATTEMPTS", "6"))
+DISBURSE_SETTLE_INTERVAL_SECONDS = int(os.getenv("DISBURSE_SETTLE_INTERVAL_SECONDS", "15"))
+DISBURSE_SETTLE_BATCH_SIZE = int(os.getenv("DISBURSE_SETTLE_BATCH_SIZE", "500"))
+DISBURSE_SETTLE_CONCURRENCY = int(os.getenv("DISBURSE_SETTLE_CONCURRENCY", "10"))
+DISBURSE_SETTLE_BASE_SECONDS = float(os.getenv("DISBURSE_SETTLE_BASE_SECONDS", "10"))
+DISBURSE_SETTLE_MAX_SECONDS = float(os.getenv("DISBURSE_SETTLE_MAX_SECONDS", "1800"))
+DISBURSE_SETTLE_TIMEOUT_HOURS = int(os.getenv("DISBURSE_SETTLE_TIMEOUT_HOURS", "72"))
+
+# Arbitrary advisory lock id so only one worker polls settlement at a time
+_SETTLE_LOCK_ID = 724005
+
+# Disbursements in these states keep their booking out of new batches
+_OPEN_OR_PAID = ('queued', 'submitting', 'processing', 'completed')
+
+_CLAIM_SQL = text("""
+WITH due AS (
+    SELECT disbursement_id FROM disbursements
+    WHERE status = 'queued' AND next_attempt_at <= now()
+    ORDER BY next_attempt_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE disbursements d
+SET status = 'submitting',
+    attempts = d.attempts + 1,
+    locked_until = now() + make_interval(secs => :lease)
+FROM due
+WHERE d.disbursement_id = due.disbursement_id
+RETURNING d.disbursement_id, d.batch_id, d.disbursement_amount, d.payment_method, d.attempts,
+          (SELECT b.transfer_details FROM disbursement_batches b WHERE b.batch_id = d.batch_id) AS transfer_details
+""")
+
+# `reference` is NULL when the outcome of the submit is unknown
+_SUBMITTED_SQL = text("""
+UPDATE disbursements
+SET status = 'processing',
+    payment_method = COALESCE(:payment_method, payment_method),
+    payment_reference = :reference,
+    failure_reason = :note,
+    submitted_at = now(),
+    attempts = 0,
+    next_attempt_at = now() + make_interval(secs => :delay),
+    locked_until = NULL
+WHERE disbursement_id = :disbursement_id AND status = 'submitting'
+""")
+
+_REQUEUE_SQL = text("""
+UPDATE disbursements
+SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'queued' END,
+    processed_at = CASE WHEN attempts >= :max_attempts THEN now() END,
+    next_attempt_at = now() + make_interval(secs => :delay),
+    locked_until = NULL,
+    failure_reason = :error
+WHERE disbursement_id = :disbursement_id AND status = 'submitting'
+RETURNING status
+""")
+
+_REJECTED_SQL = text("""
+UPDATE disbursements
+SET status = 'failed', processed_at = now(), next_attempt_at = NULL, locked_until = NULL,
+    failure_reason = :error
+WHERE disbursement_id = :disbursement_id AND status = 'submitting'
+""")
+
+# Submits whose worker died mid-request may have reached PayChangu: look them up, never resend
+_ADOPT_STALE_SQL = text("""
+UPDATE disbursements
+SET status = 'processing',
+    submitted_at = COALESCE(submitted_at, now()),
+    attempts = 0,
+    next_attempt_at = now(),
+    locked_until = NULL,
+    failure_reason = 'Submission interrupted; confirming with PayChangu'
+WHERE status = 'submitting' AND locked_until < now()
+""")
+
+_DUE_SQL = text("""
+SELECT disbursement_id, attempts, submitted_at FROM disbursements
+WHERE status = 'processing' AND next_attempt_at <= now()
+ORDER BY next_attempt_at
+LIMIT :limit
+""")
+
+_SETTLED_SQL = text("""
+UPDATE disbursements
+SET status = :status, processed_at = now(), next_attempt_at = NULL, failure_reason = :failure_reason
+WHERE disbursement_id = :disbursement_id AND status = 'processing'
+""")
+
+_STILL_PENDING_SQL = text("""
+UPDATE disbursements
+SET attempts = attempts + 1, next_attempt_at = :next_attempt_at,
+    failure_reason = COALESCE(:failure_reason, failure_reason)
+WHERE disbursement_id = :disbursement_id AND status = 'processing'
+""")
+
+_FINISH_BATCHES_SQL = text("""
+UPDATE disbursement_batches b
+SET status = CASE WHEN s.failed = 0 THEN 'completed'
+                  WHEN s.completed = 0 THEN 'failed'
+                  ELSE 'partially_failed' END,
+    finished_at = now()
+FROM (
+    SELECT d.batch_id,
+           count(*) FILTER (WHERE d.status = 'completed') AS completed,
+           count(*) FILTER (WHERE d.status = 'failed') AS failed,
+           count(*) FILTER (WHERE d.status NOT IN ('completed', 'failed')) AS open
+    FROM disbursements d
+    JOIN disbursement_batches ob ON ob.batch_id = d.batch_id AND ob.status = 'processing'
+    GROUP BY d.batch_id
+) s
+WHERE b.batch_id = s.batch_id AND s.open = 0
+RETURNING b.batch_id, b.status
+""")
+
+# Set when this process queues transfers so idle submit workers start at once
+_wakeup: Optional[asyncio.Event] = None
+
+
+def _backoff(attempts: int, base: float, ceiling: float) -> float:
+    """Exponential backoff with jitter in [ceiling/2, ceiling] of the current step."""
+    step = min(base * (2 ** max(attempts - 1, 0)), ceiling)
+    return random.uniform(step / 2, step)
+
+
+# Submission ---------------------------------------------------------------
+
+def _claim() -> Optional[dict]:
+    with db_session() as db:
+        row = db.execute(_CLAIM_SQL, {"lease": DISBURSE_LEASE_SECONDS}).mappings().first()
+        db.commit()
+        return dict(row) if row else None
+
+
+def _record_submit(disbursement_id, **params) -> None:
+    with db_session() as db:
+        db.execute(_SUBMITTED_SQL, {"disbursement_id": disbursement_id, "delay": DISBURSE_SETTLE_BASE_SECONDS, **params})
+        db.commit()
+
+
+def _record_requeue(disbursement_id, attempts: int, error: str) -> str:
+    with db_session() as db:
+        new_status = db.execute(_REQUEUE_SQL, {
+            "disbursement_id": disbursement_id,
+            "max_attempts": DISBURSE_MAX_SUBMIT_ATTEMPTS,
+            "delay": _backoff(attempts, DISBURSE_SETTLE_BASE_SECONDS, DISBURSE_SETTLE_MAX_SECONDS),
+            "error": error[:2000],
+        }).scalar()
+        db.commit()
+        return new_status
+
+
+def _record_rejected(disbursement_id, error: str) -> None:
+    with db_session() as db:
+        db.execute(_REJECTED_SQL, {"disbursement_id": disbursement_id, "error": error[:2000]})
+        db.commit()
+
+
+async def _submit(job: dict) -> None:
+    """Send one claimed transfer and record where it stands."""
+    loop = asyncio.get_running_loop()
+    disbursement_id = job["disbursement_id"]
+    details = job["transfer_details"] or {}
+    try:
+        payment_method, reference = await submit_transfer(
+            disbursement_charge_id(disbursement_id),
+            job["disbursement_amount"],
+            payment_method=job["payment_method"] or "bank_transfer",
+            bank_uuid=details.get("bank_uuid"),
+            bank_account_number=details.get("bank_account_number"),
+            bank_account_name=details.get("bank_account_name"),
+            mobile_number=details.get("mobile_number"),
+            mobile_money_operator_ref_id=details.get("mobile_money_operator_ref_id"),
+        )
+    except asyncio.CancelledError:
+        raise
+    except (ValueError, TransferRejected) as e:
+        logger.error("Disbursement %s rejected: %s", disbursement_id, e)
+        await loop.run_in_executor(None, _record_rejected, disbursement_id, str(e))
+    except Exception as e:
+        if request_not_sent(e):
+            new_status = await loop.run_in_executor(None, _record_requeue, disbursement_id, job["attempts"], str(e))
+            logger.warning("Disbursement %s not sent (attempt %d), now %s: %s", disbursement_id, job["attempts"], new_status, e)
+        else:
+            # PayChangu may have accepted it; the scheduler finds out by charge id
+            logger.warning("Disbursement %s submit outcome unknown, confirming by polling: %s", disbursement_id, e)
+            note = f"Submission outcome unknown ({e}); confirming with PayChangu"[:2000]
+            await loop.run_in_executor(None, functools.partial(
+                _record_submit, disbursement_id, payment_method=None, reference=None, note=note,
+            ))
+    else:
+        await loop.run_in_executor(None, functools.partial(
+            _record_submit, disbursement_id, payment_method=payment_method, reference=reference, note=None,
+        ))
+
+
+async def _submit_worker() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            job = await loop.run_in_executor(None, _claim)
+        except Exception as e:
+            logger.error("Disbursement claim failed: %s", e)
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=DISBURSE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+
+        try:
+            await _submit(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Left in `submitting`; the scheduler adopts it once the lease expires
+            logger.error("Failed to record disbursement %s submit: %s", job["disbursement_id"], e)
+
+
+# Settlement ---------------------------------------------------------------
+
+def _try_lock():
+    conn = engine.connect()
+    if conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _SETTLE_LOCK_ID}).scalar():
+        return conn
+    conn.close()
+    return None
+
+
+def _unlock(conn) -> None:
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _SETTLE_LOCK_ID})
+    finally:
+        conn.close()
+
+
+def _due_transfers(limit: int) -> List[dict]:
+    with db_session() as db:
+        adopted = db.execute(_ADOPT_STALE_SQL).rowcount
+        db.commit()
+        if adopted:
+            logger.warning("Adopted %d interrupted disbursement submits for settlement polling", adopted)
+        return [dict(row) for row in db.execute(_DUE_SQL, {"limit": limit}).mappings().all()]
+
+
+async def _poll_all(transfers: List[dict]) -> List[dict]:
+    client = get_paychangu_client()
+    semaphore = asyncio.Semaphore(DISBURSE_SETTLE_CONCURRENCY)
+
+    async def poll(transfer: dict) -> dict:
+        result = dict(transfer)
+        async with semaphore:
+            try:
+                payout = await client.get_payout_details_by_charge(disbursement_charge_id(transfer["disbursement_id"]))
+            except Exception as e:
+                result.update(outcome="error", error=str(e))
+                return result
+        state = transfer_status(payout)
+        if state in DISBURSEMENT_COMPLETED_STATES:
+            result["outcome"] = "completed"
+        elif state in DISBURSEMENT_FAILED_STATES:
+            result.update(outcome="failed", error=f"Transfer failed with status {state}")
+        else:
+            result["outcome"] = "pending"
+        return result
+
+    return await asyncio.gather(*(poll(transfer) for transfer in transfers))
+
+
+def _apply_settlements(results: List[dict]) -> Dict[str, int]:
+    """Write every poll result in one transaction and close finished batches."""
+    now = datetime.now(timezone.utc)
+    timeout = timedelta(hours=DISBURSE_SETTLE_TIMEOUT_HOURS)
+    settled, pending = [], []
+    counts = {"completed": 0, "failed": 0, "pending": 0, "error": 0, "abandoned": 0}
+    for result in results:
+        counts[result["outcome"]] += 1
+        if result["outcome"] == "completed":
+            settled.append({"disbursement_id": result["disbursement_id"], "status": "completed", "failure_reason": None})
+        elif result["outcome"] == "failed":
+            settled.append({"disbursement_id": result["disbursement_id"], "status": "failed", "failure_reason": result["error"]})
+        elif result["submitted_at"] and now - result["submitted_at"] > timeout:
+            counts["abandoned"] += 1
+            logger.error("Disbursement %s unsettled after %dh; polling stopped, check it on PayChangu",
+                         result["disbursement_id"], DISBURSE_SETTLE_TIMEOUT_HOURS)
+            pending.append({
+                "disbursement_id": result["disbursement_id"],
+                "next_attempt_at": None,
+                "failure_reason": f"Not settled after {DISBURSE_SETTLE_TIMEOUT_HOURS}h; confirm on PayChangu before resending",
+            })
+        else:
+            delay = _backoff(result["attempts"] + 1, DISBURSE_SETTLE_BASE_SECONDS, DISBURSE_SETTLE_MAX_SECONDS)
+            pending.append({
+                "disbursement_id": result["disbursement_id"],
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "failure_reason": None,
+            })
+
+    with db_session() as db:
+        if settled:
+            db.execute(_SETTLED_SQL, settled)
+        if pending:
+            db.execute(_STILL_PENDING_SQL, pending)
+        finished = db.execute(_FINISH_BATCHES_SQL).all()
+        db.commit()
+    for batch_id, batch_status in finished:
+        logger.info("Disbursement batch %s finished: %s", batch_id, batch_status)
+    return counts
+
+
+async def run_settlement_pass(limit: int = DISBURSE_SETTLE_BATCH_SIZE) -> Optional[Dict[str, int]]:
+    """Poll every due in-flight transfer once; None if another worker holds the scheduler lock."""
+    loop = asyncio.get_running_loop()
+    lock = await loop.run_in_executor(None, _try_lock)
+    if lock is None:
+        return None
+    try:
+        transfers = await loop.run_in_executor(None, _due_transfers, limit)
+        if not transfers:
+            return {}
+        results = await _poll_all(transfers)
+        counts = await loop.run_in_executor(None, _apply_settlements, results)
+    finally:
+        await loop.run_in_executor(None, _unlock, lock)
+
+    if counts["completed"] or counts["failed"] or counts["error"]:
+        logger.info("Polled %d transfers: %d completed, %d failed, %d pending, %d errors",
+                    len(results), counts["completed"], counts["failed"], counts["pending"], counts["error"])
+    return counts
+
+
+async def _settlement_scheduler() -> None:
+    while True:
+        await asyncio.sleep(DISBURSE_SETTLE_INTERVAL_SECONDS)
+        try:
+            await run_settlement_pass()
+        except Exception as e:
+            logger.error("Disbursement settlement pass failed: %s", e)
+
+
+async def run_disbursement_engine() -> None:
+    """Run the submit workers and settlement scheduler forever; started from the app lifespan."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    tasks: List[asyncio.Task] = [asyncio.create_task(_submit_worker()) for _ in range(DISBURSE_SUBMIT_WORKERS)]
+    tasks.append(asyncio.create_task(_settlement_scheduler()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# Endpoints ----------------------------------------------------------------
+
+def _check_balance(db: Session, landlord_id, reserved: float, override_balance: bool,
+                   current_user: User, what: str) -> float:
+    """409 when `reserved` exceeds the landlord's ledger balance, unless the admin overrides it."""
+    available = payout_available(db, landlord_id)
+    if reserved > available:
+        if not override_balance:
+            raise HTTPException(
+                status_code=409,
+                detail=f"{what} needs {reserved:.2f} but only {available:.2f} is available for this landlord; "
+                       "set override_balance to pay out anyway",
+            )
+        logger.warning("%s for landlord=%s reserves %.2f but only %.2f is available; admin %s overrode the balance check",
+                       what, landlord_id, reserved, available, current_user.user_id)
+    return available
+
+
+def _queue_payouts(db: Session, landlord_id, current_user: User, transfer_details: dict,
+                   payouts: List[Tuple[Booking, float]], payment_method: str, platform_fee: float):
+    """Add a batch and one queued disbursement per `(booking, payout amount)`; the caller commits."""
+    batch = DisbursementBatch(
+        landlord_id=landlord_id,
+        created_by=current_user.user_id,
+        transfer_details=transfer_details,
+    )
+    db.add(batch)
+    db.flush()
+
+    queued = []
+    for booking, disbursement_amount in payouts:
+        disbursement = Disbursement(
+            booking_id=booking.booking_id,
+            landlord_id=landlord_id,
+            amount=float(booking.total_amount) if booking.total_amount else 0.0,
+            platform_fee=platform_fee,
+            disbursement_amount=disbursement_amount,
+            status='queued',
+            payment_method=payment_method,
+            batch_id=batch.batch_id,
+            next_attempt_at=func.now(),
+        )
+        db.add(disbursement)
+        queued.append(disbursement)
+
+    batch.total_bookings = len(queued)
+    batch.total_amount = sum(float(d.disbursement_amount) for d in queued)
+    return batch, queued
+
+
+@router.post("/admin/disbursements/batch", status_code=status.HTTP_202_ACCEPTED)
+def queue_batch_disbursement(
+    payload: BatchDisbursementCreate = Body(...),
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Queue payouts for all of a landlord's unpaid confirmed bookings; track them via the returned batch id."""
+    landlord_id = payload.landlord_id
+
+    # Row lock: two concurrent batches for one landlord would pay bookings twice
+    landlord = db.query(User).filter(
+        User.user_id == landlord_id, User.user_type == 'landlord'
+    ).with_for_update().first()
+    if not landlord:
+        raise HTTPException(status_code=404, detail="Landlord not found")
+
+    payment_preference = db.query(PaymentPreference).filter(
+        PaymentPreference.user_id == landlord_id,
+        PaymentPreference.is_preferred == True
+    ).first()
+    if not payment_preference:
+        raise HTTPException(status_code=400, detail="Landlord has no payment preferences set")
+
+    payment_method = 'mobile_money' if payment_preference.mobile_number else 'bank_transfer'
+    bank_uuid = payload.bank_uuid or getattr(payment_preference, 'bank_uuid', None) or os.getenv('PAYCHANGU_DEFAULT_BANK_UUID')
+    if payment_method == 'bank_transfer':
+        if not bank_uuid:
+            logger.error("Missing bank_uuid for batch disbursement: neither payment preference nor PAYCHANGU_DEFAULT_BANK_UUID is set for landlord=%s", landlord_id)
+            raise HTTPException(status_code=400, detail="Missing bank UUID for batch disbursements. Set PAYCHANGU_DEFAULT_BANK_UUID or save a bank_uuid in the landlord's payment preferences.")
+        if not (payment_preference.account_number and payment_preference.account_name):
+            raise HTTPException(status_code=400, detail="Landlord's payment preference has no bank account number or account name")
+
+    already_handled = db.query(Disbursement.booking_id).filter(
+        Disbursement.booking_id == Booking.booking_id,
+        Disbursement.status.in_(_OPEN_OR_PAID),
+    ).exists()
+    bookings = db.query(Booking).join(Room).join(Hostel).filter(
+        Hostel.landlord_id == landlord_id,
+        Booking.status == 'confirmed',
+        ~already_handled,
+    ).order_by(Booking.created_at).all()
+    if not bookings:
+        raise HTTPException(status_code=400, detail="No pending disbursements found for this landlord")
+
+    platform_fee = get_config_value(db, 'platform_fee', 10.0)
+    # Each payout reserves its booking total (payout plus platform fee) from the ledger balance
+    reserved = sum(float(booking.total_amount) if booking.total_amount else 0.0 for booking in bookings)
+    available = _check_balance(db, landlord_id, reserved, payload.override_balance, current_user, "Batch")
+
+    try:
+        batch, queued = _queue_payouts(
+            db, landlord_id, current_user,
+            transfer_details={
+                "bank_uuid": bank_uuid,
+                "bank_account_number": payment_preference.account_number,
+                "bank_account_name": payment_preference.account_name,
+                "mobile_number": payment_preference.mobile_number,
+                "mobile_money_operator_ref_id": os.getenv('PAYCHANGU_MOBILE_OPERATOR_REF_ID'),
+            },
+            payouts=[
+                (booking, (float(booking.total_amount) if booking.total_amount else 0.0) - platform_fee)
+                for booking in bookings
+            ],
+            payment_method=payment_method,
+            platform_fee=platform_fee,
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to queue batch disbursement: {str(e)}")
+
+    if _wakeup is not None:
+        _wakeup.set()
+
+    return {
+        "success": True,
+        "batch_id": str(batch.batch_id),
+        "status": batch.status,
+        "total_amount": float(batch.total_amount),
+        "total_bookings": batch.total_bookings,
+        "landlord_name": f"{landlord.first_name} {landlord.last_name}",
+        "available_balance": available,
+        "exceeds_available_balance": reserved > available,
+        "payment_method": {
+            "mobile_number": payment_preference.mobile_number,
+            "bank_name": payment_preference.bank_name,
+            "account_name": payment_preference.account_name
+        },
+        "queued_bookings": [
+            {
+                "disbursement_id": str(d.disbursement_id),
+                "booking_id": str(d.booking_id),
+                "amount": float(d.disbursement_amount),
+            }
+            for d in queued
+        ],
+        "status_url": f"/admin/disbursements/batches/{batch.batch_id}",
+        "message": f"Batch disbursement queued: {len(queued)} transfers",
+    }
+
+
+@router.post("/admin/disbursements/process", status_code=status.HTTP_202_ACCEPTED)
+def queue_disbursement(
+    payload: DisbursementCreate = Body(...),
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Queue the payout of one booking; it is sent and settled like a batch of one."""
+    landlord_id = payload.landlord_id
+
+    # Same landlord row lock as batches, so the two cannot queue one booking twice
+    landlord = db.query(User).filter(
+        User.user_id == landlord_id, User.user_type == 'landlord'
+    ).with_for_update().first()
+    if not landlord:
+        raise HTTPException(status_code=404, detail="Landlord not found")
+
+    booking = db.query(Booking).join(Room).join(Hostel).filter(
+        Booking.booking_id == payload.booking_id,
+        Hostel.landlord_id == landlord_id,
+    ).first()
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found for this landlord")
+
+    payment_preference = db.query(PaymentPreference).filter(
+        PaymentPreference.user_id == landlord_id,
+        PaymentPreference.is_preferred == True
+    ).first()
+    if not payment_preference:
+        raise HTTPException(status_code=400, detail="Landlord has no payment preferences set")
+
+    payment_method = payload.payment_method or ('mobile_money' if payment_preference.mobile_number else 'bank_transfer')
+    bank_uuid = payload.bank_uuid or getattr(payment_preference, 'bank_uuid', None) or os.getenv('PAYCHANGU_DEFAULT_BANK_UUID')
+    if payment_method == 'bank_transfer' and not bank_uuid:
+        raise HTTPException(status_code=400, detail="Missing bank_uuid for PayChangu transfer. Set PAYCHANGU_DEFAULT_BANK_UUID or provide bank_uuid in request.")
+
+    in_flight = db.query(Disbursement.disbursement_id).filter(
+        Disbursement.booking_id == booking.booking_id,
+        Disbursement.status.in_(_OPEN_OR_PAID),
+    ).first()
+    if in_flight:
+        raise HTTPException(status_code=400, detail="Disbursement already queued or processed for this booking")
+
+    reserved = float(booking.total_amount) if booking.total_amount else 0.0
+    available = _check_balance(db, landlord_id, reserved, payload.override_balance, current_user, "Payout")
+
+    try:
+        bank_account_number = payload.bank_account_number or payment_preference.account_number or payment_preference.mobile_number
+        batch, [disbursement] = _queue_payouts(
+            db, landlord_id, current_user,
+            transfer_details={
+                "bank_uuid": bank_uuid,
+                "bank_account_number": str(bank_account_number) if bank_account_number is not None else None,
+                "bank_account_name": payload.bank_account_name or payment_preference.account_name,
+                "mobile_number": payload.mobile_number or payment_preference.mobile_number,
+                "mobile_money_operator_ref_id": payload.mobile_money_operator_ref_id or os.getenv('PAYCHANGU_MOBILE_OPERATOR_REF_ID'),
+            },
+            payouts=[(booking, float(payload.disbursement_amount))],
+            payment_method=payment_method,
+            platform_fee=get_config_value(db, 'platform_fee', 10.0),
+        )
+        if booking.status != 'confirmed':
+            booking.status = 'confirmed'
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to queue disbursement: {str(e)}")
+
+    if _wakeup is not None:
+        _wakeup.set()
+
+    return {
+        "success": True,
+        "batch_id": str(batch.batch_id),
+        "disbursement_id": str(disbursement.disbursement_id),
+        "status": disbursement.status,
+        "amount": float(disbursement.disbursement_amount),
+        "landlord_name": f"{landlord.first_name} {landlord.last_name}",
+        "available_balance": available,
+        "exceeds_available_balance": reserved > available,
+        "payment_method": {
+            "mobile_number": payment_preference.mobile_number,
+            "bank_name": payment_preference.bank_name,
+            "account_name": payment_preference.account_name
+        },
+        "status_url": f"/admin/disbursements/batches/{batch.batch_id}",
+        "message": "Disbursement queued",
+    }
+
+
+def _status_counts(db: Session, batch_ids: List) -> Dict:
+    rows = db.query(
+        Disbursement.batch_id, Disbursement.status, func.count(), func.coalesce(func.sum(Disbursement.disbursement_amount), 0)
+    ).filter(Disbursement.batch_id.in_(batch_ids)).group_by(Disbursement.batch_id, Disbursement.status).all()
+    counts: Dict = {}
+    for batch_id, disbursement_status, count, amount in rows:
+        counts.setdefault(batch_id, {})[disbursement_status] = {"count": count, "amount": float(amount)}
+    return counts
+
+
+def _serialize_batch(batch: DisbursementBatch, counts: Dict) -> dict:
+    done = sum(counts.get(s, {}).get("count", 0) for s in ("completed", "failed"))
+    return {
+        "batch_id": str(batch.batch_id),
+        "landlord_id": str(batch.landlord_id),
+        "created_by": str(batch.created_by) if batch.created_by else None,
+        "status": batch.status,
+        "total_amount": float(batch.total_amount or 0),
+        "total_bookings": batch.total_bookings,
+        "progress": {
+            "done": done,
+            "total": batch.total_bookings,
+            "by_status": counts,
+        },
+        "created_at": batch.created_at.isoformat() if batch.created_at else None,
+        "finished_at": batch.finished_at.isoformat() if batch.finished_at else None,
+    }
+
+
+@router.get("/admin/disbursements/batches")
+def list_disbursement_batches(
+    landlord_id: Optional[str] = None,
+    batch_status: Optional[str] = Query(None, alias="status"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    query = db.query(DisbursementBatch)
+    if landlord_id:
+        query = query.filter(DisbursementBatch.landlord_id == landlord_id)
+    if batch_status:
+        query = query.filter(DisbursementBatch.status == batch_status)
+    batches = query.order_by(DisbursementBatch.created_at.desc()).offset(skip).limit(limit).all()
+    counts = _status_counts(db, [batch.batch_id for batch in batches]) if batches else {}
+    return [_serialize_batch(batch, counts.get(batch.batch_id, {})) for batch in batches]
+
+
+@router.get("/admin/disbursements/batches/{batch_id}")
+def get_disbursement_batch(
+    batch_id: str,
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Batch progress with the state of every transfer in it."""
+    batch = db.query(DisbursementBatch).filter(DisbursementBatch.batch_id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Disbursement batch not found")
+
+    data = _serialize_batch(batch, _status_counts(db, [batch.batch_id]).get(batch.batch_id, {}))
+    disbursements = db.query(Disbursement).filter(
+        Disbursement.batch_id == batch.batch_id
+    ).order_by(Disbursement.created_at).all()
+    data["disbursements"] = [
+        {
+            "disbursement_id": str(d.disbursement_id),
+            "booking_id": str(d.booking_id),
+            "amount": float(d.disbursement_amount),
+            "status": d.status,
+            "payment_method": d.payment_method,
+            "payment_reference": d.payment_reference,
+            "failure_reason": d.failure_reason,
+            "attempts": d.attempts,
+            "submitted_at": d.submitted_at.isoformat() if d.submitted_at else None,
+            "processed_at": d.processed_at.isoformat() if d.processed_at else None,
+        }
+        for d in disbursements
+    ]
+    return data
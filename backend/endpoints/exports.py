@@ -0,0 +1,489 @@
+"""Asynchronous CSV/XLSX exports.
+
+`POST /exports/` queues an `export_jobs` row and returns at once. A worker
+task in each app process claims queued jobs (`FOR UPDATE SKIP LOCKED`) and
+streams the rows with `yield_per` straight into a file under `EXPORT_DIR`,
+so memory stays flat and multi-year histories don't hit the request
+timeout. Progress (`rows_written` / `total_rows`) is committed from a
+separate session every `EXPORT_PROGRESS_ROWS` rows.
+
+Finished files are served by `GET /exports/{job_id}/download` with HTTP
+range support (resumable downloads) and removed after
+`EXPORT_RETENTION_HOURS`. XLSX needs the optional `xlsxwriter` package,
+used in constant-memory mode.
+"""
+import asyncio
+import csv
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, db_session, get_db
+from models import Booking, ExportJob, Hostel, Payment, Room, User
+from endpoints.users import get_current_user
+
+logger = logging.getLogger('exports')
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_POLL_SECONDS = float(os.getenv("EXPORT_POLL_SECONDS", "2"))
+EXPORT_RETENTION_HOURS = int(os.getenv("EXPORT_RETENTION_HOURS", "24"))
+EXPORT_STALE_MINUTES = int(os.getenv("EXPORT_STALE_MINUTES", "60"))
+EXPORT_BATCH_SIZE = 1000
+EXPORT_PROGRESS_ROWS = 5000
+XLSX_MAX_ROWS = 1048575  # sheet limit minus the header row
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+BOOKING_COLUMNS = [
+    "booking_id", "hostel", "room", "student_name", "student_email", "check_in_date",
+    "check_out_date", "duration_months", "monthly_rent", "total_amount", "paid_amount",
+    "status", "payment_type", "created_at",
+]
+PAYMENT_COLUMNS = [
+    "payment_id", "booking_id", "hostel", "room", "student_name", "student_email", "amount",
+    "payment_type", "payment_method", "status", "transaction_id", "paid_at",
+]
+
+
+def _parse_datetime(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} format")
+
+
+def _bookings_query(db: Session, landlord_id, filters: dict):
+    paid_amount = select(
+        func.coalesce(func.sum(Payment.amount), 0)
+    ).where(
+        Payment.booking_id == Booking.booking_id,
+        Payment.status == 'completed',
+    ).correlate(Booking).scalar_subquery()
+
+    query = db.query(
+        Booking.booking_id,
+        Hostel.name,
+        Room.room_number,
+        (User.first_name + ' ' + User.last_name),
+        User.email,
+        Booking.start_date,
+        Booking.end_date,
+        Booking.duration_months,
+        Room.price_per_month,
+        Booking.total_amount,
+        paid_amount,
+        Booking.status,
+        Booking.payment_type,
+        Booking.created_at,
+    ).join(
+        Room, Booking.room_id == Room.room_id
+    ).join(
+        Hostel, Room.hostel_id == Hostel.hostel_id
+    ).outerjoin(
+        User, Booking.student_id == User.user_id
+    )
+    if landlord_id is not None:
+        query = query.filter(Hostel.landlord_id == landlord_id)
+    if filters.get("status"):
+        query = query.filter(Booking.status == filters["status"])
+    start_dt = _parse_datetime(filters.get("start_date"), "start_date")
+    if start_dt:
+        query = query.filter(Booking.created_at >= start_dt)
+    end_dt = _parse_datetime(filters.get("end_date"), "end_date")
+    if end_dt:
+        query = query.filter(Booking.created_at <= end_dt)
+    return query.order_by(Booking.created_at.desc(), Booking.booking_id.desc())
+
+
+def _payments_query(db: Session, landlord_id, filters: dict):
+    query = db.query(
+        Payment.payment_id,
+        Payment.booking_id,
+        Hostel.name,
+        Room.room_number,
+        (User.first_name + ' ' + User.last_name),
+        User.email,
+        Payment.amount,
+        Payment.payment_type,
+        Payment.payment_method,
+        Payment.status,
+        Payment.transaction_id,
+        Payment.paid_at,
+    ).join(
+        Booking, Payment.booking_id == Booking.booking_id
+    ).join(
+        Room, Booking.room_id == Room.room_id
+    ).join(
+        Hostel, Room.hostel_id == Hostel.hostel_id
+    ).outerjoin(
+        User, Booking.student_id == User.user_id
+    )
+    if landlord_id is not None:
+        query = query.filter(Hostel.landlord_id == landlord_id)
+    if filters.get("status"):
+        query = query.filter(Payment.status == filters["status"])
+    if filters.get("payment_type"):
+        query = query.filter(Payment.payment_type == filters["payment_type"])
+    start_dt = _parse_datetime(filters.get("start_date"), "start_date")
+    if start_dt:
+        query = query.filter(Payment.paid_at >= start_dt)
+    end_dt = _parse_datetime(filters.get("end_date"), "end_date")
+    if end_dt:
+        query = query.filter(Payment.paid_at <= end_dt)
+    return query.order_by(Payment.paid_at.desc().nulls_last(), Payment.payment_id.desc())
+
+
+# kind -> (user type allowed to request it, scoped to the requesting landlord, columns, query builder)
+EXPORT_KINDS: Dict[str, tuple] = {
+    "landlord_bookings": ("landlord", True, BOOKING_COLUMNS, _bookings_query),
+    "landlord_payments": ("landlord", True, PAYMENT_COLUMNS, _payments_query),
+    "admin_bookings": ("admin", False, BOOKING_COLUMNS, _bookings_query),
+    "admin_payments": ("admin", False, PAYMENT_COLUMNS, _payments_query),
+}
+
+
+# Spreadsheet apps treat text starting with these as a formula (CSV/formula injection)
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _CsvFile:
+    def __init__(self, path: str, columns: List[str]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, row) -> None:
+        self._writer.writerow([_cell(v) for v in row])
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _XlsxFile:
+    def __init__(self, path: str, columns: List[str]):
+        import xlsxwriter  # optional dependency, only needed for XLSX exports
+
+        # constant_memory flushes each row to disk as soon as the next one starts
+        self._workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        self._sheet = self._workbook.add_worksheet("Export")
+        self._sheet.write_row(0, 0, columns)
+        self._row = 1
+
+    def write(self, row) -> None:
+        for col, value in enumerate(row):
+            value = _cell(value)
+            if isinstance(value, str):
+                # Never let xlsxwriter infer a formula or number from user text
+                self._sheet.write_string(self._row, col, value)
+            elif value is not None:
+                self._sheet.write(self._row, col, value)
+        self._row += 1
+
+    def close(self) -> None:
+        self._workbook.close()
+
+
+def xlsx_available() -> bool:
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_path(job_id, fmt: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{job_id}.{fmt}")
+
+
+def _set_progress(job_id, **values) -> None:
+    with db_session() as db:
+        db.query(ExportJob).filter(ExportJob.job_id == job_id).update(values, synchronize_session=False)
+        db.commit()
+
+
+def run_export(job_id) -> None:
+    """Write one claimed job's file. Runs in a worker thread."""
+    with db_session() as db:
+        job = db.query(ExportJob).filter(ExportJob.job_id == job_id).first()
+        if job is None:
+            return
+        kind, fmt, owner_id, filters = job.kind, job.format, job.owner_id, job.filters or {}
+
+    _, scoped, columns, build_query = EXPORT_KINDS[kind]
+    path = export_path(job_id, fmt)
+    partial = f"{path}.part"
+    # Streaming session: its server-side cursor must stay open while progress is committed elsewhere
+    stream = SessionLocal()
+    try:
+        query = build_query(stream, owner_id if scoped else None, filters)
+        total = query.order_by(None).count()
+        if fmt == "xlsx" and total > XLSX_MAX_ROWS:
+            raise ValueError(f"{total} rows exceed the XLSX sheet limit; export as CSV instead")
+        _set_progress(job_id, total_rows=total)
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        writer = _XlsxFile(partial, columns) if fmt == "xlsx" else _CsvFile(partial, columns)
+        written = 0
+        try:
+            for row in query.yield_per(EXPORT_BATCH_SIZE):
+                writer.write(row)
+                written += 1
+                if written % EXPORT_PROGRESS_ROWS == 0:
+                    _set_progress(job_id, rows_written=written)
+        finally:
+            writer.close()
+
+        os.replace(partial, path)
+        _set_progress(
+            job_id,
+            status="completed",
+            rows_written=written,
+            file_path=path,
+            file_size=os.path.getsize(path),
+            finished_at=datetime.now(timezone.utc),
+        )
+    except Exception as e:
+        logger.error("Export %s failed: %s", job_id, e)
+        if os.path.exists(partial):
+            os.remove(partial)
+        _set_progress(job_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc))
+    finally:
+        stream.close()
+
+
+def _claim_job() -> Optional[UUID]:
+    with db_session() as db:
+        job = db.query(ExportJob).filter(
+            ExportJob.status == "queued"
+        ).order_by(ExportJob.created_at).with_for_update(skip_locked=True).first()
+        if job is None:
+            return None
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        db.commit()
+        return job.job_id
+
+
+def cleanup_exports() -> None:
+    """Expire old files and fail jobs whose worker died mid-export."""
+    now = datetime.now(timezone.utc)
+    with db_session() as db:
+        old = db.query(ExportJob).filter(
+            ExportJob.status == "completed",
+            ExportJob.finished_at < now - timedelta(hours=EXPORT_RETENTION_HOURS),
+        ).all()
+        for job in old:
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            job.status = "expired"
+            job.file_path = None
+        db.query(ExportJob).filter(
+            ExportJob.status == "running",
+            ExportJob.started_at < now - timedelta(minutes=EXPORT_STALE_MINUTES),
+        ).update({"status": "failed", "error": "Export interrupted", "finished_at": now}, synchronize_session=False)
+        db.commit()
+
+
+def _work_once() -> bool:
+    job_id = _claim_job()
+    if job_id is None:
+        return False
+    run_export(job_id)
+    return True
+
+
+async def run_export_worker() -> None:
+    """Process queued exports forever; started from the app lifespan and cancelled on shutdown."""
+    loop = asyncio.get_running_loop()
+    last_cleanup = 0.0
+    while True:
+        try:
+            if loop.time() - last_cleanup > 600:
+                await loop.run_in_executor(None, cleanup_exports)
+                last_cleanup = loop.time()
+            # Drain the queue before sleeping again
+            while await loop.run_in_executor(None, _work_once):
+                pass
+        except Exception as e:
+            logger.error("Export worker failed: %s", e)
+        await asyncio.sleep(EXPORT_POLL_SECONDS)
+
+
+def _serialize_job(job: ExportJob) -> dict:
+    progress = None
+    if job.total_rows:
+        progress = round(min(job.rows_written / job.total_rows, 1.0), 4)
+    elif job.status == "completed":
+        progress = 1.0
+    return {
+        "job_id": str(job.job_id),
+        "kind": job.kind,
+        "format": job.format,
+        "filters": job.filters or {},
+        "status": job.status,
+        "total_rows": job.total_rows,
+        "rows_written": job.rows_written,
+        "progress": progress,
+        "file_size": job.file_size,
+        "error": job.error,
+        "download_url": f"/exports/{job.job_id}/download" if job.status == "completed" else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _get_own_job(db: Session, job_id: UUID, user: User) -> ExportJob:
+    job = db.query(ExportJob).filter(ExportJob.job_id == job_id, ExportJob.owner_id == user.user_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+def create_export(
+    payload: dict,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue an export: `{"kind": ..., "format": "csv"|"xlsx", "filters": {...}}`."""
+    kind = payload.get("kind")
+    fmt = (payload.get("format") or "csv").lower()
+    filters = payload.get("filters") or {}
+
+    if kind not in EXPORT_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(EXPORT_KINDS)}")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'xlsx'")
+    if fmt == "xlsx" and not xlsx_available():
+        raise HTTPException(status_code=400, detail="XLSX export is not available on this server; use CSV")
+    if not isinstance(filters, dict):
+        raise HTTPException(status_code=400, detail="filters must be an object")
+
+    role = EXPORT_KINDS[kind][0]
+    if (current_user.user_type or "").lower() != role:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Only {role}s can request this export")
+
+    # Validate dates now rather than failing in the worker
+    _parse_datetime(filters.get("start_date"), "start_date")
+    _parse_datetime(filters.get("end_date"), "end_date")
+
+    job = ExportJob(owner_id=current_user.user_id, kind=kind, format=fmt, filters=filters)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return _serialize_job(job)
+
+
+@router.get("/")
+def list_exports(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The current user's recent exports, newest first."""
+    jobs = db.query(ExportJob).filter(
+        ExportJob.owner_id == current_user.user_id
+    ).order_by(ExportJob.created_at.desc()).limit(50).all()
+    return [_serialize_job(job) for job in jobs]
+
+
+@router.get("/{job_id}")
+def get_export(
+    job_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return _serialize_job(_get_own_job(db, job_id, current_user))
+
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _file_chunks(path: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def range_file_response(request: Request, path: str, media_type: str, filename: str) -> StreamingResponse:
+    """Stream a file, honouring a single `Range: bytes=...` request with 206/416."""
+    size = os.path.getsize(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    start, end, status_code = 0, size - 1, 200
+
+    range_header = request.headers.get("range")
+    match = _RANGE_RE.match(range_header.strip()) if range_header else None
+    if match and (match.group(1) or match.group(2)):
+        first, last = match.group(1), match.group(2)
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+        if start >= size or start > end:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"},
+            )
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1 if size else 0)
+    return StreamingResponse(
+        _file_chunks(path, start, end) if size else iter(()),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@router.get("/{job_id}/download")
+def download_export(
+    job_id: UUID,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = _get_own_job(db, job_id, current_user)
+    if job.status != "completed" or not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=409, detail=f"Export is {job.status}, not ready for download")
+    filename = f"{job.kind}_{job.created_at:%Y%m%d_%H%M%S}.{job.format}"
+    return range_file_response(request, job.file_path, EXPORT_FORMATS[job.format], filename)
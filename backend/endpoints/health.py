@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from database import get_db, engine
+from paychangu_service import paychangu_stats
 import time
 
 router = APIRouter(tags=["health"])
@@ -37,3 +38,8 @@ async def db_stats():
         return stats
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+@router.get("/paychangu-stats")
+async def paychangu_client_stats():
+    """PayChangu client circuit state, per-operation counts and latencies for this worker"""
+    return paychangu_stats()
@@ -0,0 +1,277 @@
+"""Versioned hostel card cache.
+
+A "card" is the serialized, request-independent part of a hostel: its
+fields, normalized amenities, coordinates, media list and cover image.
+Cards are keyed by `(hostel_id, cache_version)`; every write that touches a
+hostel bumps `hostels.cache_version` in the same transaction, so stale cards
+are never served and simply age out of the LRU. An optional Redis backend
+(`HOSTEL_CACHE_REDIS_URL`) shares cards between uvicorn workers.
+"""
+import logging
+import json
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import literal_column
+from sqlalchemy.orm import Session
+
+from models import Hostel, Media
+
+logger = logging.getLogger('hostel_cache')
+
+HOSTEL_CACHE_MAX_ENTRIES = int(os.getenv("HOSTEL_CACHE_MAX_ENTRIES", "5000"))
+HOSTEL_CACHE_REDIS_URL = os.getenv("HOSTEL_CACHE_REDIS_URL")
+HOSTEL_CACHE_TTL_SECONDS = int(os.getenv("HOSTEL_CACHE_TTL_SECONDS", "86400"))
+
+# PostGIS coordinate extraction from the geography column
+HOSTEL_LONGITUDE = literal_column("ST_X(hostels.location::geometry)")
+HOSTEL_LATITUDE = literal_column("ST_Y(hostels.location::geometry)")
+
+
+def normalize_amenities(amenities) -> dict:
+    """Canonical stored shape for `Hostel.amenities`: `{name: true}` for each amenity present.
+
+    Accepts the legacy list form, a dict of flags, or a single name. Falsy
+    flags and blank names are dropped so JSONB containment (`@>`) and amenity
+    facets only ever see amenities the hostel actually has.
+    """
+    if amenities is None:
+        return {}
+    if isinstance(amenities, str):
+        amenities = [amenities]
+    if isinstance(amenities, dict):
+        names = [k for k, v in amenities.items() if v]
+    else:
+        names = list(amenities)
+    return {str(name).strip(): True for name in names if name and str(name).strip()}
+
+
+def amenities_to_dict(amenities) -> dict:
+    """Coerce stored amenities (list or dict) into the `{name: bool}` response shape."""
+    if isinstance(amenities, list):
+        return {item: True for item in amenities if item}
+    if isinstance(amenities, dict):
+        return {k: bool(v) for k, v in amenities.items() if k}
+    return {}
+
+
+def serialize_media(m: Media) -> dict:
+    return {
+        "media_id": str(m.media_id),
+        "url": m.url,
+        "file_name": m.file_name,
+        "media_type": m.media_type,
+        "is_cover": m.is_cover,
+        "display_order": m.display_order,
+        "created_at": m.created_at
+    }
+
+
+def load_media(db: Session, hostel_ids: List) -> Dict[str, List[Media]]:
+    """Return hostel media grouped by hostel id, in display order."""
+    grouped: Dict[str, List[Media]] = defaultdict(list)
+    if not hostel_ids:
+        return grouped
+    media_files = db.query(Media).filter(
+        Media.hostel_id.in_(hostel_ids)
+    ).order_by(Media.hostel_id, Media.display_order, Media.created_at).all()
+    for m in media_files:
+        grouped[str(m.hostel_id)].append(m)
+    return grouped
+
+
+class LRUCache:
+    """Thread-safe in-process LRU keyed by strings."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._data.get(key)
+                if value is None:
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                self.hits += 1
+                found[key] = value
+        return found
+
+    def set_many(self, items: Dict[str, dict]) -> None:
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+class RedisCardBackend:
+    """Shared card store so workers don't each rebuild the same cards.
+
+    Cards are stored as JSON (datetimes become ISO strings, as in responses).
+    """
+
+    def __init__(self, url: str, ttl_seconds: int):
+        import redis  # optional dependency, only needed when a shared backend is configured
+
+        self._client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        if not keys:
+            return {}
+        try:
+            values = self._client.mget(keys)
+        except Exception as e:
+            logger.warning("Hostel card cache read failed: %s", e)
+            return {}
+        return {k: json.loads(v) for k, v in zip(keys, values) if v is not None}
+
+    def set_many(self, items: Dict[str, dict]) -> None:
+        if not items:
+            return
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(key, json.dumps(jsonable_encoder(value)), ex=self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Hostel card cache write failed: %s", e)
+
+
+def _create_shared_backend() -> Optional[RedisCardBackend]:
+    if not HOSTEL_CACHE_REDIS_URL:
+        return None
+    try:
+        return RedisCardBackend(HOSTEL_CACHE_REDIS_URL, HOSTEL_CACHE_TTL_SECONDS)
+    except ImportError:
+        logger.warning("HOSTEL_CACHE_REDIS_URL is set but the redis package is not installed; using in-process cache only")
+    except Exception as e:
+        logger.warning("Could not connect hostel card cache to Redis: %s", e)
+    return None
+
+
+local_cards = LRUCache(HOSTEL_CACHE_MAX_ENTRIES)
+shared_cards = _create_shared_backend()
+
+
+def card_key(hostel_id, version) -> str:
+    return f"hostel_card:{hostel_id}:{version or 0}"
+
+
+def bump_hostel_version(db: Session, hostel_id) -> None:
+    """Invalidate the cached card for a hostel.
+
+    Must be called inside the transaction of the write that changes the
+    hostel, its rooms, media or reviews; the new version becomes visible to
+    readers exactly when that write commits.
+    """
+    if hostel_id is None:
+        return
+    db.query(Hostel).filter(Hostel.hostel_id == hostel_id).update(
+        {Hostel.cache_version: Hostel.cache_version + 1},
+        synchronize_session=False,
+    )
+
+
+def build_cards(db: Session, hostel_ids: List) -> Dict[str, dict]:
+    """Build fresh cards for the given hostels with two queries (hostels, media)."""
+    if not hostel_ids:
+        return {}
+    # populate_existing: the session may hold a Hostel loaded before this request's write
+    rows = db.query(Hostel, HOSTEL_LONGITUDE, HOSTEL_LATITUDE).filter(
+        Hostel.hostel_id.in_(hostel_ids)
+    ).populate_existing().all()
+    media_map = load_media(db, hostel_ids)
+
+    cards = {}
+    for hostel, longitude, latitude in rows:
+        hostel_id_str = str(hostel.hostel_id)
+        media_files = media_map.get(hostel_id_str, [])
+        cover_media = next((m for m in media_files if m.is_cover), None)
+        if not cover_media and media_files:
+            cover_media = media_files[0]
+
+        cards[hostel_id_str] = {
+            "version": hostel.cache_version or 0,
+            "hostel_id": hostel_id_str,
+            "landlord_id": str(hostel.landlord_id),
+            "name": hostel.name,
+            "district": hostel.district,
+            "university": hostel.university,
+            "address": hostel.address,
+            "description": hostel.description,
+            "type": hostel.type,
+            "amenities": amenities_to_dict(hostel.amenities),
+            "price_per_month": float(hostel.price_per_month) if hostel.price_per_month is not None else None,
+            "booking_fee": float(hostel.booking_fee) if hostel.booking_fee is not None else 0.0,
+            "latitude": float(latitude) if latitude is not None else None,
+            "longitude": float(longitude) if longitude is not None else None,
+            "created_at": hostel.created_at,
+            "updated_at": hostel.updated_at,
+            "is_active": bool(getattr(hostel, "is_active", True)),
+            "cover_image_url": cover_media.url if cover_media else None,
+            "media": [serialize_media(m) for m in media_files],
+        }
+    return cards
+
+
+def get_hostel_cards(db: Session, versions: List[Tuple[object, Optional[int]]]) -> Dict[str, dict]:
+    """Return `{hostel_id: card}` for `(hostel_id, cache_version)` pairs.
+
+    Looks in the local LRU, then the shared backend, and builds whatever is
+    still missing in one batch. A card whose stored version differs from the
+    requested one is never returned.
+    """
+    keys = {str(hostel_id): card_key(hostel_id, version) for hostel_id, version in versions}
+    found = local_cards.get_many(keys.values())
+
+    missing_keys = [k for k in keys.values() if k not in found]
+    if missing_keys and shared_cards is not None:
+        from_shared = shared_cards.get_many(missing_keys)
+        if from_shared:
+            local_cards.set_many(from_shared)
+            found.update(from_shared)
+
+    built = {}
+    missing_ids = [hostel_id for hostel_id, key in keys.items() if key not in found]
+    if missing_ids:
+        built = build_cards(db, missing_ids)
+        fresh = {card_key(hostel_id, card["version"]): card for hostel_id, card in built.items()}
+        local_cards.set_many(fresh)
+        if shared_cards is not None:
+            shared_cards.set_many(fresh)
+        found.update(fresh)
+
+    cards = {}
+    for hostel_id, key in keys.items():
+        # Fall back to the freshly built card if the version moved since the key query
+        card = found.get(key) or built.get(hostel_id)
+        if card is not None:
+            cards[hostel_id] = card
+    return cards
+
+
+def cache_stats() -> dict:
+    return {
+        "local": local_cards.stats(),
+        "shared_backend": "redis" if shared_cards is not None else None,
+    }
@@ -0,0 +1,158 @@
+"""Set-based hostel catalog engine.
+
+Builds the student-facing hostel catalog from a fixed number of queries
+(one per entity type) instead of issuing per-hostel lookups, and exposes
+opaque keyset cursors so clients can page through the catalog. Static
+hostel content is served from the versioned card cache (`hostel_cache`).
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.orm import Session
+
+from models import Hostel, User, Verification
+from endpoints.hostel_stats import load_hostel_stats
+from endpoints.hostel_cache import get_hostel_cards
+
+# Page-size limits for cursor-based catalog pagination
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at: Optional[datetime], hostel_id) -> str:
+    """Encode the sort key of the last hostel on a page into an opaque cursor."""
+    payload = {
+        "c": created_at.isoformat() if created_at else None,
+        "h": str(hostel_id),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], uuid.UUID]:
+    """Decode a cursor produced by `encode_cursor`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(payload["c"]) if payload.get("c") else None
+        return created_at, uuid.UUID(payload["h"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    """Return a page size within [1, MAX_PAGE_SIZE]."""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def approved_landlord_clause():
+    """Filter clause: the hostel's landlord has an approved verification."""
+    return exists().where(
+        Verification.landlord_id == Hostel.landlord_id,
+        Verification.status == 'approved',
+    )
+
+
+def catalog_hostels_query(db: Session):
+    """Base query for the student catalog.
+
+    Selects only the key columns needed for ordering, paging and the card
+    cache lookup; hostel content comes from `get_hostel_cards`.
+    """
+    return db.query(
+        Hostel.hostel_id,
+        Hostel.cache_version,
+        Hostel.landlord_id,
+        Hostel.created_at,
+    ).filter(
+        Hostel.is_active == True,
+        approved_landlord_clause(),
+    )
+
+
+def apply_keyset(query, cursor: Optional[str]):
+    """Order newest-first and skip everything up to and including `cursor`."""
+    query = query.order_by(Hostel.created_at.desc().nullslast(), Hostel.hostel_id.desc())
+    if not cursor:
+        return query
+
+    created_at, hostel_id = decode_cursor(cursor)
+    if created_at is None:
+        # Rows without created_at sort last; continue within that tail by id only
+        return query.filter(Hostel.created_at.is_(None), Hostel.hostel_id < hostel_id)
+    return query.filter(
+        or_(
+            Hostel.created_at < created_at,
+            and_(Hostel.created_at == created_at, Hostel.hostel_id < hostel_id),
+            Hostel.created_at.is_(None),
+        )
+    )
+
+
+def load_landlords(db: Session, landlord_ids: List) -> Dict[str, User]:
+    """Return `{user_id: User}` for the given landlords in one query."""
+    if not landlord_ids:
+        return {}
+    landlords = db.query(User).filter(User.user_id.in_(set(landlord_ids))).all()
+    return {str(u.user_id): u for u in landlords}
+
+
+def build_catalog(db: Session, rows) -> List[dict]:
+    """Assemble catalog entries for rows from `catalog_hostels_query`.
+
+    Hostel content comes from the card cache; room/rating aggregates come
+    from `hostel_stats` and landlords from one batched query, regardless of
+    how many hostels are passed in.
+    """
+    hostel_ids = [row.hostel_id for row in rows]
+
+    cards = get_hostel_cards(db, [(row.hostel_id, row.cache_version) for row in rows])
+    stats_map = load_hostel_stats(db, hostel_ids)
+    landlords = load_landlords(db, [row.landlord_id for row in rows])
+
+    result = []
+    for row in rows:
+        hostel_id_str = str(row.hostel_id)
+        card = cards.get(hostel_id_str)
+        if card is None:
+            continue
+        stats = stats_map[hostel_id_str]
+
+        landlord = landlords.get(str(row.landlord_id))
+        landlord_name = f"{landlord.first_name} {landlord.last_name}" if landlord and landlord.first_name and landlord.last_name else "Unknown Landlord"
+        landlord_phone = landlord.phone_number if landlord else "+265 888 123 456"
+
+        result.append({
+            "hostel_id": hostel_id_str,
+            "landlord_id": card["landlord_id"],
+            "landlord_name": landlord_name,
+            "landlord_phone": landlord_phone,
+            "name": card["name"],
+            "district": card["district"],
+            "university": card["university"],
+            "address": card["address"],
+            "description": card["description"],
+            "type": card["type"],
+            "amenities": card["amenities"],
+            "price_per_month": card["price_per_month"],
+            "booking_fee": card["booking_fee"],
+            "latitude": card["latitude"] if card["latitude"] is not None else 0.0,
+            "longitude": card["longitude"] if card["longitude"] is not None else 0.0,
+            "created_at": card["created_at"],
+            "updated_at": card["updated_at"],
+            "total_rooms": stats["total_rooms"],
+            "occupied_rooms": stats["occupied_rooms"],
+            "available_rooms": stats["available_rooms"],
+            "is_active": card["is_active"],
+            "average_rating": stats["average_rating"],
+            "reviews_count": stats["reviews_count"],
+            "media": card["media"]
+        })
+    return result
@@ -0,0 +1,111 @@
+"""Geospatial hostel search backed by the PostGIS `hostels.location` geography column."""
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, cast
+from sqlalchemy.orm import Session
+
+from models import Hostel, Geography
+from endpoints.hostel_catalog import catalog_hostels_query, build_catalog
+
+# Search bounds for /hostels/nearby
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 50.0
+DEFAULT_NEARBY_LIMIT = 20
+MAX_NEARBY_LIMIT = 100
+
+# Campus coordinates as (latitude, longitude); mirrors the Flutter app's
+# `UniversityCoordinates` fallback table
+UNIVERSITY_COORDINATES = {
+    'University of Malawi (UNIMA)': (-15.3861, 35.3181),
+    'Malawi University of Science and Technology (MUST)': (-16.0644, 35.0381),
+    'Lilongwe University of Agriculture and Natural Resources (LUANAR)': (-13.9626, 33.7741),
+    'Mzuzu University (MZUNI)': (-11.4528, 34.0214),
+    'Malawi University of Business and Applied Sciences (MUBAS)': (-15.7861, 35.0058),
+    'Kamuzu University of Health Sciences (KUHeS)': (-15.7861, 35.0058),
+    'Malawi College of Accountancy (MCA)': (-15.7861, 35.0058),
+    'Malawi School of Government (MSG)': (-15.7861, 35.0058),
+    'Domasi College of Education (DCE)': (-15.3847, 35.3331),
+    'Nalikule College of Education (NCE)': (-13.9626, 33.7741),
+    'Malawi College of Health Sciences (MCHS)': (-15.7861, 35.0058),
+    'Catholic University of Malawi (CUNIMA)': (-15.3847, 35.3331),
+    'DMI St John the Baptist University (DMI)': (-15.7861, 35.0058),
+    'Nkhoma University (NKHUNI)': (-13.9626, 33.7741),
+    'Malawi Assemblies of God University (MAGU)': (-15.7861, 35.0058),
+    'Daeyang University (DU)': (-15.7861, 35.0058),
+    'Malawi Adventist University (MAU)': (-15.7861, 35.0058),
+    'African Bible College (ABC)': (-15.7861, 35.0058),
+    'University of Livingstonia (UNILIA)': (-11.4528, 34.0214),
+    'Exploits University (EU)': (-15.7861, 35.0058),
+    'University of Lilongwe (UNILIL)': (-13.9626, 33.7741),
+    'Millennium University (MU)': (-15.7861, 35.0058),
+}
+
+
+def resolve_university(name: str) -> Optional[Tuple[float, float]]:
+    """Return `(latitude, longitude)` for a university by full name or abbreviation."""
+    needle = name.strip().lower()
+    if not needle:
+        return None
+    for key, coords in UNIVERSITY_COORDINATES.items():
+        if key.lower() == needle:
+            return coords
+    for key, coords in UNIVERSITY_COORDINATES.items():
+        key_lower = key.lower()
+        # Match "UNIMA" against "University of Malawi (UNIMA)" and partial names
+        if f"({needle})" in key_lower or needle in key_lower or key_lower in needle:
+            return coords
+    return None
+
+
+def geography_point(latitude: float, longitude: float):
+    """SQL expression for a WGS84 geography point."""
+    return cast(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326), Geography())
+
+
+def resolve_search_origin(
+    latitude: Optional[float],
+    longitude: Optional[float],
+    university: Optional[str],
+) -> Tuple[float, float]:
+    """Pick the search origin from explicit coordinates or a named university."""
+    if latitude is not None and longitude is not None:
+        return latitude, longitude
+    if university:
+        coords = resolve_university(university)
+        if not coords:
+            raise HTTPException(status_code=404, detail=f"Unknown university: {university}")
+        return coords
+    raise HTTPException(
+        status_code=400,
+        detail="Provide latitude and longitude, or a university name"
+    )
+
+
+def find_nearby_hostels(
+    db: Session,
+    latitude: float,
+    longitude: float,
+    radius_km: Optional[float] = DEFAULT_RADIUS_KM,
+    limit: int = DEFAULT_NEARBY_LIMIT,
+) -> list:
+    """Return catalog entries near a point, nearest first, with `distance_km`.
+
+    The radius filter uses `ST_DWithin` and ordering uses the KNN `<->`
+    operator, both served by the GiST index on `hostels.location`. Passing
+    `radius_km=None` performs a pure k-nearest-neighbour search.
+    """
+    origin = geography_point(latitude, longitude)
+    distance_m = func.ST_Distance(Hostel.location, origin).label("distance_m")
+
+    query = catalog_hostels_query(db).add_columns(distance_m)
+    if radius_km is not None:
+        query = query.filter(func.ST_DWithin(Hostel.location, origin, radius_km * 1000.0))
+    rows = query.order_by(Hostel.location.op('<->')(origin)).limit(limit).all()
+
+    distances = {str(row.hostel_id): row.distance_m for row in rows}
+    items = build_catalog(db, rows)
+    for item in items:
+        distance_m = distances.get(item["hostel_id"])
+        item["distance_km"] = round(float(distance_m) / 1000.0, 3) if distance_m is not None else None
+    return items
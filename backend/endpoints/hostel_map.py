@@ -0,0 +1,162 @@
+"""Server-side clustering of hostel map pins.
+
+The world is split into tiles of `360 / 2**zoom` degrees. Each tile is
+further split into `MAP_CELLS_PER_TILE`² grid cells; hostels falling in
+the same cell are aggregated into one cluster (count, price range,
+centroid) by PostGIS. From `MAP_INDIVIDUAL_ZOOM` on, hostels are returned
+as individual pins instead.
+
+Results are cached per `(catalog stamp, zoom, tile)`, so panning reuses
+tiles already computed and any catalog change (new hostel, price or
+location edit, landlord approval) moves to fresh keys.
+"""
+import math
+import os
+from typing import Dict, List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Float, String, cast, func
+from sqlalchemy.orm import Session
+
+from models import Hostel, Geography
+from endpoints.hostel_cache import HOSTEL_LATITUDE, HOSTEL_LONGITUDE, LRUCache
+from endpoints.hostel_catalog import catalog_hostels_query
+
+MAX_MAP_ZOOM = 22
+MAP_INDIVIDUAL_ZOOM = 15
+MAP_CELLS_PER_TILE = 4
+MAX_MAP_TILES = 64
+
+map_tiles = LRUCache(int(os.getenv("HOSTEL_MAP_CACHE_MAX_TILES", "20000")))
+
+Tile = Tuple[int, int]
+
+
+def tile_size(zoom: int) -> float:
+    return 360.0 / (2 ** zoom)
+
+
+def covering_tiles(zoom: int, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Tile]:
+    """Tiles (x, y) overlapping the bounding box; x counts from -180 lon, y from -90 lat."""
+    size = tile_size(zoom)
+    x0 = math.floor((min_lon + 180.0) / size)
+    x1 = math.floor((min(max_lon, 179.999999) + 180.0) / size)
+    y0 = math.floor((min_lat + 90.0) / size)
+    y1 = math.floor((min(max_lat, 89.999999) + 90.0) / size)
+    count = (x1 - x0 + 1) * (y1 - y0 + 1)
+    if count > MAX_MAP_TILES:
+        raise HTTPException(status_code=400, detail="Bounding box too large for this zoom level")
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def _tiles_envelope(zoom: int, tiles: List[Tile]):
+    size = tile_size(zoom)
+    xs = [x for x, _ in tiles]
+    ys = [y for _, y in tiles]
+    envelope = func.ST_MakeEnvelope(
+        min(xs) * size - 180.0, min(ys) * size - 90.0,
+        (max(xs) + 1) * size - 180.0, (max(ys) + 1) * size - 90.0,
+        4326,
+    )
+    return cast(envelope, Geography())
+
+
+def _cluster_tiles(db: Session, zoom: int, tiles: List[Tile]) -> Dict[Tile, list]:
+    """Aggregate catalog hostels in the given tiles into grid-cell clusters."""
+    cell = tile_size(zoom) / MAP_CELLS_PER_TILE
+    cell_x = func.floor((HOSTEL_LONGITUDE + 180.0) / cell).label("cell_x")
+    cell_y = func.floor((HOSTEL_LATITUDE + 90.0) / cell).label("cell_y")
+
+    rows = catalog_hostels_query(db).with_entities(
+        cell_x,
+        cell_y,
+        func.count().label("count"),
+        func.avg(HOSTEL_LATITUDE).label("latitude"),
+        func.avg(HOSTEL_LONGITUDE).label("longitude"),
+        func.min(Hostel.price_per_month).label("min_price"),
+        func.max(Hostel.price_per_month).label("max_price"),
+        func.min(cast(Hostel.hostel_id, String)).label("hostel_id"),
+    ).filter(
+        Hostel.location.op('&&')(_tiles_envelope(zoom, tiles))
+    ).group_by(cell_x, cell_y).all()
+
+    wanted = set(tiles)
+    result: Dict[Tile, list] = {tile: [] for tile in tiles}
+    for row in rows:
+        tile = (int(row.cell_x) // MAP_CELLS_PER_TILE, int(row.cell_y) // MAP_CELLS_PER_TILE)
+        if tile not in wanted:
+            continue
+        cluster = {
+            "latitude": float(row.latitude),
+            "longitude": float(row.longitude),
+            "count": int(row.count),
+            "min_price": float(row.min_price) if row.min_price is not None else None,
+            "max_price": float(row.max_price) if row.max_price is not None else None,
+        }
+        if row.count == 1:
+            cluster["hostel_id"] = row.hostel_id
+        result[tile].append(cluster)
+    return result
+
+
+def _pin_tiles(db: Session, zoom: int, tiles: List[Tile]) -> Dict[Tile, list]:
+    """Individual catalog hostels in the given tiles."""
+    size = tile_size(zoom)
+    rows = catalog_hostels_query(db).with_entities(
+        Hostel.hostel_id,
+        Hostel.name,
+        Hostel.type,
+        Hostel.price_per_month,
+        cast(HOSTEL_LATITUDE, Float).label("latitude"),
+        cast(HOSTEL_LONGITUDE, Float).label("longitude"),
+    ).filter(
+        Hostel.location.op('&&')(_tiles_envelope(zoom, tiles))
+    ).all()
+
+    result: Dict[Tile, list] = {tile: [] for tile in tiles}
+    for row in rows:
+        tile = (math.floor((row.longitude + 180.0) / size), math.floor((row.latitude + 90.0) / size))
+        if tile not in result:
+            continue
+        result[tile].append({
+            "hostel_id": str(row.hostel_id),
+            "name": row.name,
+            "type": row.type,
+            "price_per_month": float(row.price_per_month) if row.price_per_month is not None else None,
+            "latitude": row.latitude,
+            "longitude": row.longitude,
+        })
+    return result
+
+
+def get_map_tiles(db: Session, stamp: str, zoom: int, tiles: List[Tile]) -> Dict[Tile, list]:
+    """Return clusters (or pins at high zoom) per tile, computing only uncached tiles."""
+    keys = {tile: f"map:{stamp}:{zoom}:{tile[0]}:{tile[1]}" for tile in tiles}
+    found = map_tiles.get_many(keys.values())
+
+    missing = [tile for tile, key in keys.items() if key not in found]
+    if missing:
+        compute = _pin_tiles if zoom >= MAP_INDIVIDUAL_ZOOM else _cluster_tiles
+        computed = compute(db, zoom, missing)
+        fresh = {keys[tile]: {"items": items} for tile, items in computed.items()}
+        map_tiles.set_many(fresh)
+        found.update(fresh)
+
+    return {tile: found[key]["items"] for tile, key in keys.items()}
+
+
+def build_map(db: Session, stamp: str, zoom: int, bbox: Tuple[float, float, float, float]) -> dict:
+    """Map payload for a bounding box `(min_lat, min_lon, max_lat, max_lon)`."""
+    tiles = covering_tiles(zoom, *bbox)
+    per_tile = get_map_tiles(db, stamp, zoom, tiles)
+    items = [item for tile in tiles for item in per_tile[tile]]
+
+    if zoom >= MAP_INDIVIDUAL_ZOOM:
+        return {"zoom": zoom, "clusters": [], "hostels": items, "count": len(items)}
+
+    return {
+        "zoom": zoom,
+        "clusters": items,
+        "hostels": [],
+        "count": sum(c["count"] for c in items),
+    }
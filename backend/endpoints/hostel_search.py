@@ -0,0 +1,247 @@
+"""Faceted and full-text hostel search over indexed columns.
+
+Structured filters use B-tree and JSONB GIN indexes; free-text queries use
+the generated `search_vector` (tsvector) and `search_text` (pg_trgm) columns
+so misspelled names still match.
+"""
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Float, func, literal, or_
+from sqlalchemy.orm import Session
+
+from models import Hostel, HostelStats
+from endpoints.hostel_catalog import (
+    approved_landlord_clause,
+    apply_keyset,
+    build_catalog,
+    catalog_hostels_query,
+    clamp_page_size,
+    encode_cursor,
+)
+
+# Amenity facets are capped so hostels with free-form amenity names don't bloat responses
+MAX_AMENITY_FACETS = 50
+
+# Text search tuning
+TEXT_SEARCH_CONFIG = 'simple'  # names and places; no language stemming
+DISTANCE_DECAY_KM = 5.0  # relevance halves at this distance from the origin
+MAX_TEXT_SEARCH_OFFSET = 1000
+
+
+def search_filters(
+    district: Optional[str] = None,
+    university: Optional[str] = None,
+    hostel_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    amenities: Optional[List[str]] = None,
+) -> list:
+    """Build filter clauses for a faceted search.
+
+    Text filters compare case-insensitively against the B-tree expression
+    indexes; amenities use JSONB containment (`@>`) against the GIN index,
+    so every requested amenity must be present.
+    """
+    clauses = []
+    if district:
+        clauses.append(func.lower(Hostel.district) == district.strip().lower())
+    if university:
+        clauses.append(func.lower(Hostel.university) == university.strip().lower())
+    if hostel_type:
+        clauses.append(func.lower(Hostel.type) == hostel_type.strip().lower())
+    if min_price is not None:
+        clauses.append(Hostel.price_per_month >= min_price)
+    if max_price is not None:
+        clauses.append(Hostel.price_per_month <= max_price)
+    wanted = [a.strip() for a in (amenities or []) if a and a.strip()]
+    if wanted:
+        clauses.append(Hostel.amenities.contains({name: True for name in wanted}))
+    return clauses
+
+
+def compute_facets(db: Session, clauses: list) -> dict:
+    """Return per-district, per-type and per-amenity counts for the filtered set."""
+    base_filters = [Hostel.is_active == True, approved_landlord_clause(), *clauses]
+
+    # District and type counts in one pass using GROUPING SETS
+    grouped = db.query(
+        Hostel.district,
+        Hostel.type,
+        func.grouping(Hostel.district).label("district_grouped"),
+        func.count().label("count"),
+    ).filter(*base_filters).group_by(
+        func.grouping_sets(Hostel.district, Hostel.type)
+    ).all()
+
+    districts = {}
+    types = {}
+    for row in grouped:
+        # grouping(district) == 0 means the row is a per-district bucket
+        if row.district_grouped == 0:
+            districts[row.district] = int(row.count)
+        else:
+            types[row.type] = int(row.count)
+
+    amenity_keys = db.query(
+        func.jsonb_object_keys(Hostel.amenities).label("amenity")
+    ).filter(
+        *base_filters,
+        func.jsonb_typeof(Hostel.amenities) == 'object',
+    ).subquery()
+    amenity_rows = db.query(
+        amenity_keys.c.amenity,
+        func.count().label("count"),
+    ).group_by(amenity_keys.c.amenity).order_by(
+        func.count().desc(), amenity_keys.c.amenity
+    ).limit(MAX_AMENITY_FACETS).all()
+
+    return {
+        "district": [{"value": k, "count": v} for k, v in sorted(districts.items(), key=lambda kv: (-kv[1], kv[0]))],
+        "type": [{"value": k, "count": v} for k, v in sorted(types.items(), key=lambda kv: (-kv[1], kv[0]))],
+        "amenities": [{"value": r.amenity, "count": int(r.count)} for r in amenity_rows],
+    }
+
+
+def encode_offset_cursor(offset: int) -> str:
+    raw = json.dumps({"o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_offset_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = int(json.loads(base64.urlsafe_b64decode(padded.encode()))["o"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0 or offset > MAX_TEXT_SEARCH_OFFSET:
+        raise HTTPException(status_code=400, detail="Cursor out of range")
+    return offset
+
+
+def text_match(q: str) -> Tuple[object, object]:
+    """Return `(filter_clause, relevance_expr)` for a free-text query.
+
+    A hostel matches when the tsquery hits `search_vector` or the query is
+    word-similar (`<%`) to `search_text`; the latter catches typos such as
+    "chancelor colege". Relevance adds the weighted text rank and the
+    trigram word similarity.
+    """
+    needle = q.strip().lower()
+    tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, needle)
+    clause = or_(
+        Hostel.search_vector.op('@@')(tsquery),
+        literal(needle).op('<%')(Hostel.search_text),
+    )
+    relevance = func.ts_rank_cd(Hostel.search_vector, tsquery) + func.word_similarity(needle, Hostel.search_text)
+    return clause, relevance
+
+
+def text_search_hostels(
+    db: Session,
+    q: str,
+    clauses: list,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    origin=None,
+    rating_weight: float = 0.0,
+) -> Tuple[list, Optional[str], bool, int]:
+    """Rank matching hostels by relevance, optionally boosted by proximity and rating.
+
+    `origin` is a geography expression; when given, relevance is divided by
+    `1 + distance_km / DISTANCE_DECAY_KM`. `rating_weight` scales a boost of
+    up to `rating_weight` for a 5-star average.
+    """
+    page_size = clamp_page_size(limit)
+    offset = decode_offset_cursor(cursor)
+    text_clause, score = text_match(q)
+
+    query = catalog_hostels_query(db).filter(*clauses, text_clause)
+
+    if rating_weight:
+        query = query.outerjoin(HostelStats, HostelStats.hostel_id == Hostel.hostel_id)
+        avg_rating = func.coalesce(
+            HostelStats.rating_sum / func.nullif(HostelStats.reviews_count, 0).cast(Float), 0
+        )
+        score = score * (1 + rating_weight * avg_rating / 5.0)
+
+    distance_km = None
+    if origin is not None:
+        distance_km = func.ST_Distance(Hostel.location, origin) / 1000.0
+        score = score / (1 + distance_km / DISTANCE_DECAY_KM)
+
+    query = query.add_columns(score.label("relevance"))
+    if distance_km is not None:
+        query = query.add_columns(distance_km.label("distance_km"))
+
+    rows = query.order_by(score.desc(), Hostel.hostel_id).offset(offset).limit(page_size + 1).all()
+    has_more = len(rows) > page_size and offset + page_size < MAX_TEXT_SEARCH_OFFSET
+    rows = rows[:page_size]
+
+    extras = {str(row.hostel_id): row for row in rows}
+    items = build_catalog(db, rows)
+    for item in items:
+        row = extras[item["hostel_id"]]
+        item["relevance"] = round(float(row.relevance or 0), 4)
+        if distance_km is not None:
+            item["distance_km"] = round(float(row.distance_km), 3) if row.distance_km is not None else None
+
+    next_cursor = encode_offset_cursor(offset + page_size) if has_more else None
+    return items, next_cursor, has_more, page_size
+
+
+def search_hostels(
+    db: Session,
+    clauses: list,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    include_facets: bool = True,
+    q: Optional[str] = None,
+    origin=None,
+    rating_weight: float = 0.0,
+) -> dict:
+    """Return one page of matching catalog hostels plus facet counts.
+
+    Without `q` results are in catalog (keyset) order; with `q` they are
+    ranked by text relevance and paged by offset cursors. Facets always
+    describe the structured filters plus the text match.
+    """
+    if q and q.strip():
+        text_clause, _ = text_match(q)
+        items, next_cursor, has_more, page_size = text_search_hostels(
+            db, q, clauses, cursor=cursor, limit=limit, origin=origin, rating_weight=rating_weight,
+        )
+        result = {
+            "items": items,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+            "limit": page_size,
+        }
+        if include_facets:
+            result["facets"] = compute_facets(db, [*clauses, text_clause])
+        return result
+
+    page_size = clamp_page_size(limit)
+    query = catalog_hostels_query(db).filter(*clauses)
+    rows = apply_keyset(query, cursor).limit(page_size + 1).all()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.hostel_id)
+
+    result = {
+        "items": build_catalog(db, rows),
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "limit": page_size,
+    }
+    if include_facets:
+        result["facets"] = compute_facets(db, clauses)
+    return result
@@ -0,0 +1,509 @@
+"""In-memory columnar snapshot of the student catalog.
+
+Every active hostel of an approved landlord is held as one row across NumPy
+column arrays (price, coordinates, rating, available rooms, type/district/
+university codes, amenity bitmask, catalog order). Filters, sorts and
+top-k selection run as vectorized operations over those arrays; SQL is only
+used to hydrate the final page through the card cache (`build_catalog`).
+
+The snapshot is refreshed incrementally from `change_log` (hostel and room
+changes) at most every `CATALOG_SNAPSHOT_REFRESH_SECONDS`, and rebuilt in
+full when landlord verifications change, when the backlog of changes is
+large, or every `CATALOG_SNAPSHOT_REBUILD_SECONDS`.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from models import ChangeLog, Hostel, HostelStats, Room, Verification
+from endpoints.change_log import visible_horizon
+from endpoints.hostel_cache import HOSTEL_LATITUDE, HOSTEL_LONGITUDE
+from endpoints.hostel_catalog import (
+    build_catalog,
+    catalog_hostels_query,
+    clamp_page_size,
+    decode_cursor,
+    encode_cursor,
+)
+from endpoints.hostel_search import MAX_TEXT_SEARCH_OFFSET, decode_offset_cursor, encode_offset_cursor
+
+logger = logging.getLogger('hostel_snapshot')
+
+CATALOG_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_REFRESH_SECONDS", "2"))
+CATALOG_SNAPSHOT_REBUILD_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_REBUILD_SECONDS", "900"))
+# Beyond this many pending change rows a full rebuild is cheaper than replaying them
+CATALOG_SNAPSHOT_MAX_CHANGES = 2000
+
+# Feed sort orders
+SORT_NEWEST = "newest"
+SORT_PRICE_ASC = "price_asc"
+SORT_PRICE_DESC = "price_desc"
+SORT_RATING = "rating"
+SORT_DISTANCE = "distance"
+SORT_ORDERS = (SORT_NEWEST, SORT_PRICE_ASC, SORT_PRICE_DESC, SORT_RATING, SORT_DISTANCE)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NULL_CREATED = np.iinfo(np.int64).min
+_EARTH_RADIUS_KM = 6371.0088
+
+# Row shape accepted by `build_catalog`
+CatalogRow = namedtuple("CatalogRow", ["hostel_id", "cache_version", "landlord_id", "created_at"])
+
+
+def _to_micros(value: Optional[datetime]) -> int:
+    if value is None:
+        return _NULL_CREATED
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> Optional[datetime]:
+    if value == _NULL_CREATED:
+        return None
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+class _Codes:
+    """Case-insensitive string -> small int dictionary for categorical columns."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        key = value.strip().lower()
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.codes)
+        return code
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self.codes.get(value.strip().lower())
+
+
+class CatalogSnapshot:
+    """Columnar catalog; all reads and writes go through `_lock`."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built_at = 0.0
+        self.checked_at = 0.0
+        self.position: Tuple[int, int] = (0, 0)
+        self.verification_stamp = None
+        self._reset()
+
+    def _reset(self):
+        self.index: Dict[uuid.UUID, int] = {}
+        self.types = _Codes()
+        self.districts = _Codes()
+        self.universities = _Codes()
+        self.amenity_bits: Dict[str, int] = {}
+        self.keys = np.empty(0, dtype=object)
+        self.landlords = np.empty(0, dtype=object)
+        self.ids = np.empty(0, dtype="<U36")
+        self.versions = np.empty(0, dtype=np.int64)
+        self.created = np.empty(0, dtype=np.int64)
+        self.updated = np.empty(0, dtype=np.int64)
+        self.price = np.empty(0, dtype=np.float64)
+        self.lat = np.empty(0, dtype=np.float64)
+        self.lon = np.empty(0, dtype=np.float64)
+        self.rating = np.empty(0, dtype=np.float64)
+        self.available = np.empty(0, dtype=np.int32)
+        self.type_code = np.empty(0, dtype=np.int32)
+        self.district_code = np.empty(0, dtype=np.int32)
+        self.university_code = np.empty(0, dtype=np.int32)
+        self.amenities = np.zeros((0, 1), dtype=np.uint64)
+        self.alive = np.empty(0, dtype=bool)
+        self._newest_rank = None
+        self._digest = None
+
+    # -- loading ---------------------------------------------------------
+
+    @staticmethod
+    def _source_query(db: Session):
+        return catalog_hostels_query(db).add_columns(
+            Hostel.updated_at,
+            Hostel.price_per_month,
+            Hostel.type,
+            Hostel.district,
+            Hostel.university,
+            Hostel.amenities,
+            HOSTEL_LATITUDE.label("latitude"),
+            HOSTEL_LONGITUDE.label("longitude"),
+            HostelStats.available_rooms,
+            HostelStats.rating_sum,
+            HostelStats.reviews_count,
+        ).outerjoin(HostelStats, HostelStats.hostel_id == Hostel.hostel_id)
+
+    @staticmethod
+    def _verification_stamp(db: Session):
+        row = db.query(func.count(Verification.verification_id), func.max(Verification.updated_at)).first()
+        return tuple(row)
+
+    def _amenity_mask(self, amenities) -> List[int]:
+        """Return the amenity bitmask words for a stored amenities value, growing the vocabulary."""
+        names = [k for k, v in amenities.items() if v] if isinstance(amenities, dict) else list(amenities or [])
+        words = [0] * self.amenities.shape[1]
+        for name in names:
+            bit = self.amenity_bits.get(name)
+            if bit is None:
+                bit = self.amenity_bits[name] = len(self.amenity_bits)
+            word, offset = divmod(bit, 64)
+            while word >= len(words):
+                words.append(0)
+            words[word] |= 1 << offset
+        if len(words) > self.amenities.shape[1]:
+            extra = len(words) - self.amenities.shape[1]
+            self.amenities = np.hstack([self.amenities, np.zeros((len(self.amenities), extra), dtype=np.uint64)])
+        return words
+
+    def _write_rows(self, rows) -> None:
+        """Upsert source rows: overwrite rows already indexed, append the rest."""
+        appended = []
+        for row in rows:
+            position = self.index.get(row.hostel_id)
+            if position is None:
+                position = len(self.ids) + len(appended)
+                self.index[row.hostel_id] = position
+                appended.append(row)
+                continue
+            self._write_row(position, row)
+
+        if appended:
+            count = len(appended)
+            self.keys = np.concatenate([self.keys, np.empty(count, dtype=object)])
+            self.landlords = np.concatenate([self.landlords, np.empty(count, dtype=object)])
+            self.ids = np.concatenate([self.ids, np.empty(count, dtype="<U36")])
+            for name in ("versions", "created", "updated", "price", "lat", "lon", "rating", "available",
+                         "type_code", "district_code", "university_code", "alive"):
+                column = getattr(self, name)
+                setattr(self, name, np.concatenate([column, np.zeros(count, dtype=column.dtype)]))
+            self.amenities = np.vstack([self.amenities, np.zeros((count, self.amenities.shape[1]), dtype=np.uint64)])
+            for row in appended:
+                self._write_row(self.index[row.hostel_id], row)
+        self._newest_rank = None
+        self._digest = None
+
+    def _write_row(self, i: int, row) -> None:
+        words = self._amenity_mask(row.amenities)
+        self.keys[i] = row.hostel_id
+        self.landlords[i] = row.landlord_id
+        self.ids[i] = str(row.hostel_id)
+        self.versions[i] = row.cache_version or 0
+        self.created[i] = _to_micros(row.created_at)
+        self.updated[i] = _to_micros(row.updated_at)
+        self.price[i] = float(row.price_per_month) if row.price_per_month is not None else np.nan
+        self.lat[i] = float(row.latitude) if row.latitude is not None else np.nan
+        self.lon[i] = float(row.longitude) if row.longitude is not None else np.nan
+        self.rating[i] = (row.rating_sum or 0) / row.reviews_count if row.reviews_count else 0.0
+        self.available[i] = row.available_rooms or 0
+        self.type_code[i] = self.types.encode(row.type)
+        self.district_code[i] = self.districts.encode(row.district)
+        self.university_code[i] = self.universities.encode(row.university)
+        self.amenities[i, :] = 0
+        self.amenities[i, :len(words)] = words
+        self.alive[i] = True
+
+    def _rebuild(self, db: Session) -> None:
+        horizon = visible_horizon(db)
+        stamp = self._verification_stamp(db)
+        rows = self._source_query(db).all()
+        self._reset()
+        self._write_rows(rows)
+        self.position = (horizon, 0)
+        self.verification_stamp = stamp
+        self.built_at = time.monotonic()
+        logger.info("Built catalog snapshot with %s hostels", len(rows))
+
+    def _apply_changes(self, db: Session) -> bool:
+        """Replay hostel/room changes since `position`; return False if a rebuild is needed."""
+        horizon = visible_horizon(db)
+        changes = db.query(ChangeLog.txid, ChangeLog.change_id, ChangeLog.entity, ChangeLog.entity_id).filter(
+            tuple_(ChangeLog.txid, ChangeLog.change_id) > tuple_(*self.position),
+            ChangeLog.txid < horizon,
+            ChangeLog.entity.in_(("hostel", "room")),
+        ).order_by(ChangeLog.txid, ChangeLog.change_id).limit(CATALOG_SNAPSHOT_MAX_CHANGES + 1).all()
+        if len(changes) > CATALOG_SNAPSHOT_MAX_CHANGES:
+            return False
+
+        hostel_ids = {c.entity_id for c in changes if c.entity == "hostel"}
+        room_ids = [c.entity_id for c in changes if c.entity == "room"]
+        if room_ids:
+            # Deleted rooms are covered by the hostel version bump in the same transaction
+            hostel_ids.update(r.hostel_id for r in db.query(Room.hostel_id).filter(Room.room_id.in_(room_ids)).all())
+
+        if hostel_ids:
+            rows = self._source_query(db).filter(Hostel.hostel_id.in_(list(hostel_ids))).all()
+            self._write_rows(rows)
+            present = {row.hostel_id for row in rows}
+            for hostel_id in hostel_ids - present:
+                position = self.index.get(hostel_id)
+                if position is not None:
+                    self.alive[position] = False
+            self._digest = None
+
+        position = (changes[-1].txid, changes[-1].change_id) if changes else self.position
+        self.position = max(position, (horizon, 0))
+        return True
+
+    def ensure_fresh(self, db: Session) -> None:
+        now = time.monotonic()
+        if now - self.checked_at < CATALOG_SNAPSHOT_REFRESH_SECONDS:
+            return
+        with self._lock:
+            if now - self.checked_at < CATALOG_SNAPSHOT_REFRESH_SECONDS:
+                return
+            stale = (
+                not self.built_at
+                or now - self.built_at > CATALOG_SNAPSHOT_REBUILD_SECONDS
+                or self._verification_stamp(db) != self.verification_stamp
+            )
+            if stale or not self._apply_changes(db):
+                self._rebuild(db)
+            if (~self.alive).sum() > max(64, len(self.alive) // 4):
+                self._rebuild(db)
+            self.checked_at = time.monotonic()
+
+    # -- querying --------------------------------------------------------
+
+    def _newest_ranks(self) -> np.ndarray:
+        """Position of each row in catalog order (created_at desc, hostel_id desc)."""
+        if self._newest_rank is None:
+            order = np.lexsort((self.ids, self.created))[::-1]
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self._newest_rank = rank
+        return self._newest_rank
+
+    def _filter_mask(
+        self,
+        district: Optional[str] = None,
+        university: Optional[str] = None,
+        hostel_type: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        amenities: Optional[List[str]] = None,
+        min_rating: Optional[float] = None,
+        available_only: bool = False,
+    ) -> np.ndarray:
+        mask = self.alive.copy()
+        for value, codes, column in (
+            (district, self.districts, self.district_code),
+            (university, self.universities, self.university_code),
+            (hostel_type, self.types, self.type_code),
+        ):
+            if value:
+                code = codes.lookup(value)
+                if code is None:
+                    return np.zeros_like(mask)
+                mask &= column == code
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if max_price is not None:
+            mask &= self.price <= max_price
+        if min_rating is not None:
+            mask &= self.rating >= min_rating
+        if available_only:
+            mask &= self.available > 0
+        wanted = [a.strip() for a in (amenities or []) if a and a.strip()]
+        if wanted:
+            required = np.zeros(self.amenities.shape[1], dtype=np.uint64)
+            for name in wanted:
+                bit = self.amenity_bits.get(name)
+                if bit is None:
+                    return np.zeros_like(mask)
+                word, offset = divmod(bit, 64)
+                required[word] |= np.uint64(1 << offset)
+            mask &= np.all((self.amenities & required) == required, axis=1)
+        return mask
+
+    def _distances_km(self, latitude: float, longitude: float) -> np.ndarray:
+        lat1, lon1 = math.radians(latitude), math.radians(longitude)
+        lat2, lon2 = np.radians(self.lat), np.radians(self.lon)
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * _EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    @staticmethod
+    def _top_k(candidates: np.ndarray, primary: np.ndarray, tiebreak: np.ndarray, k: int) -> np.ndarray:
+        """Return up to `k` candidate row positions ordered by (primary, tiebreak) ascending."""
+        if len(candidates) > k:
+            keys = primary[candidates]
+            kth = np.partition(keys, k - 1)[k - 1]
+            candidates = candidates[keys <= kth]
+        order = np.lexsort((tiebreak[candidates], primary[candidates]))
+        return candidates[order][:k]
+
+    def _rows(self, positions) -> List[CatalogRow]:
+        return [
+            CatalogRow(self.keys[i], int(self.versions[i]), self.landlords[i], _from_micros(self.created[i]))
+            for i in positions
+        ]
+
+    def catalog_rows(self, cursor: Optional[str] = None, limit: Optional[int] = None) -> List[CatalogRow]:
+        """Catalog-ordered rows after the keyset `cursor`; `limit=None` returns all."""
+        with self._lock:
+            mask = self.alive.copy()
+            if cursor:
+                created_at, hostel_id = decode_cursor(cursor)
+                hostel_key = str(hostel_id)
+                if created_at is None:
+                    mask &= (self.created == _NULL_CREATED) & (self.ids < hostel_key)
+                else:
+                    micros = _to_micros(created_at)
+                    mask &= (
+                        (self.created < micros)
+                        | ((self.created == micros) & (self.ids < hostel_key))
+                    )
+            candidates = np.flatnonzero(mask)
+            ranks = self._newest_ranks()
+            if limit is None:
+                positions = candidates[np.argsort(ranks[candidates])]
+            else:
+                positions = self._top_k(candidates, ranks, ranks, limit)
+            return self._rows(positions)
+
+    def feed(
+        self,
+        sort: str = SORT_NEWEST,
+        origin: Optional[Tuple[float, float]] = None,
+        radius_km: Optional[float] = None,
+        offset: int = 0,
+        limit: int = 50,
+        **filters,
+    ) -> Tuple[List[CatalogRow], Dict[str, float], int]:
+        """Filter, sort and slice the catalog.
+
+        Returns `(rows, distances_km_by_id, total_matches)`; distances are
+        only filled when `origin` is given.
+        """
+        with self._lock:
+            mask = self._filter_mask(**filters)
+            distances = None
+            if origin is not None:
+                distances = self._distances_km(*origin)
+                if radius_km is not None:
+                    mask &= distances <= radius_km
+            candidates = np.flatnonzero(mask)
+            total = len(candidates)
+            ranks = self._newest_ranks()
+
+            if sort == SORT_PRICE_ASC:
+                primary = np.where(np.isnan(self.price), np.inf, self.price)
+            elif sort == SORT_PRICE_DESC:
+                primary = np.where(np.isnan(self.price), np.inf, -self.price)
+            elif sort == SORT_RATING:
+                primary = -self.rating
+            elif sort == SORT_DISTANCE and distances is not None:
+                primary = np.where(np.isnan(distances), np.inf, distances)
+            else:
+                primary = ranks
+
+            positions = self._top_k(candidates, primary, ranks, offset + limit)[offset:]
+            distance_map = {}
+            if distances is not None:
+                distance_map = {self.ids[i]: float(distances[i]) for i in positions if not np.isnan(distances[i])}
+            return self._rows(positions), distance_map, total
+
+    def validators(self) -> Tuple[str, Optional[datetime], Optional[datetime]]:
+        """Return `(digest, hostels_updated, verifications_updated)` for the rows being served.
+
+        The digest covers membership and card versions, so it is the same in
+        every worker holding the same catalog.
+        """
+        with self._lock:
+            if self._digest is None:
+                alive = np.flatnonzero(self.alive)
+                alive = alive[np.argsort(self.ids[alive])]
+                raw = ",".join(f"{self.ids[i]}:{self.versions[i]}" for i in alive)
+                self._digest = hashlib.sha1(raw.encode()).hexdigest()
+            updated = self.updated[self.alive]
+            hostels_updated = _from_micros(updated.max()) if len(updated) else None
+            verifications_updated = self.verification_stamp[1] if self.verification_stamp else None
+            return self._digest, hostels_updated, verifications_updated
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hostels": int(self.alive.sum()),
+                "rows": len(self.alive),
+                "amenities": len(self.amenity_bits),
+                "position": list(self.position),
+                "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at else None,
+            }
+
+
+catalog_snapshot = CatalogSnapshot()
+
+
+def get_catalog_page(db: Session, cursor: Optional[str] = None, limit: Optional[int] = None) -> dict:
+    """Return one keyset-paginated page of the student catalog."""
+    page_size = clamp_page_size(limit)
+    catalog_snapshot.ensure_fresh(db)
+    rows = catalog_snapshot.catalog_rows(cursor, page_size + 1)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.hostel_id)
+
+    return {
+        "items": build_catalog(db, rows),
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "limit": page_size,
+    }
+
+
+def get_full_catalog(db: Session) -> List[dict]:
+    """Return the whole student catalog (legacy, unpaginated response)."""
+    catalog_snapshot.ensure_fresh(db)
+    return build_catalog(db, catalog_snapshot.catalog_rows())
+
+
+def get_catalog_feed(
+    db: Session,
+    sort: str = SORT_NEWEST,
+    origin: Optional[Tuple[float, float]] = None,
+    radius_km: Optional[float] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    **filters,
+) -> dict:
+    """Filtered, sorted page of the catalog for the student home feed."""
+    page_size = clamp_page_size(limit)
+    offset = decode_offset_cursor(cursor)
+    catalog_snapshot.ensure_fresh(db)
+    rows, distances, total = catalog_snapshot.feed(
+        sort=sort, origin=origin, radius_km=radius_km, offset=offset, limit=page_size + 1, **filters,
+    )
+
+    has_more = len(rows) > page_size and offset + page_size < MAX_TEXT_SEARCH_OFFSET
+    rows = rows[:page_size]
+    items = build_catalog(db, rows)
+    if origin is not None:
+        for item in items:
+            distance = distances.get(item["hostel_id"])
+            item["distance_km"] = round(distance, 3) if distance is not None else None
+
+    return {
+        "items": items,
+        "next_cursor": encode_offset_cursor(offset + page_size) if has_more else None,
+        "has_more": has_more,
+        "limit": page_size,
+        "total": total,
+    }
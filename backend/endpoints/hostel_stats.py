@@ -0,0 +1,218 @@
+"""Incrementally maintained per-hostel statistics.
+
+`hostel_stats` holds room, capacity, occupancy and rating aggregates per
+hostel. Row-level triggers on `rooms` and `reviews` apply deltas in the same
+transaction as the write, so booking confirmations (which bump
+`rooms.occupants`), room edits and reviews keep it current without any
+endpoint recomputing counts.
+
+A room counts as available when `is_available` is set and it still has a
+free bed (`occupants < capacity`); occupied rooms are the rest.
+"""
+import logging
+from typing import Dict, List
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from models import Hostel, HostelStats
+
+logger = logging.getLogger('hostel_stats')
+
+# Arbitrary advisory lock id so only one worker installs triggers at a time
+_INSTALL_LOCK_ID = 724001
+
+_APPLY_FUNCTION = """
+CREATE OR REPLACE FUNCTION hostel_stats_apply(
+    p_hostel_id UUID,
+    d_rooms INTEGER,
+    d_available INTEGER,
+    d_capacity INTEGER,
+    d_occupants INTEGER,
+    d_rating_sum INTEGER,
+    d_reviews INTEGER
+) RETURNS VOID AS $$
+BEGIN
+    -- Skip hostels being deleted (cascaded room/review deletes)
+    INSERT INTO hostel_stats AS s (
+        hostel_id, total_rooms, available_rooms, total_capacity,
+        total_occupants, rating_sum, reviews_count, updated_at
+    )
+    SELECT p_hostel_id, d_rooms, d_available, d_capacity,
+           d_occupants, d_rating_sum, d_reviews, now()
+    WHERE EXISTS (SELECT 1 FROM hostels WHERE hostel_id = p_hostel_id)
+    ON CONFLICT (hostel_id) DO UPDATE SET
+        total_rooms = s.total_rooms + EXCLUDED.total_rooms,
+        available_rooms = s.available_rooms + EXCLUDED.available_rooms,
+        total_capacity = s.total_capacity + EXCLUDED.total_capacity,
+        total_occupants = s.total_occupants + EXCLUDED.total_occupants,
+        rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+        reviews_count = s.reviews_count + EXCLUDED.reviews_count,
+        updated_at = now();
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_ROOMS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION hostel_stats_rooms_trg() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM hostel_stats_apply(
+            OLD.hostel_id, -1,
+            -(CASE WHEN OLD.is_available AND OLD.occupants < OLD.capacity THEN 1 ELSE 0 END),
+            -OLD.capacity, -OLD.occupants, 0, 0
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM hostel_stats_apply(
+            NEW.hostel_id, 1,
+            (CASE WHEN NEW.is_available AND NEW.occupants < NEW.capacity THEN 1 ELSE 0 END),
+            NEW.capacity, NEW.occupants, 0, 0
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_REVIEWS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION hostel_stats_reviews_trg() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM hostel_stats_apply(OLD.hostel_id, 0, 0, 0, 0, -OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM hostel_stats_apply(NEW.hostel_id, 0, 0, 0, 0, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_TRIGGERS = """
+DROP TRIGGER IF EXISTS hostel_stats_rooms ON rooms;
+CREATE TRIGGER hostel_stats_rooms
+    AFTER INSERT OR DELETE OR UPDATE OF hostel_id, capacity, occupants, is_available ON rooms
+    FOR EACH ROW EXECUTE FUNCTION hostel_stats_rooms_trg();
+
+DROP TRIGGER IF EXISTS hostel_stats_reviews ON reviews;
+CREATE TRIGGER hostel_stats_reviews
+    AFTER INSERT OR DELETE OR UPDATE OF hostel_id, rating ON reviews
+    FOR EACH ROW EXECUTE FUNCTION hostel_stats_reviews_trg();
+"""
+
+_REBUILD = """
+INSERT INTO hostel_stats AS s (
+    hostel_id, total_rooms, available_rooms, total_capacity,
+    total_occupants, rating_sum, reviews_count, updated_at
+)
+SELECT h.hostel_id,
+       COALESCE(r.total_rooms, 0), COALESCE(r.available_rooms, 0),
+       COALESCE(r.total_capacity, 0), COALESCE(r.total_occupants, 0),
+       COALESCE(v.rating_sum, 0), COALESCE(v.reviews_count, 0), now()
+FROM hostels h
+LEFT JOIN (
+    SELECT hostel_id,
+           COUNT(*) AS total_rooms,
+           SUM(CASE WHEN is_available AND occupants < capacity THEN 1 ELSE 0 END) AS available_rooms,
+           SUM(capacity) AS total_capacity,
+           SUM(occupants) AS total_occupants
+    FROM rooms GROUP BY hostel_id
+) r ON r.hostel_id = h.hostel_id
+LEFT JOIN (
+    SELECT hostel_id, SUM(rating) AS rating_sum, COUNT(*) AS reviews_count
+    FROM reviews GROUP BY hostel_id
+) v ON v.hostel_id = h.hostel_id
+ON CONFLICT (hostel_id) DO UPDATE SET
+    total_rooms = EXCLUDED.total_rooms,
+    available_rooms = EXCLUDED.available_rooms,
+    total_capacity = EXCLUDED.total_capacity,
+    total_occupants = EXCLUDED.total_occupants,
+    rating_sum = EXCLUDED.rating_sum,
+    reviews_count = EXCLUDED.reviews_count,
+    updated_at = now()
+"""
+
+
+def install_hostel_stats(engine) -> None:
+    """Create/refresh the maintenance triggers and backfill an empty table.
+
+    Idempotent; called on startup after `create_all`.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _INSTALL_LOCK_ID})
+        conn.execute(text(_APPLY_FUNCTION))
+        conn.execute(text(_ROOMS_TRIGGER_FUNCTION))
+        conn.execute(text(_REVIEWS_TRIGGER_FUNCTION))
+        conn.execute(text(_TRIGGERS))
+        if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM hostel_stats)")).scalar():
+            conn.execute(text(_REBUILD))
+            logger.info("Backfilled hostel_stats")
+
+
+def rebuild_hostel_stats(db: Session) -> None:
+    """Recompute every row from source tables (repair after manual data fixes)."""
+    db.execute(text("LOCK TABLE rooms, reviews IN SHARE MODE"))
+    db.execute(text(_REBUILD))
+    db.commit()
+
+
+def _empty_stats() -> dict:
+    return {
+        "total_rooms": 0,
+        "available_rooms": 0,
+        "occupied_rooms": 0,
+        "total_capacity": 0,
+        "total_occupants": 0,
+        "average_rating": 0.0,
+        "reviews_count": 0,
+    }
+
+
+def _stats_dict(row: HostelStats) -> dict:
+    total_rooms = row.total_rooms or 0
+    available_rooms = row.available_rooms or 0
+    reviews_count = row.reviews_count or 0
+    return {
+        "total_rooms": total_rooms,
+        "available_rooms": available_rooms,
+        "occupied_rooms": total_rooms - available_rooms,
+        "total_capacity": row.total_capacity or 0,
+        "total_occupants": row.total_occupants or 0,
+        "average_rating": (row.rating_sum or 0) / reviews_count if reviews_count else 0.0,
+        "reviews_count": reviews_count,
+    }
+
+
+def load_hostel_stats(db: Session, hostel_ids: List) -> Dict[str, dict]:
+    """Return `{hostel_id: stats}` for the given hostels in one primary-key lookup.
+
+    Hostels without rooms or reviews get zeroed stats.
+    """
+    if not hostel_ids:
+        return {}
+    rows = db.query(HostelStats).filter(HostelStats.hostel_id.in_(hostel_ids)).all()
+    stats = {str(hostel_id): _empty_stats() for hostel_id in hostel_ids}
+    for row in rows:
+        stats[str(row.hostel_id)] = _stats_dict(row)
+    return stats
+
+
+def load_landlord_totals(db: Session, landlord_id) -> dict:
+    """Sum hostel_stats across a landlord's hostels."""
+    row = db.query(
+        func.count(Hostel.hostel_id).label("total_properties"),
+        func.coalesce(func.sum(HostelStats.total_rooms), 0).label("total_rooms"),
+        func.coalesce(func.sum(HostelStats.total_occupants), 0).label("total_occupants"),
+        func.coalesce(func.sum(HostelStats.total_capacity), 0).label("total_capacity"),
+    ).outerjoin(
+        HostelStats, HostelStats.hostel_id == Hostel.hostel_id
+    ).filter(
+        Hostel.landlord_id == landlord_id
+    ).first()
+    return {
+        "total_properties": int(row.total_properties or 0),
+        "total_rooms": int(row.total_rooms or 0),
+        "total_occupants": int(row.total_occupants or 0),
+        "total_capacity": int(row.total_capacity or 0),
+    }
@@ -1,12 +1,31 @@
-from fastapi import Depends, HTTPException, Form, status, BackgroundTasks
+from fastapi import Depends, HTTPException, Form, Query, Request, Response, status, BackgroundTasks
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
+from sqlalchemy import func
 from models import (
-    User, Hostel, Room, Media, Review, Verification,
+    User, Hostel,
     HostelCreate, HostelUpdate, HostelRead
 )
 from database import get_db, db_session
 from endpoints.notifications import send_notification_to_users
+from endpoints.hostel_catalog import MAX_PAGE_SIZE
+from endpoints.hostel_snapshot import (
+    get_catalog_page, get_full_catalog, get_catalog_feed, SORT_NEWEST, SORT_DISTANCE, SORT_ORDERS,
+)
+from endpoints.hostel_cache import amenities_to_dict, bump_hostel_version, get_hostel_cards, normalize_amenities
+from endpoints.hostel_stats import load_hostel_stats, load_landlord_totals
+from endpoints.http_cache import (
+    conditional_response,
+    catalog_validators,
+    hostel_validators,
+    make_etag,
+    snapshot_catalog_validators,
+)
+from endpoints.hostel_map import build_map, MAX_MAP_ZOOM
+from endpoints.hostel_search import search_filters, search_hostels
+from endpoints.hostel_geo import (
+    find_nearby_hostels, resolve_search_origin, geography_point,
+    DEFAULT_RADIUS_KM, MAX_RADIUS_KM, DEFAULT_NEARBY_LIMIT, MAX_NEARBY_LIMIT,
+)
 import uuid
 from typing import List, Optional
 from fastapi import APIRouter
@@ -80,7 +99,7 @@ async def create_hostel(
     import json
     try:
         amenities_list = json.loads(amenities) if amenities else []
-        if not isinstance(amenities_list, list):
+        if not isinstance(amenities_list, (list, dict)):
             amenities_list = [amenities_list]  # Handle case where single amenity is sent
     except json.JSONDecodeError:
         amenities_list = [amenities] if amenities else []  # Fallback to single item list if not valid JSON
@@ -110,7 +129,7 @@ async def create_hostel(
         address=address,
         type=type,
         description=description,
-        amenities=amenities_list,  # Use the parsed amenities_list
+        amenities=normalize_amenities(amenities_list),
         price_per_month=price_per_month,
         booking_fee=booking_fee,  # Add booking_fee to the Hostel model
         location=location_point,
@@ -138,13 +157,7 @@ async def create_hostel(
         price_text
     )
     
-    # Ensure amenities is a dictionary in the response
-    amenities = {}
-    if db_hostel.amenities is not None:
-        if isinstance(db_hostel.amenities, list):
-            amenities = {item: True for item in db_hostel.amenities if item}
-        elif isinstance(db_hostel.amenities, dict):
-            amenities = {k: bool(v) for k, v in db_hostel.amenities.items() if k}
+    amenities = amenities_to_dict(db_hostel.amenities)
     
     return {
         "hostel_id": str(db_hostel.hostel_id),
@@ -169,121 +182,200 @@ async def create_hostel(
 
 
 @router.get("/all-hostels")
-def get_all_hostels(db: Session = Depends(get_db)):
-    """Get all hostels for students with their media and landlord details."""
-    
-    # Get all active hostels whose landlords have approved verification status
-    hostels = db.query(Hostel).join(Verification, Hostel.landlord_id == Verification.landlord_id).filter(
-        Hostel.is_active == True,
-        Verification.status == 'approved'
-    ).all()
-    
-    # Fetch all coordinates in a single query for better performance
-    hostel_ids = [str(h.hostel_id) for h in hostels]
-    coordinates_map = {}
-    if hostel_ids:
-        # Use IN clause with tuple for PostgreSQL
-        placeholders = ','.join([':id' + str(i) for i in range(len(hostel_ids))])
-        params = {f'id{i}': hostel_id for i, hostel_id in enumerate(hostel_ids)}
-        coord_results = db.execute(
-            text(f"SELECT hostel_id::text, ST_X(location::geometry) as longitude, ST_Y(location::geometry) as latitude FROM hostels WHERE hostel_id::text IN ({placeholders})"),
-            params
-        ).fetchall()
-        coordinates_map = {str(row.hostel_id): (float(row.longitude) if row.longitude is not None else 0.0, float(row.latitude) if row.latitude is not None else 0.0) for row in coord_results}
-    
-    result = []
-    for hostel in hostels:
-        # Count rooms
-        rooms = db.query(Room).filter(Room.hostel_id == hostel.hostel_id).all()
-        available_rooms = sum(1 for room in rooms if room.is_available and room.occupants < room.capacity)
-        total_rooms = len(rooms)
-        occupied_rooms = total_rooms - available_rooms
-        
-        # Get all media for the hostel
-        media_files = db.query(Media).filter(
-            Media.hostel_id == hostel.hostel_id
-        ).order_by(Media.display_order, Media.created_at).all()
-        
-        # Get landlord details
-        landlord = db.query(User).filter(User.user_id == hostel.landlord_id).first()
-        
-        landlord_name = f"{landlord.first_name} {landlord.last_name}" if landlord and landlord.first_name and landlord.last_name else "Unknown Landlord"
-        landlord_phone = landlord.phone_number if landlord else "+265 888 123 456"
+def get_all_hostels(
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned as `next_cursor` by the previous page"),
+    limit: Optional[int] = Query(None, ge=1, description=f"Page size (max {MAX_PAGE_SIZE})"),
+    request: Request = None,
+    response: Response = None,
+    db: Session = Depends(get_db)
+):
+    """Get all hostels for students with their media and landlord details.
 
-        # Aggregate reviews for this hostel
-        reviews_stats = db.query(
-            func.coalesce(func.avg(Review.rating), 0).label("avg_rating"),
-            func.count(Review.review_id).label("reviews_count"),
-        ).filter(Review.hostel_id == hostel.hostel_id).first()
+    Without `cursor`/`limit` the full catalog is returned as a list (legacy
+    clients). When either is given, a single page is returned as
+    `{"items", "next_cursor", "has_more", "limit"}`.
+
+    Supports conditional requests: a matching `If-None-Match` gets a 304
+    without building the catalog.
+    """
+    etag = snapshot_catalog_validators(db, cursor, limit)
+    not_modified = conditional_response(request, response, etag, None, "hostel_catalog")
+    if not_modified is not None:
+        return not_modified
+
+    if cursor is None and limit is None:
+        return get_full_catalog(db)
+    return get_catalog_page(db, cursor=cursor, limit=limit)
 
-        average_rating = float(reviews_stats.avg_rating or 0)
-        reviews_count = int(reviews_stats.reviews_count or 0)
-        
-        # Extract coordinates from the pre-fetched coordinates map
-        hostel_id_str = str(hostel.hostel_id)
-        if hostel_id_str in coordinates_map:
-            longitude, latitude = coordinates_map[hostel_id_str]
-        else:
-            # Fallback: try to parse as WKT string if it's already in that format
-            try:
-                if hostel.location and isinstance(hostel.location, str) and hostel.location.startswith('POINT('):
-                    coords = hostel.location.replace('POINT(', '').replace(')', '').split()
-                    longitude = float(coords[0]) if len(coords) > 0 else 0.0
-                    latitude = float(coords[1]) if len(coords) > 1 else 0.0
-                else:
-                    longitude = 0.0
-                    latitude = 0.0
-            except Exception:
-                longitude = 0.0
-                latitude = 0.0
-        
-        # Ensure amenities is a dictionary
-        amenities = {}
-        if hostel.amenities is not None:
-            if isinstance(hostel.amenities, list):
-                amenities = {item: True for item in hostel.amenities if item}
-            elif isinstance(hostel.amenities, dict):
-                amenities = {k: bool(v) for k, v in hostel.amenities.items() if k}
-        
-        # If amenities is None or empty after processing, use an empty dict
-        result.append({
-            "hostel_id": str(hostel.hostel_id),
-            "landlord_id": str(hostel.landlord_id),
-            "landlord_name": landlord_name,
-            "landlord_phone": landlord_phone,
-            "name": hostel.name,
-            "district": hostel.district,
-            "university": hostel.university,
-            "address": hostel.address,
-            "description": hostel.description,
-            "type": hostel.type,
-            "amenities": amenities,
-            "price_per_month": float(hostel.price_per_month) if hostel.price_per_month is not None else None,
-            "booking_fee": float(hostel.booking_fee) if hostel.booking_fee is not None else 0.0,
-            "latitude": latitude,
-            "longitude": longitude,
-            "created_at": hostel.created_at,
-            "updated_at": hostel.updated_at,
-            "total_rooms": total_rooms,
-            "occupied_rooms": occupied_rooms,
-            "available_rooms": available_rooms,
-            "is_active": bool(getattr(hostel, "is_active", True)),
-            "average_rating": average_rating,
-            "reviews_count": reviews_count,
-            "media": [
-                {
-                    "media_id": str(m.media_id),
-                    "url": m.url,
-                    "file_name": m.file_name,
-                    "media_type": m.media_type,
-                    "is_cover": m.is_cover,
-                    "display_order": m.display_order,
-                    "created_at": m.created_at
-                } for m in media_files
-            ]
-        })
-    
-    return result
+
+@router.get("/feed")
+def get_hostel_feed(
+    district: Optional[str] = Query(None),
+    university: Optional[str] = Query(None),
+    type: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    amenities: Optional[List[str]] = Query(None, description="Required amenities; repeat the parameter or comma-separate"),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    available_only: bool = Query(False, description="Only hostels with at least one free room"),
+    sort: str = Query(SORT_NEWEST, description=f"One of: {', '.join(SORT_ORDERS)}"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_RADIUS_KM),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, description=f"Page size (max {MAX_PAGE_SIZE})"),
+    db: Session = Depends(get_db)
+):
+    """Student home feed: filter and sort the in-memory catalog snapshot.
+
+    Returns `{"items", "next_cursor", "has_more", "limit", "total"}`; items
+    carry `distance_km` when `latitude`/`longitude` are given.
+    """
+    if sort not in SORT_ORDERS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SORT_ORDERS)}")
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price cannot be greater than max_price")
+
+    origin = None
+    if latitude is not None and longitude is not None:
+        origin = (latitude, longitude)
+    elif sort == SORT_DISTANCE or radius_km is not None:
+        raise HTTPException(status_code=400, detail="latitude and longitude are required for distance sorting or radius")
+
+    amenity_names = []
+    for value in amenities or []:
+        amenity_names.extend(part for part in value.split(',') if part.strip())
+
+    return get_catalog_feed(
+        db,
+        sort=sort,
+        origin=origin,
+        radius_km=radius_km,
+        cursor=cursor,
+        limit=limit,
+        district=district,
+        university=university,
+        hostel_type=type,
+        min_price=min_price,
+        max_price=max_price,
+        amenities=amenity_names,
+        min_rating=min_rating,
+        available_only=available_only,
+    )
+
+
+@router.get("/map")
+def get_hostel_map(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(..., ge=0, le=MAX_MAP_ZOOM),
+    request: Request = None,
+    response: Response = None,
+    db: Session = Depends(get_db)
+):
+    """Clustered hostel pins for a map viewport.
+
+    Below the individual-pin zoom, returns `clusters` with `count`,
+    `min_price`, `max_price` and a centroid (single-hostel clusters carry
+    `hostel_id`); at high zoom returns individual `hostels`.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Bounding box minimums must not exceed maximums")
+
+    # Tile cache keys embed the catalog stamp, so any catalog change misses the cache
+    stamp = catalog_validators(db)
+    etag = make_etag(stamp, zoom, min_lat, min_lon, max_lat, max_lon)
+    not_modified = conditional_response(request, response, etag, None, "hostel_map")
+    if not_modified is not None:
+        return not_modified
+
+    return build_map(db, stamp.strip('"'), zoom, (min_lat, min_lon, max_lat, max_lon))
+
+
+@router.get("/search")
+def search_hostels_endpoint(
+    district: Optional[str] = Query(None),
+    university: Optional[str] = Query(None),
+    type: Optional[str] = Query(None, description="Hostel type, e.g. Private, Shared, Self-contained"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    amenities: Optional[List[str]] = Query(None, description="Required amenities; repeat the parameter or comma-separate"),
+    q: Optional[str] = Query(None, max_length=200, description="Free-text query; typo tolerant, ranks by relevance"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90, description="With q: boost hostels near this point"),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    rating_weight: float = Query(0.0, ge=0, le=1, description="With q: boost by average rating (0 disables)"),
+    facets: bool = Query(True, description="Include facet counts for the filtered set"),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, description=f"Page size (max {MAX_PAGE_SIZE})"),
+    db: Session = Depends(get_db)
+):
+    """Faceted hostel search for student filter UIs.
+
+    Returns a page of catalog hostels matching every filter, plus `facets`
+    with per-district, per-type and per-amenity counts. With `q`, results are
+    ranked by text relevance (optionally combined with distance and rating)
+    and each item carries `relevance`.
+    """
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price cannot be greater than max_price")
+
+    amenity_names = []
+    for value in amenities or []:
+        amenity_names.extend(part for part in value.split(',') if part.strip())
+
+    clauses = search_filters(
+        district=district,
+        university=university,
+        hostel_type=type,
+        min_price=min_price,
+        max_price=max_price,
+        amenities=amenity_names,
+    )
+    origin = None
+    if q and latitude is not None and longitude is not None:
+        origin = geography_point(latitude, longitude)
+    return search_hostels(
+        db,
+        clauses,
+        cursor=cursor,
+        limit=limit,
+        include_facets=facets,
+        q=q,
+        origin=origin,
+        rating_weight=rating_weight,
+    )
+
+
+@router.get("/nearby")
+def get_nearby_hostels(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    university: Optional[str] = Query(None, description="Search around this campus instead of a lat/lon"),
+    radius_km: Optional[float] = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+    nearest: bool = Query(False, description="Ignore the radius and return the k nearest hostels"),
+    limit: int = Query(DEFAULT_NEARBY_LIMIT, ge=1, le=MAX_NEARBY_LIMIT),
+    db: Session = Depends(get_db)
+):
+    """Find catalog hostels around a point or university, nearest first.
+
+    Each entry carries `distance_km` from the search origin.
+    """
+    origin_lat, origin_lon = resolve_search_origin(latitude, longitude, university)
+    items = find_nearby_hostels(
+        db,
+        origin_lat,
+        origin_lon,
+        radius_km=None if nearest else radius_km,
+        limit=limit,
+    )
+    return {
+        "origin": {"latitude": origin_lat, "longitude": origin_lon},
+        "radius_km": None if nearest else radius_km,
+        "count": len(items),
+        "hostels": items,
+    }
 
 
 @router.get("/")
@@ -306,88 +398,39 @@ def get_landlord_hostels(
         )
     
     # Get hostels with additional stats
-    hostels = db.query(Hostel).filter(Hostel.landlord_id == landlord.user_id).all()
+    hostels = db.query(Hostel.hostel_id, Hostel.cache_version).filter(
+        Hostel.landlord_id == landlord.user_id
+    ).all()
+    cards = get_hostel_cards(db, [(h.hostel_id, h.cache_version) for h in hostels])
+    stats_map = load_hostel_stats(db, [h.hostel_id for h in hostels])
     
     result = []
-    for hostel in hostels:
-        # Count rooms
-        total_rooms = db.query(Room).filter(Room.hostel_id == hostel.hostel_id).count()
-        occupied_rooms = db.query(Room).filter(
-            Room.hostel_id == hostel.hostel_id,
-            Room.is_available == False
-        ).count()
-        
-        # Get all media for the hostel
-        media_files = db.query(Media).filter(
-            Media.hostel_id == hostel.hostel_id
-        ).order_by(Media.display_order, Media.created_at).all()
-        
-        # Find cover image
-        cover_media = next((m for m in media_files if m.is_cover), None)
-        
-        # Extract coordinates from PostGIS geography using ST_X and ST_Y
-        try:
-            # Query coordinates directly from database using PostGIS functions
-            coord_result = db.execute(
-                text("SELECT ST_X(location::geometry) as longitude, ST_Y(location::geometry) as latitude FROM hostels WHERE hostel_id = :hostel_id"),
-                {"hostel_id": str(hostel.hostel_id)}
-            ).first()
-            
-            if coord_result:
-                longitude = float(coord_result.longitude) if coord_result.longitude is not None else None
-                latitude = float(coord_result.latitude) if coord_result.latitude is not None else None
-            else:
-                longitude = None
-                latitude = None
-        except Exception as e:
-            # Fallback: try to parse as WKT string if it's already in that format
-            if hostel.location and isinstance(hostel.location, str) and hostel.location.startswith('POINT('):
-                coords_str = hostel.location[6:-1]  # Remove "POINT(" and ")"
-                coords = coords_str.split()
-                longitude = float(coords[0]) if len(coords) > 0 else None
-                latitude = float(coords[1]) if len(coords) > 1 else None
-            else:
-                longitude = None
-                latitude = None
-        
-        # Ensure amenities is a dictionary in the response
-        amenities = {}
-        if hostel.amenities is not None:
-            if isinstance(hostel.amenities, list):
-                amenities = {item: True for item in hostel.amenities if item}
-            elif isinstance(hostel.amenities, dict):
-                amenities = {k: bool(v) for k, v in hostel.amenities.items() if k}
+    for h in hostels:
+        card = cards.get(str(h.hostel_id))
+        if card is None:
+            continue
+        stats = stats_map[card["hostel_id"]]
         
         hostel_data = {
-            "hostel_id": str(hostel.hostel_id),
-            "landlord_id": str(hostel.landlord_id),
-            "name": hostel.name,
-            "district": hostel.district,
-            "university": hostel.university,
-            "address": hostel.address,
-            "description": hostel.description,
-            "amenities": amenities,
-            "price_per_month": float(hostel.price_per_month) if hostel.price_per_month is not None else None,
-            "booking_fee": float(hostel.booking_fee) if hostel.booking_fee is not None else 0.0,
-            "latitude": latitude,
-            "longitude": longitude,
-            "created_at": hostel.created_at,
-            "updated_at": hostel.updated_at,
-            "total_rooms": total_rooms,
-            "occupied_rooms": occupied_rooms,
-            "available_rooms": total_rooms - occupied_rooms,
-            "is_active": bool(getattr(hostel, "is_active", True)),
-            "media": [
-                {
-                    "media_id": str(m.media_id),
-                    "url": m.url,
-                    "file_name": m.file_name,
-                    "media_type": m.media_type,
-                    "is_cover": m.is_cover,
-                    "display_order": m.display_order,
-                    "created_at": m.created_at
-                } for m in media_files
-            ]
+            "hostel_id": card["hostel_id"],
+            "landlord_id": card["landlord_id"],
+            "name": card["name"],
+            "district": card["district"],
+            "university": card["university"],
+            "address": card["address"],
+            "description": card["description"],
+            "amenities": card["amenities"],
+            "price_per_month": card["price_per_month"],
+            "booking_fee": card["booking_fee"],
+            "latitude": card["latitude"],
+            "longitude": card["longitude"],
+            "created_at": card["created_at"],
+            "updated_at": card["updated_at"],
+            "total_rooms": stats["total_rooms"],
+            "occupied_rooms": stats["occupied_rooms"],
+            "available_rooms": stats["available_rooms"],
+            "is_active": card["is_active"],
+            "media": card["media"]
         }
         
         result.append(hostel_data)
@@ -395,102 +438,61 @@ def get_landlord_hostels(
     return result
 
 
-def get_hostel(hostel_id: str, db: Session = Depends(get_db)):
+def get_hostel(
+    hostel_id: str,
+    db: Session = Depends(get_db),
+    request: Request = None,
+    response: Response = None,
+):
     """Get a specific hostel by ID with its media."""
     try:
         hostel_uuid = uuid.UUID(hostel_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid hostel ID format")
     
-    hostel = db.query(Hostel).filter(Hostel.hostel_id == hostel_uuid).first()
-    
-    if not hostel:
+    validators = hostel_validators(db, hostel_uuid)
+    if validators is None:
         raise HTTPException(status_code=404, detail="Hostel not found")
+    not_modified = conditional_response(request, response, *validators, "hostel_detail")
+    if not_modified is not None:
+        return not_modified
     
-    # Get hostel media
-    media_files = db.query(Media).filter(
-        Media.hostel_id == hostel_uuid
-    ).order_by(Media.display_order, Media.created_at).all()
+    row = db.query(Hostel.hostel_id, Hostel.cache_version).filter(
+        Hostel.hostel_id == hostel_uuid
+    ).first()
     
-    # Count rooms
-    total_rooms = db.query(Room).filter(Room.hostel_id == hostel.hostel_id).count()
-    occupied_rooms = db.query(Room).filter(
-        Room.hostel_id == hostel.hostel_id,
-        Room.is_available == False
-    ).count()
+    if not row:
+        raise HTTPException(status_code=404, detail="Hostel not found")
     
-    # Extract coordinates from PostGIS geography using ST_X and ST_Y
-    try:
-        # Query coordinates directly from database using PostGIS functions
-        coord_result = db.execute(
-            text("SELECT ST_X(location::geometry) as longitude, ST_Y(location::geometry) as latitude FROM hostels WHERE hostel_id = :hostel_id"),
-            {"hostel_id": str(hostel.hostel_id)}
-        ).first()
-        
-        if coord_result:
-            longitude = float(coord_result.longitude) if coord_result.longitude is not None else None
-            latitude = float(coord_result.latitude) if coord_result.latitude is not None else None
-        else:
-            longitude = None
-            latitude = None
-    except Exception as e:
-        # Fallback: try to parse as WKT string if it's already in that format
-        if hostel.location and isinstance(hostel.location, str) and hostel.location.startswith('POINT('):
-            coords_str = hostel.location[6:-1]  # Remove "POINT(" and ")"
-            coords = coords_str.split()
-            longitude = float(coords[0]) if len(coords) > 0 else None
-            latitude = float(coords[1]) if len(coords) > 1 else None
-        else:
-            longitude = None
-            latitude = None
-    
-    # Ensure amenities is a dictionary
-    amenities = {}
-    if hostel.amenities is not None:
-        if isinstance(hostel.amenities, list):
-            amenities = {item: True for item in hostel.amenities if item}
-        elif isinstance(hostel.amenities, dict):
-            amenities = {k: bool(v) for k, v in hostel.amenities.items() if k}
-    # If amenities is None or empty after processing, use an empty dict
-        
-    # Find cover image
-    cover_media = next((m for m in media_files if m.is_cover), None)
-    if not cover_media and media_files:
-        cover_media = media_files[0]
+    card = get_hostel_cards(db, [(row.hostel_id, row.cache_version)]).get(str(row.hostel_id))
+    if card is None:
+        raise HTTPException(status_code=404, detail="Hostel not found")
     
-    cover_image_url = cover_media.url if cover_media else None
+    stats = load_hostel_stats(db, [row.hostel_id])[str(row.hostel_id)]
 
     return {
-        "hostel_id": str(hostel.hostel_id),
-        "landlord_id": str(hostel.landlord_id),
-        "name": hostel.name,
-        "district": hostel.district,
-        "university": hostel.university,
-        "address": hostel.address,
-        "description": hostel.description,
-        "amenities": amenities,
-        "price_per_month": float(hostel.price_per_month) if hostel.price_per_month is not None else None,
-        "booking_fee": float(hostel.booking_fee) if hostel.booking_fee is not None else 0.0,
-        "latitude": latitude,
-        "longitude": longitude,
-        "created_at": hostel.created_at,
-        "updated_at": hostel.updated_at,
-        "total_rooms": total_rooms,
-        "occupied_rooms": occupied_rooms,
-        "available_rooms": total_rooms - occupied_rooms,
-        "cover_image_url": cover_image_url,
-        "image_url": cover_image_url, # Fallback for frontend
-        "media": [
-            {
-                "media_id": str(m.media_id),
-                "url": m.url,
-                "file_name": m.file_name,
-                "media_type": m.media_type,
-                "is_cover": m.is_cover,
-                "display_order": m.display_order,
-                "created_at": m.created_at
-            } for m in media_files
-        ]
+        "hostel_id": card["hostel_id"],
+        "landlord_id": card["landlord_id"],
+        "name": card["name"],
+        "district": card["district"],
+        "university": card["university"],
+        "address": card["address"],
+        "description": card["description"],
+        "amenities": card["amenities"],
+        "price_per_month": card["price_per_month"],
+        "booking_fee": card["booking_fee"],
+        "latitude": card["latitude"],
+        "longitude": card["longitude"],
+        "created_at": card["created_at"],
+        "updated_at": card["updated_at"],
+        "total_rooms": stats["total_rooms"],
+        "occupied_rooms": stats["occupied_rooms"],
+        "available_rooms": stats["available_rooms"],
+        "average_rating": stats["average_rating"],
+        "reviews_count": stats["reviews_count"],
+        "cover_image_url": card["cover_image_url"],
+        "image_url": card["cover_image_url"], # Fallback for frontend
+        "media": card["media"]
     }
 
 
@@ -537,17 +539,13 @@ async def update_hostel(
     if type is not None:
         hostel.type = type
     if amenities is not None:
-        # Convert list of amenities to a dictionary with boolean values
-        if isinstance(amenities, list):
-            amenities_dict = {item: True for item in amenities} if amenities else {}
-            hostel.amenities = amenities_dict
-        else:
-            hostel.amenities = amenities
+        hostel.amenities = normalize_amenities(amenities)
     if latitude is not None and longitude is not None:
         location_point = f"POINT({longitude} {latitude})"
         hostel.location = location_point
     
     hostel.updated_at = func.now()
+    bump_hostel_version(db, hostel.hostel_id)
     db.commit()
     db.refresh(hostel)
     
@@ -576,6 +574,7 @@ def change_hostel_status(hostel_id: str, db: Session = Depends(get_db)):
     current = bool(getattr(hostel, "is_active", True))
     hostel.is_active = not current
     hostel.updated_at = func.now()
+    bump_hostel_version(db, hostel.hostel_id)
     db.commit()
 
     if hostel.is_active:
@@ -597,13 +596,7 @@ def get_hostel_amenities(hostel_id: str, db: Session = Depends(get_db)):
     if not hostel:
         raise HTTPException(status_code=404, detail="Hostel not found")
     
-    # Ensure amenities is a dictionary in the response
-    amenities = {}
-    if hostel.amenities is not None:
-        if isinstance(hostel.amenities, list):
-            amenities = {item: True for item in hostel.amenities if item}
-        elif isinstance(hostel.amenities, dict):
-            amenities = {k: bool(v) for k, v in hostel.amenities.items() if k}
+    amenities = amenities_to_dict(hostel.amenities)
     
     return {
         "hostel_id": str(hostel.hostel_id),
@@ -626,25 +619,13 @@ def get_landlord_stats(landlord_email: str, db: Session = Depends(get_db)):
             detail="Landlord not found or user is not a landlord"
         )
     
-    # Get total properties
-    total_properties = db.query(Hostel).filter(
-        Hostel.landlord_id == landlord.user_id
-    ).count()
-    
-    # Get total rooms and occupied rooms across all hostels
-    result = db.query(
-        func.count(Room.room_id).label('total_rooms'),
-        func.sum(Room.occupants).label('total_occupants'),
-        func.sum(Room.capacity).label('total_capacity')
-    ).join(
-        Hostel, Hostel.hostel_id == Room.hostel_id
-    ).filter(
-        Hostel.landlord_id == landlord.user_id
-    ).first()
+    # Totals come from the trigger-maintained hostel_stats rows
+    result = load_landlord_totals(db, landlord.user_id)
+    total_properties = result["total_properties"]
     
-    total_rooms = result.total_rooms or 0
-    total_occupants = result.total_occupants or 0
-    total_capacity = result.total_capacity or 1  # Avoid division by zero
+    total_rooms = result["total_rooms"]
+    total_occupants = result["total_occupants"]
+    total_capacity = result["total_capacity"] or 1  # Avoid division by zero
     
     # Calculate occupancy rate (percentage of occupied beds)
     occupancy_rate = (total_occupants / total_capacity) * 100 if total_capacity > 0 else 0
@@ -0,0 +1,182 @@
+"""Conditional GET support (ETag / Last-Modified / 304) for read-heavy endpoints.
+
+Each endpoint computes its validators from a single cheap aggregate query
+(version stamps and `updated_at` maxima) *before* running its heavy query.
+When the client's `If-None-Match` / `If-Modified-Since` still matches, the
+endpoint answers 304 with no body and skips the real work. Catalog-wide
+responses (catalog and map) are validated by ETag alone; see
+`catalog_validators`.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import Hostel, HostelStats, Review, Room, User, Verification
+from endpoints.hostel_catalog import approved_landlord_clause
+from endpoints.hostel_snapshot import catalog_snapshot
+
+# Cache-Control policy per route; clients may reuse a response for max-age
+# seconds, then revalidate with the ETag
+CACHE_POLICIES = {
+    "hostel_catalog": "public, max-age=60",
+    "hostel_map": "public, max-age=60",
+    "hostel_detail": "public, max-age=30",
+    "hostel_rooms": "public, max-age=15",
+    "hostel_reviews": "public, max-age=120",
+}
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag over the given validator parts."""
+    raw = "|".join("" if p is None else (p.isoformat() if isinstance(p, datetime) else str(p)) for p in parts)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def latest(*timestamps) -> Optional[datetime]:
+    values = [t for t in timestamps if t is not None]
+    return max(values) if values else None
+
+
+def _http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        return modified.replace(microsecond=0) <= since
+    return False
+
+
+def conditional_response(
+    request: Optional[Request],
+    response: Optional[Response],
+    etag: str,
+    last_modified: Optional[datetime],
+    policy: str,
+) -> Optional[Response]:
+    """Return a 304 response if the client copy is current, else stamp validators on `response`.
+
+    `request`/`response` are None when an endpoint is called directly from
+    Python (e.g. `update_hostel` returning `get_hostel(...)`); validators are
+    skipped then.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_POLICIES[policy]}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+
+    if request is not None and _is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    if response is not None:
+        response.headers.update(headers)
+    return None
+
+
+def catalog_validators(db: Session, *scope) -> str:
+    """ETag for the student catalog: membership, card versions, stats and landlord freshness.
+
+    `scope` distinguishes representations of the catalog (e.g. cursor and
+    page size) so each page gets its own ETag. Catalog responses carry no
+    Last-Modified: a hostel leaving the catalog (deactivated, or its landlord
+    unapproved) moves no timestamp forward, so only the ETag, which covers
+    membership, can validate them.
+    """
+    row = db.query(
+        func.count(Hostel.hostel_id).label("hostels"),
+        func.coalesce(func.sum(Hostel.cache_version), 0).label("versions"),
+        func.max(Hostel.updated_at).label("hostels_updated"),
+        func.max(HostelStats.updated_at).label("stats_updated"),
+        func.max(User.updated_at).label("landlords_updated"),
+        db.query(func.max(Verification.updated_at)).scalar_subquery().label("verifications_updated"),
+    ).outerjoin(
+        HostelStats, HostelStats.hostel_id == Hostel.hostel_id
+    ).outerjoin(
+        User, User.user_id == Hostel.landlord_id
+    ).filter(
+        Hostel.is_active == True,
+        approved_landlord_clause(),
+    ).first()
+    last_modified = latest(row.hostels_updated, row.stats_updated, row.landlords_updated, row.verifications_updated)
+    return make_etag("catalog", row.hostels, row.versions, last_modified, *scope)
+
+
+def snapshot_catalog_validators(db: Session, *scope) -> str:
+    """ETag for catalog responses served from `catalog_snapshot`.
+
+    Membership and card versions come from the snapshot itself (refreshed
+    first, so the body read right after is never older than the ETag);
+    stats and landlord details are read live by `build_catalog`, so their
+    `updated_at` maxima are queried live too. No Last-Modified, as for
+    `catalog_validators`.
+    """
+    catalog_snapshot.ensure_fresh(db)
+    digest, hostels_updated, verifications_updated = catalog_snapshot.validators()
+    row = db.query(
+        func.max(HostelStats.updated_at).label("stats_updated"),
+        func.max(User.updated_at).label("landlords_updated"),
+    ).select_from(Hostel).outerjoin(
+        HostelStats, HostelStats.hostel_id == Hostel.hostel_id
+    ).outerjoin(
+        User, User.user_id == Hostel.landlord_id
+    ).filter(
+        Hostel.is_active == True,
+        approved_landlord_clause(),
+    ).first()
+    last_modified = latest(hostels_updated, row.stats_updated, row.landlords_updated, verifications_updated)
+    return make_etag("catalog", digest, last_modified, *scope)
+
+
+def hostel_validators(db: Session, hostel_id):
+    """Validators for a single hostel, or None if it does not exist."""
+    row = db.query(
+        Hostel.cache_version,
+        Hostel.updated_at,
+        HostelStats.updated_at.label("stats_updated"),
+    ).outerjoin(
+        HostelStats, HostelStats.hostel_id == Hostel.hostel_id
+    ).filter(Hostel.hostel_id == hostel_id).first()
+    if row is None:
+        return None
+    last_modified = latest(row.updated_at, row.stats_updated)
+    return make_etag("hostel", hostel_id, row.cache_version, last_modified), last_modified
+
+
+def rooms_validators(db: Session, hostel_id, *scope):
+    """Validators for a hostel's room list (room rows plus the hostel's media version)."""
+    version = db.query(Hostel.cache_version).filter(Hostel.hostel_id == hostel_id).scalar()
+    row = db.query(
+        func.count(Room.room_id).label("rooms"),
+        func.max(Room.updated_at).label("rooms_updated"),
+    ).filter(Room.hostel_id == hostel_id).first()
+    last_modified = row.rooms_updated
+    return make_etag("rooms", hostel_id, version, row.rooms, last_modified, *scope), last_modified
+
+
+def reviews_validators(db: Session, hostel_id):
+    """Validators for a hostel's review list."""
+    row = db.query(
+        func.count(Review.review_id).label("reviews"),
+        func.max(Review.updated_at).label("reviews_updated"),
+    ).filter(Review.hostel_id == hostel_id).first()
+    last_modified = row.reviews_updated
+    return make_etag("reviews", hostel_id, row.reviews, last_modified), last_modified
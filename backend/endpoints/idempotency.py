@@ -0,0 +1,225 @@
+"""Idempotency-Key handling for write endpoints.
+
+Mobile clients retry `POST`s on flaky networks. An endpoint opts in with
+
+    idem: IdempotencyContext = Depends(idempotent("create_booking"))
+
+and returns through `idem.complete(result)`. When the request carries an
+`Idempotency-Key` header the dependency claims `(user, endpoint, key)` in
+`idempotency_keys` (committed before the endpoint runs, so a concurrent
+duplicate sees the claim):
+
+- first request: the endpoint runs and its response is stored;
+- retry after completion: the stored response is replayed by
+  `idempotent_replay_handler` without running the endpoint
+  (`Idempotent-Replayed: true`);
+- retry while the first is still running: 409 with Retry-After;
+- same key with a different body: 422.
+
+If the endpoint raises, the claim is released so the client can retry.
+Claims whose worker died are taken over after `IDEMPOTENCY_LOCK_SECONDS`;
+keys are kept for `IDEMPOTENCY_TTL_HOURS` and purged by the booking
+sweeper. Requests without the header behave exactly as before.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import IdempotencyKey
+from endpoints.users import get_current_user
+
+logger = logging.getLogger('idempotency')
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+MAX_KEY_LENGTH = 255
+
+# Claim the key, or take over one that expired or whose in-flight request
+# was abandoned (same body only). Returns a row only when this request owns it.
+_CLAIM_SQL = text("""
+INSERT INTO idempotency_keys (user_id, endpoint, key, request_hash, status, locked_until, created_at)
+VALUES (:user_id, :endpoint, :key, :request_hash, 'in_progress',
+        now() + make_interval(secs => :lock_seconds), now())
+ON CONFLICT (user_id, endpoint, key) DO UPDATE
+SET request_hash = EXCLUDED.request_hash,
+    status = 'in_progress',
+    locked_until = EXCLUDED.locked_until,
+    created_at = now(),
+    response_status = NULL,
+    response_body = NULL,
+    completed_at = NULL
+WHERE idempotency_keys.created_at < now() - make_interval(hours => :ttl_hours)
+   OR (idempotency_keys.status = 'in_progress'
+       AND idempotency_keys.locked_until < now()
+       AND idempotency_keys.request_hash = EXCLUDED.request_hash)
+RETURNING key
+""")
+
+_PURGE_SQL = text("""
+DELETE FROM idempotency_keys
+WHERE ctid IN (
+    SELECT ctid FROM idempotency_keys
+    WHERE created_at < now() - make_interval(hours => :ttl_hours)
+    LIMIT :batch
+)
+""")
+
+
+class IdempotentReplay(Exception):
+    """Raised by the dependency to answer a retry with the stored response."""
+
+    def __init__(self, status_code: int, body):
+        self.status_code = status_code
+        self.body = body
+
+
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay) -> JSONResponse:
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=exc.body,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class IdempotencyContext:
+    def __init__(self, db: Session, user_id, endpoint: str, key: Optional[str]):
+        self.db = db
+        self.user_id = user_id
+        self.endpoint = endpoint
+        self.key = key
+        self.completed = False
+
+    def _row(self):
+        return self.db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == self.user_id,
+            IdempotencyKey.endpoint == self.endpoint,
+            IdempotencyKey.key == self.key,
+        )
+
+    def complete(self, result, status_code: int = status.HTTP_200_OK):
+        """Store the endpoint's response for replay and return it unchanged."""
+        if self.key is None:
+            return result
+        if isinstance(result, Response):
+            status_code = result.status_code
+            body = json.loads(result.body) if result.body else None
+        else:
+            body = jsonable_encoder(result)
+        try:
+            self._row().update({
+                "status": "completed",
+                "response_status": status_code,
+                "response_body": body,
+                "locked_until": None,
+                "completed_at": datetime.now(timezone.utc),
+            }, synchronize_session=False)
+            self.db.commit()
+            self.completed = True
+        except Exception as e:
+            # The write already happened; a retry will re-run rather than replay
+            logger.error("Failed to store idempotent response for %s/%s: %s", self.endpoint, self.key, e)
+            self.db.rollback()
+        return result
+
+    def release(self) -> None:
+        try:
+            self.db.rollback()
+            self._row().filter(IdempotencyKey.status == "in_progress").delete(synchronize_session=False)
+            self.db.commit()
+        except Exception as e:
+            logger.error("Failed to release idempotency key %s/%s: %s", self.endpoint, self.key, e)
+            self.db.rollback()
+
+
+def _request_hash(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256(request.url.path.encode())
+    digest.update(b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _claim(db: Session, user_id, endpoint: str, key: str, request_hash: str) -> None:
+    claimed = db.execute(_CLAIM_SQL, {
+        "user_id": user_id,
+        "endpoint": endpoint,
+        "key": key,
+        "request_hash": request_hash,
+        "lock_seconds": IDEMPOTENCY_LOCK_SECONDS,
+        "ttl_hours": IDEMPOTENCY_TTL_HOURS,
+    }).first()
+    db.commit()
+    if claimed:
+        return
+
+    existing = db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.endpoint == endpoint,
+        IdempotencyKey.key == key,
+    ).first()
+    if existing is None:
+        # Released between our insert attempt and this read; let the client retry
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is being processed",
+            headers={"Retry-After": "1"},
+        )
+    if existing.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    if existing.status == "completed":
+        raise IdempotentReplay(existing.response_status, existing.response_body)
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is being processed",
+        headers={"Retry-After": "2"},
+    )
+
+
+def idempotent(endpoint: str):
+    """Dependency factory; `endpoint` namespaces keys per operation."""
+
+    async def dependency(
+        request: Request,
+        current_user=Depends(get_current_user),
+        db: Session = Depends(get_db),
+    ):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            yield IdempotencyContext(db, current_user.user_id, endpoint, None)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters")
+
+        _claim(db, current_user.user_id, endpoint, key, _request_hash(request, await request.body()))
+        ctx = IdempotencyContext(db, current_user.user_id, endpoint, key)
+        try:
+            yield ctx
+        finally:
+            if not ctx.completed:
+                ctx.release()
+
+    return dependency
+
+
+def purge_idempotency_keys(db: Session, batch: int = 1000) -> int:
+    """Delete keys older than the TTL in batches; returns how many were removed."""
+    removed = 0
+    while True:
+        deleted = db.execute(_PURGE_SQL, {"ttl_hours": IDEMPOTENCY_TTL_HOURS, "batch": batch}).rowcount
+        db.commit()
+        removed += deleted
+        if deleted < batch:
+            return removed
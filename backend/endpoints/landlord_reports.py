@@ -0,0 +1,370 @@
+"""Landlord reports built from SQL aggregates, cached per report version.
+
+Money collected and paid out comes from the landlord's ledger balances
+(`endpoints.ledger`); other totals and counts come from one aggregate query
+over the landlord's bookings and their payments; detail rows are fetched a
+page at a time with per-booking paid sums computed by correlated
+subqueries, so only the rows on the page are touched. Next due dates come from the payment
+schedule (`payment_schedule.schedule_summaries`).
+
+`landlord_report_versions.version` is bumped by deferred triggers on
+bookings, payments, disbursements, room price/number edits, hostel renames
+and student name/email edits, i.e. once per committing transaction that
+changes what a landlord's report shows.
+Snapshots are cached under `(landlord, version, day)` (the day because
+"due in N days" texts move with the date), so a cached report is never
+served after a relevant write and old versions just age out of the LRU.
+"""
+import logging
+import os
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from models import Booking, Hostel, LandlordReportVersion, Payment, Room, User
+from endpoints.hostel_cache import LRUCache
+from endpoints.payment_schedule import due_explanation, schedule_summaries
+from endpoints.ledger import landlord_balances
+
+logger = logging.getLogger('landlord_reports')
+
+# Arbitrary advisory lock id so only one worker installs triggers at a time
+_INSTALL_LOCK_ID = 724003
+
+REPORT_PAGE_SIZE = 50
+MAX_REPORT_PAGE_SIZE = 200
+
+report_snapshots = LRUCache(int(os.getenv("LANDLORD_REPORT_CACHE_MAX_ENTRIES", "2000")))
+
+_BUMP_FUNCTION = """
+CREATE OR REPLACE FUNCTION landlord_report_bump(p_landlord_id UUID) RETURNS VOID AS $$
+BEGIN
+    IF p_landlord_id IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO landlord_report_versions AS v (landlord_id, version, updated_at)
+    SELECT p_landlord_id, 1, now()
+    WHERE EXISTS (SELECT 1 FROM users WHERE user_id = p_landlord_id)
+    ON CONFLICT (landlord_id) DO UPDATE SET
+        version = v.version + 1,
+        updated_at = now();
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION landlord_report_trg() RETURNS TRIGGER AS $$
+DECLARE
+    rec RECORD;
+    p_landlord_id UUID;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME = 'disbursements' THEN
+        p_landlord_id := rec.landlord_id;
+    ELSIF TG_TABLE_NAME = 'payments' THEN
+        SELECT h.landlord_id INTO p_landlord_id
+        FROM bookings b
+        JOIN rooms r ON r.room_id = b.room_id
+        JOIN hostels h ON h.hostel_id = r.hostel_id
+        WHERE b.booking_id = rec.booking_id;
+    ELSIF TG_TABLE_NAME = 'bookings' THEN
+        SELECT h.landlord_id INTO p_landlord_id
+        FROM rooms r JOIN hostels h ON h.hostel_id = r.hostel_id
+        WHERE r.room_id = rec.room_id;
+    ELSIF TG_TABLE_NAME = 'hostels' THEN
+        p_landlord_id := rec.landlord_id;
+    ELSIF TG_TABLE_NAME = 'users' THEN
+        -- A student's name and email show in the report of every landlord they booked with
+        FOR p_landlord_id IN
+            SELECT DISTINCT h.landlord_id
+            FROM bookings b
+            JOIN rooms r ON r.room_id = b.room_id
+            JOIN hostels h ON h.hostel_id = r.hostel_id
+            WHERE b.student_id = rec.user_id
+        LOOP
+            PERFORM landlord_report_bump(p_landlord_id);
+        END LOOP;
+        RETURN NULL;
+    ELSE
+        SELECT landlord_id INTO p_landlord_id FROM hostels WHERE hostel_id = rec.hostel_id;
+    END IF;
+
+    PERFORM landlord_report_bump(p_landlord_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Deferred so the version row is only locked for the instant before commit,
+# not for the whole booking/payment transaction
+_TRIGGERS = """
+DROP TRIGGER IF EXISTS landlord_report_bookings ON bookings;
+CREATE CONSTRAINT TRIGGER landlord_report_bookings
+    AFTER INSERT OR UPDATE OR DELETE ON bookings
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION landlord_report_trg();
+
+DROP TRIGGER IF EXISTS landlord_report_payments ON payments;
+CREATE CONSTRAINT TRIGGER landlord_report_payments
+    AFTER INSERT OR UPDATE OR DELETE ON payments
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION landlord_report_trg();
+
+DROP TRIGGER IF EXISTS landlord_report_disbursements ON disbursements;
+CREATE CONSTRAINT TRIGGER landlord_report_disbursements
+    AFTER INSERT OR UPDATE OR DELETE ON disbursements
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION landlord_report_trg();
+
+DROP TRIGGER IF EXISTS landlord_report_rooms ON rooms;
+CREATE CONSTRAINT TRIGGER landlord_report_rooms
+    AFTER UPDATE OF price_per_month, room_number ON rooms
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION landlord_report_trg();
+
+DROP TRIGGER IF EXISTS landlord_report_hostels ON hostels;
+CREATE CONSTRAINT TRIGGER landlord_report_hostels
+    AFTER UPDATE OF name ON hostels
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION landlord_report_trg();
+
+DROP TRIGGER IF EXISTS landlord_report_users ON users;
+CREATE CONSTRAINT TRIGGER landlord_report_users
+    AFTER UPDATE OF first_name, last_name, email ON users
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    WHEN (OLD.first_name IS DISTINCT FROM NEW.first_name
+          OR OLD.last_name IS DISTINCT FROM NEW.last_name
+          OR OLD.email IS DISTINCT FROM NEW.email)
+    EXECUTE FUNCTION landlord_report_trg();
+"""
+
+_SUMMARY_SQL = text("""
+WITH lb AS (
+    SELECT b.booking_id, b.status, b.total_amount
+    FROM bookings b
+    JOIN rooms r ON r.room_id = b.room_id
+    JOIN hostels h ON h.hostel_id = r.hostel_id
+    WHERE h.landlord_id = :landlord_id
+      AND b.status <> 'expired'
+), paid AS (
+    SELECT p.booking_id,
+           COALESCE(SUM(p.amount) FILTER (WHERE p.status = 'completed'), 0) AS paid_amount,
+           COUNT(*) AS payments,
+           COUNT(*) FILTER (WHERE p.status = 'completed') AS completed_payments,
+           COUNT(*) FILTER (WHERE p.status = 'pending') AS pending_payments
+    FROM payments p
+    JOIN lb ON lb.booking_id = p.booking_id
+    GROUP BY p.booking_id
+)
+SELECT COUNT(*) AS total_bookings,
+       COALESCE(SUM(lb.total_amount), 0) AS total_revenue,
+       COALESCE(SUM(GREATEST(lb.total_amount - COALESCE(paid.paid_amount, 0), 0)), 0) AS total_pending,
+       COUNT(*) FILTER (WHERE lb.status IN ('confirmed', 'active')) AS active_bookings,
+       COUNT(*) FILTER (WHERE lb.status = 'pending') AS pending_bookings,
+       COUNT(*) FILTER (WHERE lb.status = 'completed') AS completed_bookings,
+       COALESCE(SUM(paid.payments), 0) AS total_payments,
+       COALESCE(SUM(paid.completed_payments), 0) AS completed_payments,
+       COALESCE(SUM(paid.pending_payments), 0) AS pending_payments
+FROM lb
+LEFT JOIN paid ON paid.booking_id = lb.booking_id
+""")
+
+
+def install_landlord_reports(engine) -> None:
+    """Create/refresh the version triggers. Idempotent; called on startup after `create_all`."""
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _INSTALL_LOCK_ID})
+        conn.execute(text(_BUMP_FUNCTION))
+        conn.execute(text(_TRIGGER_FUNCTION))
+        conn.execute(text(_TRIGGERS))
+
+
+def report_version(db: Session, landlord_id) -> int:
+    version = db.query(LandlordReportVersion.version).filter(
+        LandlordReportVersion.landlord_id == landlord_id
+    ).scalar()
+    return version or 0
+
+
+def _summary(db: Session, landlord_id) -> dict:
+    row = db.execute(_SUMMARY_SQL, {"landlord_id": landlord_id}).mappings().one()
+    balances = landlord_balances(db, [landlord_id])[str(landlord_id)]
+    return {
+        "total_revenue": float(row["total_revenue"]),
+        "total_paid": balances["collected"],
+        "total_disbursed": balances["disbursed"],
+        "available_balance": balances["available"],
+        "pending_disbursement": balances["in_transit"],
+        "total_pending": float(row["total_pending"]),
+        "total_bookings": int(row["total_bookings"]),
+        "active_bookings": int(row["active_bookings"]),
+        "pending_bookings": int(row["pending_bookings"]),
+        "completed_bookings": int(row["completed_bookings"]),
+        "total_payments": int(row["total_payments"]),
+        "completed_payments": int(row["completed_payments"]),
+        "pending_payments": int(row["pending_payments"]),
+    }
+
+
+def _booking_rows(db: Session, landlord_id, skip: int, limit: int, today: date) -> list:
+    paid_amount = select(
+        func.coalesce(func.sum(Payment.amount), 0)
+    ).where(
+        Payment.booking_id == Booking.booking_id,
+        Payment.status == 'completed',
+    ).correlate(Booking).scalar_subquery()
+
+    rows = db.query(
+        Booking.booking_id,
+        Booking.start_date,
+        Booking.end_date,
+        Booking.duration_months,
+        Booking.total_amount,
+        Booking.status,
+        Booking.created_at,
+        Room.room_number,
+        Room.price_per_month,
+        Hostel.name.label("hostel_name"),
+        User.first_name,
+        User.last_name,
+        User.email,
+        paid_amount.label("paid_amount"),
+    ).join(
+        Room, Booking.room_id == Room.room_id
+    ).join(
+        Hostel, Room.hostel_id == Hostel.hostel_id
+    ).join(
+        User, Booking.student_id == User.user_id
+    ).filter(
+        Hostel.landlord_id == landlord_id,
+        # Lapsed holds that were never paid are not bookings the landlord has
+        Booking.status != 'expired',
+    ).order_by(
+        Booking.created_at.desc(), Booking.booking_id.desc()
+    ).offset(skip).limit(limit).all()
+
+    schedules = schedule_summaries(db, [row.booking_id for row in rows], today)
+
+    result = []
+    for row in rows:
+        # Next instalment due, for bookings that are running
+        due = amount = explanation = None
+        schedule = schedules.get(str(row.booking_id))
+        if schedule and row.status in ('confirmed', 'active') and schedule["next_due_date"] is not None:
+            due = schedule["next_due_date"]
+            amount = schedule["monthly_amount"]
+            explanation = due_explanation(schedule["days_until_due"])
+        paid = Decimal(row.paid_amount or 0)
+        result.append({
+            "booking_id": str(row.booking_id),
+            "hostel_name": row.hostel_name,
+            "room_number": row.room_number,
+            "student_name": f"{row.first_name} {row.last_name}",
+            "student_email": row.email,
+            "check_in_date": row.start_date.isoformat(),
+            "check_out_date": row.end_date.isoformat(),
+            "duration_months": row.duration_months,
+            "monthly_rent": float(row.price_per_month),
+            "total_amount": float(row.total_amount),
+            "paid_amount": float(paid),
+            "remaining_amount": float(row.total_amount) - float(paid),
+            "status": row.status,
+            "next_payment_due_date": due.isoformat() if due else None,
+            "next_payment_amount": amount,
+            "payment_due_explanation": explanation,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        })
+    return result
+
+
+def _payment_rows(db: Session, landlord_id, skip: int, limit: int) -> list:
+    rows = db.query(
+        Payment.payment_id,
+        Payment.booking_id,
+        Payment.amount,
+        Payment.payment_type,
+        Payment.payment_method,
+        Payment.status,
+        Payment.transaction_id,
+        Payment.paid_at,
+        Room.room_number,
+        Hostel.name.label("hostel_name"),
+        User.first_name,
+        User.last_name,
+    ).join(
+        Booking, Payment.booking_id == Booking.booking_id
+    ).join(
+        Room, Booking.room_id == Room.room_id
+    ).join(
+        Hostel, Room.hostel_id == Hostel.hostel_id
+    ).outerjoin(
+        User, Booking.student_id == User.user_id
+    ).filter(
+        Hostel.landlord_id == landlord_id,
+        # Same bookings as the summary, so `total_payments` bounds the pages
+        Booking.status != 'expired',
+    ).order_by(
+        Payment.paid_at.desc().nulls_last(), Payment.payment_id.desc()
+    ).offset(skip).limit(limit).all()
+
+    return [
+        {
+            "payment_id": str(row.payment_id),
+            "booking_id": str(row.booking_id),
+            "hostel_name": row.hostel_name,
+            "room_number": row.room_number,
+            "student_name": f"{row.first_name} {row.last_name}" if row.first_name is not None else None,
+            "amount": float(row.amount),
+            "payment_type": row.payment_type,
+            "payment_method": row.payment_method,
+            "status": row.status,
+            "transaction_id": row.transaction_id,
+            "paid_at": row.paid_at.isoformat() if row.paid_at else None,
+        }
+        for row in rows
+    ]
+
+
+def _cached(key: str, build):
+    found = report_snapshots.get_many([key])
+    if key in found:
+        return found[key]["value"]
+    value = build()
+    report_snapshots.set_many({key: {"value": value}})
+    return value
+
+
+def get_landlord_report(db: Session, landlord_id, skip: int = 0, limit: int = REPORT_PAGE_SIZE,
+                        today: Optional[date] = None) -> dict:
+    """Summary plus one page of bookings and payments (both newest first)."""
+    today = today or date.today()
+    # Read the version before the data: a write committing in between then
+    # only makes the cached snapshot newer than its key, never older
+    prefix = f"report:{landlord_id}:{report_version(db, landlord_id)}:{today.isoformat()}"
+
+    summary = _cached(f"{prefix}:summary", lambda: _summary(db, landlord_id))
+    bookings = _cached(f"{prefix}:bookings:{skip}:{limit}", lambda: _booking_rows(db, landlord_id, skip, limit, today))
+    payments = _cached(f"{prefix}:payments:{skip}:{limit}", lambda: _payment_rows(db, landlord_id, skip, limit))
+
+    return {
+        "summary": summary,
+        "bookings": bookings,
+        "payments": payments,
+        "pagination": {
+            "skip": skip,
+            "limit": limit,
+            "has_more_bookings": skip + len(bookings) < summary["total_bookings"],
+            "has_more_payments": skip + len(payments) < summary["total_payments"],
+        },
+    }
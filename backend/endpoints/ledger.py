@@ -0,0 +1,420 @@
+"""Double-entry ledger of money collected for and paid out to landlords.
+
+Every change in a payment's or disbursement's status that moves money posts
+one balanced journal to `ledger_entries`. Debits equal credits in every
+journal, and entries are never updated or deleted. `ledger_balances` keeps
+running debit/credit totals per account, so balances are a primary-key
+lookup. Postgres triggers do the posting, so it happens in the same
+transaction as the status change whichever code path made it. The
+triggers are deferred, so the hot platform rows in `ledger_balances` are
+only locked for the instant before commit.
+
+Accounts (`landlord:<id>:...` per landlord):
+
+- `platform:clearing` - money held at PayChangu (debit balance);
+- `platform:fees` - platform fees earned (credit balance);
+- `landlord:<id>:payable` - collected for the landlord, not yet paid out;
+- `landlord:<id>:in_transit` - payouts queued or awaiting settlement.
+
+Postings:
+
+- payment completed: Dr clearing / Cr landlord payable (amount)
+- payout reserved (disbursement queued/processing/completed):
+  Dr landlord payable (amount + fee) / Cr landlord in_transit (amount) / Cr fees (fee)
+- payout settled (disbursement completed): Dr landlord in_transit / Cr clearing
+
+A payment leaving `completed` (or its amount changing while completed) and
+a payout failing are posted as reversals. The original legs are repeated
+with negated amounts, so cumulative columns keep their meaning: payable
+credits are what was collected for a landlord, and in_transit debits are
+what was paid out.
+Payment and disbursement rows that are deleted keep their postings.
+
+`install_ledger()` installs the functions and triggers on startup. If the
+ledger is empty it backfills it from existing payments and disbursements.
+`GET /admin/ledger/audit` checks that journals balance, that running totals
+match their entries and that the ledger agrees with the source tables.
+"""
+import logging
+from decimal import Decimal
+from typing import Dict, List
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import LedgerBalance, LedgerEntry, User
+from endpoints.admin import require_admin_user
+
+logger = logging.getLogger('ledger')
+
+router = APIRouter(prefix="/admin/ledger", tags=["admin"])
+
+# Arbitrary advisory lock id so only one worker installs triggers at a time
+_INSTALL_LOCK_ID = 724006
+
+PLATFORM_CLEARING = "platform:clearing"
+PLATFORM_FEES = "platform:fees"
+
+_POST_FUNCTION = """
+CREATE OR REPLACE FUNCTION ledger_post(
+    p_journal UUID, p_event TEXT, p_account TEXT, p_landlord UUID,
+    p_debit NUMERIC, p_credit NUMERIC,
+    p_payment UUID, p_disbursement UUID, p_booking UUID
+) RETURNS VOID AS $$
+BEGIN
+    IF COALESCE(p_debit, 0) = 0 AND COALESCE(p_credit, 0) = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO ledger_entries (
+        journal_id, event, account, landlord_id, debit, credit, payment_id, disbursement_id, booking_id
+    ) VALUES (
+        p_journal, p_event, p_account, p_landlord, COALESCE(p_debit, 0), COALESCE(p_credit, 0),
+        p_payment, p_disbursement, p_booking
+    );
+    INSERT INTO ledger_balances AS b (account, landlord_id, debits, credits, entries, updated_at)
+    VALUES (
+        p_account, CASE WHEN p_account LIKE 'landlord:%' THEN p_landlord END,
+        COALESCE(p_debit, 0), COALESCE(p_credit, 0), 1, now()
+    )
+    ON CONFLICT (account) DO UPDATE SET
+        debits = b.debits + EXCLUDED.debits,
+        credits = b.credits + EXCLUDED.credits,
+        entries = b.entries + 1,
+        updated_at = now();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ledger_landlord_account(p_landlord UUID, p_kind TEXT) RETURNS TEXT AS $$
+    SELECT 'landlord:' || COALESCE(p_landlord::text, 'unassigned') || ':' || p_kind;
+$$ LANGUAGE sql IMMUTABLE;
+"""
+
+# Platform legs first in every journal, so concurrent postings lock balance rows in one order
+_POSTING_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION ledger_post_payment(
+    p_event TEXT, p_payment UUID, p_booking UUID, p_amount NUMERIC
+) RETURNS VOID AS $$
+DECLARE
+    v_journal UUID := uuid_generate_v4();
+    v_landlord UUID;
+BEGIN
+    SELECT h.landlord_id INTO v_landlord
+    FROM bookings b
+    JOIN rooms r ON r.room_id = b.room_id
+    JOIN hostels h ON h.hostel_id = r.hostel_id
+    WHERE b.booking_id = p_booking;
+
+    PERFORM ledger_post(v_journal, p_event, 'platform:clearing', v_landlord, p_amount, 0, p_payment, NULL, p_booking);
+    PERFORM ledger_post(v_journal, p_event, ledger_landlord_account(v_landlord, 'payable'), v_landlord, 0, p_amount, p_payment, NULL, p_booking);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ledger_post_payout_reserve(
+    p_event TEXT, p_disbursement UUID, p_booking UUID, p_landlord UUID, p_amount NUMERIC, p_fee NUMERIC
+) RETURNS VOID AS $$
+DECLARE
+    v_journal UUID := uuid_generate_v4();
+BEGIN
+    PERFORM ledger_post(v_journal, p_event, 'platform:fees', p_landlord, 0, p_fee, NULL, p_disbursement, p_booking);
+    PERFORM ledger_post(v_journal, p_event, ledger_landlord_account(p_landlord, 'payable'), p_landlord, p_amount + p_fee, 0, NULL, p_disbursement, p_booking);
+    PERFORM ledger_post(v_journal, p_event, ledger_landlord_account(p_landlord, 'in_transit'), p_landlord, 0, p_amount, NULL, p_disbursement, p_booking);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ledger_post_payout_settle(
+    p_event TEXT, p_disbursement UUID, p_booking UUID, p_landlord UUID, p_amount NUMERIC
+) RETURNS VOID AS $$
+DECLARE
+    v_journal UUID := uuid_generate_v4();
+BEGIN
+    PERFORM ledger_post(v_journal, p_event, 'platform:clearing', p_landlord, 0, p_amount, NULL, p_disbursement, p_booking);
+    PERFORM ledger_post(v_journal, p_event, ledger_landlord_account(p_landlord, 'in_transit'), p_landlord, p_amount, 0, NULL, p_disbursement, p_booking);
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_TRIGGER_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION ledger_payments_trg() RETURNS TRIGGER AS $$
+DECLARE
+    old_amount NUMERIC := 0;
+    new_amount NUMERIC := 0;
+    was_completed BOOLEAN := TG_OP = 'UPDATE' AND OLD.status = 'completed';
+    is_completed BOOLEAN := NEW.status = 'completed';
+BEGIN
+    IF was_completed THEN
+        old_amount := COALESCE(OLD.amount, 0);
+    END IF;
+    IF is_completed THEN
+        new_amount := COALESCE(NEW.amount, 0);
+    END IF;
+    IF new_amount = old_amount THEN
+        RETURN NULL;
+    END IF;
+    PERFORM ledger_post_payment(
+        CASE WHEN NOT was_completed THEN 'payment_completed'
+             WHEN NOT is_completed THEN 'payment_reversed'
+             ELSE 'payment_adjusted' END,
+        NEW.payment_id, NEW.booking_id, new_amount - old_amount
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ledger_disbursements_trg() RETURNS TRIGGER AS $$
+DECLARE
+    was_reserved BOOLEAN := COALESCE(TG_OP = 'UPDATE' AND OLD.status IN ('queued', 'submitting', 'processing', 'completed'), false);
+    is_reserved BOOLEAN := COALESCE(NEW.status IN ('queued', 'submitting', 'processing', 'completed'), false);
+    was_settled BOOLEAN := COALESCE(TG_OP = 'UPDATE' AND OLD.status = 'completed', false);
+    is_settled BOOLEAN := COALESCE(NEW.status = 'completed', false);
+BEGIN
+    IF is_reserved AND NOT was_reserved THEN
+        PERFORM ledger_post_payout_reserve('payout_reserved', NEW.disbursement_id, NEW.booking_id, NEW.landlord_id,
+                                           COALESCE(NEW.disbursement_amount, 0), COALESCE(NEW.platform_fee, 0));
+    END IF;
+    IF is_settled AND NOT was_settled THEN
+        PERFORM ledger_post_payout_settle('payout_settled', NEW.disbursement_id, NEW.booking_id, NEW.landlord_id,
+                                          COALESCE(NEW.disbursement_amount, 0));
+    ELSIF was_settled AND NOT is_settled THEN
+        PERFORM ledger_post_payout_settle('payout_unsettled', OLD.disbursement_id, OLD.booking_id, OLD.landlord_id,
+                                          -COALESCE(OLD.disbursement_amount, 0));
+    END IF;
+    IF was_reserved AND NOT is_reserved THEN
+        PERFORM ledger_post_payout_reserve('payout_released', OLD.disbursement_id, OLD.booking_id, OLD.landlord_id,
+                                           -COALESCE(OLD.disbursement_amount, 0), -COALESCE(OLD.platform_fee, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ledger_entries_immutable_trg() RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'ledger_entries is append-only; post a reversal instead';
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Deferred so balance rows are only locked for the instant before commit,
+# not for the whole payment/disbursement transaction
+_TRIGGERS = """
+DROP TRIGGER IF EXISTS ledger_payments ON payments;
+CREATE CONSTRAINT TRIGGER ledger_payments
+    AFTER INSERT OR UPDATE OF status, amount ON payments
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION ledger_payments_trg();
+
+DROP TRIGGER IF EXISTS ledger_disbursements ON disbursements;
+CREATE CONSTRAINT TRIGGER ledger_disbursements
+    AFTER INSERT OR UPDATE OF status ON disbursements
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION ledger_disbursements_trg();
+
+DROP TRIGGER IF EXISTS ledger_entries_immutable ON ledger_entries;
+CREATE TRIGGER ledger_entries_immutable
+    BEFORE UPDATE OR DELETE ON ledger_entries
+    FOR EACH ROW EXECUTE FUNCTION ledger_entries_immutable_trg();
+"""
+
+# Opening entries for data that predates the ledger, oldest first
+_BACKFILL = """
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT payment_id, booking_id, amount FROM payments
+             WHERE status = 'completed' ORDER BY paid_at NULLS FIRST, payment_id LOOP
+        PERFORM ledger_post_payment('payment_completed', r.payment_id, r.booking_id, COALESCE(r.amount, 0));
+    END LOOP;
+    FOR r IN SELECT disbursement_id, booking_id, landlord_id, status, disbursement_amount, platform_fee
+             FROM disbursements
+             WHERE status IN ('queued', 'submitting', 'processing', 'completed')
+             ORDER BY created_at, disbursement_id LOOP
+        PERFORM ledger_post_payout_reserve('payout_reserved', r.disbursement_id, r.booking_id, r.landlord_id,
+                                           COALESCE(r.disbursement_amount, 0), COALESCE(r.platform_fee, 0));
+        IF r.status = 'completed' THEN
+            PERFORM ledger_post_payout_settle('payout_settled', r.disbursement_id, r.booking_id, r.landlord_id,
+                                              COALESCE(r.disbursement_amount, 0));
+        END IF;
+    END LOOP;
+END;
+$$;
+"""
+
+_UNBALANCED_JOURNALS_SQL = text("""
+SELECT journal_id, MIN(event) AS event, SUM(debit) - SUM(credit) AS difference
+FROM ledger_entries
+GROUP BY journal_id
+HAVING SUM(debit) <> SUM(credit)
+LIMIT :limit
+""")
+
+_BALANCE_DRIFT_SQL = text("""
+SELECT COALESCE(b.account, e.account) AS account,
+       COALESCE(b.debits, 0) AS stored_debits, COALESCE(e.debits, 0) AS entry_debits,
+       COALESCE(b.credits, 0) AS stored_credits, COALESCE(e.credits, 0) AS entry_credits
+FROM ledger_balances b
+FULL OUTER JOIN (
+    SELECT account, SUM(debit) AS debits, SUM(credit) AS credits
+    FROM ledger_entries GROUP BY account
+) e ON e.account = b.account
+WHERE COALESCE(b.debits, 0) <> COALESCE(e.debits, 0)
+   OR COALESCE(b.credits, 0) <> COALESCE(e.credits, 0)
+LIMIT :limit
+""")
+
+# Ledger vs. source tables: collected per landlord and paid out per landlord
+_SOURCE_DRIFT_SQL = text("""
+WITH collected AS (
+    SELECT ledger_landlord_account(h.landlord_id, 'payable') AS account, SUM(p.amount) AS amount
+    FROM payments p
+    JOIN bookings b ON b.booking_id = p.booking_id
+    JOIN rooms r ON r.room_id = b.room_id
+    JOIN hostels h ON h.hostel_id = r.hostel_id
+    WHERE p.status = 'completed'
+    GROUP BY h.landlord_id
+), paid_out AS (
+    SELECT ledger_landlord_account(landlord_id, 'in_transit') AS account, SUM(disbursement_amount) AS amount
+    FROM disbursements
+    WHERE status = 'completed'
+    GROUP BY landlord_id
+), expected AS (
+    SELECT account, amount, 'credits' AS measure FROM collected
+    UNION ALL
+    SELECT account, amount, 'debits' FROM paid_out
+)
+SELECT x.account, x.measure, x.amount AS source_amount,
+       CASE WHEN x.measure = 'credits' THEN COALESCE(b.credits, 0) ELSE COALESCE(b.debits, 0) END AS ledger_amount
+FROM expected x
+LEFT JOIN ledger_balances b ON b.account = x.account
+WHERE x.amount <> CASE WHEN x.measure = 'credits' THEN COALESCE(b.credits, 0) ELSE COALESCE(b.debits, 0) END
+LIMIT :limit
+""")
+
+
+def install_ledger(engine) -> None:
+    """Create/refresh the posting functions and triggers and backfill an empty ledger.
+
+    Idempotent; called on startup after `create_all`.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _INSTALL_LOCK_ID})
+        conn.execute(text(_POST_FUNCTION))
+        conn.execute(text(_POSTING_FUNCTIONS))
+        conn.execute(text(_TRIGGER_FUNCTIONS))
+        conn.execute(text(_TRIGGERS))
+        if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM ledger_entries)")).scalar():
+            conn.execute(text(_BACKFILL))
+            logger.info("Backfilled ledger from existing payments and disbursements")
+
+
+def landlord_account(landlord_id, kind: str) -> str:
+    return f"landlord:{landlord_id}:{kind}"
+
+
+def _credit_balance(row) -> float:
+    return float(-(row.balance or Decimal(0))) if row is not None else 0.0
+
+
+def landlord_balances(db: Session, landlord_ids: List) -> Dict[str, dict]:
+    """Return `{landlord_id: balances}` for the given landlords in one primary-key lookup."""
+    if not landlord_ids:
+        return {}
+    accounts = {}
+    for landlord_id in landlord_ids:
+        for kind in ("payable", "in_transit"):
+            accounts[landlord_account(landlord_id, kind)] = (str(landlord_id), kind)
+    rows = {row.account: row for row in db.query(LedgerBalance).filter(LedgerBalance.account.in_(list(accounts))).all()}
+
+    balances = {}
+    for landlord_id in landlord_ids:
+        payable = rows.get(landlord_account(landlord_id, "payable"))
+        in_transit = rows.get(landlord_account(landlord_id, "in_transit"))
+        balances[str(landlord_id)] = {
+            "collected": float(payable.credits) if payable else 0.0,
+            "available": _credit_balance(payable),
+            "in_transit": _credit_balance(in_transit),
+            "disbursed": float(in_transit.debits) if in_transit else 0.0,
+        }
+    return balances
+
+
+def payout_available(db: Session, landlord_id) -> float:
+    """What the platform holds for a landlord and has not yet reserved for a payout."""
+    return landlord_balances(db, [landlord_id])[str(landlord_id)]["available"]
+
+
+def platform_balances(db: Session) -> dict:
+    rows = {row.account: row for row in db.query(LedgerBalance).filter(
+        LedgerBalance.account.in_([PLATFORM_CLEARING, PLATFORM_FEES])
+    ).all()}
+    clearing = rows.get(PLATFORM_CLEARING)
+    return {
+        "clearing": float(clearing.balance) if clearing else 0.0,
+        "fees_earned": _credit_balance(rows.get(PLATFORM_FEES)),
+    }
+
+
+def _serialize_entry(entry: LedgerEntry) -> dict:
+    return {
+        "entry_id": entry.entry_id,
+        "journal_id": str(entry.journal_id),
+        "event": entry.event,
+        "account": entry.account,
+        "debit": float(entry.debit),
+        "credit": float(entry.credit),
+        "payment_id": str(entry.payment_id) if entry.payment_id else None,
+        "disbursement_id": str(entry.disbursement_id) if entry.disbursement_id else None,
+        "booking_id": str(entry.booking_id) if entry.booking_id else None,
+        "created_at": entry.created_at.isoformat() if entry.created_at else None,
+    }
+
+
+@router.get("/platform")
+def get_platform_balances(
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    return platform_balances(db)
+
+
+@router.get("/landlords/{landlord_id}")
+def get_landlord_ledger(
+    landlord_id: UUID,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """A landlord's balances and ledger entries, newest first."""
+    entries = db.query(LedgerEntry).filter(
+        LedgerEntry.landlord_id == landlord_id
+    ).order_by(LedgerEntry.entry_id.desc()).offset(skip).limit(limit).all()
+    return {
+        "landlord_id": str(landlord_id),
+        "balances": landlord_balances(db, [landlord_id])[str(landlord_id)],
+        "entries": [_serialize_entry(entry) for entry in entries],
+    }
+
+
+@router.get("/audit")
+def audit_ledger(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Full-scan consistency check; every list is empty when the ledger is sound."""
+    params = {"limit": limit}
+    unbalanced = db.execute(_UNBALANCED_JOURNALS_SQL, params).mappings().all()
+    drifted = db.execute(_BALANCE_DRIFT_SQL, params).mappings().all()
+    source = db.execute(_SOURCE_DRIFT_SQL, params).mappings().all()
+    return {
+        "ok": not (unbalanced or drifted or source),
+        "unbalanced_journals": [
+            {"journal_id": str(row["journal_id"]), "event": row["event"], "difference": float(row["difference"])}
+            for row in unbalanced
+        ],
+        "balance_drift": [{k: (float(v) if isinstance(v, Decimal) else v) for k, v in row.items()} for row in drifted],
+        "source_drift": [{k: (float(v) if isinstance(v, Decimal) else v) for k, v in row.items()} for row in source],
+    }
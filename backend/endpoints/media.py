@@ -5,6 +5,7 @@ from models import (
     MediaRead
 )
 from database import get_db
+from endpoints.hostel_cache import bump_hostel_version
 import uuid
 import os
 import shutil
@@ -128,6 +129,7 @@ async def upload_hostel_media(
     )
     
     db.add(media)
+    bump_hostel_version(db, hostel_uuid)
     db.commit()
     db.refresh(media)
     
@@ -219,6 +221,7 @@ async def upload_room_media(
     )
     
     db.add(media)
+    bump_hostel_version(db, room.hostel_id)
     db.commit()
     db.refresh(media)
     
@@ -297,7 +300,9 @@ def delete_media(media_id: str, db: Session = Depends(get_db)):
             
     
     # Delete database record
+    hostel_id = media.hostel_id or (media.room.hostel_id if media.room else None)
     db.delete(media)
+    bump_hostel_version(db, hostel_id)
     db.commit()
     
     return {"message": "Media deleted successfully"}
@@ -330,6 +335,7 @@ def set_media_as_cover(media_id: str, db: Session = Depends(get_db)):
     
     # Set this media as cover
     media.is_cover = True
+    bump_hostel_version(db, media.hostel_id or (media.room.hostel_id if media.room else None))
     db.commit()
     
     return {"message": "Media set as cover successfully"}
@@ -0,0 +1,380 @@
+"""Reconciliation of payments stuck in `pending`.
+
+A payment stays pending when its webhook never arrives (or arrives before
+the payment row exists and exhausts its retries). Every
+`RECONCILE_INTERVAL_SECONDS` one worker (advisory lock 724004) picks up to
+`RECONCILE_BATCH_SIZE` pending payments older than
+`RECONCILE_MIN_AGE_MINUTES`, plus payments the booking sweeper expired
+within the last `RECONCILE_EXPIRED_LOOKBACK_HOURS` (the student may have
+paid just before the hold lapsed), and verifies them against PayChangu, at most
+`RECONCILE_CONCURRENCY` at a time through the shared client. Results that are
+final are applied with the webhook's own transition
+(`payments._apply_webhook_verification`), so a payment reconciled here ends up
+exactly as if its webhook had been processed. Payments PayChangu still
+reports as pending are left for the next pass; the booking sweeper expires
+them after their TTL.
+
+Every verified payment gets `last_reconciled_at` and `reconciled_outcome`.
+Pending payments come first in a batch, least recently verified first, so
+expired ones cannot starve them. An expired payment is polled again only
+once a quarter of its age has passed since its last poll, and never again
+once PayChangu has given a final outcome for it.
+
+Each pass is stored in `reconciliation_runs` and readable under
+`/admin/reconciliation`. The student-facing verify-stuck endpoints run
+the same path for a single payment.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import and_, case, func, or_, text
+from sqlalchemy.orm import Session
+
+from database import db_session, engine, get_db
+from models import Booking as BookingModel, Payment as PaymentModel, ReconciliationRun, User
+from endpoints.admin import require_admin_user
+from endpoints.users import get_current_user
+from endpoints.payments import _apply_webhook_verification
+from paychangu_service import get_paychangu_client, verification_outcome as classify
+
+logger = logging.getLogger('payment_reconciliation')
+
+router = APIRouter()
+
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("RECONCILE_INTERVAL_SECONDS", "120"))
+RECONCILE_MIN_AGE_MINUTES = int(os.getenv("RECONCILE_MIN_AGE_MINUTES", "5"))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "200"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "8"))
+RECONCILE_EXPIRED_LOOKBACK_HOURS = int(os.getenv("RECONCILE_EXPIRED_LOOKBACK_HOURS", "48"))
+
+# Arbitrary advisory lock id so only one worker reconciles at a time
+_RUN_LOCK_ID = 724004
+
+
+async def _verify_all(payments: List[tuple]) -> List[dict]:
+    client = get_paychangu_client()
+    semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+
+    async def verify(payment_id, tx_ref) -> dict:
+        result = {"payment_id": str(payment_id), "tx_ref": tx_ref}
+        async with semaphore:
+            try:
+                response = await client.verify_transaction(tx_ref)
+            except Exception as e:
+                result.update(outcome="error", error=str(e))
+                return result
+        result.update(outcome=classify(response), response=response)
+        return result
+
+    return await asyncio.gather(*(verify(payment_id, tx_ref) for payment_id, tx_ref in payments))
+
+
+def _apply_results(results: List[dict]) -> list:
+    """Apply final outcomes, one transaction per payment; returns the notifications to send."""
+    followups = []
+    for result in results:
+        if result["outcome"] not in ("success", "failed"):
+            continue
+        try:
+            followups.extend(_apply_webhook_verification(result["tx_ref"], result["response"]))
+        except Exception as e:
+            logger.error("Failed to apply reconciliation result for %s: %s", result["tx_ref"], e)
+            result.update(outcome="error", error=str(e))
+    return followups
+
+
+async def _send_followups(followups: list) -> None:
+    for send, args, kwargs in followups:
+        try:
+            await send(*args, **kwargs)
+        except Exception as e:
+            logger.error("Failed to send reconciliation notification: %s", e)
+
+
+# Back-off for expired payments: the gap between polls grows with the payment's age
+_EXPIRED_BACKOFF_SQL = text(
+    "(payments.last_reconciled_at IS NULL"
+    " OR payments.last_reconciled_at <= payments.created_at + (now() - payments.created_at) * 0.75)"
+)
+
+
+def _due_payments(limit: int, min_age_minutes: int) -> List[tuple]:
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(minutes=min_age_minutes)
+    expired_since = now - timedelta(hours=RECONCILE_EXPIRED_LOOKBACK_HOURS)
+    with db_session() as db:
+        return [tuple(row) for row in db.query(
+            PaymentModel.payment_id, PaymentModel.transaction_id
+        ).filter(
+            or_(
+                PaymentModel.status == 'pending',
+                and_(
+                    PaymentModel.status == 'expired',
+                    PaymentModel.created_at >= expired_since,
+                    or_(PaymentModel.reconciled_outcome.is_(None), PaymentModel.reconciled_outcome == 'pending'),
+                    _EXPIRED_BACKOFF_SQL,
+                ),
+            ),
+            PaymentModel.transaction_id.isnot(None),
+            PaymentModel.created_at <= cutoff,
+        ).order_by(
+            case((PaymentModel.status == 'pending', 0), else_=1),
+            PaymentModel.last_reconciled_at.asc().nullsfirst(),
+            PaymentModel.created_at,
+        ).limit(limit).all()]
+
+
+def _mark_reconciled(results: List[dict]) -> None:
+    """Record when each payment was verified and, if PayChangu answered, what it said."""
+    by_outcome: Dict[Optional[str], list] = {}
+    for result in results:
+        outcome = None if result["outcome"] == "error" else result["outcome"]
+        by_outcome.setdefault(outcome, []).append(result["tx_ref"])
+    with db_session() as db:
+        for outcome, tx_refs in by_outcome.items():
+            values = {PaymentModel.last_reconciled_at: func.now()}
+            if outcome is not None:
+                values[PaymentModel.reconciled_outcome] = outcome
+            db.query(PaymentModel).filter(
+                PaymentModel.transaction_id.in_(tx_refs)
+            ).update(values, synchronize_session=False)
+        db.commit()
+
+
+def _try_lock():
+    conn = engine.connect()
+    if conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _RUN_LOCK_ID}).scalar():
+        return conn
+    conn.close()
+    return None
+
+
+def _unlock(conn) -> None:
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _RUN_LOCK_ID})
+    finally:
+        conn.close()
+
+
+def _summarize(results: List[dict]) -> Dict[str, int]:
+    counts = {"completed": 0, "failed": 0, "still_pending": 0, "errors": 0}
+    key = {"success": "completed", "failed": "failed", "pending": "still_pending", "error": "errors"}
+    for result in results:
+        counts[key[result["outcome"]]] += 1
+    return counts
+
+
+def _store_run(trigger: str, started_at: datetime, results: List[dict]) -> ReconciliationRun:
+    details = [
+        {k: result.get(k) for k in ("payment_id", "tx_ref", "outcome", "error")}
+        for result in results if result["outcome"] != "pending"
+    ]
+    with db_session() as db:
+        run = ReconciliationRun(
+            trigger=trigger,
+            started_at=started_at,
+            finished_at=datetime.now(timezone.utc),
+            examined=len(results),
+            details=details,
+            **_summarize(results),
+        )
+        db.add(run)
+        db.commit()
+        db.refresh(run)
+        db.expunge(run)
+        return run
+
+
+async def run_reconciliation(trigger: str = "schedule", limit: int = RECONCILE_BATCH_SIZE,
+                             min_age_minutes: int = RECONCILE_MIN_AGE_MINUTES) -> Optional[ReconciliationRun]:
+    """One reconciliation pass; None if another worker is already running one."""
+    loop = asyncio.get_running_loop()
+    lock = await loop.run_in_executor(None, _try_lock)
+    if lock is None:
+        return None
+    try:
+        started_at = datetime.now(timezone.utc)
+        payments = await loop.run_in_executor(None, _due_payments, limit, min_age_minutes)
+        if not payments and trigger == "schedule":
+            return None
+        results = await _verify_all(payments)
+        await loop.run_in_executor(None, _mark_reconciled, results)
+        followups = await loop.run_in_executor(None, _apply_results, results)
+        run = await loop.run_in_executor(None, _store_run, trigger, started_at, results)
+    finally:
+        await loop.run_in_executor(None, _unlock, lock)
+
+    if run.completed or run.failed or run.errors:
+        logger.info(
+            "Reconciled %d pending payments: %d completed, %d failed, %d still pending, %d errors",
+            run.examined, run.completed, run.failed, run.still_pending, run.errors,
+        )
+    await _send_followups(followups)
+    return run
+
+
+async def run_reconciler() -> None:
+    """Reconcile forever; started from the app lifespan and cancelled on shutdown."""
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+        try:
+            await run_reconciliation()
+        except Exception as e:
+            logger.error("Payment reconciliation failed: %s", e)
+
+
+async def reconcile_payment(payment: PaymentModel) -> str:
+    """Verify and apply a single payment now; returns its outcome."""
+    [result] = await _verify_all([(payment.payment_id, payment.transaction_id)])
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _mark_reconciled, [result])
+    followups = await loop.run_in_executor(None, _apply_results, [result])
+    if result["outcome"] == "error":
+        raise HTTPException(status_code=500, detail=f"Verification failed: {result['error']}")
+    await _send_followups(followups)
+    return result["outcome"]
+
+
+def _serialize_run(run: ReconciliationRun, with_details: bool = False) -> dict:
+    data = {
+        "run_id": str(run.run_id),
+        "trigger": run.trigger,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "examined": run.examined,
+        "completed": run.completed,
+        "failed": run.failed,
+        "still_pending": run.still_pending,
+        "errors": run.errors,
+    }
+    if with_details:
+        data["details"] = run.details or []
+    return data
+
+
+@router.get("/admin/reconciliation/runs")
+def list_reconciliation_runs(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    runs = db.query(ReconciliationRun).order_by(
+        ReconciliationRun.started_at.desc()
+    ).offset(skip).limit(limit).all()
+    return [_serialize_run(run) for run in runs]
+
+
+@router.get("/admin/reconciliation/runs/{run_id}")
+def get_reconciliation_run(
+    run_id: str,
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    run = db.query(ReconciliationRun).filter(ReconciliationRun.run_id == run_id).first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Reconciliation run not found")
+    return _serialize_run(run, with_details=True)
+
+
+@router.post("/admin/reconciliation/run")
+async def trigger_reconciliation(
+    current_user: User = Depends(require_admin_user),
+):
+    """Run a pass now instead of waiting for the schedule."""
+    run = await run_reconciliation(trigger="manual")
+    if run is None:
+        raise HTTPException(status_code=409, detail="A reconciliation pass is already running")
+    return _serialize_run(run, with_details=True)
+
+
+async def _stuck_payment(request: Request, current_user, db: Session, payment_type: str):
+    try:
+        request_body = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON in request body")
+
+    booking_id = request_body.get("booking_id")
+    if not booking_id:
+        raise HTTPException(status_code=422, detail="booking_id field is required")
+
+    booking = db.query(BookingModel).filter(
+        BookingModel.booking_id == booking_id,
+        BookingModel.student_id == current_user.user_id
+    ).first()
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found or you don't have permission")
+
+    # The most recent unsettled payment of this type for the booking; a
+    # completed one only when nothing newer is waiting (an earlier extension
+    # must not stand in for the stuck one)
+    payment = db.query(PaymentModel).filter(
+        PaymentModel.booking_id == booking_id,
+        PaymentModel.payment_type == payment_type
+    ).order_by(
+        case((PaymentModel.status == 'completed', 1), else_=0),
+        PaymentModel.created_at.desc().nullslast(),
+        PaymentModel.payment_id.desc(),
+    ).first()
+    if not payment:
+        raise HTTPException(status_code=404, detail=f"No {payment_type} payment found for this booking")
+    if not payment.transaction_id:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{payment_type.capitalize()} payment was not initiated properly. No transaction ID found."
+        )
+
+    if payment.status == 'completed':
+        outcome = "success"
+    else:
+        outcome = await reconcile_payment(payment)
+    db.expire_all()
+    return booking, outcome
+
+
+@router.post("/payments/verify-stuck-extension-payment/")
+async def verify_stuck_extension_payment(
+    request: Request,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Verify an extension payment now instead of waiting for reconciliation."""
+    booking, outcome = await _stuck_payment(request, current_user, db, "extension")
+    if outcome == "success":
+        return {
+            "status": "success",
+            "message": "Extension payment verified successfully",
+            "booking_status": booking.status,
+            "new_end_date": booking.end_date.isoformat() if booking.end_date else None
+        }
+    return {
+        "status": outcome,
+        "message": "Extension payment is still pending" if outcome == "pending" else "Extension payment verification failed",
+        "booking_status": booking.status,
+    }
+
+
+@router.post("/payments/verify-stuck-complete-payment/")
+async def verify_stuck_complete_payment(
+    request: Request,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Verify a complete payment now instead of waiting for reconciliation."""
+    booking, outcome = await _stuck_payment(request, current_user, db, "complete")
+    if outcome == "success":
+        return {
+            "status": "success",
+            "message": "Complete payment verified successfully",
+            "booking_status": booking.status,
+            "payment_type": booking.payment_type
+        }
+    return {
+        "status": outcome,
+        "message": "Complete payment is still pending" if outcome == "pending" else "Complete payment verification failed",
+        "booking_status": booking.status,
+    }
@@ -0,0 +1,258 @@
+"""Materialized payment schedules.
+
+Every booking has one `payment_instalments` row per month of its stay
+(`seq` 1..n, due on the start date plus `seq - 1` months, for that month's
+rent). An instalment is paid when the payment it is linked to is
+completed:
+
+- booking created with a full payment: every instalment links to it;
+- booking created with a booking fee: instalments start unlinked and are
+  linked to the "complete" payment that converts the booking to full;
+- extension applied: the new months are appended, linked to the
+  extension payment.
+
+Balances and next due dates for many bookings at once are computed with
+NumPy over per-booking arrays (start date, instalment count, paid amount,
+unpaid instalments, first unpaid month) built from one grouped query. "Due in the next N days"
+lookups go through the `due_date` index.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from models import Booking, Hostel, Payment, PaymentInstalment, Room, User
+
+MAX_DUE_WINDOW_DAYS = 90
+
+
+def months_between(start: date, end: date) -> int:
+    """Whole months from `start` to `end` (a stay of `n` months ends on `start + n months`)."""
+    delta = relativedelta(end, start)
+    return delta.years * 12 + delta.months + (1 if delta.days > 0 else 0)
+
+
+def add_months(start: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """Vectorized `start + relativedelta(months=...)` over `datetime64[D]` arrays.
+
+    Days past the end of the target month are clipped to its last day.
+    """
+    month_start = start.astype('datetime64[M]')
+    day = (start - month_start.astype('datetime64[D]')).astype(np.int64)
+    target = month_start + months.astype(np.int64)
+    month_days = ((target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')).astype(np.int64)
+    return target.astype('datetime64[D]') + np.minimum(day, month_days - 1)
+
+
+def _instalment_rows(booking: Booking, first_seq: int, count: int, monthly_rent, payment_id) -> List[PaymentInstalment]:
+    return [
+        PaymentInstalment(
+            booking_id=booking.booking_id,
+            seq=seq,
+            due_date=booking.start_date + relativedelta(months=seq - 1),
+            amount=monthly_rent,
+            payment_id=payment_id,
+        )
+        for seq in range(first_seq, first_seq + count)
+    ]
+
+
+def materialize_schedule(db: Session, booking: Booking, monthly_rent, payment_id=None) -> None:
+    """Create the instalments of a new booking (`duration_months` of them)."""
+    db.add_all(_instalment_rows(booking, 1, booking.duration_months, monthly_rent, payment_id))
+
+
+def extend_schedule(db: Session, booking: Booking, new_end_date: date, payment_id=None) -> None:
+    """Append instalments up to `new_end_date`, linked to the extension payment.
+
+    Months already in the schedule are left as they are, so applying the
+    same extension twice adds nothing.
+    """
+    last_seq = db.query(func.max(PaymentInstalment.seq)).filter(
+        PaymentInstalment.booking_id == booking.booking_id
+    ).scalar() or 0
+    wanted = months_between(booking.start_date, new_end_date)
+    if wanted <= last_seq:
+        return
+    room = booking.room
+    db.add_all(_instalment_rows(booking, last_seq + 1, wanted - last_seq, room.price_per_month, payment_id))
+
+
+def _is_paid():
+    return Payment.status == 'completed'
+
+
+def assign_unpaid_instalments(db: Session, booking_id, payment_id) -> int:
+    """Link the booking's unpaid instalments to `payment_id` (a payment covering the rest of the stay)."""
+    paid_ids = db.query(Payment.payment_id).filter(
+        Payment.booking_id == booking_id, _is_paid()
+    )
+    return db.query(PaymentInstalment).filter(
+        PaymentInstalment.booking_id == booking_id,
+        or_(PaymentInstalment.payment_id.is_(None), PaymentInstalment.payment_id.notin_(paid_ids)),
+    ).update({PaymentInstalment.payment_id: payment_id}, synchronize_session=False)
+
+
+def unpaid_total(db: Session, booking_id) -> Optional[Decimal]:
+    """Rent still owed on the booking's schedule, or None if it has no schedule."""
+    unpaid = or_(Payment.payment_id.is_(None), Payment.status != 'completed')
+    row = db.query(
+        func.count(PaymentInstalment.instalment_id).label("instalments"),
+        func.sum(PaymentInstalment.amount).filter(unpaid).label("unpaid"),
+    ).outerjoin(
+        Payment, Payment.payment_id == PaymentInstalment.payment_id
+    ).filter(
+        PaymentInstalment.booking_id == booking_id,
+    ).one()
+    if not row.instalments:
+        return None
+    return Decimal(row.unpaid or 0)
+
+
+def quote_instalments(booking: Booking, additional_months: int, monthly_rent) -> List[dict]:
+    """Instalments an extension by `additional_months` would add to the schedule."""
+    first_seq = months_between(booking.start_date, booking.end_date) + 1
+    return [
+        {
+            "month": seq,
+            "due_date": (booking.start_date + relativedelta(months=seq - 1)).isoformat(),
+            "amount": float(monthly_rent),
+        }
+        for seq in range(first_seq, first_seq + additional_months)
+    ]
+
+
+def schedule_summaries(db: Session, booking_ids: List, today: Optional[date] = None) -> Dict[str, dict]:
+    """`{booking_id: summary}` with months paid, paid/outstanding amounts and next due date.
+
+    One grouped query gathers per-booking arrays; everything else is
+    vectorized. Bookings without instalments are omitted.
+    """
+    if not booking_ids:
+        return {}
+    # Free instalments (zero rent) count as paid
+    unpaid = and_(
+        or_(Payment.payment_id.is_(None), Payment.status != 'completed'),
+        PaymentInstalment.amount > 0,
+    )
+    rows = db.query(
+        PaymentInstalment.booking_id,
+        func.min(PaymentInstalment.due_date).label("start_date"),
+        func.count(PaymentInstalment.instalment_id).label("instalments"),
+        func.sum(PaymentInstalment.amount).label("total_amount"),
+        func.coalesce(func.sum(PaymentInstalment.amount).filter(_is_paid()), 0).label("paid_amount"),
+        func.count(PaymentInstalment.instalment_id).filter(unpaid).label("unpaid_instalments"),
+        func.min(PaymentInstalment.seq).filter(unpaid).label("next_unpaid_seq"),
+    ).outerjoin(
+        Payment, Payment.payment_id == PaymentInstalment.payment_id
+    ).filter(
+        PaymentInstalment.booking_id.in_(booking_ids)
+    ).group_by(PaymentInstalment.booking_id).all()
+    return summarize_schedules(rows, today or date.today())
+
+
+def summarize_schedules(rows, today: date) -> Dict[str, dict]:
+    """Vectorized part of `schedule_summaries` over its grouped rows.
+
+    The next due date is that of the first unpaid instalment, so a
+    schedule paid out of order (e.g. an extension paid before an earlier
+    month) still points at the month actually owed.
+    """
+    if not rows:
+        return {}
+    start = np.array([row.start_date for row in rows], dtype='datetime64[D]')
+    instalments = np.array([row.instalments for row in rows], dtype=np.int64)
+    total = np.array([float(row.total_amount) for row in rows], dtype=np.float64)
+    paid = np.array([float(row.paid_amount) for row in rows], dtype=np.float64)
+    unpaid = np.array([row.unpaid_instalments for row in rows], dtype=np.int64)
+    next_seq = np.array([row.next_unpaid_seq or 0 for row in rows], dtype=np.int64)
+
+    monthly = total / instalments
+    months_paid = instalments - unpaid
+    outstanding = np.maximum(total - paid, 0.0)
+    has_next = unpaid > 0
+    next_due = add_months(start, np.maximum(next_seq - 1, 0))
+    days_until = (next_due - np.datetime64(today, 'D')).astype(np.int64)
+
+    result = {}
+    for i, row in enumerate(rows):
+        result[str(row.booking_id)] = {
+            "instalments": int(instalments[i]),
+            "months_paid": int(months_paid[i]),
+            "monthly_amount": float(monthly[i]),
+            "paid_amount": float(paid[i]),
+            "outstanding_amount": float(outstanding[i]),
+            "next_due_date": next_due[i].item() if has_next[i] else None,
+            "days_until_due": int(days_until[i]) if has_next[i] else None,
+        }
+    return result
+
+
+def due_explanation(days_until_due: Optional[int]) -> Optional[str]:
+    if days_until_due is None:
+        return None
+    if days_until_due < 0:
+        return f"Overdue by {abs(days_until_due)} day(s)"
+    if days_until_due == 0:
+        return "Due today"
+    return f"Due in {days_until_due} day(s)"
+
+
+def instalments_due_within(db: Session, days: int, landlord_id=None, student_id=None,
+                           today: Optional[date] = None, skip: int = 0, limit: int = 100) -> List[dict]:
+    """Unpaid instalments of active bookings due from `today` through `today + days`, soonest first."""
+    today = today or date.today()
+    query = db.query(
+        PaymentInstalment.instalment_id,
+        PaymentInstalment.booking_id,
+        PaymentInstalment.seq,
+        PaymentInstalment.due_date,
+        PaymentInstalment.amount,
+        Room.room_number,
+        Hostel.name.label("hostel_name"),
+        User.first_name,
+        User.last_name,
+        User.email,
+    ).join(
+        Booking, Booking.booking_id == PaymentInstalment.booking_id
+    ).join(
+        Room, Room.room_id == Booking.room_id
+    ).join(
+        Hostel, Hostel.hostel_id == Room.hostel_id
+    ).join(
+        User, User.user_id == Booking.student_id
+    ).outerjoin(
+        Payment, and_(Payment.payment_id == PaymentInstalment.payment_id, _is_paid())
+    ).filter(
+        PaymentInstalment.due_date >= today,
+        PaymentInstalment.due_date <= today + timedelta(days=days),
+        Payment.payment_id.is_(None),
+        Booking.status.in_(('confirmed', 'active')),
+    )
+    if landlord_id is not None:
+        query = query.filter(Hostel.landlord_id == landlord_id)
+    if student_id is not None:
+        query = query.filter(Booking.student_id == student_id)
+
+    rows = query.order_by(
+        PaymentInstalment.due_date, PaymentInstalment.booking_id, PaymentInstalment.seq
+    ).offset(skip).limit(limit).all()
+    return [
+        {
+            "instalment_id": str(row.instalment_id),
+            "booking_id": str(row.booking_id),
+            "month": row.seq,
+            "due_date": row.due_date.isoformat(),
+            "days_until_due": (row.due_date - today).days,
+            "amount": float(row.amount),
+            "hostel_name": row.hostel_name,
+            "room_number": row.room_number,
+            "student_name": f"{row.first_name} {row.last_name}",
+            "student_email": row.email,
+        }
+        for row in rows
+    ]
@@ -9,7 +9,6 @@ import hmac
 import hashlib
 import json
 import asyncio
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from decimal import Decimal
 
 from endpoints.users import get_current_user
@@ -21,12 +20,14 @@ from datetime import datetime
 from email_service import email_service
 from endpoints.config import get_platform_fee
 from dateutil.relativedelta import relativedelta
+from endpoints.room_availability import extend_stay, lock_booking, reclaim_bed, renew_hold, reserve_extension
+from endpoints.payment_schedule import assign_unpaid_instalments
+from endpoints.idempotency import IdempotencyContext, idempotent
+from endpoints.webhook_inbox import enqueue_event
+from paychangu_service import PayChanguError, get_paychangu_client, verification_outcome
 
 router = APIRouter()
 
-# Thread pool for PayChangu blocking calls
-_paychangu_executor = ThreadPoolExecutor(max_workers=5)
-
 
 def _safe_format_datetime(dt, format_str="%B %d, %Y", default="N/A"):
     """Safely format datetime with timezone handling"""
@@ -44,29 +45,24 @@ def _safe_format_datetime(dt, format_str="%B %d, %Y", default="N/A"):
 
 
 def _get_paychangu_client():
-    """Try to construct a PayChangu client from the installed package."""
+    """The shared pooled PayChangu client (see paychangu_service)."""
     try:
-        from paychangu import PayChanguClient
-        from paychangu.models.payment import Payment
-    except Exception as e:
-        raise RuntimeError(
-            "PayChangu Python client is not installed. Install the package 'paychangu' in your backend environment."
-        )
-
-    secret = os.getenv("PAYCHANGU_SECRET_KEY")
-    if not secret:
-        raise RuntimeError("PAYCHANGU_SECRET_KEY is not set in environment variables")
-
-    client = PayChanguClient(secret_key=secret)
-    return client, Payment
+        return get_paychangu_client()
+    except PayChanguError as e:
+        raise RuntimeError(str(e))
 
 
 @router.post("/paychangu/initiate")
 @router.post("/paychangu/initiate/")
-def initiate_paychangu_payment(payload: dict, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def initiate_paychangu_payment(
+    payload: dict,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+    idem: IdempotencyContext = Depends(idempotent("initiate_paychangu_payment"))
+):
     """Initiate a PayChangu payment server-side and return a payment URL."""
     try:
-        client, Payment = _get_paychangu_client()
+        client = _get_paychangu_client()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -95,9 +91,14 @@ def initiate_paychangu_payment(payload: dict, current_user=Depends(get_current_u
     if not hostel:
         raise HTTPException(status_code=404, detail="Hostel associated with room not found")
 
+    # Keep the bed for the whole checkout; an expired booking is only resumed if a bed is still free
+    booking = lock_booking(db, booking.booking_id)
+    renew_hold(db, booking)
+    db.commit()
+
     tx_ref = f"bk_{booking_id}_{int(time.time())}_{uuid.uuid4().hex[:6]}"
 
-    payment = Payment(
+    payment = dict(
         amount=amount,
         currency=currency,
         email=email,
@@ -121,9 +122,7 @@ def initiate_paychangu_payment(payload: dict, current_user=Depends(get_current_u
     )
 
     try:
-        # Run blocking initiate_transaction in a thread with a timeout
-        future = _paychangu_executor.submit(client.initiate_transaction, payment)
-        response = future.result(timeout=20)
+        response = await client.initiate_transaction(payment)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to contact PayChangu: {e}")
 
@@ -135,6 +134,9 @@ def initiate_paychangu_payment(payload: dict, current_user=Depends(get_current_u
             payment_record = db.query(PaymentModel).filter(PaymentModel.booking_id == booking_id).first()
             if payment_record:
                 payment_record.transaction_id = tx_ref
+                if payment_record.status == 'expired':
+                    # The booking's hold was renewed above
+                    payment_record.status = 'pending'
                 db.add(payment_record)
                 db.commit()
             else:
@@ -154,10 +156,10 @@ def initiate_paychangu_payment(payload: dict, current_user=Depends(get_current_u
             except Exception:
                 pass
 
-        return JSONResponse({
+        return idem.complete(JSONResponse({
             "payment_url": payment_url,
             "tx_ref": tx_ref
-        })
+        }))
     else:
         error_detail = response.get("message", str(response))
         raise HTTPException(status_code=400, detail=f"PayChangu initiation failed: {error_detail}")
@@ -172,14 +174,13 @@ async def verify_payment(
 ):
     """Verify a PayChangu transaction and update booking and room status."""
     try:
-        client, _ = _get_paychangu_client()
+        client = _get_paychangu_client()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     try:
         print(reference)
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(None, client.verify_transaction, reference)
+        response = await client.verify_transaction(reference)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Verification failed: {e}")
 
@@ -188,7 +189,7 @@ async def verify_payment(
         raise HTTPException(status_code=404, detail="Payment record not found.")
 
     # Idempotency check: If booking is already confirmed, do nothing further.
-    booking = db.query(BookingModel).filter(BookingModel.booking_id == payment.booking_id).first()
+    booking = lock_booking(db, payment.booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Associated booking not found.")
 
@@ -200,12 +201,14 @@ async def verify_payment(
         # Update payment status
         payment.status = 'completed'
         payment.paid_at = datetime.utcnow()
+        reclaim_bed(db, booking)
         booking.status = 'confirmed'
         
         # Handle different payment types
         if payment.payment_type == "complete":
             # Update booking to full payment type and status
             booking.payment_type = 'full'
+            assign_unpaid_instalments(db, booking.booking_id, payment.payment_id)
             booking.status = 'confirmed'
             
             # Update total_amount to reflect full payment
@@ -399,8 +402,13 @@ async def _send_payment_notifications(
 
 
 @router.post("/paychangu/webhook/")
-async def paychangu_webhook(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """Receive PayChangu webhook callbacks."""
+async def paychangu_webhook(request: Request, db: Session = Depends(get_db)):
+    """Receive PayChangu webhook callbacks.
+
+    Only the signature is checked here; the event is stored in the webhook
+    inbox and applied by `process_paychangu_event` in a worker, so the
+    provider gets its 2xx without waiting on verification.
+    """
     try:
         request_body = await request.body()
     except Exception:
@@ -450,197 +458,219 @@ async def paychangu_webhook(request: Request, background_tasks: BackgroundTasks,
         data = {}
 
     tx_ref = None
+    event_type = None
     if isinstance(data, dict):
         tx_ref = data.get('tx_ref') or data.get('txRef')
+        event_type = data.get('event_type') or data.get('type')
         if not tx_ref:
             d = data.get('data')
             if isinstance(d, dict):
-                tx_ref = d.get('tx_ref') or d.get('txRef') or d.get('txRef')
+                tx_ref = d.get('tx_ref') or d.get('txRef')
 
-    if tx_ref:
-        try:
-            client, _ = _get_paychangu_client()
-            loop = asyncio.get_running_loop()
-            verify_resp = await loop.run_in_executor(None, client.verify_transaction, tx_ref)
+    if not tx_ref:
+        return Response(status_code=204)
 
-            try:
-                payment_query = db.query(PaymentModel).filter(PaymentModel.transaction_id == tx_ref)
-                try:
-                    payment_query = payment_query.with_for_update()
-                except Exception:
-                    pass
-
-                payment = payment_query.first()
-                if payment:
-                    # Idempotency: webhook delivery is retried by payment providers.
-                    # If we've already processed this payment, do not apply booking updates again.
-                    if (payment.status or "").lower() == "completed":
-                        return Response(status_code=204)
-
-                    if verify_resp.get('status') == 'success':
-                        payment.status = 'completed'
-                        payment.paid_at = datetime.utcnow()
-                        
-                        booking = db.query(BookingModel).filter(BookingModel.booking_id == payment.booking_id).first()
-                        if booking:
-                            booking.status = 'confirmed'
-                            
-                            # Handle different payment types
-                            if payment.payment_type == "complete":
-                                # Update booking to full payment type and status
-                                booking.payment_type = 'full'
+    try:
+        enqueue_event(db, "paychangu", str(tx_ref), str(event_type or "payment"), payload_bytes.decode('utf-8'))
+    except Exception as e:
+        db.rollback()
+        print(f"!!! Failed to store PayChangu webhook for tx_ref {tx_ref}: {e}")
+        # Let PayChangu redeliver
+        raise HTTPException(status_code=503, detail="Webhook could not be stored")
+
+    return Response(status_code=204)
+
+
+def _apply_webhook_verification(tx_ref: str, verify_resp: dict) -> list:
+    """Apply a verified PayChangu result to the payment and its booking.
+
+    Returns the notification calls to make once committed, as
+    `(coroutine_function, args, kwargs)` tuples. Already-completed payments
+    are left alone, so replays are harmless. Raises while PayChangu still
+    reports the transaction as pending, so the inbox retries it later.
+    """
+    outcome = verification_outcome(verify_resp)
+    if outcome == "pending":
+        raise PayChanguError(f"PayChangu has not settled tx_ref {tx_ref} yet")
+
+    followups = []
+    with db_session() as db:
+        payment = db.query(PaymentModel).filter(PaymentModel.transaction_id == tx_ref).first()
+        if payment:
+            # Booking (with its room) first, then the payment: the order admissions lock in
+            booking = lock_booking(db, payment.booking_id)
+            db.refresh(payment, with_for_update=True)
+
+            # Idempotency: webhook delivery is retried by payment providers.
+            # If we've already processed this payment, do not apply booking updates again.
+            if (payment.status or "").lower() == "completed":
+                return []
+
+            if outcome == 'success':
+                payment.status = 'completed'
+                payment.paid_at = datetime.utcnow()
+
+                if booking:
+                    reclaim_bed(db, booking)
+                    booking.status = 'confirmed'
+
+                    # Handle different payment types
+                    if payment.payment_type == "complete":
+                        # Update booking to full payment type and status
+                        booking.payment_type = 'full'
+                        assign_unpaid_instalments(db, booking.booking_id, payment.payment_id)
+                        booking.status = 'confirmed'
+
+                        # Update total_amount to reflect full payment
+                        # Use stored duration_months from booking instead of calculating
+                        try:
+                            platform_fee = get_platform_fee(db)
+                            # Use stored duration_months from booking creation
+                            original_months = booking.duration_months
+                            full_amount = float((booking.room.price_per_month * Decimal(original_months)) + Decimal(str(platform_fee)))
+                            booking.total_amount = full_amount
+                            print(f"Updated booking total_amount to {full_amount} for complete payment (stored duration_months: {original_months})")
+                        except Exception as e:
+                            print(f"Error calculating full amount for booking: {e}")
+                    elif payment.payment_type == "extension":
+                        # Update booking end date and total_amount after successful payment
+                        try:
+                            extension_months = None
+                            if payment.meta and isinstance(payment.meta, dict):
+                                extension_months = payment.meta.get('additional_months')
+
+                            if extension_months:
+                                booking.duration_months = (booking.duration_months or 0) + int(extension_months)
+                                new_end_date = booking.end_date + relativedelta(months=extension_months)
+                                extend_stay(db, booking, new_end_date, payment_id=payment.payment_id)
                                 booking.status = 'confirmed'
-                                
-                                # Update total_amount to reflect full payment
-                                # Use stored duration_months from booking instead of calculating
-                                try:
-                                    platform_fee = get_platform_fee(db)
-                                    # Use stored duration_months from booking creation
-                                    original_months = booking.duration_months
-                                    full_amount = float((booking.room.price_per_month * Decimal(original_months)) + Decimal(str(platform_fee)))
-                                    booking.total_amount = full_amount
-                                    print(f"Updated booking total_amount to {full_amount} for complete payment (stored duration_months: {original_months})")
-                                except Exception as e:
-                                    print(f"Error calculating full amount for booking: {e}")
-                            elif payment.payment_type == "extension":
-                                # Update booking end date and total_amount after successful payment
-                                try:
-                                    extension_months = None
-                                    if payment.meta and isinstance(payment.meta, dict):
-                                        extension_months = payment.meta.get('additional_months')
-                                    
-                                    if extension_months:
-                                        booking.duration_months = (booking.duration_months or 0) + int(extension_months)
-                                        new_end_date = booking.end_date + relativedelta(months=extension_months)
-                                        booking.end_date = new_end_date
-                                        booking.status = 'confirmed'
-                                        
-                                        # Update total_amount to include extension payment
-                                        # Get sum of all previous completed payments
-                                        previous_payments = db.query(PaymentModel).filter(
-                                            PaymentModel.booking_id == booking.booking_id,
-                                            PaymentModel.status == 'completed',
-                                            PaymentModel.transaction_id != tx_ref
-                                        ).all()
-                                        
-                                        previous_total = sum(
-                                            (
-                                                (p.amount if p.amount is not None else Decimal("0"))
-                                                for p in previous_payments
-                                            ),
-                                            Decimal("0"),
-                                        )
-                                        payment_amount = payment.amount if payment.amount is not None else Decimal("0")
-                                        new_total_amount = previous_total + payment_amount
-                                        booking.total_amount = float(new_total_amount)
-                                        print(f"Updated booking total_amount to {new_total_amount} for extension (previous: {previous_total}, extension: {payment.amount})")
-                                except Exception as e:
-                                    print(f"Error updating extension payment: {e}")
-                            
-                            db.add(booking)
-                            
-                            # Note: Extension payments do NOT update room occupancy
-                            # since student is already occupying the room
-                            # Only extending their stay duration
-                    else:
-                        # Handle failed payment in webhook
-                        payment.status = 'failed'
-                        
-                        booking = db.query(BookingModel).filter(BookingModel.booking_id == payment.booking_id).first()
-                        if booking:
-                            booking.status = 'payment_failed'
-                            db.add(booking)
-                    
-                    db.add(payment)
 
-                    db.commit()
-                    
-                    # Send notifications after successful payment (webhook) - in background
-                    if booking and verify_resp.get('status') == 'success' and payment.status == 'completed':
-                        # Get room, hostel, and student info (refresh from DB after commit)
-                        room = db.query(Room).filter(Room.room_id == booking.room_id).first()
-                        hostel = db.query(Hostel).filter(Hostel.hostel_id == room.hostel_id).first() if room else None
-                        student = db.query(User).filter(User.user_id == booking.student_id).first()
-                        landlord_id = hostel.landlord_id if hostel else None
-                        
-                        # Schedule notification sending in background (don't await)
-                        if room and hostel and student:
-                            import asyncio
-                            
-                            # Check if this is an extension payment
-                            if payment.payment_type == "extension":
-                                print(f"Extension payment found: {payment.payment_id}, meta: {payment.meta}")
-                                
-                                # Booking updates were already applied above; do NOT update/commit again here.
-                                additional_months = None
-                                if payment.meta and isinstance(payment.meta, dict):
-                                    additional_months = payment.meta.get("additional_months")
-                                    print(f"Additional months from meta: {additional_months}")
-                                else:
-                                    print(f"Payment meta is None or not a dict: {payment.meta}")
-                                
-                                if not additional_months:
-                                    print(f"Extension payment found but additional_months metadata missing for payment {payment.payment_id}")
-
-                                # Prepare extension data for email
-                                extension_data = {
-                                    'booking_id': str(booking.booking_id),
-                                    'student_first_name': student.first_name,
-                                    'student_last_name': student.last_name,
-                                    'student_email': student.email,
-                                    'hostel_name': hostel.name,
-                                    'room_number': room.room_number,
-                                    'room_type': room.room_type,
-                                    'extension_payment_id': str(payment.payment_id),
-                                    'payment_date': _safe_format_datetime(payment.paid_at, "%B %d, %Y", "Payment Processing"),
-                                    'previous_checkout_date': payment.meta.get("original_end_date", "N/A") if payment.meta else 'N/A',
-                                    'new_checkout_date': _safe_format_datetime(booking.end_date, "%B %d, %Y", "N/A"),
-                                    'monthly_rent': str(room.price_per_month),
-                                    'platform_fee': str(get_platform_fee(db)),
-                                    'extension_amount': str(payment.amount),
-                                    'new_total_amount': str(booking.total_amount),
-                                    'payment_method': payment.payment_method,
-                                    'transaction_id': payment.transaction_id or 'N/A',
-                                }
-                                
-                                # Send extension email with PDF (in background to avoid blocking)
-                                try:
-                                    background_tasks.add_task(
-                                        email_service.send_booking_extension_email,
-                                        email=student.email,
-                                        first_name=student.first_name,
-                                        booking_data=extension_data
-                                    )
-                                except Exception as email_error:
-                                    # Log email error but don't fail the payment
-                                    print(f"Failed to send extension email: {email_error}")
-                            else:
-                                # Regular booking confirmation email (in background to avoid blocking)
-                                background_tasks.add_task(
-                                    _send_payment_notifications,
-                                    str(booking.booking_id),
-                                    str(payment.payment_id),
-                                    str(payment.amount),
-                                    payment.transaction_id or "",
-                                    booking.student_id,
-                                    landlord_id,
-                                    room.room_number,
-                                    hostel.name,
-                                    student.first_name,
-                                    student.last_name
+                                # Update total_amount to include extension payment
+                                # Get sum of all previous completed payments
+                                previous_payments = db.query(PaymentModel).filter(
+                                    PaymentModel.booking_id == booking.booking_id,
+                                    PaymentModel.status == 'completed',
+                                    PaymentModel.transaction_id != tx_ref
+                                ).all()
+
+                                previous_total = sum(
+                                    (
+                                        (p.amount if p.amount is not None else Decimal("0"))
+                                        for p in previous_payments
+                                    ),
+                                    Decimal("0"),
                                 )
-            except Exception:
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
+                                payment_amount = payment.amount if payment.amount is not None else Decimal("0")
+                                new_total_amount = previous_total + payment_amount
+                                booking.total_amount = float(new_total_amount)
+                                print(f"Updated booking total_amount to {new_total_amount} for extension (previous: {previous_total}, extension: {payment.amount})")
+                        except HTTPException:
+                            # No bed left for the extension: leave the payment pending for an admin
+                            raise
+                        except Exception as e:
+                            print(f"Error updating extension payment: {e}")
+
+                    db.add(booking)
+
+                    # Note: Extension payments do NOT update room occupancy
+                    # since student is already occupying the room
+                    # Only extending their stay duration
+            else:
+                # Handle failed payment in webhook
+                payment.status = 'failed'
 
-            return Response(status_code=204)
-        except Exception as e:
-            return Response(status_code=204)
+                if booking:
+                    booking.status = 'payment_failed'
+                    db.add(booking)
 
-    return Response(status_code=204)
+            db.add(payment)
+
+            db.commit()
+
+            # Send notifications after successful payment (webhook) - in background
+            if booking and outcome == 'success' and payment.status == 'completed':
+                # Get room, hostel, and student info (refresh from DB after commit)
+                room = db.query(Room).filter(Room.room_id == booking.room_id).first()
+                hostel = db.query(Hostel).filter(Hostel.hostel_id == room.hostel_id).first() if room else None
+                student = db.query(User).filter(User.user_id == booking.student_id).first()
+                landlord_id = hostel.landlord_id if hostel else None
+
+                # Notifications are sent by the inbox worker once this transaction has committed
+                if room and hostel and student:
+                    # Check if this is an extension payment
+                    if payment.payment_type == "extension":
+                        print(f"Extension payment found: {payment.payment_id}, meta: {payment.meta}")
+
+                        # Booking updates were already applied above; do NOT update/commit again here.
+                        additional_months = None
+                        if payment.meta and isinstance(payment.meta, dict):
+                            additional_months = payment.meta.get("additional_months")
+                            print(f"Additional months from meta: {additional_months}")
+                        else:
+                            print(f"Payment meta is None or not a dict: {payment.meta}")
+
+                        if not additional_months:
+                            print(f"Extension payment found but additional_months metadata missing for payment {payment.payment_id}")
+
+                        # Prepare extension data for email
+                        extension_data = {
+                            'booking_id': str(booking.booking_id),
+                            'student_first_name': student.first_name,
+                            'student_last_name': student.last_name,
+                            'student_email': student.email,
+                            'hostel_name': hostel.name,
+                            'room_number': room.room_number,
+                            'room_type': room.room_type,
+                            'extension_payment_id': str(payment.payment_id),
+                            'payment_date': _safe_format_datetime(payment.paid_at, "%B %d, %Y", "Payment Processing"),
+                            'previous_checkout_date': payment.meta.get("original_end_date", "N/A") if payment.meta else 'N/A',
+                            'new_checkout_date': _safe_format_datetime(booking.end_date, "%B %d, %Y", "N/A"),
+                            'monthly_rent': str(room.price_per_month),
+                            'platform_fee': str(get_platform_fee(db)),
+                            'extension_amount': str(payment.amount),
+                            'new_total_amount': str(booking.total_amount),
+                            'payment_method': payment.payment_method,
+                            'transaction_id': payment.transaction_id or 'N/A',
+                        }
 
+                        # Send extension email with PDF
+                        followups.append((
+                            email_service.send_booking_extension_email,
+                            (),
+                            {"email": student.email, "first_name": student.first_name, "booking_data": extension_data},
+                        ))
+                    else:
+                        # Regular booking confirmation email
+                        followups.append((_send_payment_notifications, (
+                            str(booking.booking_id),
+                            str(payment.payment_id),
+                            str(payment.amount),
+                            payment.transaction_id or "",
+                            booking.student_id,
+                            landlord_id,
+                            room.room_number,
+                            hostel.name,
+                            student.first_name,
+                            student.last_name
+                        ), {}))
+        else:
+            # PayChangu can call back before initiate has committed the payment row; retry later
+            raise LookupError(f"No payment recorded for tx_ref {tx_ref}")
+    return followups
+
+
+async def process_paychangu_event(event: dict) -> None:
+    """Webhook inbox handler: verify the transaction with PayChangu and apply it."""
+    tx_ref = event["tx_ref"]
+    client = _get_paychangu_client()
+    verify_resp = await client.verify_transaction(tx_ref)
+    loop = asyncio.get_running_loop()
+    followups = await loop.run_in_executor(None, _apply_webhook_verification, tx_ref, verify_resp)
+    for send, args, kwargs in followups:
+        try:
+            await send(*args, **kwargs)
+        except Exception as e:
+            print(f"Error sending payment notification for tx_ref {tx_ref}: {e}")
 
 
 @router.post("/verify-extension-payment/")
@@ -662,17 +692,11 @@ async def verify_extension_payment(
     if not transaction_id:
         raise HTTPException(status_code=422, detail="payment_id field is required")
     
-    # Get extension payment record by transaction_id (lock row if supported)
-    payment_query = db.query(PaymentModel).filter(
+    # Get extension payment record by transaction_id; it is locked only after PayChangu answers
+    payment = db.query(PaymentModel).filter(
         PaymentModel.transaction_id == transaction_id,
         PaymentModel.payment_type == "extension"
-    )
-    try:
-        payment_query = payment_query.with_for_update()
-    except Exception:
-        pass
-
-    payment = payment_query.first()
+    ).first()
     
     if not payment:
         raise HTTPException(status_code=404, detail="Extension payment not found")
@@ -703,14 +727,24 @@ async def verify_extension_payment(
 
     # Call PayChangu verification
     try:
-        client, _ = _get_paychangu_client()
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(None, client.verify_transaction, payment.transaction_id)
+        client = _get_paychangu_client()
+        response = await client.verify_transaction(payment.transaction_id)
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=f"PayChangu client error: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Verification failed: {e}")
 
+    # Lock for the update only; a concurrent verifier or the webhook may have applied it meanwhile
+    db.refresh(payment, with_for_update=True)
+    db.refresh(booking)
+    if (payment.status or "").lower() == "completed":
+        return {
+            "status": "success",
+            "message": "Extension payment already verified",
+            "booking_status": booking.status,
+            "new_end_date": booking.end_date.isoformat() if booking.end_date else None
+        }
+
     # Handle successful extension payment
     if response.get("status") == "success":
         # Update payment status
@@ -724,7 +758,7 @@ async def verify_extension_payment(
         
         if additional_months:
             new_end_date = booking.end_date + relativedelta(months=additional_months)
-            booking.end_date = new_end_date
+            extend_stay(db, booking, new_end_date, payment_id=payment.payment_id)
             booking.status = 'confirmed'
             # Update duration_months to reflect the extension
             booking.duration_months = (booking.duration_months or 0) + additional_months
@@ -871,17 +905,11 @@ async def verify_complete_payment(
     if not transaction_id:
         raise HTTPException(status_code=422, detail="payment_id field is required")
     
-    # Get complete payment record by transaction_id (lock row if supported)
-    payment_query = db.query(PaymentModel).filter(
+    # Get complete payment record by transaction_id; it is locked only after PayChangu answers
+    payment = db.query(PaymentModel).filter(
         PaymentModel.transaction_id == transaction_id,
         PaymentModel.payment_type == "complete"
-    )
-    try:
-        payment_query = payment_query.with_for_update()
-    except Exception:
-        pass
-
-    payment = payment_query.first()
+    ).first()
     
     if not payment:
         raise HTTPException(status_code=404, detail="Complete payment not found")
@@ -913,14 +941,24 @@ async def verify_complete_payment(
     
     # Call PayChangu verification
     try:
-        client, _ = _get_paychangu_client()
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(None, client.verify_transaction, payment.transaction_id)
+        client = _get_paychangu_client()
+        response = await client.verify_transaction(payment.transaction_id)
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=f"PayChangu client error: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Verification failed: {e}")
 
+    # Lock for the update only; a concurrent verifier or the webhook may have applied it meanwhile
+    db.refresh(payment, with_for_update=True)
+    db.refresh(booking)
+    if (payment.status or "").lower() == "completed" or (booking.payment_type or "").lower() == "full":
+        return {
+            "status": "success",
+            "message": "Complete payment already verified",
+            "booking_status": booking.status,
+            "payment_type": booking.payment_type
+        }
+
     # Handle successful complete payment
     if response.get("status") == "success":
         # Update payment status
@@ -929,6 +967,7 @@ async def verify_complete_payment(
         
         # Update booking payment type and status
         booking.payment_type = 'full'
+        assign_unpaid_instalments(db, booking.booking_id, payment.payment_id)
         booking.status = 'confirmed'
         
         # Update total_amount to reflect full payment
@@ -1107,27 +1146,32 @@ async def verify_my_payment(
     
     # Call the existing verify_payment function
     try:
-        client, _ = _get_paychangu_client()
+        client = _get_paychangu_client()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     try:
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(None, client.verify_transaction, payment.transaction_id)
+        response = await client.verify_transaction(payment.transaction_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Verification failed: {e}")
 
+    booking = lock_booking(db, booking.booking_id)
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found or you don't have permission to access it")
+
     # Handle successful payment
     if response.get("status") == "success":
         # Update payment status
         payment.status = 'completed'
         payment.paid_at = datetime.utcnow()
+        reclaim_bed(db, booking)
         booking.status = 'confirmed'
         
         # Handle different payment types
         if payment.payment_type == "complete":
             # Update booking to full payment type and status
             booking.payment_type = 'full'
+            assign_unpaid_instalments(db, booking.booking_id, payment.payment_id)
             booking.status = 'confirmed'
             
             # Update total_amount to reflect full payment
@@ -1223,11 +1267,12 @@ def return_page():
 async def initiate_extension_payment(
     payload: dict,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idem: IdempotencyContext = Depends(idempotent("initiate_extension_payment"))
 ):
     """Initiate payment for booking extension."""
     try:
-        client, Payment = _get_paychangu_client()
+        client = _get_paychangu_client()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1274,6 +1319,10 @@ async def initiate_extension_payment(
     if not hostel:
         raise HTTPException(status_code=404, detail="Hostel associated with room not found")
 
+    # Refuse before taking payment if no bed is free for the longer stay
+    reserve_extension(db, booking, booking.end_date + relativedelta(months=additional_months))
+    db.commit()
+
     # Calculate extension amount
     platform_fee = get_platform_fee(db)
     monthly_rent = room.price_per_month
@@ -1281,7 +1330,7 @@ async def initiate_extension_payment(
 
     tx_ref = f"ext_{booking_id}_{additional_months}_{int(time.time())}_{uuid.uuid4().hex[:6]}"
 
-    payment = Payment(
+    payment = dict(
         amount=float(extension_amount),
         currency=currency,
         email=email,
@@ -1307,9 +1356,7 @@ async def initiate_extension_payment(
     )
 
     try:
-        # Run blocking initiate_transaction in a thread with a timeout
-        future = _paychangu_executor.submit(client.initiate_transaction, payment)
-        response = future.result(timeout=20)
+        response = await client.initiate_transaction(payment)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to contact PayChangu: {e}")
 
@@ -1346,12 +1393,12 @@ async def initiate_extension_payment(
             except Exception:
                 pass
 
-        return JSONResponse({
+        return idem.complete(JSONResponse({
             "payment_url": payment_url,
             "tx_ref": tx_ref,
             "extension_amount": float(extension_amount),
             "additional_months": additional_months
-        })
+        }))
     else:
         error_detail = response.get("message", str(response))
         raise HTTPException(status_code=400, detail=f"PayChangu initiation failed: {error_detail}")
@@ -1361,11 +1408,12 @@ async def initiate_extension_payment(
 async def initiate_complete_payment(
     payload: dict,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idem: IdempotencyContext = Depends(idempotent("initiate_complete_payment"))
 ):
     """Initiate payment for completing booking fee to full payment."""
     try:
-        client, Payment = _get_paychangu_client()
+        client = _get_paychangu_client()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1418,7 +1466,7 @@ async def initiate_complete_payment(
 
     tx_ref = f"complete_{booking_id}_{int(time.time())}_{uuid.uuid4().hex[:6]}"
 
-    payment = Payment(
+    payment = dict(
         amount=float(remaining_amount),
         currency=currency,
         email=email,
@@ -1444,9 +1492,7 @@ async def initiate_complete_payment(
     )
 
     try:
-        # Run blocking initiate_transaction in a thread with a timeout
-        future = _paychangu_executor.submit(client.initiate_transaction, payment)
-        response = future.result(timeout=20)
+        response = await client.initiate_transaction(payment)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to contact PayChangu: {e}")
 
@@ -1483,208 +1529,11 @@ async def initiate_complete_payment(
             except Exception:
                 pass
 
-        return JSONResponse({
+        return idem.complete(JSONResponse({
             "payment_url": payment_url,
             "tx_ref": tx_ref,
             "remaining_amount": float(remaining_amount)
-        })
+        }))
     else:
         error_detail = response.get("message", str(response))
         raise HTTPException(status_code=400, detail=f"PayChangu initiation failed: {error_detail}")
-
-
-@router.post("/verify-stuck-extension-payment/")
-async def verify_stuck_extension_payment(
-    request: Request,
-    background_tasks: BackgroundTasks,
-    current_user=Depends(get_current_user), 
-    db: Session = Depends(get_db)
-):
-    """Verify extension payment when process is stuck - finds payment by booking ID."""
-    # Get request body
-    try:
-        request_body = await request.json()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON in request body")
-    
-    # Get booking_id from request body
-    booking_id = request_body.get("booking_id")
-    if not booking_id:
-        raise HTTPException(status_code=422, detail="booking_id field is required")
-    
-    # Get booking
-    booking = db.query(BookingModel).filter(
-        BookingModel.booking_id == booking_id,
-        BookingModel.student_id == current_user.user_id
-    ).first()
-    
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found or you don't have permission")
-    
-    # Find the most recent extension payment for this booking
-    payment = db.query(PaymentModel).filter(
-        PaymentModel.booking_id == booking_id,
-        PaymentModel.payment_type == "extension"
-    ).order_by(PaymentModel.paid_at.desc().nullslast(), PaymentModel.payment_id.desc()).first()
-    
-    if not payment:
-        raise HTTPException(status_code=404, detail="No extension payment found for this booking")
-    
-    if not payment.transaction_id:
-        raise HTTPException(
-            status_code=400, 
-            detail="Extension payment was not initiated properly. No transaction ID found."
-        )
-    
-    # Call PayChangu verification
-    try:
-        client, _ = _get_paychangu_client()
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(None, client.verify_transaction, payment.transaction_id)
-    except RuntimeError as e:
-        raise HTTPException(status_code=500, detail=f"PayChangu client error: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Verification failed: {e}")
-
-    # Handle successful extension payment
-    if response.get("status") == "success":
-        # Update payment status
-        payment.status = 'completed'
-        payment.paid_at = datetime.utcnow()
-        
-        # Update booking end date and status
-        additional_months = None
-        if payment.meta and isinstance(payment.meta, dict):
-            additional_months = payment.meta.get("additional_months")
-        
-        if additional_months:
-            new_end_date = booking.end_date + relativedelta(months=additional_months)
-            booking.end_date = new_end_date
-            booking.status = 'confirmed'
-            
-            # Update total_amount to include extension payment
-            previous_payments = db.query(PaymentModel).filter(
-                PaymentModel.booking_id == booking.booking_id,
-                PaymentModel.status == 'completed'
-            ).all()
-            
-            previous_total = sum(p.amount for p in previous_payments)
-            new_total_amount = previous_total + payment.amount
-            booking.total_amount = float(new_total_amount)
-        
-        db.add(payment)
-        db.add(booking)
-        
-        try:
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=500, detail=f"Database update failed: {e}")
-        
-        return {
-            "status": "success",
-            "message": "Extension payment verified successfully",
-            "booking_status": booking.status,
-            "new_end_date": booking.end_date.isoformat() if booking.end_date else None
-        }
-    else:
-        return {
-            "status": "failed",
-            "message": "Extension payment verification failed",
-            "response": response
-        }
-
-
-@router.post("/verify-stuck-complete-payment/")
-async def verify_stuck_complete_payment(
-    request: Request,
-    background_tasks: BackgroundTasks,
-    current_user=Depends(get_current_user), 
-    db: Session = Depends(get_db)
-):
-    """Verify complete payment when process is stuck - finds payment by booking ID."""
-    # Get request body
-    try:
-        request_body = await request.json()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON in request body")
-    
-    # Get booking_id from request body
-    booking_id = request_body.get("booking_id")
-    if not booking_id:
-        raise HTTPException(status_code=422, detail="booking_id field is required")
-    
-    # Get booking
-    booking = db.query(BookingModel).filter(
-        BookingModel.booking_id == booking_id,
-        BookingModel.student_id == current_user.user_id
-    ).first()
-    
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found or you don't have permission")
-    
-    # Find the most recent complete payment for this booking
-    payment = db.query(PaymentModel).filter(
-        PaymentModel.booking_id == booking_id,
-        PaymentModel.payment_type == "complete"
-    ).order_by(PaymentModel.paid_at.desc().nullslast(), PaymentModel.payment_id.desc()).first()
-    
-    if not payment:
-        raise HTTPException(status_code=404, detail="No complete payment found for this booking")
-    
-    if not payment.transaction_id:
-        raise HTTPException(
-            status_code=400, 
-            detail="Complete payment was not initiated properly. No transaction ID found."
-        )
-    
-    # Call PayChangu verification
-    try:
-        client, _ = _get_paychangu_client()
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(None, client.verify_transaction, payment.transaction_id)
-    except RuntimeError as e:
-        raise HTTPException(status_code=500, detail=f"PayChangu client error: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Verification failed: {e}")
-
-    # Handle successful complete payment
-    if response.get("status") == "success":
-        # Update payment status
-        payment.status = 'completed'
-        payment.paid_at = datetime.utcnow()
-        
-        # Update booking payment type and status
-        booking.payment_type = 'full'
-        booking.status = 'confirmed'
-        
-        # Update total_amount to reflect full payment
-        try:
-            platform_fee = get_platform_fee(db)
-            original_months = booking.duration_months
-            full_amount = float((booking.room.price_per_month * Decimal(original_months)) + Decimal(str(platform_fee)))
-            booking.total_amount = full_amount
-        except Exception as e:
-            print(f"Error calculating full amount for booking: {e}")
-        
-        db.add(payment)
-        db.add(booking)
-        
-        try:
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=500, detail=f"Database update failed: {e}")
-        
-        return {
-            "status": "success",
-            "message": "Complete payment verified successfully",
-            "booking_status": booking.status,
-            "payment_type": booking.payment_type
-        }
-    else:
-        return {
-            "status": "failed",
-            "message": "Complete payment verification failed",
-            "response": response
-        }
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from database import get_db
 from models import Payment as PaymentModel, Booking as BookingModel, Room, Hostel, User
 from endpoints.config import get_platform_fee
+from endpoints.room_availability import extend_stay
 from email_service import email_service
 from dateutil.relativedelta import relativedelta
 import asyncio
@@ -79,7 +80,7 @@ async def manual_verify_extension(
         
         # Update booking
         booking.status = 'confirmed'
-        booking.end_date = request.new_end_date
+        extend_stay(db, booking, request.new_end_date, payment_id=payment.payment_id)
         
         # Update total amount to include extension payment
         previous_payments = db.query(PaymentModel).filter(
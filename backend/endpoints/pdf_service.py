@@ -11,7 +11,8 @@ from io import BytesIO
 import os
 from datetime import datetime
 from database import get_db
-from models import Booking as BookingModel, Payment, Room, Hostel, User, Configuration
+from models import Booking as BookingModel, Payment, Room, Hostel, User
+from endpoints.config_cache import config_decimal
 from endpoints.users import get_current_user
 from decimal import Decimal
 import uuid
@@ -20,8 +21,7 @@ router = APIRouter(prefix="/pdf", tags=["pdf"])
 
 def get_platform_fee(db: Session) -> Decimal:
     """Get platform fee from configuration"""
-    config = db.query(Configuration).filter(Configuration.config_key == "platform_fee").first()
-    return Decimal(str(config.config_value)) if config else Decimal('0')
+    return config_decimal(db, "platform_fee", Decimal('0'))
 
 @router.get("/booking-receipt/{booking_id}")
 async def generate_booking_receipt(
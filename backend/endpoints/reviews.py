@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from datetime import datetime
 from uuid import UUID
@@ -15,6 +15,8 @@ from models import (
     User,
 )
 from endpoints.users import get_current_user
+from endpoints.hostel_cache import bump_hostel_version
+from endpoints.http_cache import conditional_response, reviews_validators
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
@@ -66,6 +68,7 @@ async def create_or_update_review_for_booking(
         existing.rating = payload.rating
         existing.comment = payload.comment
         existing.updated_at = datetime.utcnow()
+        bump_hostel_version(db, hostel_id)
         db.commit()
         db.refresh(existing)
         return ReviewRead.from_orm(existing)
@@ -77,6 +80,7 @@ async def create_or_update_review_for_booking(
         comment=payload.comment,
     )
     db.add(review)
+    bump_hostel_version(db, hostel_id)
     db.commit()
     db.refresh(review)
     return ReviewRead.from_orm(review)
@@ -85,10 +89,17 @@ async def create_or_update_review_for_booking(
 @router.get("/hostel/{hostel_id}", response_model=list[ReviewRead])
 async def list_reviews_for_hostel(
     hostel_id: UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
 ):
     """Return all reviews for a particular hostel (for future use on hostel detail)."""
 
+    etag, last_modified = reviews_validators(db, hostel_id)
+    not_modified = conditional_response(request, response, etag, last_modified, "hostel_reviews")
+    if not_modified is not None:
+        return not_modified
+
     reviews = db.query(ReviewModel).filter(ReviewModel.hostel_id == hostel_id).order_by(ReviewModel.created_at.desc()).all()
     return [ReviewRead.from_orm(r) for r in reviews]
 
@@ -0,0 +1,360 @@
+"""Per-room availability over booking date ranges.
+
+Every booking has a generated `stay` column (`daterange(start_date,
+end_date, '[)')`) indexed with GiST together with `room_id`. A booking
+that holds a place in a room also holds a bed number; the exclusion
+constraint `bookings_no_double_bed` forbids two overlapping stays on the
+same bed, and beds are only handed out up to the room's capacity, so a
+room can never be booked beyond capacity for any day.
+
+Availability questions ("which rooms have a free bed for these months?")
+are answered with indexed `&&` overlap counts instead of loading bookings.
+
+Admission is serialized per room: `admit_booking` locks the room row,
+expires the room's lapsed holds and picks a bed in the same transaction
+that inserts the booking. A new booking is `pending` with a hold that
+keeps its bed for `BOOKING_HOLD_MINUTES` while payment is in flight; a
+lapsed hold no longer counts against capacity and is turned into
+`expired` (releasing the bed in the constraint) by the next admission on
+that room.
+"""
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+from fastapi import HTTPException
+from sqlalchemy import and_, bindparam, func, or_, select, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from models import Booking, Hostel, Payment, Room
+from endpoints.hostel_catalog import approved_landlord_clause
+from endpoints.payment_schedule import extend_schedule
+
+logger = logging.getLogger('room_availability')
+
+# Bookings in these states no longer hold a bed
+RELEASED_BOOKING_STATUSES = ('rejected', 'cancelled', 'payment_failed', 'expired')
+
+MAX_AVAILABILITY_MONTHS = 24
+
+BOOKING_HOLD_MINUTES = int(os.getenv("BOOKING_HOLD_MINUTES", "30"))
+# Give up waiting for a contended room quickly instead of piling up requests
+ADMISSION_LOCK_TIMEOUT_MS = int(os.getenv("BOOKING_ADMISSION_LOCK_TIMEOUT_MS", "3000"))
+
+
+def stay_range(start: date, end: date):
+    """SQL half-open date range `[start, end)`."""
+    return func.daterange(start, end, '[)')
+
+
+def stay_end(start: date, months: int) -> date:
+    return start + relativedelta(months=months)
+
+
+def hold_deadline() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(minutes=BOOKING_HOLD_MINUTES)
+
+
+def holds_bed():
+    """Filter clause: the booking currently occupies (or reserves) a bed."""
+    return and_(
+        Booking.status.notin_(RELEASED_BOOKING_STATUSES),
+        or_(
+            Booking.status != 'pending',
+            Booking.hold_expires_at.is_(None),
+            Booking.hold_expires_at > func.now(),
+        ),
+    )
+
+
+def overlapping_bookings(start: date, end: date):
+    return [holds_bed(), Booking.stay.op('&&')(stay_range(start, end))]
+
+
+def find_free_bed(db: Session, room: Room, start: date, end: date, exclude_booking_id=None) -> Optional[int]:
+    """Lowest bed number of `room` that is free for the whole `[start, end)`, or None.
+
+    Bookings without a bed number (created before bed tracking) still count
+    against capacity.
+    """
+    query = db.query(Booking.bed_number).filter(
+        Booking.room_id == room.room_id,
+        *overlapping_bookings(start, end),
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.booking_id != exclude_booking_id)
+
+    return pick_free_bed([row.bed_number for row in query.all()], room.capacity or 0)
+
+
+def pick_free_bed(taken: List[Optional[int]], capacity: int) -> Optional[int]:
+    """Lowest bed in `1..capacity` not in `taken`, or None when the room is full.
+
+    `taken` has one entry per overlapping booking; a bed can appear more
+    than once (back-to-back stays). Each `None` (legacy booking without a
+    bed) takes up one bed, like `_taken_beds` counts them in SQL.
+    """
+    used_beds = {bed for bed in taken if bed is not None}
+    unassigned = sum(1 for bed in taken if bed is None)
+    free_beds = [bed for bed in range(1, capacity + 1) if bed not in used_beds]
+    if len(free_beds) <= unassigned:
+        return None
+    return free_beds[0]
+
+
+def extension_bed(db: Session, room: Room, booking: Booking, new_end_date: date) -> Optional[int]:
+    """Bed `booking` can use if its stay ran to `new_end_date`, or None when the room is full.
+
+    Keeps the current bed when it is still free for the longer stay.
+    """
+    bed = find_free_bed(db, room, booking.start_date, new_end_date, exclude_booking_id=booking.booking_id)
+    if booking.bed_number is not None and bed is not None:
+        current_free = db.query(Booking.booking_id).filter(
+            Booking.room_id == room.room_id,
+            Booking.bed_number == booking.bed_number,
+            Booking.booking_id != booking.booking_id,
+            *overlapping_bookings(booking.start_date, new_end_date),
+        ).first() is None
+        if current_free:
+            bed = booking.bed_number
+    return bed
+
+
+def reserve_extension(db: Session, booking: Booking, new_end_date: date) -> int:
+    """Lock the booking's room and return the bed it keeps for the extended stay.
+
+    Raises 409 when no bed is free for the whole new range, so extensions
+    are refused before the student pays. The room lock is held until the
+    caller commits or rolls back.
+    """
+    room = lock_room(db, booking.room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room associated with booking not found")
+    release_expired_holds(db, room.room_id)
+    bed = extension_bed(db, room, booking, new_end_date)
+    if bed is None:
+        raise HTTPException(status_code=409, detail="No bed in this room is free for the extended stay")
+    return bed
+
+
+def extend_stay(db: Session, booking: Booking, new_end_date: date, payment_id=None) -> None:
+    """Move a booking's end date, keeping it on a bed that is free for the longer stay.
+
+    Availability is checked when the extension is initiated; if the room
+    filled up before the payment landed this raises 409 and leaves the
+    booking unchanged. The added months are appended to the payment
+    schedule, covered by `payment_id`.
+    """
+    bed = reserve_extension(db, booking, new_end_date)
+    extend_schedule(db, booking, new_end_date, payment_id)
+    booking.bed_number = bed
+    booking.end_date = new_end_date
+
+
+def release_expired_holds(db: Session, room_id) -> int:
+    """Expire the room's pending bookings whose hold has lapsed, and their pending payments.
+
+    Must run before a bed is handed out again so the exclusion constraint
+    no longer sees the lapsed booking.
+    """
+    expired = db.execute(
+        update(Booking)
+        .where(
+            Booking.room_id == room_id,
+            Booking.status == 'pending',
+            Booking.hold_expires_at <= func.now(),
+        )
+        .values(status='expired')
+        .returning(Booking.booking_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if expired:
+        db.execute(
+            update(Payment)
+            .where(Payment.booking_id.in_(expired), Payment.status == 'pending')
+            .values(status='expired')
+            .execution_options(synchronize_session=False)
+        )
+    return len(expired)
+
+
+def lock_room(db: Session, room_id) -> Optional[Room]:
+    """`SELECT ... FOR UPDATE` the room, waiting at most `ADMISSION_LOCK_TIMEOUT_MS`.
+
+    Raises 503 with `Retry-After` when the room stays locked by other
+    admissions for longer than that.
+    """
+    try:
+        db.execute(
+            text("SELECT set_config('lock_timeout', :timeout, true)"),
+            {"timeout": f"{ADMISSION_LOCK_TIMEOUT_MS}ms"},
+        )
+        return db.query(Room).filter(Room.room_id == room_id).with_for_update().first()
+    except OperationalError:
+        db.rollback()
+        raise HTTPException(
+            status_code=503,
+            detail="Room is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+
+def admit_booking(db: Session, room_id, start: date, end: date) -> Tuple[Optional[Room], Optional[int]]:
+    """Lock the room and pick a bed free for `[start, end)`.
+
+    Returns `(room, bed_number)`; `room` is None if it does not exist and
+    `bed_number` is None when the room is full. The row lock is held until
+    the caller commits, so the booking must be inserted in the same
+    transaction.
+    """
+    room = lock_room(db, room_id)
+    if room is None:
+        return None, None
+    release_expired_holds(db, room.room_id)
+    return room, find_free_bed(db, room, start, end)
+
+
+def lock_booking(db: Session, booking_id) -> Optional[Booking]:
+    """Lock a booking before deciding what a payment does to it.
+
+    Takes the room lock first (the order admissions use), expires the
+    room's lapsed holds, then re-reads the booking `FOR UPDATE`, so the
+    returned status is current and cannot change until the caller commits.
+    """
+    room_id = db.query(Booking.room_id).filter(Booking.booking_id == booking_id).scalar()
+    if room_id is None:
+        return None
+    if lock_room(db, room_id) is not None:
+        release_expired_holds(db, room_id)
+    return db.query(Booking).filter(
+        Booking.booking_id == booking_id
+    ).populate_existing().with_for_update().first()
+
+
+def _take_free_bed(db: Session, booking: Booking) -> Optional[int]:
+    """Lock the room, expire its lapsed holds and return a bed free for the booking's stay."""
+    room = lock_room(db, booking.room_id)
+    if room is None:
+        return None
+    release_expired_holds(db, room.room_id)
+    return find_free_bed(db, room, booking.start_date, booking.end_date, exclude_booking_id=booking.booking_id)
+
+
+def renew_hold(db: Session, booking: Booking) -> None:
+    """Restart the hold of an unpaid booking before sending the student to checkout.
+
+    An expired booking gets a bed again if one is still free; raises 409
+    when the room filled up meanwhile, so no payment is taken for it. The
+    caller must hold the booking lock (`lock_booking`).
+    """
+    if booking.status == 'expired':
+        bed = _take_free_bed(db, booking)
+        if bed is None:
+            raise HTTPException(status_code=409, detail="This booking has expired and the room is now full")
+        booking.bed_number = bed
+        booking.status = 'pending'
+    if booking.status == 'pending':
+        booking.hold_expires_at = hold_deadline()
+
+
+def reclaim_bed(db: Session, booking: Booking) -> None:
+    """Give an expired booking a bed again before it is confirmed.
+
+    A payment can still land after the booking's hold lapsed. The booking
+    gets any bed free for its stay; when the room filled up in the
+    meantime this raises 409 and nothing is confirmed, leaving the payment
+    for an admin to refund. The caller must hold the booking lock
+    (`lock_booking`).
+    """
+    if booking.status != 'expired':
+        return
+    bed = _take_free_bed(db, booking)
+    if bed is None:
+        logger.error("No free bed in room %s for late-paid booking %s", booking.room_id, booking.booking_id)
+        raise HTTPException(status_code=409, detail="This booking expired before payment and the room is now full")
+    booking.bed_number = bed
+    booking.hold_expires_at = None
+
+
+def _taken_beds(start: date, end: date):
+    """Correlated count of beds of the outer `Room` that are held on any day of `[start, end)`.
+
+    Distinct bed numbers, plus one per legacy booking without a bed.
+    """
+    taken = (
+        func.count(func.distinct(Booking.bed_number))
+        + func.count(Booking.booking_id).filter(Booking.bed_number.is_(None))
+    )
+    return select(taken).where(
+        Booking.room_id == Room.room_id,
+        *overlapping_bookings(start, end),
+    ).correlate(Room).scalar_subquery()
+
+
+def available_rooms_query(db: Session, start: date, end: date):
+    """Rooms with at least one bed free for the whole stay, with a `free_beds` column."""
+    free_beds = (Room.capacity - _taken_beds(start, end)).label("free_beds")
+    return db.query(Room, free_beds).filter(
+        Room.is_available == True,
+        (Room.availability_start_date.is_(None)) | (Room.availability_start_date <= start),
+        (Room.availability_end_date.is_(None)) | (Room.availability_end_date >= end),
+        free_beds > 0,
+    )
+
+
+def get_available_rooms(db: Session, hostel_id, start: date, months: int) -> List[tuple]:
+    """`(room, free_beds)` for a hostel's rooms free for `months` from `start`."""
+    end = stay_end(start, months)
+    return available_rooms_query(db, start, end).filter(
+        Room.hostel_id == hostel_id
+    ).order_by(Room.price_per_month, Room.room_number).all()
+
+
+def search_available_rooms(db: Session, start: date, months: int, clauses: list, limit: int) -> List[tuple]:
+    """`(room, free_beds, hostel)` across catalog hostels, cheapest first.
+
+    `clauses` are extra filters on `Hostel` (e.g. from `hostel_search.search_filters`).
+    """
+    end = stay_end(start, months)
+    return available_rooms_query(db, start, end).join(
+        Hostel, Hostel.hostel_id == Room.hostel_id
+    ).add_columns(Hostel).filter(
+        Hostel.is_active == True,
+        approved_landlord_clause(),
+        *clauses,
+    ).order_by(Room.price_per_month, Room.room_id).limit(limit).all()
+
+
+_CALENDAR_SQL = text("""
+SELECT m.month_start::date AS month_start,
+       r.capacity
+         - COUNT(DISTINCT b.bed_number)
+         - COUNT(b.booking_id) FILTER (WHERE b.bed_number IS NULL) AS free_beds
+FROM rooms r
+CROSS JOIN generate_series(CAST(:start AS date), CAST(:start AS date) + (:months - 1) * INTERVAL '1 month', INTERVAL '1 month') AS m(month_start)
+LEFT JOIN bookings b
+       ON b.room_id = r.room_id
+      AND b.status NOT IN :released
+      AND NOT (b.status = 'pending' AND b.hold_expires_at <= now())
+      AND b.stay && daterange(m.month_start::date, (m.month_start + INTERVAL '1 month')::date, '[)')
+WHERE r.room_id = :room_id
+GROUP BY m.month_start, r.capacity
+ORDER BY m.month_start
+""").bindparams(bindparam("released", expanding=True))
+
+
+def room_calendar(db: Session, room: Room, start: date, months: int) -> List[dict]:
+    """Free beds per month for `months` months from `start` (a bed counts as taken if booked any day of the month)."""
+    rows = db.execute(_CALENDAR_SQL, {
+        "start": start,
+        "months": months,
+        "room_id": room.room_id,
+        "released": list(RELEASED_BOOKING_STATUSES),
+    }).all()
+    return [
+        {"month": row.month_start.isoformat(), "free_beds": max(int(row.free_beds), 0)}
+        for row in rows
+    ]
@@ -1,6 +1,6 @@
 import os
 import shutil
-from fastapi import Depends, HTTPException, Form, Query, status, UploadFile, File
+from fastapi import Depends, HTTPException, Form, Query, Request, Response, status, UploadFile, File
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from models import (
@@ -8,7 +8,18 @@ from models import (
     RoomCreate, RoomUpdate, RoomRead, Media
 )
 from database import get_db
+from endpoints.hostel_cache import bump_hostel_version
+from endpoints.http_cache import conditional_response, rooms_validators
+from endpoints.hostel_search import search_filters
+from endpoints.room_availability import (
+    get_available_rooms as query_available_rooms,
+    search_available_rooms as query_available_rooms_across_hostels,
+    room_calendar,
+    stay_end,
+    MAX_AVAILABILITY_MONTHS,
+)
 import uuid
+from datetime import date
 from typing import Optional
 
 
@@ -92,6 +103,7 @@ async def create_room(
     
     # Update the hostel's room count
     hostel.total_rooms += 1
+    bump_hostel_version(db, hostel.hostel_id)
     
     # Handle image upload if provided
     if image:
@@ -144,9 +156,50 @@ async def create_room(
             detail=f"Error saving room: {str(e)}"
         )
 
+def _room_image_urls(db: Session, room_ids: list) -> dict:
+    """Map room_id -> image URL for the given rooms in a single query."""
+    images = {}
+    if room_ids:
+        media_list = db.query(Media).filter(
+            Media.room_id.in_(room_ids),
+            Media.media_type == 'image'
+        ).all()
+        
+        # Create a mapping of room_id to image URL
+        for media in media_list:
+            room_id_str = str(media.room_id)
+            clean_url = media.url.replace('\\', '/')
+            if not clean_url.startswith('uploads/'):
+                clean_url = f'uploads/{clean_url}'
+            images[room_id_str] = f"/{clean_url}"
+    return images
+
+
+def _room_payload(room: Room, booking_fee, image_url: Optional[str]) -> dict:
+    return {
+        'room_id': str(room.room_id),
+        'hostel_id': str(room.hostel_id),
+        'room_number': room.room_number,
+        'type': room.type,
+        'capacity': room.capacity,
+        'occupants': room.occupants,
+        'price_per_month': float(room.price_per_month),
+        'booking_fee': float(booking_fee) if booking_fee is not None else None,
+        'availability_start_date': room.availability_start_date.isoformat() if room.availability_start_date else None,
+        'availability_end_date': room.availability_end_date.isoformat() if room.availability_end_date else None,
+        'configuration': room.configuration,
+        'is_available': room.is_available,
+        'created_at': room.created_at.isoformat(),
+        'updated_at': room.updated_at.isoformat(),
+        'image_url': image_url
+    }
+
+
 def get_hostel_rooms(
     hostel_id: str = Query(...),
     user_type: Optional[str] = Query(None),
+    request: Request = None,
+    response: Response = None,
     db: Session = Depends(get_db)
 ):
     """Get all available rooms for a specific hostel with their images."""
@@ -161,6 +214,11 @@ def get_hostel_rooms(
     if not hostel:
         raise HTTPException(status_code=404, detail="Hostel not found")
     
+    etag, last_modified = rooms_validators(db, hostel_uuid, user_type == 'student')
+    not_modified = conditional_response(request, response, etag, last_modified, "hostel_rooms")
+    if not_modified is not None:
+        return not_modified
+    
     # Base query for rooms
     query = db.query(Room).filter(Room.hostel_id == hostel_uuid)
     
@@ -170,48 +228,11 @@ def get_hostel_rooms(
     
     rooms = query.all()
     
-    # Get all room IDs
-    room_ids = [str(room.room_id) for room in rooms]
-    
-    # Get all images for these rooms in a single query
-    images = {}
-    if room_ids:
-        media_list = db.query(Media).filter(
-            Media.room_id.in_(room_ids),
-            Media.media_type == 'image'
-        ).all()
-        
-        # Create a mapping of room_id to image URL
-        for media in media_list:
-            room_id_str = str(media.room_id)
-            clean_url = media.url.replace('\\', '/')
-            if not clean_url.startswith('uploads/'):
-                clean_url = f'uploads/{clean_url}'
-            images[room_id_str] = f"/{clean_url}"
-
-    # Add image URLs to each room
-    result = []
-    for room in rooms:
-        room_data = {
-            'room_id': str(room.room_id),
-            'hostel_id': str(room.hostel_id),
-            'room_number': room.room_number,
-            'type': room.type,
-            'capacity': room.capacity,
-            'occupants': room.occupants,
-            'price_per_month': float(room.price_per_month),
-            'booking_fee': float(hostel.booking_fee) if hostel.booking_fee is not None else None,
-            'availability_start_date': room.availability_start_date.isoformat() if room.availability_start_date else None,
-            'availability_end_date': room.availability_end_date.isoformat() if room.availability_end_date else None,
-            'configuration': room.configuration,
-            'is_available': room.is_available,
-            'created_at': room.created_at.isoformat(),
-            'updated_at': room.updated_at.isoformat(),
-            'image_url': images.get(str(room.room_id))
-        }
-        result.append(room_data)
-    
-    return result
+    image_urls = _room_image_urls(db, [room.room_id for room in rooms])
+    return [
+        _room_payload(room, hostel.booking_fee, image_urls.get(str(room.room_id)))
+        for room in rooms
+    ]
 
 def get_room(room_id: str, db: Session = Depends(get_db)):
     """Get a specific room by ID with its image."""
@@ -240,6 +261,99 @@ def get_room(room_id: str, db: Session = Depends(get_db)):
     return room_data
 
 
+def get_available_rooms(
+    hostel_id: str = Query(...),
+    from_date: date = Query(..., alias="from", description="Move-in date (YYYY-MM-DD)"),
+    months: int = Query(1, ge=1, le=MAX_AVAILABILITY_MONTHS),
+    db: Session = Depends(get_db)
+):
+    """Rooms of a hostel with a bed free for the whole stay, cheapest first.
+
+    Each room carries `free_beds` for the requested period.
+    """
+    try:
+        hostel_uuid = uuid.UUID(hostel_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid hostel ID format")
+
+    hostel = db.query(Hostel).filter(Hostel.hostel_id == hostel_uuid).first()
+    if not hostel:
+        raise HTTPException(status_code=404, detail="Hostel not found")
+
+    rows = query_available_rooms(db, hostel_uuid, from_date, months)
+    image_urls = _room_image_urls(db, [room.room_id for room, _ in rows])
+    rooms = []
+    for room, free_beds in rows:
+        payload = _room_payload(room, hostel.booking_fee, image_urls.get(str(room.room_id)))
+        payload['free_beds'] = int(free_beds)
+        rooms.append(payload)
+
+    return {
+        "hostel_id": str(hostel_uuid),
+        "from": from_date.isoformat(),
+        "to": stay_end(from_date, months).isoformat(),
+        "months": months,
+        "rooms": rooms,
+    }
+
+
+def search_available_rooms(
+    from_date: date = Query(..., alias="from", description="Move-in date (YYYY-MM-DD)"),
+    months: int = Query(1, ge=1, le=MAX_AVAILABILITY_MONTHS),
+    district: Optional[str] = Query(None),
+    university: Optional[str] = Query(None),
+    type: Optional[str] = Query(None, description="Hostel type"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum room price per month"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """Rooms with a free bed for the whole stay across all catalog hostels, cheapest first."""
+    clauses = search_filters(district=district, university=university, hostel_type=type)
+    if max_price is not None:
+        clauses.append(Room.price_per_month <= max_price)
+
+    rows = query_available_rooms_across_hostels(db, from_date, months, clauses, limit)
+    image_urls = _room_image_urls(db, [room.room_id for room, _, _ in rows])
+    rooms = []
+    for room, free_beds, hostel in rows:
+        payload = _room_payload(room, hostel.booking_fee, image_urls.get(str(room.room_id)))
+        payload['free_beds'] = int(free_beds)
+        payload['hostel_name'] = hostel.name
+        payload['district'] = hostel.district
+        payload['university'] = hostel.university
+        rooms.append(payload)
+
+    return {
+        "from": from_date.isoformat(),
+        "to": stay_end(from_date, months).isoformat(),
+        "months": months,
+        "rooms": rooms,
+    }
+
+
+def get_room_calendar(
+    room_id: str,
+    from_date: date = Query(..., alias="from", description="First month shown (YYYY-MM-DD)"),
+    months: int = Query(6, ge=1, le=MAX_AVAILABILITY_MONTHS),
+    db: Session = Depends(get_db)
+):
+    """Free beds per month for a room."""
+    try:
+        room_uuid = uuid.UUID(room_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid room ID format")
+
+    room = db.query(Room).filter(Room.room_id == room_uuid).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+    return {
+        "room_id": str(room.room_id),
+        "capacity": room.capacity,
+        "months": room_calendar(db, room, from_date, months),
+    }
+
+
 async def update_room(
     room_id: str,
     room_number: str = Form(None),
@@ -346,6 +460,7 @@ async def update_room(
         db.add(media)
     
     room.updated_at = func.now()
+    bump_hostel_version(db, room.hostel_id)
     db.commit()
     db.refresh(room)
     
@@ -392,6 +507,7 @@ def delete_room(room_id: str, db: Session = Depends(get_db)):
     # Update the hostel's room count if the hostel exists
     if hostel and hostel.total_rooms > 0:
         hostel.total_rooms -= 1
+    bump_hostel_version(db, room.hostel_id)
     
     db.commit()
     
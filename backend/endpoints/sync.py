@@ -0,0 +1,255 @@
+"""Delta sync for the mobile apps.
+
+`GET /sync?cursor=...` returns the hostels, rooms, media, bookings and
+notifications that were created, updated or deleted since the cursor, as
+seen by the caller. Without a cursor it returns only a fresh cursor and
+`reset: true`; the client then loads its lists once through the regular
+endpoints and keeps them current with `/sync` from there on.
+"""
+import base64
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import Booking, ChangeLog, Hostel, Media, Notification, Room, User
+from endpoints.users import get_current_user
+from endpoints.change_log import CHANGE_LOG_RETENTION_DAYS, TRACKED_TABLES, visible_horizon
+from endpoints.hostel_catalog import approved_landlord_clause, build_catalog
+from endpoints.hostel_cache import serialize_media
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+DEFAULT_SYNC_PAGE_SIZE = 200
+MAX_SYNC_PAGE_SIZE = 1000
+
+# Catalog entities are visible to everyone; bookings and notifications only to their owners
+PUBLIC_ENTITIES = ("hostel", "room", "media")
+
+# Cursors older than this cannot be served from the pruned change log
+_CURSOR_MAX_AGE_SECONDS = CHANGE_LOG_RETENTION_DAYS * 86400 - 3600
+
+
+def encode_sync_cursor(txid: int, change_id: int) -> str:
+    payload = {"t": txid, "c": change_id, "s": int(time.time())}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor: str) -> Tuple[int, int, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(payload["t"]), int(payload["c"]), int(payload["s"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _reset_response(horizon: int) -> dict:
+    return {"reset": True, "changes": {}, "next_cursor": encode_sync_cursor(horizon, 0), "has_more": False}
+
+
+def _compact(rows: List[ChangeLog]) -> Dict[str, "OrderedDict"]:
+    """Collapse a page of changes to one action per entity: created, updated or deleted."""
+    ops: Dict[str, "OrderedDict"] = {entity: OrderedDict() for entity in TRACKED_TABLES.values()}
+    for row in rows:
+        ops[row.entity].setdefault(row.entity_id, []).append(row.op)
+
+    actions: Dict[str, "OrderedDict"] = {}
+    for entity, by_id in ops.items():
+        actions[entity] = OrderedDict()
+        for entity_id, entity_ops in by_id.items():
+            if entity_ops[-1] == "D":
+                actions[entity][entity_id] = "deleted"
+            elif "I" in entity_ops:
+                actions[entity][entity_id] = "created"
+            else:
+                actions[entity][entity_id] = "updated"
+    return actions
+
+
+def _visible_hostel_ids(db: Session, hostel_ids: List, user: User) -> set:
+    """Hostels the caller may see: the public catalog plus a landlord's own hostels."""
+    if not hostel_ids:
+        return set()
+    rows = db.query(Hostel.hostel_id).filter(
+        Hostel.hostel_id.in_(hostel_ids),
+        or_(
+            and_(Hostel.is_active == True, approved_landlord_clause()),
+            Hostel.landlord_id == user.user_id,
+        ),
+    ).all()
+    return {row.hostel_id for row in rows}
+
+
+def _serialize_room(room: Room) -> dict:
+    return {
+        "room_id": str(room.room_id),
+        "hostel_id": str(room.hostel_id),
+        "room_number": room.room_number,
+        "type": room.type,
+        "capacity": room.capacity,
+        "occupants": room.occupants,
+        "price_per_month": float(room.price_per_month) if room.price_per_month is not None else None,
+        "availability_start_date": room.availability_start_date.isoformat() if room.availability_start_date else None,
+        "availability_end_date": room.availability_end_date.isoformat() if room.availability_end_date else None,
+        "configuration": room.configuration,
+        "is_available": room.is_available,
+        "updated_at": room.updated_at,
+    }
+
+
+def _serialize_booking(booking: Booking, hostel_id) -> dict:
+    return {
+        "booking_id": str(booking.booking_id),
+        "student_id": str(booking.student_id),
+        "room_id": str(booking.room_id),
+        "hostel_id": str(hostel_id) if hostel_id else None,
+        "start_date": booking.start_date.isoformat() if booking.start_date else None,
+        "end_date": booking.end_date.isoformat() if booking.end_date else None,
+        "duration_months": booking.duration_months,
+        "status": booking.status,
+        "payment_type": booking.payment_type,
+        "total_amount": float(booking.total_amount) if booking.total_amount is not None else None,
+        "created_at": booking.created_at,
+    }
+
+
+def _serialize_notification(notification: Notification) -> dict:
+    return {
+        "notification_id": str(notification.notification_id),
+        "type": notification.type,
+        "title": notification.title,
+        "body": notification.body,
+        "data": notification.data or {},
+        "is_read": notification.is_read,
+        "created_at": notification.created_at,
+    }
+
+
+def _load_current(db: Session, entity: str, ids: List, user: User) -> Dict:
+    """Return `{entity_id: payload}` for entities that still exist and the caller may see."""
+    if not ids:
+        return {}
+
+    if entity == "hostel":
+        visible = list(_visible_hostel_ids(db, ids, user))
+        if not visible:
+            return {}
+        rows = db.query(
+            Hostel.hostel_id, Hostel.cache_version, Hostel.landlord_id, Hostel.created_at
+        ).filter(Hostel.hostel_id.in_(visible)).all()
+        return {item["hostel_id"]: item for item in build_catalog(db, rows)}
+
+    if entity == "room":
+        rooms = db.query(Room).filter(Room.room_id.in_(ids)).all()
+        visible = _visible_hostel_ids(db, list({r.hostel_id for r in rooms}), user)
+        return {str(r.room_id): _serialize_room(r) for r in rooms if r.hostel_id in visible}
+
+    if entity == "media":
+        media_files = db.query(Media, Room.hostel_id.label("room_hostel_id")).outerjoin(
+            Room, Room.room_id == Media.room_id
+        ).filter(Media.media_id.in_(ids)).all()
+        owners = {m.media_id: m.hostel_id or room_hostel_id for m, room_hostel_id in media_files}
+        visible = _visible_hostel_ids(db, list({h for h in owners.values() if h}), user)
+        result = {}
+        for m, _ in media_files:
+            if owners[m.media_id] in visible:
+                payload = serialize_media(m)
+                payload["hostel_id"] = str(owners[m.media_id])
+                payload["room_id"] = str(m.room_id) if m.room_id else None
+                result[str(m.media_id)] = payload
+        return result
+
+    if entity == "booking":
+        rows = db.query(Booking, Hostel.hostel_id, Hostel.landlord_id).join(
+            Room, Room.room_id == Booking.room_id
+        ).join(
+            Hostel, Hostel.hostel_id == Room.hostel_id
+        ).filter(
+            Booking.booking_id.in_(ids),
+            or_(Booking.student_id == user.user_id, Hostel.landlord_id == user.user_id),
+        ).all()
+        return {str(b.booking_id): _serialize_booking(b, hostel_id) for b, hostel_id, _ in rows}
+
+    notifications = db.query(Notification).filter(
+        Notification.notification_id.in_(ids),
+        Notification.user_id == user.user_id,
+    ).all()
+    return {str(n.notification_id): _serialize_notification(n) for n in notifications}
+
+
+@router.get("")
+def sync_changes(
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous sync; omit on first launch"),
+    limit: int = Query(DEFAULT_SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Return changes visible to the caller since `cursor`.
+
+    Response: `{"reset", "changes", "next_cursor", "has_more"}` where
+    `changes` maps `hostels`/`rooms`/`media`/`bookings`/`notifications` to
+    `{"created": [...], "updated": [...], "deleted": [ids]}` (empty groups
+    are omitted). `reset: true` means the client must reload its lists and
+    continue from `next_cursor`.
+    """
+    horizon = visible_horizon(db)
+    if not cursor:
+        return _reset_response(horizon)
+
+    txid, change_id, issued_at = decode_sync_cursor(cursor)
+    if time.time() - issued_at > _CURSOR_MAX_AGE_SECONDS:
+        return _reset_response(horizon)
+
+    rows = db.query(ChangeLog).filter(
+        tuple_(ChangeLog.txid, ChangeLog.change_id) > tuple_(txid, change_id),
+        ChangeLog.txid < horizon,
+        or_(
+            ChangeLog.entity.in_(PUBLIC_ENTITIES),
+            ChangeLog.user_id == current_user.user_id,
+            ChangeLog.landlord_id == current_user.user_id,
+        ),
+    ).order_by(ChangeLog.txid, ChangeLog.change_id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    position = (txid, change_id)
+    if rows:
+        position = (rows[-1].txid, rows[-1].change_id)
+    if not has_more:
+        # Everything below the horizon has been read; skip past other users' rows too
+        position = max(position, (horizon, 0))
+
+    changes = {}
+    for entity, actions in _compact(rows).items():
+        if not actions:
+            continue
+        live_ids = [entity_id for entity_id, action in actions.items() if action != "deleted"]
+        current = _load_current(db, entity, live_ids, current_user)
+
+        group = {"created": [], "updated": [], "deleted": []}
+        for entity_id, action in actions.items():
+            payload = current.get(str(entity_id))
+            if action == "deleted" or payload is None:
+                # Gone, or no longer visible to this caller (e.g. hostel deactivated)
+                if action != "created":
+                    group["deleted"].append(str(entity_id))
+                continue
+            group[action].append(payload)
+
+        key = entity if entity == "media" else f"{entity}s"
+        changes[key] = {name: values for name, values in group.items() if values}
+
+    return {
+        "reset": False,
+        "changes": {k: v for k, v in changes.items() if v},
+        "next_cursor": encode_sync_cursor(*position),
+        "has_more": has_more,
+    }
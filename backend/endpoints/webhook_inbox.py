@@ -0,0 +1,250 @@
+"""Durable inbox for payment-provider webhooks.
+
+The webhook endpoint only checks the signature, stores the event in
+`webhook_events` and answers 2xx. Each `(provider, tx_ref, event_type)` is
+stored once, so provider retries are absorbed by the unique constraint. A
+redelivery of an event still waiting for a retry makes it due at once, and
+a redelivery of a dead-lettered event puts it back in the queue.
+
+`run_webhook_workers(handler)` starts `WEBHOOK_WORKERS` tasks per app
+process. Each claims one due event at a time (`FOR UPDATE SKIP LOCKED`,
+leased for `WEBHOOK_LEASE_SECONDS` so a crashed worker's event is picked
+up again) and awaits `handler(event)`:
+
+- handler returns: the event is `processed`;
+- handler raises: the event is retried with jittered exponential backoff,
+  and after `WEBHOOK_MAX_ATTEMPTS` it is `dead` (listed and requeued via
+  `/admin/webhook-events`).
+
+Handlers must be idempotent; an event can be delivered to them more than
+once when a lease expires.
+"""
+import asyncio
+import logging
+import os
+import random
+from typing import Awaitable, Callable, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from database import db_session, get_db
+from models import User, WebhookEvent
+from endpoints.admin import require_admin_user
+
+logger = logging.getLogger('webhook_inbox')
+
+router = APIRouter(prefix="/admin/webhook-events", tags=["admin"])
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "2"))
+WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", "120"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "5"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "3600"))
+
+_ENQUEUE_SQL = text("""
+INSERT INTO webhook_events (provider, tx_ref, event_type, payload)
+VALUES (:provider, :tx_ref, :event_type, CAST(:payload AS JSONB))
+ON CONFLICT (provider, tx_ref, event_type) DO UPDATE
+SET status = 'pending',
+    attempts = CASE WHEN webhook_events.status = 'dead' THEN 0 ELSE webhook_events.attempts END,
+    next_attempt_at = now(),
+    last_error = CASE WHEN webhook_events.status = 'dead' THEN NULL ELSE webhook_events.last_error END,
+    payload = EXCLUDED.payload
+WHERE webhook_events.status IN ('pending', 'dead')
+RETURNING event_id
+""")
+
+_CLAIM_SQL = text("""
+WITH due AS (
+    SELECT event_id FROM webhook_events
+    WHERE (status = 'pending' AND next_attempt_at <= now())
+       OR (status = 'processing' AND locked_until < now())
+    ORDER BY next_attempt_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE webhook_events e
+SET status = 'processing',
+    attempts = e.attempts + 1,
+    locked_until = now() + make_interval(secs => :lease)
+FROM due
+WHERE e.event_id = due.event_id
+RETURNING e.event_id, e.provider, e.tx_ref, e.event_type, e.payload, e.attempts
+""")
+
+_DONE_SQL = text("""
+UPDATE webhook_events
+SET status = 'processed', processed_at = now(), locked_until = NULL, last_error = NULL
+WHERE event_id = :event_id
+""")
+
+_FAIL_SQL = text("""
+UPDATE webhook_events
+SET status = CASE WHEN attempts >= :max_attempts THEN 'dead' ELSE 'pending' END,
+    next_attempt_at = now() + make_interval(secs => :delay),
+    locked_until = NULL,
+    last_error = :error
+WHERE event_id = :event_id
+RETURNING status
+""")
+
+# Set when this process enqueues an event so idle workers pick it up without waiting for the poll
+_wakeup: Optional[asyncio.Event] = None
+
+
+def enqueue_event(db: Session, provider: str, tx_ref: str, event_type: str, payload_json: str) -> bool:
+    """Store an event; returns False if it is already being processed or was processed."""
+    inserted = db.execute(_ENQUEUE_SQL, {
+        "provider": provider,
+        "tx_ref": tx_ref,
+        "event_type": event_type,
+        "payload": payload_json,
+    }).first()
+    db.commit()
+    if inserted and _wakeup is not None:
+        _wakeup.set()
+    return inserted is not None
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped at `WEBHOOK_RETRY_MAX_SECONDS`."""
+    ceiling = min(WEBHOOK_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), WEBHOOK_RETRY_MAX_SECONDS)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def _claim() -> Optional[dict]:
+    with db_session() as db:
+        row = db.execute(_CLAIM_SQL, {"lease": WEBHOOK_LEASE_SECONDS}).mappings().first()
+        db.commit()
+        return dict(row) if row else None
+
+
+def _mark_done(event_id) -> None:
+    with db_session() as db:
+        db.execute(_DONE_SQL, {"event_id": event_id})
+        db.commit()
+
+
+def _mark_failed(event_id, attempts: int, error: str) -> str:
+    with db_session() as db:
+        new_status = db.execute(_FAIL_SQL, {
+            "event_id": event_id,
+            "max_attempts": WEBHOOK_MAX_ATTEMPTS,
+            "delay": retry_delay(attempts),
+            "error": error[:2000],
+        }).scalar()
+        db.commit()
+        return new_status
+
+
+async def _worker(handler: Callable[[dict], Awaitable[None]]) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            event = await loop.run_in_executor(None, _claim)
+        except Exception as e:
+            logger.error("Webhook inbox claim failed: %s", e)
+            event = None
+
+        if event is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=WEBHOOK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+
+        try:
+            await handler(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            try:
+                new_status = await loop.run_in_executor(
+                    None, _mark_failed, event["event_id"], event["attempts"], f"{type(e).__name__}: {e}"
+                )
+            except Exception as mark_error:
+                # Left in `processing`; the expired lease makes it due again
+                logger.error("Failed to record webhook event %s failure: %s", event["event_id"], mark_error)
+                continue
+            log = logger.error if new_status == "dead" else logger.warning
+            log("Webhook event %s (%s) attempt %d failed, now %s: %s",
+                event["event_id"], event["tx_ref"], event["attempts"], new_status, e)
+            continue
+
+        try:
+            await loop.run_in_executor(None, _mark_done, event["event_id"])
+        except Exception as e:
+            # The lease will expire and the idempotent handler will run again
+            logger.error("Failed to mark webhook event %s processed: %s", event["event_id"], e)
+
+
+async def run_webhook_workers(handler: Callable[[dict], Awaitable[None]]) -> None:
+    """Run the worker pool forever; started from the app lifespan and cancelled on shutdown."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    workers: List[asyncio.Task] = [asyncio.create_task(_worker(handler)) for _ in range(WEBHOOK_WORKERS)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+
+def _serialize_event(event: WebhookEvent) -> dict:
+    return {
+        "event_id": str(event.event_id),
+        "provider": event.provider,
+        "tx_ref": event.tx_ref,
+        "event_type": event.event_type,
+        "status": event.status,
+        "attempts": event.attempts,
+        "last_error": event.last_error,
+        "next_attempt_at": event.next_attempt_at.isoformat() if event.next_attempt_at else None,
+        "received_at": event.received_at.isoformat() if event.received_at else None,
+        "processed_at": event.processed_at.isoformat() if event.processed_at else None,
+    }
+
+
+@router.get("/")
+def list_webhook_events(
+    status: Optional[str] = Query("dead"),
+    tx_ref: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Inbox events, dead letters by default."""
+    query = db.query(WebhookEvent)
+    if status:
+        query = query.filter(WebhookEvent.status == status)
+    if tx_ref:
+        query = query.filter(WebhookEvent.tx_ref == tx_ref)
+    events = query.order_by(WebhookEvent.received_at.desc()).offset(skip).limit(limit).all()
+    return [_serialize_event(event) for event in events]
+
+
+@router.post("/{event_id}/retry")
+def retry_webhook_event(
+    event_id: str,
+    current_user: User = Depends(require_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Put a dead-lettered event back in the queue with a fresh attempt budget."""
+    event = db.query(WebhookEvent).filter(WebhookEvent.event_id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Webhook event not found")
+    if event.status != "dead":
+        raise HTTPException(status_code=409, detail=f"Webhook event is {event.status}, only dead events can be retried")
+    event.status = "pending"
+    event.attempts = 0
+    event.next_attempt_at = func.now()
+    db.commit()
+    if _wakeup is not None:
+        _wakeup.set()
+    db.refresh(event)
+    return _serialize_event(event)
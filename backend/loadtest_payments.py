@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""End-to-end payment load benchmark against the PayChangu simulator.
+
+Drives concurrent students through the booking flow of a running API whose
+`PAYCHANGU_BASE_URL` points at `paychangu_simulator`:
+
+1. `POST /bookings/` for a random room of a freshly seeded hostel;
+2. `POST /payments/paychangu/initiate` for the booking;
+3. `POST <checkout_url>` on the simulator (the student paying), which sends
+   the signed webhook(s) to `/payments/paychangu/webhook/`;
+4. `GET /payments/verify` (skip with `--no-verify`), racing the webhook;
+5. polls `/bookings/my-bookings/` until the booking is confirmed or failed.
+
+Rooms are deliberately scarce (`--rooms` x `--capacity` beds for
+`--students` students) so admissions contend. The run prints throughput,
+p50/p99 latency per step and outcome counts, then checks the database for
+consistency violations among the seeded rooms:
+
+- rooms holding more overlapping bookings than beds, or whose `occupants`
+  counter exceeds capacity;
+- payments whose ledger credit differs from their amount (double or missing
+  credit) and bookings with more than one completed payment of a type;
+- confirmed bookings without a completed payment, completed payments whose
+  booking is not confirmed, and checkouts paid on the simulator that never
+  confirmed (or declined ones that did).
+
+Fixtures are tagged with the run id and left in place (ledger entries can't
+be deleted), so point it at a disposable database. The API, this script
+and the simulator must share `DATABASE_URL`, `JWT_SECRET_KEY` and
+`PAYCHANGU_WEBHOOK_SECRET`.
+
+    uvicorn paychangu_simulator:app --port 8090
+    PAYCHANGU_BASE_URL=http://127.0.0.1:8090 PAYCHANGU_API_KEY=sim uvicorn main:app --port 8000
+    python loadtest_payments.py --students 500 --concurrency 100 --rooms 20 --capacity 4
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+import httpx
+from sqlalchemy import bindparam, text
+
+from database import db_session
+from models import Hostel, Room, User
+from endpoints.users import create_access_token
+from endpoints.room_availability import RELEASED_BOOKING_STATUSES
+
+_OVERBOOKED_SQL = text("""
+SELECT r.room_number, r.capacity, MAX(o.held) AS peak
+FROM rooms r
+JOIN bookings b ON b.room_id = r.room_id AND b.status NOT IN :released
+CROSS JOIN LATERAL (
+    SELECT COUNT(*) AS held FROM bookings x
+    WHERE x.room_id = r.room_id AND x.status NOT IN :released
+      AND x.start_date <= b.start_date AND x.end_date > b.start_date
+) o
+WHERE r.hostel_id = :hostel_id
+GROUP BY r.room_id, r.room_number, r.capacity
+HAVING MAX(o.held) > r.capacity
+""").bindparams(bindparam("released", expanding=True))
+
+_OCCUPANTS_SQL = text("""
+SELECT room_number, capacity, occupants FROM rooms
+WHERE hostel_id = :hostel_id AND occupants > capacity
+""")
+
+# Net credit to the landlord's payable account per payment vs. what was collected
+_LEDGER_CREDIT_SQL = text("""
+SELECT p.payment_id, p.status, p.amount, COALESCE(SUM(e.credit - e.debit), 0) AS credited
+FROM payments p
+JOIN bookings b ON b.booking_id = p.booking_id
+JOIN rooms r ON r.room_id = b.room_id
+LEFT JOIN ledger_entries e ON e.payment_id = p.payment_id AND e.account LIKE 'landlord:%:payable'
+WHERE r.hostel_id = :hostel_id
+GROUP BY p.payment_id, p.status, p.amount
+HAVING COALESCE(SUM(e.credit - e.debit), 0) <> CASE WHEN p.status = 'completed' THEN p.amount ELSE 0 END
+""")
+
+_DUPLICATE_PAYMENTS_SQL = text("""
+SELECT p.booking_id, p.payment_type, COUNT(*) AS completed
+FROM payments p
+JOIN bookings b ON b.booking_id = p.booking_id
+JOIN rooms r ON r.room_id = b.room_id
+WHERE r.hostel_id = :hostel_id AND p.status = 'completed'
+GROUP BY p.booking_id, p.payment_type
+HAVING COUNT(*) > 1
+""")
+
+_CONFIRMED_UNPAID_SQL = text("""
+SELECT b.booking_id FROM bookings b
+JOIN rooms r ON r.room_id = b.room_id
+WHERE r.hostel_id = :hostel_id AND b.status = 'confirmed'
+  AND NOT EXISTS (SELECT 1 FROM payments p WHERE p.booking_id = b.booking_id AND p.status = 'completed')
+""")
+
+_PAID_UNCONFIRMED_SQL = text("""
+SELECT b.booking_id, b.status FROM bookings b
+JOIN rooms r ON r.room_id = b.room_id
+WHERE r.hostel_id = :hostel_id AND b.status <> 'confirmed'
+  AND EXISTS (SELECT 1 FROM payments p WHERE p.booking_id = b.booking_id AND p.status = 'completed')
+""")
+
+
+def seed(args, run_id: str) -> dict:
+    """Landlord, hostel, rooms and students for this run; returns ids and student tokens."""
+    with db_session() as db:
+        landlord = User(
+            email=f"loadtest-{run_id}-landlord@example.com", user_type="landlord",
+            first_name="Loadtest", last_name="Landlord", is_verified=True,
+        )
+        db.add(landlord)
+        db.flush()
+        hostel = Hostel(
+            landlord_id=landlord.user_id, name=f"Loadtest {run_id}", district="Lilongwe",
+            university="Loadtest", address="Loadtest", type="Shared",
+            location="POINT(33.7741 -13.9626)", booking_fee=Decimal(args.booking_fee),
+            price_per_month=Decimal(args.price), total_rooms=args.rooms,
+        )
+        db.add(hostel)
+        db.flush()
+        rooms = [
+            Room(hostel_id=hostel.hostel_id, room_number=f"LT-{i + 1}", type="shared",
+                 capacity=args.capacity, price_per_month=Decimal(args.price))
+            for i in range(args.rooms)
+        ]
+        students = [
+            User(email=f"loadtest-{run_id}-{i}@example.com", user_type="tenant",
+                 first_name="Student", last_name=str(i), phone_number="0999000000", is_verified=True)
+            for i in range(args.students)
+        ]
+        db.add_all(rooms + students)
+        db.commit()
+        return {
+            "hostel_id": hostel.hostel_id,
+            "room_ids": [str(room.room_id) for room in rooms],
+            "students": [
+                {"email": s.email, "token": create_access_token({"sub": str(s.user_id), "role": "tenant"})}
+                for s in students
+            ],
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.outcomes: Counter = Counter()
+        self.paid: Dict[str, Tuple[str, str]] = {}  # tx_ref -> (simulator outcome, booking id)
+        self.final: Dict[str, str] = {}  # booking id -> status seen by the student
+
+    async def step(self, name: str, call):
+        started = time.monotonic()
+        try:
+            resp = await call
+        except httpx.HTTPError as e:
+            self.errors[name][type(e).__name__] += 1
+            return None
+        self.latencies[name].append(time.monotonic() - started)
+        if resp.status_code >= 400:
+            self.errors[name][resp.status_code] += 1
+        return resp
+
+
+async def student_flow(args, api: httpx.AsyncClient, sim: httpx.AsyncClient, student: dict,
+                       room_ids: List[str], rec: Recorder) -> None:
+    headers = {"Authorization": f"Bearer {student['token']}"}
+    started = time.monotonic()
+
+    resp = await rec.step("booking", api.post("/bookings/", headers={**headers, "Idempotency-Key": uuid.uuid4().hex}, json={
+        "room_id": random.choice(room_ids),
+        "check_in_date": args.check_in,
+        "duration_months": args.months,
+        "payment_type": args.payment_type,
+        "payment_method": "paychangu",
+    }))
+    if resp is None or resp.status_code != 201:
+        code = resp.status_code if resp is not None else "network"
+        rec.outcomes[{409: "room_full", 503: "room_busy"}.get(code, f"booking_error_{code}")] += 1
+        return
+    booking = resp.json()
+    booking_id = booking["booking_id"]
+
+    resp = await rec.step("initiate", api.post("/payments/paychangu/initiate", headers={**headers, "Idempotency-Key": uuid.uuid4().hex}, json={
+        "booking_id": booking_id,
+        "amount": booking["amount_breakdown"]["total_amount"],
+        "email": student["email"],
+        "phone_number": "0999000000",
+        "callback_url": f"{args.api}/payments/paychangu/webhook/",
+    }))
+    if resp is None or resp.status_code != 200:
+        rec.outcomes["initiate_failed"] += 1
+        return
+    tx_ref, checkout_url = resp.json()["tx_ref"], resp.json()["payment_url"]
+
+    resp = await rec.step("checkout", sim.post(checkout_url))
+    if resp is None or resp.status_code != 200:
+        rec.outcomes["checkout_failed"] += 1
+        return
+    paid = resp.json()["status"]
+    rec.paid[tx_ref] = (paid, booking_id)
+    paid_at = time.monotonic()
+
+    if args.verify:
+        await rec.step("verify", api.get("/payments/verify", headers=headers, params={"reference": tx_ref}))
+
+    deadline = paid_at + args.settle_timeout
+    while time.monotonic() < deadline:
+        resp = await rec.step("poll", api.get("/bookings/my-bookings/", headers=headers))
+        if resp is not None and resp.status_code == 200:
+            status = next((b.get("status") for b in resp.json() if str(b.get("booking_id")) == booking_id), "payment_failed")
+            if status in ("confirmed", "payment_failed"):
+                rec.final[booking_id] = status
+                rec.latencies["paid_to_settled"].append(time.monotonic() - paid_at)
+                rec.latencies["end_to_end"].append(time.monotonic() - started)
+                rec.outcomes["confirmed" if status == "confirmed" else "declined"] += 1
+                return
+        await asyncio.sleep(args.poll_interval)
+    rec.outcomes["not_settled"] += 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def check_consistency(hostel_id, rec: Recorder) -> Dict[str, list]:
+    params = {"hostel_id": hostel_id}
+    with db_session() as db:
+        violations = {
+            "overbooked_rooms": db.execute(_OVERBOOKED_SQL, {**params, "released": list(RELEASED_BOOKING_STATUSES)}).mappings().all(),
+            "occupants_over_capacity": db.execute(_OCCUPANTS_SQL, params).mappings().all(),
+            "ledger_credit_mismatch": db.execute(_LEDGER_CREDIT_SQL, params).mappings().all(),
+            "duplicate_completed_payments": db.execute(_DUPLICATE_PAYMENTS_SQL, params).mappings().all(),
+            "confirmed_without_payment": db.execute(_CONFIRMED_UNPAID_SQL, params).mappings().all(),
+            "paid_not_confirmed": db.execute(_PAID_UNCONFIRMED_SQL, params).mappings().all(),
+        }
+    violations = {name: [{k: str(v) for k, v in row.items()} for row in rows] for name, rows in violations.items()}
+    violations["paid_checkout_not_confirmed"] = [
+        {"tx_ref": tx_ref, "booking_id": booking_id, "seen": rec.final.get(booking_id)}
+        for tx_ref, (paid, booking_id) in rec.paid.items()
+        if paid == "success" and rec.final.get(booking_id) != "confirmed"
+    ]
+    violations["declined_checkout_confirmed"] = [
+        {"tx_ref": tx_ref, "booking_id": booking_id}
+        for tx_ref, (paid, booking_id) in rec.paid.items()
+        if paid == "failed" and rec.final.get(booking_id) == "confirmed"
+    ]
+    return violations
+
+
+async def run(args) -> int:
+    run_id = uuid.uuid4().hex[:8]
+    fixture = seed(args, run_id)
+    print(f"Run {run_id}: {args.students} students, {args.rooms} rooms x {args.capacity} beds, "
+          f"concurrency {args.concurrency}")
+
+    rec = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.request_timeout)
+
+    async with httpx.AsyncClient(base_url=args.api, limits=limits, timeout=timeout) as api, \
+            httpx.AsyncClient(base_url=args.simulator, limits=limits, timeout=timeout) as sim:
+        await sim.post("/_simulator/reset")
+
+        async def bounded(student):
+            async with semaphore:
+                await student_flow(args, api, sim, student, fixture["room_ids"], rec)
+
+        started = time.monotonic()
+        await asyncio.gather(*(bounded(student) for student in fixture["students"]))
+        elapsed = time.monotonic() - started
+        sim_stats = (await sim.get("/_simulator/stats")).json()
+
+    # Let trailing duplicate webhooks land before checking
+    await asyncio.sleep(args.drain_seconds)
+    violations = check_consistency(fixture["hostel_id"], rec)
+
+    print(f"\nElapsed {elapsed:.1f}s, {args.students / elapsed:.1f} flows/s, "
+          f"{rec.outcomes['confirmed'] / elapsed:.1f} confirmed bookings/s")
+    print("\nOutcomes:", dict(rec.outcomes))
+    print(f"\n{'step':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}  errors")
+    for name in ("booking", "initiate", "checkout", "verify", "poll", "paid_to_settled", "end_to_end"):
+        values = rec.latencies.get(name)
+        if not values and not rec.errors.get(name):
+            continue
+        values = values or [0.0]
+        print(f"{name:<16}{len(rec.latencies.get(name, [])):>8}{percentile(values, 50) * 1000:>10.0f}"
+              f"{percentile(values, 99) * 1000:>10.0f}{max(values) * 1000:>10.0f}  {dict(rec.errors.get(name, {}))}")
+    print("\nSimulator:", json.dumps(sim_stats["counters"], sort_keys=True))
+
+    failed = {name: rows for name, rows in violations.items() if rows}
+    print("\nConsistency:", "ok" if not failed else "VIOLATIONS")
+    for name, rows in violations.items():
+        print(f"  {name}: {len(rows)}")
+        for row in rows[:5]:
+            print(f"    {row}")
+    return 1 if failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--api", default="http://127.0.0.1:8000")
+    parser.add_argument("--simulator", default="http://127.0.0.1:8090")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--months", type=int, default=4)
+    parser.add_argument("--check-in", default=(date.today() + timedelta(days=30)).isoformat())
+    parser.add_argument("--payment-type", choices=("booking_fee", "full"), default="booking_fee")
+    parser.add_argument("--price", default="60000")
+    parser.add_argument("--booking-fee", default="10000")
+    parser.add_argument("--no-verify", dest="verify", action="store_false",
+                        help="rely on the webhook alone instead of also calling /payments/verify")
+    parser.add_argument("--settle-timeout", type=float, default=30.0)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--drain-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
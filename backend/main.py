@@ -9,6 +9,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.middleware import Middleware
 from sqlalchemy.orm import Session
+from sqlalchemy import text
 import time
 import asyncio
 from typing import Callable, Optional
@@ -18,10 +19,27 @@ from database import engine, Base, db_session, get_db
 from endpoints import users, hostels, rooms, media, config, bookings, browse
 from endpoints import payments, health, verifications
 from endpoints import messages, websocket
-from endpoints import notifications, reviews, activities
+from endpoints import notifications, reviews, activities, sync
 from endpoints import payment_references, admin, oauth, pdf_service, banks, data_deletion
 from endpoints.payments_manual_verification import router as manual_verification_router
 from endpoints.websocket import websocket_endpoint
+from endpoints.hostel_stats import install_hostel_stats
+from endpoints.change_log import install_change_log
+from endpoints.landlord_reports import install_landlord_reports
+from endpoints import ledger
+from endpoints.ledger import install_ledger
+from endpoints.booking_sweeper import run_sweeper
+from endpoints import exports
+from endpoints.exports import run_export_worker
+from endpoints.idempotency import IdempotentReplay, idempotent_replay_handler
+from endpoints import webhook_inbox
+from endpoints.webhook_inbox import run_webhook_workers
+from paychangu_service import close_paychangu_client
+from endpoints import payment_reconciliation
+from endpoints.payment_reconciliation import run_reconciler
+from endpoints import disbursement_engine
+from endpoints.disbursement_engine import run_disbursement_engine
+from endpoints.config_cache import install_config_notify, run_config_listener
 
 # Database tables are now created in the lifespan event
 
@@ -35,6 +53,10 @@ class TimeoutMiddleware:
         # Skip timeout for lifespan events and websockets
         if scope["type"] in ["lifespan", "websocket"]:
             return await self.app(scope, receive, send)
+        # Export downloads can legitimately stream for longer than the timeout
+        path = scope.get("path", "")
+        if path.startswith("/exports/") and path.endswith("/download"):
+            return await self.app(scope, receive, send)
             
         try:
             task = asyncio.create_task(self.app(scope, receive, send))
@@ -50,8 +72,19 @@ class TimeoutMiddleware:
 async def lifespan(app: FastAPI):
     # Startup
     try:
+        # Extensions required by column types and indexes (geography, trigram search, booking exclusion constraint)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+
         # Create database tables if they don't exist
         Base.metadata.create_all(bind=engine)
+        install_hostel_stats(engine)
+        install_change_log(engine)
+        install_landlord_reports(engine)
+        install_ledger(engine)
+        install_config_notify(engine)
         
         # Initialize default configuration if not exists
         with db_session() as db:
@@ -80,8 +113,28 @@ async def lifespan(app: FastAPI):
         print(f"Startup failed: {str(e)}")
         raise
 
+    # Expire abandoned booking holds and pending payments in the background
+    sweeper = asyncio.create_task(run_sweeper())
+    # Build queued CSV/XLSX exports outside the request cycle
+    export_worker = asyncio.create_task(run_export_worker())
+    # Apply stored PayChangu webhooks
+    webhook_workers = asyncio.create_task(run_webhook_workers(payments.process_paychangu_event))
+    # Settle payments whose webhook never arrived
+    reconciler = asyncio.create_task(run_reconciler())
+    # Submit queued landlord payouts and poll their settlement
+    disbursements = asyncio.create_task(run_disbursement_engine())
+    # Serve configuration from memory, dropped whenever any worker changes it
+    config_listener = asyncio.create_task(run_config_listener())
+
     yield
-    # Shutdown logic (if any) goes here
+    # Shutdown
+    sweeper.cancel()
+    export_worker.cancel()
+    webhook_workers.cancel()
+    reconciler.cancel()
+    disbursements.cancel()
+    config_listener.cancel()
+    await close_paychangu_client()
     
 
 # Initialize FastAPI app with middleware and lifespan
@@ -161,6 +214,10 @@ async def get_user_profile_endpoint(
 app.post("/hostels/", response_model=hostels.HostelRead)(hostels.create_hostel)
 app.post("/hostels/update_hostel/{hostel_id}")(hostels.update_hostel)
 app.get("/hostels/all-hostels")(hostels.get_all_hostels)
+app.get("/hostels/feed")(hostels.get_hostel_feed)
+app.get("/hostels/map")(hostels.get_hostel_map)
+app.get("/hostels/search")(hostels.search_hostels_endpoint)
+app.get("/hostels/nearby")(hostels.get_nearby_hostels)
 app.get("/hostels/", response_model=list[hostels.HostelRead])(hostels.get_landlord_hostels)
 app.get("/hostels/amenities/{hostel_id}")(hostels.get_hostel_amenities)
 app.get("/hostels/{hostel_id}", response_model=hostels.HostelRead)(hostels.get_hostel)
@@ -172,7 +229,10 @@ app.post("/hostels/{hostel_id}/change_hostel_status")(hostels.change_hostel_stat
 # Room Management Endpoints
 app.post("/rooms/", response_model=rooms.RoomRead)(rooms.create_room)
 app.get("/rooms", )(rooms.get_hostel_rooms)
+app.get("/rooms/available")(rooms.get_available_rooms)
+app.get("/rooms/available/search")(rooms.search_available_rooms)
 app.get("/rooms/{room_id}", response_model=rooms.RoomRead)(rooms.get_room)
+app.get("/rooms/{room_id}/calendar")(rooms.get_room_calendar)
 app.post("/rooms/{room_id}/update", response_model=rooms.RoomRead)(rooms.update_room)
 app.delete("/rooms/{room_id}")(rooms.delete_room)
 
@@ -210,11 +270,20 @@ app.include_router(messages.router)
 app.include_router(notifications.router)
 app.include_router(reviews.router)
 app.include_router(activities.router)
+app.include_router(sync.router)
 app.include_router(admin.router, prefix="/admin", tags=["admin"])
 app.include_router(oauth.router, prefix="/auth", tags=["oauth"])
 app.include_router(pdf_service.router)
 app.include_router(banks.router, tags=["banks"])
 app.include_router(data_deletion.router, prefix="/api/data-deletion", tags=["data-deletion"])
+app.include_router(exports.router)
+app.include_router(webhook_inbox.router)
+app.include_router(payment_reconciliation.router, tags=["payments"])
+app.include_router(disbursement_engine.router)
+app.include_router(ledger.router)
+
+# Retries carrying an already-completed Idempotency-Key get the stored response
+app.add_exception_handler(IdempotentReplay, idempotent_replay_handler)
 
 
 def _add_slash_variants_for_all_routes(fastapi_app: FastAPI) -> None:
@@ -1,14 +1,35 @@
 from uuid import UUID as PyUUID, uuid4
 
 from pydantic import BaseModel, Field
-from sqlalchemy import Column, String, Boolean, DateTime, text, ForeignKey, Numeric, Date, Integer, BigInteger, Text, JSON
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, Boolean, DateTime, text, ForeignKey, Numeric, Date, Integer, BigInteger, Text, JSON, Index, Computed
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.types import UserDefinedType
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR, DATERANGE, ExcludeConstraint
 from sqlalchemy.sql import func
 from database import Base
 from datetime import datetime, date
 
 
+class Geography(UserDefinedType):
+    """PostGIS `geography(Point,4326)` column.
+
+    Values are written and read as WKT (`"POINT(longitude latitude)"`) so
+    callers keep working with plain strings while the database stores a
+    native, GiST-indexable geography.
+    """
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "geography(Point,4326)"
+
+    def bind_expression(self, bindvalue):
+        return func.ST_GeogFromText(bindvalue, type_=self)
+
+    def column_expression(self, col):
+        return func.ST_AsText(col, type_=String())
+
+
 class Verification(Base):
     """SQLAlchemy model for the verifications table."""
 
@@ -193,31 +214,69 @@ class Hostel(Base):
         UUID(as_uuid=True),
         ForeignKey("users.user_id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     name = Column(String(255), nullable=False)
     district = Column(String(255), nullable=False)
     university = Column(String(255), nullable=False)
     address = Column(String, nullable=False)
     type = Column(String(20), nullable=False, default='Private')  # 'Private', 'Shared', 'Self-contained'
-    location = Column(String, nullable=False)  # Will store as "POINT(longitude latitude)"
+    location = Column(Geography(), nullable=False)  # Read/written as "POINT(longitude latitude)"
     description = Column(String, nullable=True)
     booking_fee = Column(Numeric(10, 2), nullable=True)
     amenities = Column(JSONB, nullable=True)
     price_per_month = Column(Numeric(10, 2), nullable=True)
     total_rooms = Column(Integer, default=0)
     is_active = Column(Boolean, default=True, server_default='true')
+    # Bumped by every write that changes the hostel's card (rooms, media, reviews included)
+    cache_version = Column(Integer, nullable=False, default=1, server_default='1')
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True),
         server_default=func.now(),
         onupdate=func.now(),
     )
+    # Search columns maintained by Postgres; deferred so normal reads don't load them
+    search_text = deferred(Column(
+        Text,
+        Computed(
+            "lower(coalesce(name, '') || ' ' || coalesce(district, '') || ' ' || "
+            "coalesce(university, '') || ' ' || coalesce(address, ''))",
+            persisted=True,
+        ),
+    ))
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(district, '') || ' ' || coalesce(university, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(address, '')), 'C') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'D')",
+            persisted=True,
+        ),
+    ))
 
     # Relationships
     landlord = relationship("User", backref="hostels")
     rooms = relationship("Room", back_populates="hostel", cascade="all, delete-orphan")
     media = relationship("Media", back_populates="hostel", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination order for the student catalog
+        Index('idx_hostels_catalog_keyset', created_at.desc().nullslast(), hostel_id.desc(),
+              postgresql_where=text('is_active = TRUE')),
+        Index('idx_hostels_location_gist', location, postgresql_using='gist'),
+        Index('idx_hostels_amenities_gin', amenities, postgresql_using='gin',
+              postgresql_ops={'amenities': 'jsonb_path_ops'}),
+        Index('idx_hostels_lower_district', func.lower(district)),
+        Index('idx_hostels_lower_university', func.lower(university)),
+        Index('idx_hostels_lower_type', func.lower(type)),
+        Index('idx_hostels_price_per_month', price_per_month),
+        Index('idx_hostels_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('idx_hostels_search_text_trgm', 'search_text', postgresql_using='gin',
+              postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
+
 
 class Room(Base):
     """SQLAlchemy model for the rooms table."""
@@ -233,6 +292,7 @@ class Room(Base):
         UUID(as_uuid=True),
         ForeignKey("hostels.hostel_id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     room_number = Column(String(50), nullable=False)
     type = Column(String(20), nullable=False)  # 'single', 'double', 'shared', 'suite'
@@ -298,6 +358,59 @@ class Media(Base):
     uploader = relationship("User", backref="uploaded_media")
 
 
+class HostelStats(Base):
+    """Per-hostel aggregates maintained by triggers on rooms and reviews (see endpoints.hostel_stats)."""
+
+    __tablename__ = "hostel_stats"
+
+    hostel_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("hostels.hostel_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    total_rooms = Column(Integer, nullable=False, default=0, server_default='0')
+    available_rooms = Column(Integer, nullable=False, default=0, server_default='0')
+    total_capacity = Column(Integer, nullable=False, default=0, server_default='0')
+    total_occupants = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_sum = Column(BigInteger, nullable=False, default=0, server_default='0')
+    reviews_count = Column(Integer, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LandlordReportVersion(Base):
+    """Per-landlord report version, bumped by triggers on bookings, payments and disbursements (see endpoints.landlord_reports)."""
+
+    __tablename__ = "landlord_report_versions"
+
+    landlord_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.user_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    version = Column(BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ChangeLog(Base):
+    """Append-only row-change feed for delta sync, written by triggers (see endpoints.change_log)."""
+
+    __tablename__ = "change_log"
+
+    change_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    txid = Column(BigInteger, nullable=False)  # writing transaction id; sync reads in (txid, change_id) order
+    entity = Column(String(20), nullable=False)  # hostel, room, media, booking, notification
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+    op = Column(String(1), nullable=False)  # I, U, D
+    user_id = Column(UUID(as_uuid=True), nullable=True)  # private owner (booking student, notification recipient)
+    landlord_id = Column(UUID(as_uuid=True), nullable=True)  # owning landlord
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_change_log_position', 'txid', 'change_id'),
+        Index('ix_change_log_changed_at', 'changed_at'),
+    )
+
+
 # Pydantic models for API
 class HostelCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
@@ -428,6 +541,23 @@ class Booking(Base):
     total_amount = Column(Numeric(10,2), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     meta = Column(JSON, nullable=True)  # For storing additional booking metadata like extension details
+    bed_number = Column(Integer, nullable=True)  # 1..room capacity; see endpoints.room_availability
+    hold_expires_at = Column(DateTime(timezone=True), nullable=True)  # Pending bookings release their bed after this
+    stay = deferred(Column(DATERANGE, Computed("daterange(start_date, end_date, '[)')", persisted=True)))
+
+    __table_args__ = (
+        Index('ix_bookings_room_stay', 'room_id', 'stay', postgresql_using='gist'),
+        Index('ix_bookings_pending_hold', 'hold_expires_at', postgresql_where=text("status = 'pending'")),
+        # No two overlapping stays on the same bed of a room (needs btree_gist)
+        ExcludeConstraint(
+            ('room_id', '='),
+            ('bed_number', '='),
+            ('stay', '&&'),
+            name='bookings_no_double_bed',
+            using='gist',
+            where=text("status NOT IN ('rejected', 'cancelled', 'payment_failed', 'expired')"),
+        ),
+    )
 
     # Relationships
     student = relationship("User", backref="bookings")
@@ -455,10 +585,44 @@ class Payment(Base):
     paid_at = Column(DateTime(timezone=True), nullable=True)
     time_zone = Column(String, nullable=True)
     meta = Column(JSON, nullable=True)  # For storing additional payment metadata like extension months
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_reconciled_at = Column(DateTime(timezone=True), nullable=True)  # last PayChangu check by endpoints.payment_reconciliation
+    reconciled_outcome = Column(String(20), nullable=True)  # what that check returned: success, failed or pending
+
+    __table_args__ = (
+        Index('ix_payments_pending_created', 'created_at', postgresql_where=text("status = 'pending'")),
+        Index('ix_payments_booking_id', 'booking_id'),
+    )
 
     booking = relationship("Booking", back_populates="payments")
 
 
+class PaymentInstalment(Base):
+    """One expected monthly rent instalment of a booking (see endpoints.payment_schedule)."""
+
+    __tablename__ = "payment_instalments"
+
+    instalment_id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        server_default=text("uuid_generate_v4()"),
+    )
+    booking_id = Column(UUID(as_uuid=True), ForeignKey("bookings.booking_id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 1-based month of the stay
+    due_date = Column(Date, nullable=False)
+    amount = Column(Numeric(10,2), nullable=False)
+    payment_id = Column(UUID(as_uuid=True), ForeignKey("payments.payment_id", ondelete="SET NULL"), nullable=True)  # paid once this payment completes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ux_payment_instalments_booking_seq', 'booking_id', 'seq', unique=True),
+        Index('ix_payment_instalments_due_date', 'due_date'),
+        Index('ix_payment_instalments_payment_id', 'payment_id'),
+    )
+
+    booking = relationship("Booking", backref="instalments")
+
+
 # Pydantic schemas for bookings and payments
 class BookingCreate(BaseModel):
     student_id: PyUUID
@@ -860,17 +1024,44 @@ class Disbursement(Base):
     amount = Column(Numeric(10, 2), nullable=False)
     platform_fee = Column(Numeric(10, 2), nullable=False)
     disbursement_amount = Column(Numeric(10, 2), nullable=False)
-    status = Column(String(20), default='pending')  # 'pending', 'processing', 'completed', 'failed'
+    status = Column(String(20), default='pending')  # 'pending', 'queued', 'submitting', 'processing', 'completed', 'failed'
     payment_reference = Column(String(100), nullable=True)
     payment_method = Column(String(50), nullable=True)  # 'mobile_money', 'bank_transfer'
     processed_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     failure_reason = Column(Text, nullable=True)
-    
+    # Disbursement engine bookkeeping (see endpoints.disbursement_engine)
+    batch_id = Column(UUID(as_uuid=True), ForeignKey("disbursement_batches.batch_id", ondelete="SET NULL"), nullable=True, index=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default='0')  # submits while queued, polls while processing
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    submitted_at = Column(DateTime(timezone=True), nullable=True)
+
     # Relationships
     booking = relationship("Booking", back_populates="disbursements")
     landlord = relationship("User", back_populates="disbursements")
+    batch = relationship("DisbursementBatch", back_populates="disbursements")
+
+    __table_args__ = (
+        Index('ix_disbursements_due', 'next_attempt_at', postgresql_where=text("status IN ('queued', 'submitting', 'processing')")),
+    )
+
+
+class DisbursementBatch(Base):
+    """A landlord payout run queued by an admin (see endpoints.disbursement_engine)."""
+    __tablename__ = "disbursement_batches"
+    batch_id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()"))
+    landlord_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True)
+    status = Column(String(20), nullable=False, default="processing", server_default="processing")  # processing, completed, partially_failed, failed
+    total_amount = Column(Numeric(12, 2), nullable=False, default=0, server_default='0')
+    total_bookings = Column(Integer, nullable=False, default=0, server_default='0')
+    transfer_details = Column(JSONB, nullable=True)  # bank_uuid, account/mobile number and name used for every transfer
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    disbursements = relationship("Disbursement", back_populates="batch")
 
 
 # Pydantic schemas for Disbursement
@@ -889,6 +1080,8 @@ class DisbursementCreate(BaseModel):
     mobile_account_name: str | None = None
     # Optional operator reference id required by PayChangu for mobile payouts
     mobile_money_operator_ref_id: str | None = None
+    # Pay out even when the booking exceeds the landlord's ledger balance
+    override_balance: bool = False
 
     class Config:
         from_attributes = True
@@ -933,6 +1126,8 @@ class BatchDisbursementCreate(BaseModel):
     total_amount: float | None = None
     total_bookings: int | None = None
     bank_uuid: str | None = None
+    # Pay out even when the batch exceeds the landlord's ledger balance
+    override_balance: bool = False
 
     class Config:
         from_attributes = True
@@ -1025,3 +1220,114 @@ class DataDeletionRequestUpdate(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class ExportJob(Base):
+    """Queued CSV/XLSX export of a landlord report or admin listing (see endpoints.exports)."""
+
+    __tablename__ = "export_jobs"
+
+    job_id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        server_default=text("uuid_generate_v4()"),
+    )
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String(30), nullable=False)  # landlord_bookings, landlord_payments, admin_bookings, admin_payments
+    format = Column(String(10), nullable=False)  # csv, xlsx
+    filters = Column(JSONB, nullable=True)
+    status = Column(String(20), nullable=False, default="queued", server_default="queued")  # queued, running, completed, failed, expired
+    total_rows = Column(Integer, nullable=True)
+    rows_written = Column(Integer, nullable=False, default=0, server_default='0')
+    file_path = Column(String(500), nullable=True)
+    file_size = Column(BigInteger, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('ix_export_jobs_queued', 'created_at', postgresql_where=text("status = 'queued'")),
+    )
+
+
+class IdempotencyKey(Base):
+    """Client-supplied Idempotency-Key and the response it produced (see endpoints.idempotency)."""
+    __tablename__ = "idempotency_keys"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    endpoint = Column(String(100), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default="in_progress", server_default="in_progress")  # in_progress, completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(JSONB, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class WebhookEvent(Base):
+    """Inbound payment-provider webhook awaiting processing (see endpoints.webhook_inbox)."""
+    __tablename__ = "webhook_events"
+    event_id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()"))
+    provider = Column(String(30), nullable=False, default="paychangu", server_default="paychangu")
+    tx_ref = Column(String(255), nullable=False)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(JSONB, nullable=True)
+    status = Column(String(20), nullable=False, default="pending", server_default="pending")  # pending, processing, processed, dead
+    attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    __table_args__ = (
+        UniqueConstraint('provider', 'tx_ref', 'event_type', name='uq_webhook_events_tx_ref_type'),
+        Index('ix_webhook_events_due', 'next_attempt_at', postgresql_where=text("status IN ('pending', 'processing')")),
+    )
+
+
+class ReconciliationRun(Base):
+    """One pass of the pending-payment reconciler and what it changed (see endpoints.payment_reconciliation)."""
+    __tablename__ = "reconciliation_runs"
+    run_id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()"))
+    trigger = Column(String(20), nullable=False, default="schedule", server_default="schedule")  # schedule, manual
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    examined = Column(Integer, nullable=False, default=0, server_default='0')
+    completed = Column(Integer, nullable=False, default=0, server_default='0')
+    failed = Column(Integer, nullable=False, default=0, server_default='0')
+    still_pending = Column(Integer, nullable=False, default=0, server_default='0')
+    errors = Column(Integer, nullable=False, default=0, server_default='0')
+    details = Column(JSONB, nullable=True)  # [{payment_id, tx_ref, outcome, error}] for everything but still-pending
+
+
+class LedgerEntry(Base):
+    """One leg of a balanced journal; append-only, written by triggers on payments and disbursements (see endpoints.ledger)."""
+    __tablename__ = "ledger_entries"
+    entry_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    journal_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    event = Column(String(40), nullable=False)  # payment_completed, payment_reversed, payment_adjusted, payout_reserved, payout_released, payout_settled, payout_unsettled
+    account = Column(String(100), nullable=False)  # platform:clearing, platform:fees, landlord:<id>:payable, landlord:<id>:in_transit
+    landlord_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    debit = Column(Numeric(14, 2), nullable=False, default=0, server_default='0')
+    credit = Column(Numeric(14, 2), nullable=False, default=0, server_default='0')
+    payment_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    disbursement_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    booking_id = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    __table_args__ = (
+        Index('ix_ledger_entries_account_entry', 'account', 'entry_id'),
+    )
+
+
+class LedgerBalance(Base):
+    """Running totals of one ledger account, updated with every entry (see endpoints.ledger)."""
+    __tablename__ = "ledger_balances"
+    account = Column(String(100), primary_key=True)
+    landlord_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    debits = Column(Numeric(14, 2), nullable=False, default=0, server_default='0')
+    credits = Column(Numeric(14, 2), nullable=False, default=0, server_default='0')
+    balance = Column(Numeric(14, 2), Computed("debits - credits", persisted=True))
+    entries = Column(BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,14 +1,15 @@
-import os
+import asyncio
+import copy
+import json
 import logging
-from typing import Any, Dict, Optional
-from datetime import datetime
+import os
+import random
 import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
 
-import requests
-from sqlalchemy.orm import Session
-
-from database import db_session
-from models import Disbursement
+import httpx
 
 logger = logging.getLogger(__name__)
 
@@ -16,23 +17,143 @@ logger = logging.getLogger(__name__)
 # Use PAYCHANGU_API_KEY if present; Fall back to PAYCHANGU_SECRET_KEY if set in .env
 PAYCHANGU_API_KEY = os.getenv("PAYCHANGU_API_KEY") or os.getenv("PAYCHANGU_SECRET_KEY")
 PAYCHANGU_BASE_URL = os.getenv("PAYCHANGU_BASE_URL", "https://api.paychangu.com")
-# Optional defaults and polling configuration
+# Optional defaults
 PAYCHANGU_DEFAULT_BANK_UUID = os.getenv("PAYCHANGU_DEFAULT_BANK_UUID")
-PAYCHANGU_POLL_RETRIES = int(os.getenv("PAYCHANGU_POLL_RETRIES", "5"))
-PAYCHANGU_POLL_INTERVAL = int(os.getenv("PAYCHANGU_POLL_INTERVAL", "5"))
+
+# Shared connection pool
+PAYCHANGU_MAX_CONNECTIONS = int(os.getenv("PAYCHANGU_MAX_CONNECTIONS", "20"))
+PAYCHANGU_MAX_KEEPALIVE = int(os.getenv("PAYCHANGU_MAX_KEEPALIVE", "10"))
+PAYCHANGU_CONNECT_TIMEOUT = float(os.getenv("PAYCHANGU_CONNECT_TIMEOUT", "5"))
+# Total timeout per operation, in seconds
+PAYCHANGU_OP_TIMEOUTS = {
+    "initiate": float(os.getenv("PAYCHANGU_TIMEOUT_INITIATE", "15")),
+    "verify": float(os.getenv("PAYCHANGU_TIMEOUT_VERIFY", "10")),
+    "transfer": float(os.getenv("PAYCHANGU_TIMEOUT_TRANSFER", "30")),
+    "payout_status": float(os.getenv("PAYCHANGU_TIMEOUT_PAYOUT_STATUS", "10")),
+}
+# Retries apply to idempotent calls; writes are only retried when the request never left us
+PAYCHANGU_MAX_RETRIES = int(os.getenv("PAYCHANGU_MAX_RETRIES", "2"))
+PAYCHANGU_RETRY_BASE_SECONDS = float(os.getenv("PAYCHANGU_RETRY_BASE_SECONDS", "0.25"))
+# Circuit breaker: open after this many consecutive failures, probe again after the cooldown
+PAYCHANGU_BREAKER_FAILURES = int(os.getenv("PAYCHANGU_BREAKER_FAILURES", "5"))
+PAYCHANGU_BREAKER_RESET_SECONDS = float(os.getenv("PAYCHANGU_BREAKER_RESET_SECONDS", "30"))
+# Final verification results are reused for this long; concurrent verifies of one tx_ref share a call
+PAYCHANGU_VERIFY_CACHE_SECONDS = float(os.getenv("PAYCHANGU_VERIFY_CACHE_SECONDS", "30"))
+PAYCHANGU_VERIFY_CACHE_SIZE = int(os.getenv("PAYCHANGU_VERIFY_CACHE_SIZE", "2000"))
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Raised before any bytes were sent, so even non-idempotent calls can be retried
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+VERIFY_FAILED_STATES = ('failed', 'cancelled', 'canceled', 'declined', 'expired', 'reversed')
+VERIFY_PENDING_STATES = ('pending', 'processing', 'initiated')
+
+
+def verification_outcome(verify_resp: Dict[str, Any]) -> str:
+    """`success`, `failed` or `pending` for a PayChangu verify response."""
+    if not isinstance(verify_resp, dict):
+        return "pending"
+    data = verify_resp.get("data")
+    inner = (data.get("status") or "").lower() if isinstance(data, dict) and isinstance(data.get("status"), str) else ""
+    if inner in VERIFY_FAILED_STATES:
+        return "failed"
+    if verify_resp.get("status") == "success" and inner not in VERIFY_PENDING_STATES:
+        return "success"
+    return "pending"
 
 
 class PayChanguError(Exception):
     pass
 
 
+class CircuitOpenError(PayChanguError):
+    """PayChangu has been failing; calls are rejected until the cooldown passes."""
+
+
+class TransferRejected(PayChanguError):
+    """PayChangu answered a payout request and refused it; nothing was sent."""
+
+
+def request_not_sent(exc: BaseException) -> bool:
+    """True when a failed call certainly never reached PayChangu, so it is safe to repeat."""
+    return isinstance(exc, CircuitOpenError) or isinstance(exc.__cause__, _NOT_SENT_ERRORS)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = PAYCHANGU_BREAKER_FAILURES, reset_seconds: float = PAYCHANGU_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        now = time.monotonic()
+        # Let a single trial call through (another one if the last probe never reported back)
+        if state == "half_open" and (self._probe_started is None or now - self._probe_started >= self.reset_seconds):
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_started = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class PayChanguMetrics:
+    """Per-operation counters and a window of recent latencies."""
+
+    def __init__(self, window: int = 500):
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def count(self, op: str, name: str) -> None:
+        self.counters[op][name] += 1
+
+    def observe(self, op: str, seconds: float) -> None:
+        self.latencies[op].append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        result = {}
+        for op in set(self.counters) | set(self.latencies):
+            samples = sorted(self.latencies[op])
+            entry: Dict[str, Any] = dict(self.counters[op])
+            if samples:
+                entry.update({
+                    "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+                    "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 1),
+                    "max_ms": round(samples[-1] * 1000, 1),
+                })
+            result[op] = entry
+        return result
+
+
 class PayChanguClient:
-    """Small client for interacting with PayChangu transfer endpoints.
+    """Async client for PayChangu checkout, verification and payout endpoints.
 
-    This implementation keeps paths configurable since PayChangu's docs use
-    several endpoints depending on the operation (direct charge, transfers,
-    bulk transfers etc.). The helper methods below implement the common
-    transfer/payout flows needed for landlord disbursements.
+    One instance per process (`get_paychangu_client()`) shares a keep-alive
+    connection pool. Every call has an operation-specific timeout, goes
+    through a circuit breaker and is recorded in `metrics`. Idempotent reads
+    are retried with jittered backoff on timeouts, 429 and 5xx; writes are
+    only retried when the connection failed before the request was sent.
     """
 
     def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
@@ -40,6 +161,19 @@ class PayChanguClient:
         self.base_url = base_url or PAYCHANGU_BASE_URL
         if not self.api_key:
             raise PayChanguError("PAYCHANGU_API_KEY is not set in environment")
+        self.breaker = CircuitBreaker()
+        self.metrics = PayChanguMetrics()
+        # tx_ref -> in-flight verification, and tx_ref -> (expires_at, final response)
+        self._verifying: Dict[str, asyncio.Task] = {}
+        self._verified: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self._headers(),
+            limits=httpx.Limits(
+                max_connections=PAYCHANGU_MAX_CONNECTIONS,
+                max_keepalive_connections=PAYCHANGU_MAX_KEEPALIVE,
+            ),
+        )
 
     def _headers(self) -> Dict[str, str]:
         return {
@@ -48,27 +182,129 @@ class PayChanguClient:
             "Content-Type": "application/json",
         }
 
-    def _post(self, path: str, payload: Dict[str, Any], timeout: int = 30) -> Dict[str, Any]:
-        """Internal helper to post data to PayChangu and handle responses uniformly."""
-        url = f"{self.base_url}{path}"
-        logger.info("Posting to PayChangu %s: %s", url, {"payload": payload})
-        resp = requests.post(url, json=payload, headers=self._headers(), timeout=timeout)
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def _request(self, op: str, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                       idempotent: bool = False) -> httpx.Response:
+        timeout = httpx.Timeout(PAYCHANGU_OP_TIMEOUTS[op], connect=PAYCHANGU_CONNECT_TIMEOUT)
+        # Decimal, UUID and date values come straight from the models
+        content = json.dumps(payload, default=str) if payload is not None else None
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.metrics.count(op, "rejected")
+                raise CircuitOpenError("PayChangu is unavailable, try again shortly")
+
+            self.metrics.count(op, "requests")
+            started = time.monotonic()
+            error: Optional[Exception] = None
+            retryable = False
+            try:
+                resp = await asyncio.wait_for(
+                    self._http.request(method, path, content=content, timeout=timeout),
+                    PAYCHANGU_OP_TIMEOUTS[op],
+                )
+            except _NOT_SENT_ERRORS as e:
+                error, retryable = e, True
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                # Timeouts and dropped connections: the request may have been processed
+                error, retryable = e, idempotent
+            else:
+                if resp.status_code not in _RETRYABLE_STATUS:
+                    self.metrics.observe(op, time.monotonic() - started)
+                    self.breaker.record_success()
+                    self.metrics.count(op, "success" if resp.status_code < 400 else "client_errors")
+                    return resp
+                error = PayChanguError(f"PayChangu returned HTTP {resp.status_code}")
+                retryable = idempotent or resp.status_code == 429
+
+            self.metrics.observe(op, time.monotonic() - started)
+            self.metrics.count(op, "failures")
+            self.breaker.record_failure()
+            if not retryable or attempt >= PAYCHANGU_MAX_RETRIES:
+                logger.error("PayChangu %s %s failed after %d attempt(s): %s", method, path, attempt + 1, error)
+                if isinstance(error, PayChanguError):
+                    raise error
+                raise PayChanguError(f"Failed to reach PayChangu ({op}): {error!r}") from error
+
+            attempt += 1
+            self.metrics.count(op, "retries")
+            await asyncio.sleep(random.uniform(0, PAYCHANGU_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+    @staticmethod
+    def _json(resp: httpx.Response, what: str) -> Dict[str, Any]:
         try:
-            data = resp.json()
+            return resp.json()
         except ValueError:
-            logger.error("Non-json response from PayChangu: %s", resp.text)
-            raise PayChanguError("Invalid response from PayChangu")
+            logger.error("Non-json response from PayChangu (%s): %s", what, resp.text)
+            raise PayChanguError(f"Invalid response from PayChangu when {what}")
+
+    async def initiate_transaction(self, payment: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a hosted checkout (POST /payment); the body carries `status` and `data.checkout_url`."""
+        resp = await self._request("initiate", "POST", "/payment", payment)
+        return self._json(resp, "initiating a payment")
+
+    async def verify_transaction(self, tx_ref: str) -> Dict[str, Any]:
+        """Fetch the outcome of a checkout (GET /verify-payment/{tx_ref}).
+
+        Callers verifying the same tx_ref at the same time share one request,
+        and a final (success/failed) answer is reused for
+        `PAYCHANGU_VERIFY_CACHE_SECONDS`. Pending answers and errors are not
+        kept. Each caller gets its own copy of the response.
+        """
+        cached = self._verified.get(tx_ref)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.metrics.count("verify", "cache_hits")
+                return copy.deepcopy(cached[1])
+            del self._verified[tx_ref]
+
+        task = self._verifying.get(tx_ref)
+        if task is None:
+            task = asyncio.ensure_future(self._verify_once(tx_ref))
+            self._verifying[tx_ref] = task
+            task.add_done_callback(lambda done: self._verify_finished(tx_ref, done))
+        else:
+            self.metrics.count("verify", "coalesced")
+        # Shielded so one caller giving up does not cancel the request for the others
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _verify_finished(self, tx_ref: str, task: asyncio.Task) -> None:
+        self._verifying.pop(tx_ref, None)
+        # Mark the error as seen in case every waiter was cancelled before it arrived
+        if not task.cancelled():
+            task.exception()
+
+    async def _verify_once(self, tx_ref: str) -> Dict[str, Any]:
+        resp = await self._request("verify", "GET", f"/verify-payment/{tx_ref}", idempotent=True)
+        data = self._json(resp, "verifying a payment")
+        if PAYCHANGU_VERIFY_CACHE_SECONDS > 0 and verification_outcome(data) != "pending":
+            self._verified[tx_ref] = (time.monotonic() + PAYCHANGU_VERIFY_CACHE_SECONDS, data)
+            self._verified.move_to_end(tx_ref)
+            while len(self._verified) > PAYCHANGU_VERIFY_CACHE_SIZE:
+                self._verified.popitem(last=False)
+        return data
+
+    async def _post_transfer(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Post a payout and fail unless PayChangu reports success."""
+        logger.info("Posting to PayChangu %s: %s", path, {"payload": payload})
+        resp = await self._request("transfer", "POST", path, payload)
+        data = self._json(resp, "creating a transfer")
 
         # PayChangu sometimes uses boolean `status` or a string - normalise it
         status = data.get("status")
         if resp.status_code >= 400 or status not in ("success", True):
             message = data.get("message") or data.get("error") or resp.text
             logger.error("PayChangu request failed: %s", message)
-            raise PayChanguError(message)
+            if resp.status_code >= 500:
+                # A server error on a write may still have been processed
+                raise PayChanguError(message)
+            raise TransferRejected(message)
 
         return data
 
-    def create_transfer(self, *, amount: float, currency: str, bank_uuid: str, bank_account_number: str, bank_account_name: str, charge_id: str, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def create_transfer(self, *, amount: float, currency: str, bank_uuid: str, bank_account_number: str, bank_account_name: str, charge_id: str, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Generic transfer call using PayChangu's `/transfers` endpoint.
 
         This can be used for simple bank/mobile transfers when the payload is the
@@ -86,9 +322,9 @@ class PayChanguClient:
         if extra:
             payload.update(extra)
 
-        return self._post("/transfers", payload)
+        return await self._post_transfer("/transfers", payload)
 
-    def create_bank_transfer(self, *, amount: float, currency: str, bank_uuid: str, account_number: str, account_name: str, charge_id: str, payout_method: str | None = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def create_bank_transfer(self, *, amount: float, currency: str, bank_uuid: str, account_number: str, account_name: str, charge_id: str, payout_method: str | None = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Create a bank transfer (payout) using PayChangu Bank Payout API.
 
         Uses the documented endpoint POST /direct-charge/payouts/initialize.
@@ -106,9 +342,9 @@ class PayChanguClient:
         if extra:
             payload.update(extra)
         # Bank payouts use the direct-charge payouts initialize endpoint
-        return self._post("/direct-charge/payouts/initialize", payload)
+        return await self._post_transfer("/direct-charge/payouts/initialize", payload)
 
-    def create_mobile_money_transfer(self, *, amount: float, mobile_number: str, charge_id: str, mobile_money_operator_ref_id: str | None = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def create_mobile_money_transfer(self, *, amount: float, mobile_number: str, charge_id: str, mobile_money_operator_ref_id: str | None = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Create a mobile money transfer (payout) using PayChangu Mobile Money Payout API.
 
         Uses the documented endpoint POST /mobile-money/payouts/initialize.
@@ -139,38 +375,57 @@ class PayChanguClient:
             payload["mobile_money_operator_ref_id"] = str(mobile_money_operator_ref_id)
         if extra:
             payload.update(extra)
-        return self._post("/mobile-money/payouts/initialize", payload)
-
-    def get_transfer(self, transfer_id: str) -> Dict[str, Any]:
-        """Deprecated: older endpoint path; kept for compatibility."""
-        url = f"{self.base_url}/transfers/{transfer_id}"
-        resp = requests.get(url, headers=self._headers(), timeout=20)
-        try:
-            data = resp.json()
-        except ValueError:
-            raise PayChanguError("Invalid response from PayChangu when fetching transfer")
+        return await self._post_transfer("/mobile-money/payouts/initialize", payload)
 
+    async def _get_checked(self, path: str, what: str) -> Dict[str, Any]:
+        resp = await self._request("payout_status", "GET", path, idempotent=True)
+        data = self._json(resp, what)
         if resp.status_code >= 400:
             message = data.get("message") or resp.text
             raise PayChanguError(message)
         return data
 
-    def get_payout_details_by_charge(self, charge_id: str) -> Dict[str, Any]:
+    async def get_transfer(self, transfer_id: str) -> Dict[str, Any]:
+        """Deprecated: older endpoint path; kept for compatibility."""
+        return await self._get_checked(f"/transfers/{transfer_id}", "fetching transfer")
+
+    async def get_payout_details_by_charge(self, charge_id: str) -> Dict[str, Any]:
         """Fetch payout details using the charge_id (documented path).
 
         GET /direct-charge/payouts/{charge_id}/details
         """
-        url = f"{self.base_url}/direct-charge/payouts/{charge_id}/details"
-        resp = requests.get(url, headers=self._headers(), timeout=20)
-        try:
-            data = resp.json()
-        except ValueError:
-            raise PayChanguError("Invalid response from PayChangu when fetching payout details")
+        return await self._get_checked(f"/direct-charge/payouts/{charge_id}/details", "fetching payout details")
+
+
+_client: Optional[PayChanguClient] = None
+
+
+def get_paychangu_client() -> PayChanguClient:
+    """The process-wide PayChangu client, created on first use."""
+    global _client
+    if _client is None:
+        _client = PayChanguClient()
+    return _client
+
+
+async def close_paychangu_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def paychangu_stats() -> Dict[str, Any]:
+    if _client is None:
+        return {"status": "idle"}
+    return {
+        "circuit": _client.breaker.state,
+        "consecutive_failures": _client.breaker.failures,
+        "operations": _client.metrics.snapshot(),
+        "verifications_in_flight": len(_client._verifying),
+        "verifications_cached": len(_client._verified),
+    }
 
-        if resp.status_code >= 400:
-            message = data.get("message") or resp.text
-            raise PayChanguError(message)
-        return data
 
 def _normalize_mobile_number(mobile: Optional[str]) -> Optional[str]:
     if not mobile:
@@ -192,182 +447,91 @@ def _normalize_mobile_number(mobile: Optional[str]) -> Optional[str]:
     return s
 
 
-def process_disbursement(
-    disbursement_id: str,
+DISBURSEMENT_COMPLETED_STATES = ("completed", "success", "settled", "paid")
+DISBURSEMENT_FAILED_STATES = ("failed", "error", "rejected", "cancelled")
+
+
+def disbursement_charge_id(disbursement_id) -> str:
+    """The charge id a disbursement is sent and polled under."""
+    return f"disb_{disbursement_id}"
+
+
+def transfer_status(transfer_data: Dict[str, Any]) -> Optional[str]:
+    """Lower-cased payout status from a PayChangu transfer/payout payload."""
+    if not isinstance(transfer_data, dict):
+        return None
+    data = transfer_data.get("data") if isinstance(transfer_data.get("data"), dict) else {}
+    transaction = data.get("transaction") if isinstance(data.get("transaction"), dict) else {}
+    status = (
+        transaction.get("status")
+        or data.get("status")
+        or transfer_data.get("status")
+        or transaction.get("state")
+    )
+    return status.lower() if isinstance(status, str) else None
+
+
+def _transfer_reference(resp: Dict[str, Any]) -> Optional[str]:
+    if not isinstance(resp, dict):
+        return None
+    data = resp.get("data") if isinstance(resp.get("data"), dict) else {}
+    transaction = data.get("transaction") if isinstance(data.get("transaction"), dict) else {}
+    return transaction.get("ref_id") or data.get("ref_id") or data.get("id") or resp.get("ref_id") or resp.get("id")
+
+
+async def submit_transfer(
+    charge_id: str,
+    amount: float,
     *,
     payment_method: str = "bank_transfer",
     bank_uuid: Optional[str] = None,
     bank_account_number: Optional[str] = None,
     bank_account_name: Optional[str] = None,
     mobile_number: Optional[str] = None,
-    mobile_account_name: Optional[str] = None,
     mobile_money_operator_ref_id: Optional[str] = None,
     currency: str = "MWK",
-) -> Disbursement:
-    """High-level helper to send a disbursement via PayChangu and update the DB record.
-
-    Supports two payment methods:
-    - `bank_transfer` (requires `bank_uuid`, `bank_account_number`, `bank_account_name`)
-    - `mobile_money` (requires `bank_uuid`, `mobile_number`, `mobile_account_name`)
-
-    The function will:
-    - Load the Disbursement record from the database
-    - Mark it as `processing` and commit
-    - Call the appropriate PayChangu transfer API
-    - Update the Disbursement with `payment_reference`, `status`, `processed_at` or `failure_reason`
-    """
-    client = PayChanguClient()
+) -> Tuple[str, Optional[str]]:
+    """Send one payout; returns the normalised payment method and PayChangu's reference.
 
-    # If caller did not provide a bank_uuid, fall back to the environment default (if set).
-    bank_uuid = bank_uuid or PAYCHANGU_DEFAULT_BANK_UUID
+    Raises ValueError for incomplete transfer details (nothing was sent) and
+    PayChanguError when PayChangu rejects or cannot be reached.
+    """
+    client = get_paychangu_client()
 
-    # Normalize and validate bank_uuid if present
-    if bank_uuid:
+    if payment_method in ("bank_transfer", "bank"):
+        # If caller did not provide a bank_uuid, fall back to the environment default (if set).
+        bank_uuid = bank_uuid or PAYCHANGU_DEFAULT_BANK_UUID
+        if not (bank_uuid and bank_account_number and bank_account_name):
+            raise ValueError("bank_uuid, bank_account_number and bank_account_name are required for bank transfers")
         try:
-            import uuid as _uuid
             # allow uuid.UUID or string; convert to canonical string
-            bank_uuid = str(_uuid.UUID(str(bank_uuid)))
-        except Exception as e:
+            bank_uuid = str(uuid.UUID(str(bank_uuid)))
+        except ValueError as e:
             raise ValueError(f"Invalid bank_uuid provided: {bank_uuid}") from e
-
-    with db_session() as db:
-        disb = db.query(Disbursement).filter(Disbursement.disbursement_id == disbursement_id).first()
-        if not disb:
-            raise ValueError("Disbursement not found")
-
-        # Set to processing
-        disb.status = "processing"
-        db.commit()
-
-        try:
-            charge_id = f"disb_{disbursement_id}"
-
-            if payment_method in ("bank_transfer", "bank"):
-                if not (bank_uuid and bank_account_number and bank_account_name):
-                    raise ValueError("bank_uuid, bank_account_number and bank_account_name are required for bank transfers")
-                print("Here1..... Bank transfer initiated")
-                resp = client.create_bank_transfer(
-                    amount=float(disb.disbursement_amount),
-                    currency=currency,
-                    bank_uuid=bank_uuid,
-                    account_number=bank_account_number,
-                    account_name=bank_account_name,
-                    charge_id=charge_id,
-                    payout_method="bank",
-                )
-                disb.payment_method = "bank_transfer"
-
-            elif payment_method in ("mobile_money", "mobile"):
-                # Normalize and validate mobile number to the expected local format (strip country code)
-                mobile_number = _normalize_mobile_number(mobile_number)
-                if mobile_number and not str(mobile_number).startswith('0'):
-                    mobile_number = '0' + str(mobile_number)
-                mobile_money_operator_ref_id = mobile_money_operator_ref_id or os.getenv("PAYCHANGU_MOBILE_OPERATOR_REF_ID")
-
-                if not mobile_number:
-                    raise ValueError("mobile_number is required for mobile money transfers")
-
-                resp = client.create_mobile_money_transfer(
-                    amount=float(disb.disbursement_amount),
-                    mobile_number=mobile_number,
-                    charge_id=charge_id,
-                    mobile_money_operator_ref_id=mobile_money_operator_ref_id,
-                )
-                disb.payment_method = "mobile_money"
-
-            else:
-                raise ValueError(f"Unsupported payment_method: {payment_method}")
-
-            # Parse response for reference id
-            reference = None
-            if isinstance(resp, dict):
-                reference = (
-                    resp.get("data", {}).get("transaction", {}).get("ref_id")
-                    or resp.get("data", {}).get("ref_id")
-                    or resp.get("data", {}).get("id")
-                    or resp.get("ref_id")
-                )
-
-            disb.payment_reference = reference
-            # Keep record in processing state until PayChangu confirms settlement
-            disb.status = "processing"
-            db.commit()
-            db.refresh(disb)
-
-            # Try to extract a transfer ID to poll
-            transfer_id = (
-                reference or
-                (resp.get("data") or {}).get("id") or
-                resp.get("id")
-            )
-
-            # Helper to read status from a transfer payload
-            def _extract_status(transfer_data: Dict[str, Any]) -> Optional[str]:
-                if not isinstance(transfer_data, dict):
-                    return None
-                # Common places for a status
-                status = (
-                    transfer_data.get("data", {}).get("transaction", {}).get("status")
-                    or transfer_data.get("data", {}).get("status")
-                    or transfer_data.get("status")
-                    or transfer_data.get("data", {}).get("transaction", {}).get("state")
-                )
-                return status.lower() if isinstance(status, str) else None
-
-            completed_states = ("completed", "success", "settled", "paid")
-            failed_states = ("failed", "error", "rejected", "cancelled")
-
-            if not transfer_id:
-                logger.warning("No transfer id available from PayChangu response; leaving disbursement in processing: %s", disbursement_id)
-                return disb
-
-            # Poll the transfer status until settled or failure
-            for attempt in range(1, PAYCHANGU_POLL_RETRIES + 1):
-                try:
-                    # Prefer polling by charge_id (we set it to disb_<id> earlier) which uses the documented
-                    # GET /direct-charge/payouts/{charge_id}/details endpoint. Fall back to transfer_id if needed.
-                    transfer = client.get_payout_details_by_charge(charge_id)
-                except Exception as e:
-                    logger.warning("Attempt %s: failed to fetch payout details %s: %s", attempt, charge_id, str(e))
-                    if attempt < PAYCHANGU_POLL_RETRIES:
-                        time.sleep(PAYCHANGU_POLL_INTERVAL)
-                    continue
-
-                status = _extract_status(transfer)
-                logger.info("Payout %s status check attempt %s: %s", charge_id, attempt, status)
-
-                if status in completed_states:
-                    disb.payment_reference = transfer_id or charge_id
-                    disb.status = "completed"
-                    disb.processed_at = datetime.utcnow()
-                    db.commit()
-                    db.refresh(disb)
-                    logger.info("Disbursement %s completed (charge id %s)", disbursement_id, charge_id)
-                    return disb
-
-                if status in failed_states:
-                    disb.payment_reference = transfer_id or charge_id
-                    disb.status = "failed"
-                    disb.failure_reason = f"Transfer failed with status {status}"
-                    disb.processed_at = datetime.utcnow()
-                    db.commit()
-                    db.refresh(disb)
-                    logger.error("Disbursement %s failed (charge id %s): %s", disbursement_id, charge_id, status)
-                    raise PayChanguError(f"Transfer failed with status {status}")
-
-                # still pending
-                if attempt < PAYCHANGU_POLL_RETRIES:
-                    time.sleep(PAYCHANGU_POLL_INTERVAL)
-
-            # If we reach here, transfer is still pending after retries; leave as processing
-            logger.info("Transfer %s still pending after %s attempts; leaving disbursement as processing", transfer_id, PAYCHANGU_POLL_RETRIES)
-            return disb
-
-        except Exception as exc:  # pylint: disable=broad-except
-            logger.exception("Disbursement processing failed for %s", disbursement_id)
-            disb.status = "failed"
-            disb.failure_reason = str(exc)
-            disb.processed_at = datetime.utcnow()
-            db.commit()
-            db.refresh(disb)
-            raise
+        resp = await client.create_bank_transfer(
+            amount=float(amount),
+            currency=currency,
+            bank_uuid=bank_uuid,
+            account_number=bank_account_number,
+            account_name=bank_account_name,
+            charge_id=charge_id,
+            payout_method="bank",
+        )
+        return "bank_transfer", _transfer_reference(resp)
+
+    if payment_method in ("mobile_money", "mobile"):
+        # Normalize and validate mobile number to the expected local format (strip country code)
+        mobile_number = _normalize_mobile_number(mobile_number)
+        if not mobile_number:
+            raise ValueError("mobile_number is required for mobile money transfers")
+        if not str(mobile_number).startswith('0'):
+            mobile_number = '0' + str(mobile_number)
+        resp = await client.create_mobile_money_transfer(
+            amount=float(amount),
+            mobile_number=mobile_number,
+            charge_id=charge_id,
+            mobile_money_operator_ref_id=mobile_money_operator_ref_id or os.getenv("PAYCHANGU_MOBILE_OPERATOR_REF_ID"),
+        )
+        return "mobile_money", _transfer_reference(resp)
+
+    raise ValueError(f"Unsupported payment_method: {payment_method}")
@@ -0,0 +1,374 @@
+"""Local stand-in for the PayChangu API, for load and failure testing.
+
+Implements the endpoints `paychangu_service.PayChanguClient` calls:
+
+- `POST /payment` - create a hosted checkout and return its `checkout_url`;
+- `GET /verify-payment/{tx_ref}` - the checkout's outcome;
+- `POST /direct-charge/payouts/initialize`, `POST /mobile-money/payouts/initialize`
+  and `POST /transfers` - payouts, one per `charge_id`;
+- `GET /direct-charge/payouts/{charge_id}/details` and `GET /transfers/{id}` -
+  payout status, `pending` until `SIM_PAYOUT_SETTLE_SECONDS` have passed.
+
+`POST /checkout/{tx_ref}` plays the student paying on the hosted page: the
+payment becomes `success` (or `failed`, see `?outcome=`) and signed webhooks
+are delivered in the background the way PayChangu sends them
+(HMAC-SHA256 of the body with `PAYCHANGU_WEBHOOK_SECRET` in `Signature`).
+
+Faults are injected from the environment:
+
+- `SIM_LATENCY_MS` / `SIM_LATENCY_JITTER_MS` - added to every API call;
+- `SIM_FAILURE_RATE` - share of API calls answered 503 without being processed;
+- `SIM_LOST_RESPONSE_RATE` - share of writes processed but answered 504;
+- `SIM_DECLINE_RATE` - share of checkouts that fail when no outcome is given;
+- `SIM_DUPLICATE_WEBHOOK_RATE` / `SIM_DUPLICATE_WEBHOOKS` - share of payments
+  whose webhook is delivered that many extra times, concurrently;
+- `SIM_WEBHOOK_DELAY_MS` - wait before delivering webhooks;
+- `SIM_PAYOUT_FAILURE_RATE` - share of payouts that settle as failed.
+
+Webhooks go to `SIM_WEBHOOK_URL` (PayChangu's dashboard setting), falling
+back to the checkout's `callback_url`. State is in memory; counters are at
+`GET /_simulator/stats` and `POST /_simulator/reset` clears everything.
+
+Run with `uvicorn paychangu_simulator:app --port 8090` and point the API at
+it with `PAYCHANGU_BASE_URL=http://127.0.0.1:8090`.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Literal, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger('paychangu_simulator')
+
+SIM_PUBLIC_URL = os.getenv("SIM_PUBLIC_URL", "http://127.0.0.1:8090")
+SIM_WEBHOOK_URL = os.getenv("SIM_WEBHOOK_URL")
+SIM_LATENCY_MS = float(os.getenv("SIM_LATENCY_MS", "50"))
+SIM_LATENCY_JITTER_MS = float(os.getenv("SIM_LATENCY_JITTER_MS", "50"))
+SIM_FAILURE_RATE = float(os.getenv("SIM_FAILURE_RATE", "0"))
+SIM_LOST_RESPONSE_RATE = float(os.getenv("SIM_LOST_RESPONSE_RATE", "0"))
+SIM_DECLINE_RATE = float(os.getenv("SIM_DECLINE_RATE", "0"))
+SIM_DUPLICATE_WEBHOOK_RATE = float(os.getenv("SIM_DUPLICATE_WEBHOOK_RATE", "0"))
+SIM_DUPLICATE_WEBHOOKS = int(os.getenv("SIM_DUPLICATE_WEBHOOKS", "1"))
+SIM_WEBHOOK_DELAY_MS = float(os.getenv("SIM_WEBHOOK_DELAY_MS", "0"))
+SIM_WEBHOOK_RETRIES = int(os.getenv("SIM_WEBHOOK_RETRIES", "3"))
+SIM_PAYOUT_SETTLE_SECONDS = float(os.getenv("SIM_PAYOUT_SETTLE_SECONDS", "5"))
+SIM_PAYOUT_FAILURE_RATE = float(os.getenv("SIM_PAYOUT_FAILURE_RATE", "0"))
+PAYCHANGU_WEBHOOK_SECRET = os.getenv("PAYCHANGU_WEBHOOK_SECRET", "")
+
+# tx_ref -> checkout, charge_id -> payout, payout ref_id -> charge_id
+_checkouts: Dict[str, Dict[str, Any]] = {}
+_payouts: Dict[str, Dict[str, Any]] = {}
+_payout_refs: Dict[str, str] = {}
+_stats: Counter = Counter()
+_webhook_tasks: set = set()
+_http: Optional[httpx.AsyncClient] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _http
+    _http = httpx.AsyncClient(timeout=httpx.Timeout(10.0))
+    yield
+    for task in list(_webhook_tasks):
+        task.cancel()
+    await _http.aclose()
+
+
+app = FastAPI(title="PayChangu simulator", lifespan=lifespan)
+
+
+def _error(status_code: int, message: str) -> JSONResponse:
+    return JSONResponse({"status": "failed", "message": message, "data": None}, status_code=status_code)
+
+
+async def _api_call(request: Request, op: str) -> Optional[JSONResponse]:
+    """Latency, auth and injected failures shared by the API endpoints; a response means stop there."""
+    _stats[f"{op}_requests"] += 1
+    delay = SIM_LATENCY_MS + random.uniform(0, SIM_LATENCY_JITTER_MS)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+    if not (request.headers.get("Authorization") or "").startswith("Bearer "):
+        _stats[f"{op}_unauthorized"] += 1
+        return _error(401, "Unauthorized")
+    if random.random() < SIM_FAILURE_RATE:
+        _stats[f"{op}_injected_failures"] += 1
+        return _error(503, "Service temporarily unavailable")
+    return None
+
+
+def _lost_response(op: str) -> Optional[JSONResponse]:
+    """For writes that were applied: sometimes answer as if the response was lost."""
+    if random.random() < SIM_LOST_RESPONSE_RATE:
+        _stats[f"{op}_lost_responses"] += 1
+        return _error(504, "Gateway timeout")
+    return None
+
+
+async def _json_body(request: Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="JSON object expected")
+    return body
+
+
+# Checkout
+
+@app.post("/payment")
+async def create_checkout(request: Request):
+    stop = await _api_call(request, "initiate")
+    if stop:
+        return stop
+    body = await _json_body(request)
+    tx_ref = body.get("tx_ref")
+    if not tx_ref or body.get("amount") in (None, ""):
+        return _error(400, "tx_ref and amount are required")
+    if tx_ref in _checkouts:
+        _stats["initiate_duplicate_tx_ref"] += 1
+        return _error(400, "tx_ref has already been used")
+
+    _checkouts[tx_ref] = {
+        "tx_ref": tx_ref,
+        "reference": uuid.uuid4().hex[:12],
+        "amount": body["amount"],
+        "currency": body.get("currency") or "MWK",
+        "email": body.get("email"),
+        "callback_url": body.get("callback_url"),
+        "return_url": body.get("return_url"),
+        "meta": body.get("meta"),
+        "status": "pending",
+        "created_at": time.time(),
+        "paid_at": None,
+        "webhooks_sent": 0,
+    }
+    return _lost_response("initiate") or {
+        "message": "Hosted payment session generated successfully.",
+        "status": "success",
+        "data": {
+            "event": "checkout.session:created",
+            "checkout_url": f"{SIM_PUBLIC_URL}/checkout/{tx_ref}",
+            "data": {"tx_ref": tx_ref, "currency": _checkouts[tx_ref]["currency"],
+                     "amount": body["amount"], "mode": "sandbox", "status": "pending"},
+        },
+    }
+
+
+def _checkout_data(checkout: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "tx_ref": checkout["tx_ref"],
+        "reference": checkout["reference"],
+        "status": checkout["status"],
+        "amount": checkout["amount"],
+        "currency": checkout["currency"],
+        "mode": "sandbox",
+        "customer": {"email": checkout["email"]},
+        "meta": checkout["meta"],
+        "authorization": {"channel": "Mobile Money"},
+        "created_at": checkout["created_at"],
+        "completed_at": checkout["paid_at"],
+    }
+
+
+@app.get("/checkout/{tx_ref}")
+async def view_checkout(tx_ref: str):
+    checkout = _checkouts.get(tx_ref)
+    if checkout is None:
+        raise HTTPException(status_code=404, detail="Checkout not found")
+    return _checkout_data(checkout)
+
+
+@app.post("/checkout/{tx_ref}")
+async def pay_checkout(tx_ref: str, outcome: Optional[Literal["success", "failed"]] = Query(None)):
+    """The student completing (or failing) the hosted checkout."""
+    checkout = _checkouts.get(tx_ref)
+    if checkout is None:
+        raise HTTPException(status_code=404, detail="Checkout not found")
+    if checkout["status"] != "pending":
+        raise HTTPException(status_code=409, detail=f"Checkout already {checkout['status']}")
+
+    if outcome is None:
+        outcome = "failed" if random.random() < SIM_DECLINE_RATE else "success"
+    checkout["status"] = outcome
+    checkout["paid_at"] = time.time()
+    _stats[f"checkouts_{outcome}"] += 1
+
+    copies = 1
+    if random.random() < SIM_DUPLICATE_WEBHOOK_RATE:
+        copies += SIM_DUPLICATE_WEBHOOKS
+    task = asyncio.create_task(_deliver_webhooks(checkout, copies))
+    _webhook_tasks.add(task)
+    task.add_done_callback(_webhook_tasks.discard)
+    return {"tx_ref": tx_ref, "status": outcome, "webhooks": copies, "redirect_url": checkout["return_url"]}
+
+
+async def _deliver_webhooks(checkout: Dict[str, Any], copies: int) -> None:
+    if SIM_WEBHOOK_DELAY_MS > 0:
+        await asyncio.sleep(SIM_WEBHOOK_DELAY_MS / 1000)
+    url = SIM_WEBHOOK_URL or checkout["callback_url"]
+    if not url:
+        _stats["webhooks_without_url"] += 1
+        return
+    body = json.dumps({
+        "event_type": "api.charge.payment",
+        "tx_ref": checkout["tx_ref"],
+        "reference": checkout["reference"],
+        "status": checkout["status"],
+        "amount": checkout["amount"],
+        "currency": checkout["currency"],
+        "meta": checkout["meta"],
+    }).encode()
+    signature = hmac.new(PAYCHANGU_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    if copies > 1:
+        _stats["webhooks_duplicated"] += copies - 1
+    await asyncio.gather(*(_deliver(url, body, signature, checkout) for _ in range(copies)))
+
+
+async def _deliver(url: str, body: bytes, signature: str, checkout: Dict[str, Any]) -> None:
+    headers = {"Content-Type": "application/json", "Signature": signature}
+    for attempt in range(SIM_WEBHOOK_RETRIES + 1):
+        try:
+            resp = await _http.post(url, content=body, headers=headers)
+        except httpx.HTTPError as e:
+            logger.warning("Webhook for %s failed: %r", checkout["tx_ref"], e)
+        else:
+            if resp.status_code < 300:
+                _stats["webhooks_delivered"] += 1
+                checkout["webhooks_sent"] += 1
+                return
+            logger.warning("Webhook for %s answered %s", checkout["tx_ref"], resp.status_code)
+        _stats["webhook_retries"] += 1
+        await asyncio.sleep(0.5 * 2 ** attempt)
+    _stats["webhooks_abandoned"] += 1
+
+
+@app.get("/verify-payment/{tx_ref}")
+async def verify_payment(tx_ref: str, request: Request):
+    stop = await _api_call(request, "verify")
+    if stop:
+        return stop
+    checkout = _checkouts.get(tx_ref)
+    if checkout is None:
+        return _error(404, "Transaction not found")
+    # A declined payment is reported as a failed verification, like PayChangu does
+    return {
+        "status": "failed" if checkout["status"] == "failed" else "success",
+        "message": "Payment details retrieved successfully.",
+        "data": _checkout_data(checkout),
+    }
+
+
+# Payouts
+
+async def _create_payout(request: Request, method: str, required: tuple):
+    stop = await _api_call(request, "payout")
+    if stop:
+        return stop
+    body = await _json_body(request)
+    missing = [field for field in required if not body.get(field)]
+    if missing:
+        return _error(400, f"Missing fields: {', '.join(missing)}")
+    charge_id = str(body["charge_id"])
+    if charge_id in _payouts:
+        _stats["payout_duplicate_charge_id"] += 1
+        return _error(400, "The charge id has already been used")
+
+    ref_id = uuid.uuid4().hex[:16]
+    _payouts[charge_id] = {
+        "charge_id": charge_id,
+        "ref_id": ref_id,
+        "method": method,
+        "amount": body["amount"],
+        "currency": body.get("currency") or "MWK",
+        "created_at": time.time(),
+        "outcome": "failed" if random.random() < SIM_PAYOUT_FAILURE_RATE else "success",
+    }
+    _payout_refs[ref_id] = charge_id
+    _stats[f"payouts_{method}"] += 1
+    return _lost_response("payout") or {
+        "status": "success",
+        "message": "Payout initiated successfully",
+        "data": {"transaction": _payout_data(_payouts[charge_id])},
+    }
+
+
+def _payout_data(payout: Dict[str, Any]) -> Dict[str, Any]:
+    settled = time.time() - payout["created_at"] >= SIM_PAYOUT_SETTLE_SECONDS
+    return {
+        "charge_id": payout["charge_id"],
+        "ref_id": payout["ref_id"],
+        "trans_id": payout["ref_id"],
+        "type": payout["method"],
+        "amount": payout["amount"],
+        "currency": payout["currency"],
+        "status": payout["outcome"] if settled else "pending",
+        "created_at": payout["created_at"],
+    }
+
+
+@app.post("/direct-charge/payouts/initialize")
+async def bank_payout(request: Request):
+    return await _create_payout(request, "bank_transfer", ("amount", "charge_id", "bank_uuid", "bank_account_number", "bank_account_name"))
+
+
+@app.post("/mobile-money/payouts/initialize")
+async def mobile_money_payout(request: Request):
+    return await _create_payout(request, "mobile_money", ("amount", "charge_id", "mobile"))
+
+
+@app.post("/transfers")
+async def transfer(request: Request):
+    return await _create_payout(request, "bank_transfer", ("amount", "charge_id", "bank_uuid", "bank_account_number", "bank_account_name"))
+
+
+async def _payout_details(request: Request, charge_id: Optional[str]):
+    stop = await _api_call(request, "payout_status")
+    if stop:
+        return stop
+    payout = _payouts.get(charge_id) if charge_id else None
+    if payout is None:
+        return _error(404, "Payout not found")
+    return {"status": "success", "message": "Payout details", "data": {"transaction": _payout_data(payout)}}
+
+
+@app.get("/direct-charge/payouts/{charge_id}/details")
+async def payout_details(charge_id: str, request: Request):
+    return await _payout_details(request, charge_id)
+
+
+@app.get("/transfers/{transfer_id}")
+async def transfer_details(transfer_id: str, request: Request):
+    return await _payout_details(request, _payout_refs.get(transfer_id, transfer_id))
+
+
+# Control
+
+@app.get("/_simulator/stats")
+async def simulator_stats():
+    return {
+        "counters": dict(_stats),
+        "checkouts": dict(Counter(checkout["status"] for checkout in _checkouts.values())),
+        "payouts": len(_payouts),
+        "webhooks_in_flight": len(_webhook_tasks),
+    }
+
+
+@app.post("/_simulator/reset")
+async def reset_simulator():
+    _checkouts.clear()
+    _payouts.clear()
+    _payout_refs.clear()
+    _stats.clear()
+    return {"status": "reset"}
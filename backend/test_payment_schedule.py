@@ -0,0 +1,125 @@
+"""Month arithmetic and next-due logic of endpoints.payment_schedule."""
+import os
+import sys
+import uuid
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+import pytest
+from dateutil.relativedelta import relativedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from endpoints.payment_schedule import add_months, months_between, summarize_schedules  # noqa: E402
+
+# Shape of the grouped rows `schedule_summaries` hands to `summarize_schedules`
+ScheduleRow = namedtuple("ScheduleRow", [
+    "booking_id", "start_date", "instalments", "total_amount",
+    "paid_amount", "unpaid_instalments", "next_unpaid_seq",
+])
+
+
+def _add_months(start: date, months: int) -> date:
+    return add_months(np.array([start], dtype='datetime64[D]'), np.array([months]))[0].item()
+
+
+@pytest.mark.parametrize("start, months, expected", [
+    (date(2024, 1, 31), 1, date(2024, 2, 29)),   # leap February
+    (date(2023, 1, 31), 1, date(2023, 2, 28)),
+    (date(2024, 8, 31), 1, date(2024, 9, 30)),
+    (date(2024, 3, 31), -1, date(2024, 2, 29)),
+    (date(2024, 1, 30), 1, date(2024, 2, 29)),
+    (date(2024, 2, 29), 12, date(2025, 2, 28)),
+    (date(2024, 11, 15), 3, date(2025, 2, 15)),
+    (date(2024, 5, 10), 0, date(2024, 5, 10)),
+])
+def test_add_months_clips_to_end_of_month(start, months, expected):
+    assert _add_months(start, months) == expected
+
+
+def test_add_months_matches_relativedelta_elementwise():
+    starts = [date(2023, 1, 1) + relativedelta(days=d) for d in range(0, 800, 7)]
+    months = [d % 25 for d in range(len(starts))]
+    result = add_months(np.array(starts, dtype='datetime64[D]'), np.array(months))
+    assert [d.item() for d in result] == [s + relativedelta(months=m) for s, m in zip(starts, months)]
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (date(2024, 1, 15), date(2024, 1, 15), 0),
+    (date(2024, 1, 15), date(2024, 4, 15), 3),
+    (date(2024, 1, 15), date(2024, 4, 16), 4),   # a partial month counts as a month
+    (date(2024, 1, 15), date(2024, 1, 20), 1),
+    (date(2024, 1, 31), date(2024, 2, 29), 1),   # end-of-month stay
+    (date(2024, 1, 31), date(2024, 3, 31), 2),
+    (date(2023, 12, 1), date(2025, 1, 1), 13),
+])
+def test_months_between(start, end, expected):
+    assert months_between(start, end) == expected
+
+
+def test_months_between_inverts_stay_end():
+    start = date(2024, 1, 31)
+    for months in range(1, 25):
+        assert months_between(start, start + relativedelta(months=months)) == months
+
+
+def _row(start, instalments, rent, paid_months, unpaid, next_seq):
+    return ScheduleRow(
+        booking_id=uuid.uuid4(),
+        start_date=start,
+        instalments=instalments,
+        total_amount=rent * instalments,
+        paid_amount=rent * paid_months,
+        unpaid_instalments=unpaid,
+        next_unpaid_seq=next_seq,
+    )
+
+
+def test_summaries_next_due_is_first_unpaid_instalment():
+    today = date(2024, 3, 1)
+    rows = [
+        _row(date(2024, 1, 31), 6, 100.0, 2, 4, 3),   # months 1-2 paid
+        _row(date(2024, 1, 31), 4, 100.0, 4, 0, None),  # fully paid
+        _row(date(2024, 1, 31), 6, 100.0, 3, 3, 2),   # month 2 unpaid, later months paid
+        _row(date(2024, 2, 10), 3, 100.0, 0, 3, 1),   # nothing paid yet
+    ]
+    summaries = summarize_schedules(rows, today)
+    first, done, gap, fresh = (summaries[str(row.booking_id)] for row in rows)
+
+    assert first["months_paid"] == 2
+    assert first["next_due_date"] == date(2024, 3, 31)
+    assert first["days_until_due"] == 30
+    assert first["outstanding_amount"] == 400.0
+
+    assert done["months_paid"] == 4
+    assert done["next_due_date"] is None
+    assert done["days_until_due"] is None
+    assert done["outstanding_amount"] == 0.0
+
+    assert gap["months_paid"] == 3
+    assert gap["next_due_date"] == date(2024, 2, 29)
+    assert gap["days_until_due"] == -1
+
+    assert fresh["months_paid"] == 0
+    assert fresh["next_due_date"] == date(2024, 2, 10)
+
+
+def test_summaries_do_not_derive_months_paid_from_amounts():
+    # Rent changed on extension: the average monthly amount no longer divides the paid amount
+    row = ScheduleRow(
+        booking_id=uuid.uuid4(),
+        start_date=date(2024, 1, 1),
+        instalments=3,
+        total_amount=100.0 + 100.0 + 150.0,
+        paid_amount=200.0,
+        unpaid_instalments=1,
+        next_unpaid_seq=3,
+    )
+    summary = summarize_schedules([row], date(2024, 1, 1))[str(row.booking_id)]
+    assert summary["months_paid"] == 2
+    assert summary["next_due_date"] == date(2024, 3, 1)
+
+
+def test_summaries_empty():
+    assert summarize_schedules([], date(2024, 1, 1)) == {}
@@ -0,0 +1,30 @@
+"""Bed selection of endpoints.room_availability."""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from endpoints.room_availability import pick_free_bed  # noqa: E402
+
+
+def test_empty_room_gets_bed_one():
+    assert pick_free_bed([], 2) == 1
+
+
+def test_back_to_back_stays_on_one_bed_leave_the_other_free():
+    # Bed 1 is booked Jan-Jun and again Jul-Dec; both overlap the requested year
+    assert pick_free_bed([1, 1], 2) == 2
+
+
+def test_legacy_booking_without_bed_takes_a_bed():
+    assert pick_free_bed([1, None], 3) == 2
+    assert pick_free_bed([1, None], 2) is None
+
+
+def test_full_room():
+    assert pick_free_bed([1, 2], 2) is None
+    assert pick_free_bed([None, None], 2) is None
+
+
+def test_zero_capacity():
+    assert pick_free_bed([], 0) is None
@@ -0,0 +1,12 @@
+-- Time-limited bed holds for pending bookings
+-- (see backend/endpoints/room_availability.py: admit_booking / release_expired_holds)
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS hold_expires_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS ix_bookings_pending_hold
+    ON bookings (hold_expires_at)
+    WHERE status = 'pending';
+
+-- Existing pending bookings keep their bed for one more hold period
+UPDATE bookings
+SET hold_expires_at = now() + INTERVAL '30 minutes'
+WHERE status = 'pending' AND hold_expires_at IS NULL;
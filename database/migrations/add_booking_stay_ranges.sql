@@ -0,0 +1,54 @@
+-- Booking date ranges, bed assignment and the no-double-bed exclusion constraint
+-- (see backend/endpoints/room_availability.py)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS bed_number INTEGER;
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS stay DATERANGE
+    GENERATED ALWAYS AS (daterange(start_date, end_date, '[)')) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_bookings_room_stay ON bookings USING gist (room_id, stay);
+
+-- Give existing confirmed stays the lowest bed free for their whole range.
+-- Pending bookings and stays beyond capacity keep a NULL bed (still counted
+-- against capacity, but outside the constraint).
+DO $$
+DECLARE
+    b RECORD;
+    bed INTEGER;
+BEGIN
+    FOR b IN
+        SELECT bk.booking_id, bk.room_id, bk.stay, r.capacity
+        FROM bookings bk JOIN rooms r ON r.room_id = bk.room_id
+        WHERE bk.bed_number IS NULL
+          AND bk.status NOT IN ('pending', 'rejected', 'cancelled', 'payment_failed', 'expired')
+        ORDER BY bk.room_id, bk.start_date, bk.created_at
+    LOOP
+        SELECT s.n INTO bed
+        FROM generate_series(1, b.capacity) AS s(n)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM bookings o
+            WHERE o.room_id = b.room_id
+              AND o.bed_number = s.n
+              AND o.stay && b.stay
+              AND o.status NOT IN ('rejected', 'cancelled', 'payment_failed', 'expired')
+        )
+        ORDER BY s.n
+        LIMIT 1;
+
+        IF bed IS NOT NULL THEN
+            UPDATE bookings SET bed_number = bed WHERE booking_id = b.booking_id;
+        END IF;
+    END LOOP;
+END $$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'bookings_no_double_bed' AND conrelid = 'bookings'::regclass
+    ) THEN
+        ALTER TABLE bookings ADD CONSTRAINT bookings_no_double_bed
+            EXCLUDE USING gist (room_id WITH =, bed_number WITH =, stay WITH &&)
+            WHERE (status NOT IN ('rejected', 'cancelled', 'payment_failed', 'expired'));
+    END IF;
+END $$;
@@ -0,0 +1,15 @@
+-- Change feed for GET /sync; rows are appended by the change_log_record()
+-- triggers installed at API startup (endpoints/change_log.py)
+CREATE TABLE IF NOT EXISTS change_log (
+    change_id BIGSERIAL PRIMARY KEY,
+    txid BIGINT NOT NULL,
+    entity VARCHAR(20) NOT NULL,
+    entity_id UUID NOT NULL,
+    op VARCHAR(1) NOT NULL,
+    user_id UUID,
+    landlord_id UUID,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_change_log_position ON change_log (txid, change_id);
+CREATE INDEX IF NOT EXISTS ix_change_log_changed_at ON change_log (changed_at);
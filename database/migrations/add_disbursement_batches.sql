@@ -0,0 +1,26 @@
+-- Queued landlord payouts (see backend/endpoints/disbursement_engine.py)
+CREATE TABLE IF NOT EXISTS disbursement_batches (
+    batch_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    landlord_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    created_by UUID REFERENCES users(user_id) ON DELETE SET NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'processing',
+    total_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    total_bookings INTEGER NOT NULL DEFAULT 0,
+    transfer_details JSONB,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_disbursement_batches_landlord_id ON disbursement_batches (landlord_id);
+CREATE INDEX IF NOT EXISTS ix_disbursement_batches_created_at ON disbursement_batches (created_at);
+
+ALTER TABLE disbursements
+    ADD COLUMN IF NOT EXISTS batch_id UUID REFERENCES disbursement_batches(batch_id) ON DELETE SET NULL,
+    ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS locked_until TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS submitted_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS ix_disbursements_batch_id ON disbursements (batch_id);
+CREATE INDEX IF NOT EXISTS ix_disbursements_due ON disbursements (next_attempt_at)
+    WHERE status IN ('queued', 'submitting', 'processing');
@@ -0,0 +1,20 @@
+-- Queued CSV/XLSX exports (see backend/endpoints/exports.py)
+CREATE TABLE IF NOT EXISTS export_jobs (
+    job_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    owner_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    kind VARCHAR(30) NOT NULL,
+    format VARCHAR(10) NOT NULL,
+    filters JSONB,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    total_rows INTEGER,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    file_path VARCHAR(500),
+    file_size BIGINT,
+    error TEXT,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_export_jobs_owner_id ON export_jobs (owner_id);
+CREATE INDEX IF NOT EXISTS ix_export_jobs_queued ON export_jobs (created_at) WHERE status = 'queued';
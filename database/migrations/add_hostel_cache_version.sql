@@ -0,0 +1,2 @@
+-- Version stamp for the hostel card cache; bumped by hostel, room, media and review writes
+ALTER TABLE hostels ADD COLUMN IF NOT EXISTS cache_version INTEGER NOT NULL DEFAULT 1;
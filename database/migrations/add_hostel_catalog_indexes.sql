@@ -0,0 +1,14 @@
+-- Indexes backing the set-based hostel catalog (GET /hostels/all-hostels)
+
+-- Keyset pagination order: newest first, hostel_id as tie-breaker
+CREATE INDEX IF NOT EXISTS idx_hostels_catalog_keyset
+    ON hostels (created_at DESC NULLS LAST, hostel_id DESC)
+    WHERE is_active = TRUE;
+
+-- Approved-landlord EXISTS filter
+CREATE INDEX IF NOT EXISTS idx_verifications_landlord_status ON verifications(landlord_id, status);
+
+-- Batched per-page lookups (room counts, media, review aggregates)
+CREATE INDEX IF NOT EXISTS idx_rooms_hostel_id ON rooms(hostel_id);
+CREATE INDEX IF NOT EXISTS idx_media_hostel_order ON media(hostel_id, display_order, created_at);
+CREATE INDEX IF NOT EXISTS idx_reviews_hostel_id ON reviews(hostel_id);
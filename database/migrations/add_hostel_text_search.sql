@@ -0,0 +1,21 @@
+-- Full-text and typo-tolerant hostel search (GET /hostels/search?q=...)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Lower-cased haystack for trigram (word_similarity / <%) matching
+ALTER TABLE hostels ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (
+        lower(coalesce(name, '') || ' ' || coalesce(district, '') || ' ' ||
+              coalesce(university, '') || ' ' || coalesce(address, ''))
+    ) STORED;
+
+-- Weighted document: name (A), district/university (B), address (C), description (D)
+ALTER TABLE hostels ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(district, '') || ' ' || coalesce(university, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(address, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'D')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_hostels_search_vector ON hostels USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_hostels_search_text_trgm ON hostels USING GIN (search_text gin_trgm_ops);
@@ -0,0 +1,16 @@
+-- Idempotency-Key claims and stored responses (see backend/endpoints/idempotency.py)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    endpoint VARCHAR(100) NOT NULL,
+    key VARCHAR(255) NOT NULL,
+    request_hash VARCHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'in_progress',
+    response_status INTEGER,
+    response_body JSONB,
+    locked_until TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    completed_at TIMESTAMPTZ,
+    PRIMARY KEY (user_id, endpoint, key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_created_at ON idempotency_keys (created_at);
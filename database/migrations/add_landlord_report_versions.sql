@@ -0,0 +1,12 @@
+-- Per-landlord report versions for the cached landlord reports
+-- (triggers are installed on startup by backend/endpoints/landlord_reports.py)
+CREATE TABLE IF NOT EXISTS landlord_report_versions (
+    landlord_id UUID PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Join paths of the report aggregates
+CREATE INDEX IF NOT EXISTS ix_hostels_landlord_id ON hostels (landlord_id);
+CREATE INDEX IF NOT EXISTS ix_rooms_hostel_id ON rooms (hostel_id);
+CREATE INDEX IF NOT EXISTS ix_payments_booking_id ON payments (booking_id);
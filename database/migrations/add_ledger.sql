@@ -0,0 +1,34 @@
+-- Double-entry ledger of payments and payouts
+-- (posting functions and triggers are installed on startup by backend/endpoints/ledger.py,
+--  which also backfills an empty ledger from existing payments and disbursements)
+CREATE TABLE IF NOT EXISTS ledger_entries (
+    entry_id BIGSERIAL PRIMARY KEY,
+    journal_id UUID NOT NULL,
+    event VARCHAR(40) NOT NULL,
+    account VARCHAR(100) NOT NULL,
+    landlord_id UUID,
+    debit NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    credit NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    payment_id UUID,
+    disbursement_id UUID,
+    booking_id UUID,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_ledger_entries_journal_id ON ledger_entries (journal_id);
+CREATE INDEX IF NOT EXISTS ix_ledger_entries_landlord_id ON ledger_entries (landlord_id);
+CREATE INDEX IF NOT EXISTS ix_ledger_entries_payment_id ON ledger_entries (payment_id);
+CREATE INDEX IF NOT EXISTS ix_ledger_entries_disbursement_id ON ledger_entries (disbursement_id);
+CREATE INDEX IF NOT EXISTS ix_ledger_entries_account_entry ON ledger_entries (account, entry_id);
+
+CREATE TABLE IF NOT EXISTS ledger_balances (
+    account VARCHAR(100) PRIMARY KEY,
+    landlord_id UUID,
+    debits NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    credits NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    balance NUMERIC(14, 2) GENERATED ALWAYS AS (debits - credits) STORED,
+    entries BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_ledger_balances_landlord_id ON ledger_balances (landlord_id);
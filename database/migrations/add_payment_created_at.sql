@@ -0,0 +1,14 @@
+-- Creation time of payments, used by the pending-payment sweeper
+-- (see backend/endpoints/booking_sweeper.py)
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ;
+
+UPDATE payments p
+SET created_at = COALESCE(p.paid_at, b.created_at, now())
+FROM bookings b
+WHERE b.booking_id = p.booking_id AND p.created_at IS NULL;
+
+ALTER TABLE payments ALTER COLUMN created_at SET DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS ix_payments_pending_created
+    ON payments (created_at)
+    WHERE status = 'pending';
@@ -0,0 +1,44 @@
+-- Materialized monthly rent instalments per booking
+-- (see backend/endpoints/payment_schedule.py)
+CREATE TABLE IF NOT EXISTS payment_instalments (
+    instalment_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    booking_id UUID NOT NULL REFERENCES bookings(booking_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    due_date DATE NOT NULL,
+    amount NUMERIC(10, 2) NOT NULL,
+    payment_id UUID REFERENCES payments(payment_id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_payment_instalments_booking_seq ON payment_instalments (booking_id, seq);
+CREATE INDEX IF NOT EXISTS ix_payment_instalments_due_date ON payment_instalments (due_date);
+CREATE INDEX IF NOT EXISTS ix_payment_instalments_payment_id ON payment_instalments (payment_id);
+
+-- Backfill existing bookings: one instalment per month of the stay at the
+-- room's current rent. Bookings that were paid in full (or completed /
+-- extended) link every month to their latest such payment; booking-fee
+-- bookings start unpaid.
+INSERT INTO payment_instalments (booking_id, seq, due_date, amount, payment_id)
+SELECT b.booking_id,
+       s.seq,
+       (b.start_date + (s.seq - 1) * INTERVAL '1 month')::date,
+       r.price_per_month,
+       paid.payment_id
+FROM bookings b
+JOIN rooms r ON r.room_id = b.room_id
+CROSS JOIN LATERAL generate_series(
+    1,
+    (EXTRACT(YEAR FROM age(b.end_date, b.start_date)) * 12
+     + EXTRACT(MONTH FROM age(b.end_date, b.start_date))
+     + CASE WHEN EXTRACT(DAY FROM age(b.end_date, b.start_date)) > 0 THEN 1 ELSE 0 END)::int
+) AS s(seq)
+LEFT JOIN LATERAL (
+    SELECT p.payment_id
+    FROM payments p
+    WHERE p.booking_id = b.booking_id
+      AND p.status = 'completed'
+      AND p.payment_type IN ('full', 'complete', 'extension')
+    ORDER BY p.paid_at DESC NULLS LAST
+    LIMIT 1
+) paid ON TRUE
+WHERE NOT EXISTS (SELECT 1 FROM payment_instalments i WHERE i.booking_id = b.booking_id);
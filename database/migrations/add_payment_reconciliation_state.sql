@@ -0,0 +1,5 @@
+-- Last PayChangu verification of each payment, used by the reconciler to
+-- back off from and stop re-polling expired payments
+-- (see backend/endpoints/payment_reconciliation.py)
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS last_reconciled_at TIMESTAMPTZ;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS reconciled_outcome VARCHAR(20);
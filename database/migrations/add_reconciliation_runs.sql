@@ -0,0 +1,15 @@
+-- Reports of the pending-payment reconciler (see backend/endpoints/payment_reconciliation.py)
+CREATE TABLE IF NOT EXISTS reconciliation_runs (
+    run_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    trigger VARCHAR(20) NOT NULL DEFAULT 'schedule',
+    started_at TIMESTAMPTZ DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    examined INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    still_pending INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    details JSONB
+);
+
+CREATE INDEX IF NOT EXISTS ix_reconciliation_runs_started_at ON reconciliation_runs (started_at);
@@ -0,0 +1,19 @@
+-- Inbox of received payment-provider webhooks (see backend/endpoints/webhook_inbox.py)
+CREATE TABLE IF NOT EXISTS webhook_events (
+    event_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    provider VARCHAR(30) NOT NULL DEFAULT 'paychangu',
+    tx_ref VARCHAR(255) NOT NULL,
+    event_type VARCHAR(100) NOT NULL,
+    payload JSONB,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ DEFAULT now(),
+    locked_until TIMESTAMPTZ,
+    last_error TEXT,
+    received_at TIMESTAMPTZ DEFAULT now(),
+    processed_at TIMESTAMPTZ,
+    CONSTRAINT uq_webhook_events_tx_ref_type UNIQUE (provider, tx_ref, event_type)
+);
+
+CREATE INDEX IF NOT EXISTS ix_webhook_events_due ON webhook_events (next_attempt_at)
+    WHERE status IN ('pending', 'processing');
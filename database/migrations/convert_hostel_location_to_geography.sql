@@ -0,0 +1,10 @@
+-- Convert hostels.location from WKT text to a native PostGIS geography column
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+-- Works for both legacy WKT text ("POINT(lon lat)") and an existing geography column
+ALTER TABLE hostels
+    ALTER COLUMN location TYPE geography(Point, 4326)
+    USING ST_SetSRID(location::text::geometry, 4326)::geography;
+
+-- Radius (ST_DWithin) and k-nearest-neighbour (<->) search
+CREATE INDEX IF NOT EXISTS idx_hostels_location_gist ON hostels USING GIST (location);
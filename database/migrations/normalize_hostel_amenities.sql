@@ -0,0 +1,30 @@
+-- Normalize hostels.amenities to the canonical {"<amenity>": true} object
+-- (create_hostel used to store a list, update_hostel a dict of flags)
+UPDATE hostels h
+SET amenities = COALESCE(
+    (SELECT jsonb_object_agg(btrim(elem), TRUE)
+     FROM jsonb_array_elements_text(h.amenities) AS elem
+     WHERE btrim(elem) <> ''),
+    '{}'::jsonb
+)
+WHERE jsonb_typeof(h.amenities) = 'array';
+
+UPDATE hostels h
+SET amenities = COALESCE(
+    (SELECT jsonb_object_agg(btrim(kv.key), TRUE)
+     FROM jsonb_each(h.amenities) AS kv
+     WHERE btrim(kv.key) <> '' AND kv.value NOT IN ('false'::jsonb, 'null'::jsonb))
+    , '{}'::jsonb
+)
+WHERE jsonb_typeof(h.amenities) = 'object';
+
+UPDATE hostels SET amenities = '{}'::jsonb WHERE amenities IS NULL OR jsonb_typeof(amenities) NOT IN ('object', 'array');
+
+-- Amenity containment (@>) for /hostels/search
+CREATE INDEX IF NOT EXISTS idx_hostels_amenities_gin ON hostels USING GIN (amenities jsonb_path_ops);
+
+-- Case-insensitive facet filters
+CREATE INDEX IF NOT EXISTS idx_hostels_lower_district ON hostels (lower(district));
+CREATE INDEX IF NOT EXISTS idx_hostels_lower_university ON hostels (lower(university));
+CREATE INDEX IF NOT EXISTS idx_hostels_lower_type ON hostels (lower(type));
+CREATE INDEX IF NOT EXISTS idx_hostels_price_per_month ON hostels (price_per_month);